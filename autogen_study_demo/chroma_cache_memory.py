@@ -0,0 +1,238 @@
+# -*- coding: utf-8 -*-
+
+"""
+带嵌入缓存与查询结果缓存的 ChromaDB 向量记忆
+
+供 code_5.5.5_构建带有向量检索功能的记忆代理.py 使用，单独成模块便于在不创建模型客户端的情况下测试
+"""
+
+import json
+import logging
+import re
+import time
+import uuid
+from collections import OrderedDict, defaultdict, deque
+
+import numpy as np
+from autogen_core.memory import MemoryContent, MemoryMimeType, MemoryQueryResult
+from autogen_ext.memory.chromadb import ChromaDBVectorMemory, PersistentChromaDBVectorMemoryConfig
+
+logger = logging.getLogger(__name__)
+
+
+class CachedChromaDBVectorMemory(ChromaDBVectorMemory):
+    """
+    带缓存的 ChromaDB 向量记忆
+
+    1. 嵌入缓存：相同文本只嵌入一次（LRU）
+    2. 查询结果缓存：按归一化后的查询文本和查询参数（where 等）缓存，add/clear/reset 时整体失效；
+       设置 near_duplicate（如 0.98）后，查询参数相同且余弦相似度 ≥ near_duplicate 的问题也复用结果。
+       默认关闭：向量很接近的问题也可能想问不同的内容，近似复用需要按数据自行评估
+    3. add_many 批量写入：一次嵌入请求 + 一次 collection.add
+    4. query 可按次指定 k / score_threshold；缓存的是按 max(k, max_k) 取回的原始结果，并记下取回条数，
+       之后的 k 超过该条数（且当时集合还有更多结果）时重新查询
+    5. stats() 输出各阶段耗时与命中率，耗时只保留最近 latency_window 个样本
+    """
+
+    def __init__(self, config: PersistentChromaDBVectorMemoryConfig, max_k: int = 10,
+                 embedding_cache_size: int = 2048, query_cache_size: int = 256, near_duplicate: float = None,
+                 latency_window: int = 1024):
+        super().__init__(config=config)
+        self.max_k = max(max_k, config.k)
+        self.embedding_cache_size = embedding_cache_size
+        self.query_cache_size = query_cache_size
+        self.near_duplicate = near_duplicate
+        self._embed_fn = None
+        self._embedding_cache = OrderedDict()
+        # (归一化查询文本, 查询参数) -> (查询向量, 原始结果[(文档, 元数据, 距离, id)], 取回条数 n_results)
+        self._query_cache = OrderedDict()
+        self._latency = defaultdict(lambda: deque(maxlen=latency_window))
+        self._counters = defaultdict(int)
+
+    # ------------------------------------------------------------------
+    # 嵌入
+    # ------------------------------------------------------------------
+
+    def _ensure_initialized(self) -> None:
+        super()._ensure_initialized()
+        if self._embed_fn is None:
+            # 复用集合上的嵌入函数，避免重复加载模型
+            self._embed_fn = getattr(self._collection, "_embedding_function", None) or self._create_embedding_function()
+
+    def _embed(self, texts):
+        """批量嵌入，只对未缓存的文本发起一次请求"""
+        missing = list(dict.fromkeys(t for t in texts if t not in self._embedding_cache))
+        self._counters["embedding_hits"] += len(texts) - len(missing)
+        self._counters["embedding_misses"] += len(missing)
+        if missing:
+            started = time.perf_counter()
+            vectors = self._embed_fn(missing)
+            self._record("embed", started)
+            for text, vector in zip(missing, vectors):
+                self._embedding_cache[text] = np.asarray(vector, dtype=np.float32)
+        out = []
+        for text in texts:
+            self._embedding_cache.move_to_end(text)
+            out.append(self._embedding_cache[text])
+        while len(self._embedding_cache) > self.embedding_cache_size:
+            self._embedding_cache.popitem(last=False)
+        return out
+
+    # ------------------------------------------------------------------
+    # 写入
+    # ------------------------------------------------------------------
+
+    async def add_many(self, contents) -> None:
+        """批量写入 MemoryContent"""
+        if not contents:
+            return
+        self._ensure_initialized()
+        if self._collection is None:
+            raise RuntimeError("Failed to initialize ChromaDB")
+        started = time.perf_counter()
+        texts = [self._extract_text(content) for content in contents]
+        metadatas = [{**(content.metadata or {}), "mime_type": str(content.mime_type)} for content in contents]
+        embeddings = self._embed(texts)
+        self._collection.add(
+            documents=texts,
+            embeddings=[vector.tolist() for vector in embeddings],
+            metadatas=metadatas,
+            ids=[str(uuid.uuid4()) for _ in contents],
+        )
+        self._query_cache.clear()
+        self._record("add", started)
+
+    async def add(self, content: MemoryContent, cancellation_token=None) -> None:
+        await self.add_many([content])
+
+    async def clear(self) -> None:
+        self._query_cache.clear()
+        await super().clear()
+
+    async def reset(self) -> None:
+        self._query_cache.clear()
+        self._embed_fn = None
+        await super().reset()
+
+    # ------------------------------------------------------------------
+    # 查询
+    # ------------------------------------------------------------------
+
+    @staticmethod
+    def _normalize(text: str) -> str:
+        return re.sub(r"\s+", " ", text).strip().strip("?？!！。.,，").lower()
+
+    @staticmethod
+    def _covers(entry, n_results: int) -> bool:
+        """缓存条目能否回答需要 n_results 条的查询：当时取回的不少于 n_results，或集合里本来就没有更多"""
+        _, raw, fetched = entry
+        return fetched >= n_results or len(raw) < fetched
+
+    def _lookup(self, key, vector, n_results: int):
+        cached = self._query_cache.get(key)
+        if cached is not None and self._covers(cached, n_results):
+            self._query_cache.move_to_end(key)
+            return cached[1]
+        if vector is None or self.near_duplicate is None:
+            return None
+        # 语义近似：只与查询参数相同、取回条数足够的已缓存查询比较余弦相似度
+        keys = [k for k, entry in self._query_cache.items() if k[1] == key[1] and self._covers(entry, n_results)]
+        if not keys:
+            return None
+        matrix = np.stack([self._query_cache[k][0] for k in keys])
+        sims = matrix @ vector / (np.linalg.norm(matrix, axis=1) * np.linalg.norm(vector) + 1e-12)
+        best = int(np.argmax(sims))
+        if sims[best] >= self.near_duplicate:
+            self._counters["near_duplicate_hits"] += 1
+            return self._query_cache[keys[best]][1]
+        return None
+
+    async def query(self, query, cancellation_token=None, k: int = None, score_threshold: float = None, **kwargs) -> MemoryQueryResult:
+        """查询记忆；k / score_threshold 缺省时使用配置中的值"""
+        self._ensure_initialized()
+        if self._collection is None:
+            raise RuntimeError("Failed to initialize ChromaDB")
+
+        try:
+            started = time.perf_counter()
+            k = k or self._config.k
+            n_results = max(k, self.max_k)
+            threshold = self._config.score_threshold if score_threshold is None else score_threshold
+            query_text = self._extract_text(query)
+            key = (self._normalize(query_text), json.dumps(kwargs, sort_keys=True, ensure_ascii=False, default=str))
+
+            raw = self._lookup(key, None, n_results)
+            if raw is None:
+                vector = self._embed([query_text])[0]
+                raw = self._lookup(key, vector, n_results)
+                if raw is None:
+                    self._counters["query_misses"] += 1
+                    chroma_started = time.perf_counter()
+                    results = self._collection.query(
+                        query_embeddings=[vector.tolist()],
+                        n_results=n_results,
+                        include=["documents", "metadatas", "distances"],
+                        **kwargs,
+                    )
+                    self._record("chroma_query", chroma_started)
+                    raw = list(zip(
+                        (results.get("documents") or [[]])[0],
+                        (results.get("metadatas") or [[]])[0],
+                        (results.get("distances") or [[]])[0],
+                        (results.get("ids") or [[]])[0],
+                    ))
+                    self._query_cache[key] = (vector, raw, n_results)
+                    self._query_cache.move_to_end(key)
+                    while len(self._query_cache) > self.query_cache_size:
+                        self._query_cache.popitem(last=False)
+                else:
+                    self._counters["query_hits"] += 1
+            else:
+                self._counters["query_hits"] += 1
+
+            memory_results = []
+            for doc, metadata_dict, distance, doc_id in raw:
+                score = self._calculate_score(distance)
+                if threshold is not None and score < threshold:
+                    continue
+                metadata = dict(metadata_dict or {})
+                metadata["score"] = score
+                metadata["id"] = doc_id
+                memory_results.append(MemoryContent(
+                    content=doc,
+                    mime_type=str((metadata_dict or {}).get("mime_type", MemoryMimeType.TEXT.value)),
+                    metadata=metadata,
+                ))
+                if len(memory_results) >= k:
+                    break
+            self._record("query", started)
+            return MemoryQueryResult(results=memory_results)
+
+        except Exception as e:
+            logger.error(f"Failed to query ChromaDB: {e}")
+            raise
+
+    async def update_context(self, model_context):
+        started = time.perf_counter()
+        result = await super().update_context(model_context)
+        self._record("update_context", started)
+        return result
+
+    # ------------------------------------------------------------------
+    # 指标
+    # ------------------------------------------------------------------
+
+    def _record(self, name: str, started: float) -> None:
+        self._latency[name].append((time.perf_counter() - started) * 1000)
+
+    def stats(self) -> dict:
+        """最近各阶段耗时（毫秒）与缓存命中情况"""
+        latency = {}
+        for name, samples in self._latency.items():
+            ordered = sorted(samples)
+            latency[name] = {
+                "count": len(samples),
+                "avg_ms": round(sum(samples) / len(samples), 2),
+                "p95_ms": round(ordered[min(len(ordered) - 1, int(len(ordered) * 0.95))], 2),
+            }
+        return {"latency": latency, **self._counters}
@@ -20,12 +20,14 @@ from autogen_agentchat.agents import AssistantAgent
 from autogen_agentchat.ui import Console
 # 导入与记忆存储相关的模块，用于保存和检索上下文信息
 from autogen_core.memory import MemoryContent, MemoryMimeType
-from autogen_ext.memory.chromadb import ChromaDBVectorMemory, PersistentChromaDBVectorMemoryConfig
+from autogen_ext.memory.chromadb import PersistentChromaDBVectorMemoryConfig
 # 导入OpenAI模型客户端，用于与语言模型交互
 from autogen_ext.models.openai import OpenAIChatCompletionClient
+# 带嵌入缓存与查询结果缓存的向量记忆
+from chroma_cache_memory import CachedChromaDBVectorMemory
 
 # 使用自定义配置初始化ChromaDB内存，这里持久化路径设置在用户的主目录下
-chroma_user_memory = ChromaDBVectorMemory(
+chroma_user_memory = CachedChromaDBVectorMemory(
     config=PersistentChromaDBVectorMemoryConfig(
         collection_name="preferences",  # 集合名称，可以理解为数据库表名
         persistence_path=os.path.join(str(Path.home()), ".chromadb_autogen"),  # 数据持久化路径
@@ -35,23 +37,20 @@ chroma_user_memory = ChromaDBVectorMemory(
 )
 
 async def main():
-    # 向内存中添加关于用户偏好的内容，例如：天气单位应该用公制
-    await chroma_user_memory.add(
+    # 批量添加用户偏好：一次嵌入请求 + 一次写入
+    # 例如：天气单位应该用公制；食谱必须是素食的
+    await chroma_user_memory.add_many([
         MemoryContent(
             content="温度单位应该用摄氏度",
             mime_type=MemoryMimeType.TEXT,
             metadata={"category": "preferences", "type": "units"},  # 元数据提供额外的信息
-        )
-    )
-    
-    # 添加另一条偏好设置，比如：食谱必须是素食的
-    await chroma_user_memory.add(
+        ),
         MemoryContent(
             content="食谱必须是素食的",
             mime_type=MemoryMimeType.TEXT,
             metadata={"category": "preferences", "type": "dietary"},
-        )
-    )
+        ),
+    ])
     
     # 定义一个异步函数，用于根据城市获取天气情况
     async def get_weather(city: str, units: str = "imperial") -> str:
@@ -80,6 +79,7 @@ async def main():
     stream = assistant_agent.run_stream(task="北京天气如何?")
     result = await Console(stream)  # 使用Console UI显示结果
     
+    print(f"记忆检索开销: {chroma_user_memory.stats()}")
     await chroma_user_memory.close()  # 关闭内存连接
     return result
 
@@ -0,0 +1,423 @@
+# -*- coding: utf-8 -*-
+
+"""
+mem0 FAISS 向量库的增量持久化实现
+
+替换 mem0 自带的 FAISS 存储（每次写入都全量重写 .faiss 索引和 .pkl/.json 元数据）：
+1. 索引快照 {collection}.mmap.faiss 以内存映射方式打开，启动时不读入内存
+2. 元数据与新增向量写入 SQLite 追加日志 {collection}.sqlite，写入只追加一行
+3. 删除只追加墓碑记录，不重建索引；快照之后新增的向量放在内存中的增量索引里
+4. 延迟加载：构造时只打开 SQLite，get/list 直接查日志，首次检索时才挂载索引
+5. 增量索引或已删除向量累积到阈值时才合并为新快照（临时文件 + 原子替换）
+6. clear/reset 清空日志、停用旧快照，不删除任何文件
+
+用法（在 Memory.from_config 之前）：
+    from mem0.utils.factory import VectorStoreFactory
+    VectorStoreFactory.provider_to_class["faiss"] = "faiss_mmap_store.MmapFAISS"
+"""
+
+import json
+import logging
+import os
+import sqlite3
+import threading
+import uuid
+from typing import Dict, List, Optional
+
+import faiss
+import numpy as np
+from mem0.vector_stores.faiss import FAISS, OutputData
+
+logger = logging.getLogger(__name__)
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS log (
+    seq INTEGER PRIMARY KEY AUTOINCREMENT,
+    op TEXT NOT NULL,
+    vector_id TEXT NOT NULL,
+    faiss_id INTEGER,
+    payload TEXT,
+    vector BLOB
+);
+CREATE INDEX IF NOT EXISTS log_vector_id ON log (vector_id, seq);
+CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT);
+"""
+
+# 每个 vector_id 的最新一条记录；op 为 put 的即为当前存活的记忆
+_ALIVE_SQL = """
+SELECT vector_id, faiss_id, payload FROM log
+WHERE seq IN (SELECT MAX(seq) FROM log GROUP BY vector_id) AND op = 'put'
+"""
+
+
+class MmapFAISS(FAISS):
+    """参数与 mem0 的 FAISS 相同，可直接通过 vector_store 配置创建"""
+
+    def __init__(
+        self,
+        collection_name: str,
+        path: Optional[str] = None,
+        distance_strategy: str = "euclidean",
+        normalize_L2: bool = False,
+        embedding_model_dims: int = 1536,
+        compact_min: int = 1000,
+        compact_ratio: float = 0.5,
+    ):
+        self.collection_name = collection_name
+        self.path = path or f"/tmp/faiss/{collection_name}"
+        self.distance_strategy = distance_strategy
+        self.normalize_L2 = normalize_L2
+        self.embedding_model_dims = embedding_model_dims
+        self.compact_min = compact_min
+        self.compact_ratio = compact_ratio
+
+        self._lock = threading.RLock()
+        self._loaded = False
+        self._base = None
+        self._delta = None
+        self._docstore: Dict[str, dict] = {}
+        self._index_to_id: Dict[int, str] = {}
+        self._id_to_index: Dict[str, int] = {}
+        self._next_id = 0
+
+        os.makedirs(self.path, exist_ok=True)
+        db_path = os.path.join(self.path, f"{collection_name}.sqlite")
+        is_new = not os.path.exists(db_path)
+        self._conn = sqlite3.connect(db_path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.executescript(_SCHEMA)
+        if is_new:
+            self._migrate_legacy()
+
+    # ------------------------------------------------------------------
+    # 加载
+    # ------------------------------------------------------------------
+
+    @property
+    def _snapshot_path(self) -> str:
+        return os.path.join(self.path, f"{self.collection_name}.mmap.faiss")
+
+    def _meta(self, key: str, default=None):
+        row = self._conn.execute("SELECT value FROM meta WHERE key = ?", (key,)).fetchone()
+        return json.loads(row[0]) if row else default
+
+    def _set_meta(self, key: str, value) -> None:
+        self._conn.execute("INSERT OR REPLACE INTO meta (key, value) VALUES (?, ?)", (key, json.dumps(value)))
+
+    def _new_index(self):
+        if self.distance_strategy.lower() in ("inner_product", "cosine"):
+            flat = faiss.IndexFlatIP(self.embedding_model_dims)
+        else:
+            flat = faiss.IndexFlatL2(self.embedding_model_dims)
+        return faiss.IndexIDMap2(flat)
+
+    def _open_snapshot(self):
+        """以只读 mmap 打开快照
+
+        IO_FLAG_MMAP 对 IndexFlat 不生效（仍整体读入内存），
+        IO_FLAG_MMAP_IFC 才会把向量数据直接映射到文件
+        """
+        return faiss.read_index(self._snapshot_path, faiss.IO_FLAG_MMAP_IFC)
+
+    def _ensure_loaded(self) -> None:
+        """首次使用时挂载快照（mmap）并回放快照之后的日志"""
+        if self._loaded:
+            return
+        with self._lock:
+            if self._loaded:
+                return
+            for vector_id, faiss_id, payload in self._conn.execute(_ALIVE_SQL):
+                self._docstore[vector_id] = json.loads(payload)
+                self._index_to_id[faiss_id] = vector_id
+                self._id_to_index[vector_id] = faiss_id
+
+            snapshot_seq = self._meta("snapshot_seq")
+            if snapshot_seq is not None and os.path.exists(self._snapshot_path):
+                self._base = self._open_snapshot()
+            else:
+                snapshot_seq = -1
+            self._delta = self._new_index()
+            rows = self._conn.execute(
+                "SELECT faiss_id, vector FROM log WHERE seq > ? AND op = 'put' AND vector IS NOT NULL",
+                (snapshot_seq,),
+            ).fetchall()
+            if rows:
+                vectors = np.stack([np.frombuffer(blob, dtype=np.float32) for _, blob in rows])
+                self._delta.add_with_ids(vectors, np.array([fid for fid, _ in rows], dtype=np.int64))
+
+            max_id = self._conn.execute("SELECT MAX(faiss_id) FROM log").fetchone()[0]
+            self._next_id = max(self._meta("next_id", 0), (max_id if max_id is not None else -1) + 1)
+            self._loaded = True
+            logger.info(
+                f"Loaded FAISS collection {self.collection_name}: {len(self._docstore)} memories, "
+                f"{self._delta.ntotal} vectors since last snapshot"
+            )
+
+    def _migrate_legacy(self) -> None:
+        """一次性导入 mem0 旧格式（{collection}.faiss + .pkl/.json）"""
+        index_path = os.path.join(self.path, f"{self.collection_name}.faiss")
+        pkl_path = os.path.join(self.path, f"{self.collection_name}.pkl")
+        json_path = os.path.join(self.path, f"{self.collection_name}.json")
+        if not os.path.exists(index_path) or not (os.path.exists(pkl_path) or os.path.exists(json_path)):
+            return
+        try:
+            legacy = FAISS.__new__(FAISS)
+            legacy.path = None  # 阻止旧实现在加载时回写文件
+            legacy.collection_name = self.collection_name
+            FAISS._load(legacy, index_path, pkl_path)
+            ids = [legacy.index_to_id[i] for i in sorted(legacy.index_to_id)]
+            vectors = [legacy.index.reconstruct(int(i)) for i in sorted(legacy.index_to_id)]
+            payloads = [legacy.docstore.get(vector_id, {}) for vector_id in ids]
+            if ids:
+                self._insert_rows(vectors, payloads, ids)
+            self._conn.commit()
+            logger.info(f"Migrated {len(ids)} memories from legacy FAISS files in {self.path}")
+        except Exception as e:
+            logger.warning(f"Failed to migrate legacy FAISS files: {e}")
+
+    # ------------------------------------------------------------------
+    # mem0 内部使用的映射（首次访问时加载）
+    # ------------------------------------------------------------------
+
+    @property
+    def docstore(self) -> Dict[str, dict]:
+        self._ensure_loaded()
+        return self._docstore
+
+    @docstore.setter
+    def docstore(self, value) -> None:
+        self._docstore = value
+
+    @property
+    def index_to_id(self) -> Dict[int, str]:
+        self._ensure_loaded()
+        return self._index_to_id
+
+    @index_to_id.setter
+    def index_to_id(self, value) -> None:
+        self._index_to_id = value
+
+    # ------------------------------------------------------------------
+    # 写入
+    # ------------------------------------------------------------------
+
+    def _prepare(self, vectors) -> np.ndarray:
+        array = np.array(vectors, dtype=np.float32).reshape(-1, self.embedding_model_dims)
+        if self._should_normalize():
+            faiss.normalize_L2(array)
+        return array
+
+    def _insert_rows(self, vectors, payloads, ids) -> None:
+        self._ensure_loaded()
+        array = self._prepare(vectors)
+        faiss_ids = np.arange(self._next_id, self._next_id + len(ids), dtype=np.int64)
+        self._next_id += len(ids)
+        self._conn.executemany(
+            "INSERT INTO log (op, vector_id, faiss_id, payload, vector) VALUES ('put', ?, ?, ?, ?)",
+            [
+                (vector_id, int(fid), json.dumps(payload, ensure_ascii=False), row.tobytes())
+                for vector_id, fid, payload, row in zip(ids, faiss_ids, payloads, array)
+            ],
+        )
+        self._delta.add_with_ids(array, faiss_ids)
+        for vector_id, fid, payload in zip(ids, faiss_ids, payloads):
+            old = self._id_to_index.pop(vector_id, None)
+            if old is not None:
+                self._index_to_id.pop(old, None)
+            self._docstore[vector_id] = dict(payload)
+            self._index_to_id[int(fid)] = vector_id
+            self._id_to_index[vector_id] = int(fid)
+
+    def insert(self, vectors: List[list], payloads: Optional[List[Dict]] = None, ids: Optional[List[str]] = None):
+        if ids is None:
+            ids = [str(uuid.uuid4()) for _ in range(len(vectors))]
+        if payloads is None:
+            payloads = [{} for _ in range(len(vectors))]
+        if len(vectors) != len(ids) or len(vectors) != len(payloads):
+            raise ValueError("Vectors, payloads, and IDs must have the same length")
+        with self._lock:
+            self._insert_rows(vectors, payloads, ids)
+            self._save()
+        logger.info(f"Inserted {len(vectors)} vectors into collection {self.collection_name}")
+
+    def delete(self, vector_id: str):
+        with self._lock:
+            self._ensure_loaded()
+            faiss_id = self._id_to_index.pop(vector_id, None)
+            if faiss_id is None:
+                logger.warning(f"Vector {vector_id} not found in collection {self.collection_name}")
+                return
+            # 追加墓碑即可，索引中的旧向量在检索时被过滤，合并快照时丢弃
+            self._conn.execute("INSERT INTO log (op, vector_id) VALUES ('del', ?)", (vector_id,))
+            self._index_to_id.pop(faiss_id, None)
+            self._docstore.pop(vector_id, None)
+            self._save()
+        logger.info(f"Deleted vector {vector_id} from collection {self.collection_name}")
+
+    def update(self, vector_id: str, vector: Optional[List[float]] = None, payload: Optional[Dict] = None):
+        with self._lock:
+            self._ensure_loaded()
+            if vector_id not in self._docstore:
+                raise ValueError(f"Vector {vector_id} not found")
+            new_payload = dict(payload) if payload is not None else self._docstore[vector_id]
+            if vector is not None:
+                self._insert_rows([vector], [new_payload], [vector_id])
+            else:
+                # 只改元数据：沿用原来的 faiss_id，不写向量
+                self._conn.execute(
+                    "INSERT INTO log (op, vector_id, faiss_id, payload) VALUES ('put', ?, ?, ?)",
+                    (vector_id, self._id_to_index[vector_id], json.dumps(new_payload, ensure_ascii=False)),
+                )
+                self._docstore[vector_id] = new_payload
+            self._save()
+        logger.info(f"Updated vector {vector_id} in collection {self.collection_name}")
+
+    def _save(self):
+        """提交日志；增量或已删除的向量过多时合并快照"""
+        with self._lock:
+            self._conn.commit()
+            if not self._loaded:
+                return
+            base_total = self._base.ntotal if self._base is not None else 0
+            pending = self._delta.ntotal + (base_total + self._delta.ntotal - len(self._index_to_id))
+            if pending > max(self.compact_min, self.compact_ratio * base_total):
+                self.compact()
+
+    def compact(self) -> None:
+        """把存活的向量写成新快照，并清理日志中已被覆盖的记录"""
+        with self._lock:
+            self._ensure_loaded()
+            snapshot = self._new_index()
+            alive_ids = np.array(sorted(self._index_to_id), dtype=np.int64)
+            if len(alive_ids):
+                vectors = np.stack([self._reconstruct(int(fid)) for fid in alive_ids])
+                snapshot.add_with_ids(vectors, alive_ids)
+            tmp_path = self._snapshot_path + ".tmp"
+            faiss.write_index(snapshot, tmp_path)
+            os.replace(tmp_path, self._snapshot_path)
+
+            seq = self._conn.execute("SELECT COALESCE(MAX(seq), 0) FROM log").fetchone()[0]
+            self._conn.execute("DELETE FROM log WHERE op = 'del' OR seq NOT IN (SELECT MAX(seq) FROM log GROUP BY vector_id)")
+            self._conn.execute("UPDATE log SET vector = NULL WHERE vector IS NOT NULL")
+            self._set_meta("snapshot_seq", seq)
+            self._set_meta("next_id", self._next_id)
+            self._conn.commit()
+
+            self._base = self._open_snapshot()
+            self._delta = self._new_index()
+            logger.info(f"Compacted collection {self.collection_name}: {len(alive_ids)} vectors")
+
+    def _reconstruct(self, faiss_id: int) -> np.ndarray:
+        for index in (self._delta, self._base):
+            if index is None:
+                continue
+            try:
+                return index.reconstruct(faiss_id)
+            except RuntimeError:
+                continue
+        raise KeyError(faiss_id)
+
+    # ------------------------------------------------------------------
+    # 读取
+    # ------------------------------------------------------------------
+
+    def search(self, query: str, vectors: List[list], top_k: int = 5, filters: Optional[Dict] = None) -> List[OutputData]:
+        with self._lock:
+            self._ensure_loaded()
+            query_vectors = self._prepare(vectors)[:1]
+            indexes = [index for index in (self._base, self._delta) if index is not None and index.ntotal]
+            total = sum(index.ntotal for index in indexes)
+            params = None
+            if filters or total > len(self._index_to_id):
+                # 只在存活且满足过滤条件的向量中检索，一次得到足量结果
+                allowed = [
+                    fid for fid, vector_id in self._index_to_id.items()
+                    if not filters or self._apply_filters(self._docstore[vector_id], filters)
+                ]
+                if not allowed:
+                    return []
+                params = faiss.SearchParameters(sel=faiss.IDSelectorBatch(np.array(allowed, dtype=np.int64)))
+
+            hits = []
+            for index in indexes:
+                k = min(top_k, index.ntotal)
+                scores, ids = index.search(query_vectors, k, params=params)
+                hits.extend(zip(scores[0].tolist(), ids[0].tolist()))
+            reverse = self.distance_strategy.lower() in ("inner_product", "cosine")
+            hits = sorted((h for h in hits if h[1] != -1), reverse=reverse)[:top_k]
+            return self._parse_output([s for s, _ in hits], [i for _, i in hits], top_k)
+
+    def get(self, vector_id: str) -> OutputData:
+        with self._lock:
+            if self._loaded:
+                payload = self._docstore.get(vector_id)
+            else:
+                row = self._conn.execute(
+                    "SELECT op, payload FROM log WHERE vector_id = ? ORDER BY seq DESC LIMIT 1", (vector_id,)
+                ).fetchone()
+                payload = json.loads(row[1]) if row and row[0] == "put" else None
+        if payload is None:
+            return None
+        return OutputData(id=vector_id, score=None, payload=dict(payload))
+
+    def list(self, filters: Optional[Dict] = None, top_k: Optional[int] = None, limit: Optional[int] = None) -> List[OutputData]:
+        limit = top_k or limit or 100
+        with self._lock:
+            if self._loaded:
+                rows = ((vector_id, payload) for vector_id, payload in self._docstore.items())
+            else:
+                rows = ((vector_id, json.loads(payload)) for vector_id, _, payload in self._conn.execute(_ALIVE_SQL))
+            results = []
+            for vector_id, payload in rows:
+                if filters and not self._apply_filters(payload, filters):
+                    continue
+                results.append(OutputData(id=vector_id, score=None, payload=dict(payload)))
+                if len(results) >= limit:
+                    break
+        return [results]
+
+    def col_info(self) -> Dict:
+        count = len(self._index_to_id) if self._loaded else self._conn.execute(
+            f"SELECT COUNT(*) FROM ({_ALIVE_SQL})"
+        ).fetchone()[0]
+        return {
+            "name": self.collection_name,
+            "count": count,
+            "dimension": self.embedding_model_dims,
+            "distance": self.distance_strategy,
+        }
+
+    def list_cols(self) -> List[str]:
+        return [self.collection_name]
+
+    # ------------------------------------------------------------------
+    # 集合管理
+    # ------------------------------------------------------------------
+
+    def create_col(self, name: str, distance: str = None):
+        self.collection_name = name
+        if distance:
+            self.distance_strategy = distance
+        return self
+
+    def clear(self) -> None:
+        """清空集合：删除日志记录并停用旧快照，文件保留，下次合并时覆盖"""
+        with self._lock:
+            self._ensure_loaded()
+            self._conn.execute("DELETE FROM log")
+            self._conn.execute("DELETE FROM meta WHERE key = 'snapshot_seq'")
+            self._set_meta("next_id", self._next_id)
+            self._conn.commit()
+            self._base = None
+            self._delta = self._new_index()
+            self._docstore.clear()
+            self._index_to_id.clear()
+            self._id_to_index.clear()
+        logger.info(f"Cleared collection {self.collection_name}")
+
+    def delete_col(self):
+        self.clear()
+
+    def reset(self):
+        logger.warning(f"Resetting index {self.collection_name}...")
+        self.clear()
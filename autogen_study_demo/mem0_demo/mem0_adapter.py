@@ -0,0 +1,251 @@
+# -*- coding: utf-8 -*-
+
+"""
+Mem0AI 与 AutoGen Memory 接口的适配器
+供 mem0_advanced_demo.py 使用：mem0 的同步调用不阻塞事件循环，写入在后台进行，查询带缓存
+"""
+
+import asyncio
+import functools
+import json
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+
+from autogen_core.memory import MemoryContent, MemoryMimeType, MemoryQueryResult, UpdateContextResult
+
+
+# 所有适配器共用的有界线程池：mem0 的 add/search 是同步调用（LLM 抽取 + 向量检索），放到这里执行
+mem0_executor = ThreadPoolExecutor(max_workers=4, thread_name_prefix="mem0")
+
+# 每个agent 有独立的记忆库,以及filter
+class Mem0MemoryAdapter:
+    """
+    Mem0AI 内存适配器，使其与 AutoGen 兼容
+
+    - 阻塞的 mem0 调用通过有界线程池执行，不占用事件循环
+    - add 写入后台队列立即返回，后台任务按入队顺序逐条 mem0.add（每条内容单独做事实抽取，
+      顺序写入保证后一条能看到前一条，mem0 的去重/更新判断不会因并发写入而失效）
+    - query 不等待写入：返回向量库的结果，再叠加仍在队列中的记忆，读得到自己的写
+    - query 结果按查询缓存 cache_ttl 秒，有新写入时失效
+    - 向量库的加锁与增量持久化由 faiss_mmap_store.MmapFAISS 负责，这里不再包装
+    """
+    def __init__(self, mem0_client, user_id: str = "default",agent_id: str = "default", filters: dict = None,
+                 executor: ThreadPoolExecutor = None, cache_ttl: float = 60.0, cache_size: int = 128):
+        self.mem0_client = mem0_client
+        self.user_id = user_id
+        self.agent_id = agent_id
+        self.filters = filters
+        self.executor = executor or mem0_executor
+        self.cache_ttl = cache_ttl
+        self.cache_size = cache_size
+        self._queue = None
+        self._writer = None
+        self._query_cache = OrderedDict()
+        # 已入队但尚未写入向量库的记忆（序号 -> 内容），query 时叠加到结果上
+        self._pending = OrderedDict()
+        self._pending_seq = 0
+        # 每完成一条写入加一；查询开始后版本变化，说明结果可能已过期，不写入缓存
+        self._write_version = 0
+    
+    async def _run_blocking(self, fn, *args, **kwargs):
+        """在线程池中执行同步的 mem0 调用"""
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self.executor, functools.partial(fn, *args, **kwargs))
+    
+    # ------------------------------------------------------------------
+    # 写入：后台队列
+    # ------------------------------------------------------------------
+    
+    def _ensure_writer(self):
+        if self._writer is None or self._writer.done():
+            if self._queue is None:
+                self._queue = asyncio.Queue()
+            self._writer = asyncio.create_task(self._writer_loop())
+    
+    async def _writer_loop(self):
+        while True:
+            seq, content = await self._queue.get()
+            try:
+                await self._write(seq, content)
+            finally:
+                self._queue.task_done()
+    
+    async def _write(self, seq, content):
+        metadata = {
+            "source": "autogen",
+            "mime_type": str(content.mime_type),
+            "user_id": self.user_id,  # 添加 user_id 到元数据
+            "agent_id": self.agent_id,
+            **(content.metadata or {})
+        }
+        try:
+            result = await self._run_blocking(
+                self.mem0_client.add,
+                [{"role": "user", "content": str(content.content)}],
+                user_id=self.user_id,
+                agent_id=self.agent_id,
+                metadata=metadata
+            )
+            print(f"✅ 添加记忆到 Mem0AI: {result}")
+        except Exception as e:
+            print(f"❌ 添加记忆失败: {e}")
+        finally:
+            self._pending.pop(seq, None)
+            self._write_version += 1
+            self._query_cache.clear()
+    
+    async def add(self, content: MemoryContent) -> None:
+        """添加记忆内容 - AutoGen 期望的方法（写入后台队列，立即返回）"""
+        print(f"🔍 调试: 添加记忆内容: {content.content[:100]}...,metadata: {content.metadata}")
+        self._ensure_writer()
+        self._pending_seq += 1
+        self._pending[self._pending_seq] = content
+        await self._queue.put((self._pending_seq, content))
+    
+    async def flush(self) -> None:
+        """等待队列中的记忆全部写入"""
+        if self._queue is not None:
+            self._ensure_writer()
+            await self._queue.join()
+    
+    # ------------------------------------------------------------------
+    # 读取：带缓存
+    # ------------------------------------------------------------------
+    
+    def _to_contents(self, results):
+        if not results or 'results' not in results:
+            return None
+        return [
+            MemoryContent(
+                content=mem['memory'],
+                mime_type=MemoryMimeType.TEXT,
+                metadata=mem.get('metadata', {})
+            )
+            for mem in results['results']
+        ]
+    
+    def _with_pending(self, memory_contents, pending):
+        """把尚未写入向量库的记忆叠加到查询结果前面（已出现在结果中的内容不重复）"""
+        seen = {str(m.content) for m in memory_contents}
+        overlay = [c for c in pending if str(c.content) not in seen]
+        if overlay:
+            print(f"🔍 调试: 叠加 {len(overlay)} 条尚未写入的记忆")
+        return MemoryQueryResult(results=overlay + list(memory_contents))
+    
+    async def query(self, query: str | MemoryContent = "", **kwargs) -> MemoryQueryResult:
+        """查询记忆内容 - AutoGen 期望的方法"""
+        try:
+            # 不等待写入：在读向量库之前取一份待写入记忆的快照，读完后叠加，保证读到自己的写
+            pending = list(self._pending.values())
+            version = self._write_version
+            
+            text = str(query.content) if isinstance(query, MemoryContent) else str(query or "")
+            key = (text, json.dumps(self.filters, sort_keys=True, default=str))
+            cached = self._query_cache.get(key)
+            if cached is not None and cached[0] > time.monotonic():
+                self._query_cache.move_to_end(key)
+                print(f"🔍 调试: 命中记忆查询缓存: {len(cached[1])} 条")
+                return self._with_pending(cached[1], pending)
+            
+            if text:
+                # 从 Mem0AI 搜索特定查询
+                results = await self._run_blocking(
+                    self.mem0_client.search, text, user_id=self.user_id, agent_id=self.agent_id, filters=self.filters
+                )
+                memory_contents = self._to_contents(results)
+                if memory_contents is not None:
+                    for memory_content in memory_contents:
+                        print(f"🔍 调试: 从 Mem0AI 查询到记忆: {memory_content.content[:100]}...,metadata: {memory_content.metadata}")
+                    print(f"🔍 调试: 从 Mem0AI 查询到 {len(memory_contents)} 条记忆")
+            else:
+                # 当查询为空时，获取该用户的所有记忆
+                try:
+                    # 使用 get_all 方法获取用户的所有记忆
+                    all_results = await self._run_blocking(
+                        self.mem0_client.get_all, user_id=self.user_id, agent_id=self.agent_id, filters=self.filters
+                    )
+                    memory_contents = self._to_contents(all_results)
+                    if memory_contents is not None:
+                        print(f"🔍 调试: 获取用户 {self.user_id} 的所有记忆: {len(memory_contents)} 条")
+                except Exception as get_all_error:
+                    print(f"⚠️ 获取用户所有记忆失败: {get_all_error}")
+                    memory_contents = None
+            
+            if memory_contents is not None:
+                if version == self._write_version:
+                    self._query_cache[key] = (time.monotonic() + self.cache_ttl, memory_contents)
+                    while len(self._query_cache) > self.cache_size:
+                        self._query_cache.popitem(last=False)
+                return self._with_pending(memory_contents, pending)
+            
+            # 如果 Mem0AI 查询失败，只返回尚未写入的记忆
+            print(f"🔍 调试: Mem0AI 查询失败，返回空结果")
+            return self._with_pending([], pending)
+        except Exception as e:
+            print(f"❌ 查询记忆失败: {e}")
+            return MemoryQueryResult(results=[])
+    
+    async def update_context(self, model_context, **kwargs) -> UpdateContextResult:
+        """更新模型上下文 - AutoGen 期望的方法"""
+        try:
+            print(f"🔍 调试: update_context 被调用，model_context 类型 = {type(model_context)}")
+            
+            # 获取所有记忆
+            query_result = await self.query()
+            memories = query_result.results
+            
+            if memories:
+                # 构建记忆上下文字符串
+                memory_strings = [f"{i}. {str(memory.content)}" for i, memory in enumerate(memories, 1)]
+                memory_context = "\nRelevant memory content (in chronological order):\n" + "\n".join(memory_strings) + "\n"
+                
+                # 添加到模型上下文
+                from autogen_core.models import SystemMessage
+                await model_context.add_message(SystemMessage(content=memory_context))
+                
+                print(f"✅ 成功更新上下文，添加了 {len(memories)} 条记忆")
+            else:
+                print("ℹ️ 没有记忆需要添加到上下文")
+            
+            return UpdateContextResult(memories=query_result)
+        except Exception as e:
+            print(f"❌ 更新上下文失败: {e}")
+            return UpdateContextResult(memories=MemoryQueryResult(results=[]))
+    
+    async def clear(self) -> None:
+        """清空记忆 - AutoGen 期望的方法"""
+        try:
+            # 先等排队中的写入完成，再清空 Mem0AI 中该用户的记忆
+            await self.flush()
+            await self._run_blocking(self.mem0_client.delete_all, user_id=self.user_id, agent_id=self.agent_id)
+            self._query_cache.clear()
+            print("✅ 用户记忆已清空")
+        except Exception as e:
+            print(f"❌ 清空记忆失败: {e}")
+    
+    async def close(self) -> None:
+        """清理资源 - AutoGen 期望的方法"""
+        try:
+            print("🔍 调试: 关闭 Mem0AI 内存适配器")
+            # 写完队列中的记忆，再停止写入任务（向量库每次写入都已提交到日志）
+            await self.flush()
+            if self._writer is not None:
+                self._writer.cancel()
+                self._writer = None
+        except Exception as e:
+            print(f"❌ 关闭内存适配器失败: {e}")
+    
+    # 为了兼容性，保留旧的方法名
+    async def get_context(self, query: str = None, **kwargs):
+        """获取上下文 - 兼容旧接口"""
+        try:
+            query_result = await self.query(query, **kwargs)
+            if query_result.results:
+                context = "\n".join([mem.content for mem in query_result.results])
+                print(f"🔍 调试: 获取到上下文: {context[:100]}...")
+                return context
+            return ""
+        except Exception as e:
+            print(f"❌ get_context 失败: {e}")
+            return ""
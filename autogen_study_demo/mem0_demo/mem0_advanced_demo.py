@@ -11,12 +11,13 @@ import os
 import asyncio
 from mem0 import Memory
 from mem0.llms.configs import LlmConfig
-from mem0.utils.factory import LlmFactory, EmbedderFactory
+from mem0.utils.factory import LlmFactory, EmbedderFactory, VectorStoreFactory
 from autogen_agentchat.agents import AssistantAgent
 from autogen_agentchat.ui import Console
 from autogen_ext.models.openai import OpenAIChatCompletionClient
-from autogen_core.memory import MemoryContent, MemoryMimeType, MemoryQueryResult, UpdateContextResult
+from autogen_core.memory import MemoryContent, MemoryMimeType
 from autogen_core.memory import ListMemory
+from mem0_adapter import Mem0MemoryAdapter
 import sys
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
@@ -56,6 +57,8 @@ config = {
                 }
             }
 }
+# faiss 使用增量持久化实现：mmap 索引快照 + SQLite 追加日志，启动时延迟加载（见 faiss_mmap_store.py）
+VectorStoreFactory.provider_to_class["faiss"] = "faiss_mmap_store.MmapFAISS"
 memory_client = memory_client.from_config(config)
 
 # # 单独修改llm配置
@@ -64,143 +67,6 @@ memory_client = memory_client.from_config(config)
 #     config={"openai_base_url": "http://39.155.179.5:8002/v1", "model": "Qwen3-235B-A22B-Instruct-2507"}
 # )
 
-# 每个agent 有独立的记忆库,以及filter
-class Mem0MemoryAdapter:
-    """Mem0AI 内存适配器，使其与 AutoGen 兼容"""
-    def __init__(self, mem0_client, user_id: str = "default",agent_id: str = "default", filters: dict = None):
-        self.mem0_client = mem0_client
-        self.user_id = user_id
-        self.agent_id = agent_id
-        self.filters = filters
-    
-    async def add(self, content: MemoryContent) -> None:
-        """添加记忆内容 - AutoGen 期望的方法"""
-        try:
-            print(f"🔍 调试: 添加记忆内容: {content.content[:100]}...,metadata: {content.metadata}")
-            
-            # 确保元数据包含 user_id
-            enhanced_metadata = {
-                "source": "autogen",
-                "mime_type": str(content.mime_type),
-                "user_id": self.user_id,  # 添加 user_id 到元数据
-                "agent_id": self.agent_id,
-                **(content.metadata or {})
-            }
-            
-            # 将 MemoryContent 转换为 Mem0AI 格式并存储
-            result = self.mem0_client.add(
-                content.content,
-                user_id=self.user_id,
-                agent_id=self.agent_id,
-                metadata=enhanced_metadata  
-            )
-            print(f"✅ 成功添加记忆到 Mem0AI: {result}")
-        except Exception as e:
-            print(f"❌ 添加记忆失败: {e}")
-    
-    async def query(self, query: str | MemoryContent = "", **kwargs) -> MemoryQueryResult:
-        """查询记忆内容 - AutoGen 期望的方法"""
-        try:
-            if query:
-                # 从 Mem0AI 搜索特定查询
-                results = self.mem0_client.search(str(query), user_id=self.user_id,agent_id=self.agent_id,filters=self.filters)
-                if results and 'results' in results:
-                    # 转换为 MemoryContent 格式
-                    memory_contents = []
-                    for mem in results['results']:
-                        memory_content = MemoryContent(
-                            content=mem['memory'],
-                            mime_type=MemoryMimeType.TEXT,
-                            metadata=mem.get('metadata', {})
-                        )
-                        memory_contents.append(memory_content)
-                        print(f"🔍 调试: 从 Mem0AI 查询到记忆: {memory_content.content[:100]}...,metadata: {memory_content.metadata}")
-                    print(f"🔍 调试: 从 Mem0AI 查询到 {len(memory_contents)} 条记忆")
-                    return MemoryQueryResult(results=memory_contents)
-            else:
-                # 当查询为空时，获取该用户的所有记忆
-                try:
-                    # 使用 get_all 方法获取用户的所有记忆
-                    all_results = self.mem0_client.get_all(user_id=self.user_id,agent_id=self.agent_id,filters=self.filters)
-                    if all_results and 'results' in all_results:
-                        memory_contents = []
-                        for mem in all_results['results']:
-                            memory_content = MemoryContent(
-                                content=mem['memory'],
-                                mime_type=MemoryMimeType.TEXT,
-                                metadata=mem.get('metadata', {})
-                            )
-                            memory_contents.append(memory_content)
-                        print(f"🔍 调试: 获取用户 {self.user_id} 的所有记忆: {len(memory_contents)} 条")
-                        return MemoryQueryResult(results=memory_contents)
-                except Exception as get_all_error:
-                    print(f"⚠️ 获取用户所有记忆失败: {get_all_error}")
-            
-            # 如果 Mem0AI 查询失败，返回空结果
-            print(f"🔍 调试: Mem0AI 查询失败，返回空结果")
-            return MemoryQueryResult(results=[])
-        except Exception as e:
-            print(f"❌ 查询记忆失败: {e}")
-            return MemoryQueryResult(results=[])
-    
-    async def update_context(self, model_context, **kwargs) -> UpdateContextResult:
-        """更新模型上下文 - AutoGen 期望的方法"""
-        try:
-            print(f"🔍 调试: update_context 被调用，model_context 类型 = {type(model_context)}")
-            
-            # 获取所有记忆
-            query_result = await self.query()
-            memories = query_result.results
-            
-            if memories:
-                # 构建记忆上下文字符串
-                memory_strings = [f"{i}. {str(memory.content)}" for i, memory in enumerate(memories, 1)]
-                memory_context = "\nRelevant memory content (in chronological order):\n" + "\n".join(memory_strings) + "\n"
-                
-                # 添加到模型上下文
-                from autogen_core.models import SystemMessage
-                await model_context.add_message(SystemMessage(content=memory_context))
-                
-                print(f"✅ 成功更新上下文，添加了 {len(memories)} 条记忆")
-            else:
-                print("ℹ️ 没有记忆需要添加到上下文")
-            
-            return UpdateContextResult(memories=query_result)
-        except Exception as e:
-            print(f"❌ 更新上下文失败: {e}")
-            return UpdateContextResult(memories=MemoryQueryResult(results=[]))
-    
-    async def clear(self) -> None:
-        """清空记忆 - AutoGen 期望的方法"""
-        try:
-            # 清空 Mem0AI 中该用户的记忆
-            self.mem0_client.delete_all(user_id=self.user_id,agent_id=self.agent_id)
-            print("✅ 用户记忆已清空")
-        except Exception as e:
-            print(f"❌ 清空记忆失败: {e}")
-    
-    async def close(self) -> None:
-        """清理资源 - AutoGen 期望的方法"""
-        try:
-            print("🔍 调试: 关闭 Mem0AI 内存适配器")
-            # 这里可以添加清理逻辑
-        except Exception as e:
-            print(f"❌ 关闭内存适配器失败: {e}")
-    
-    # 为了兼容性，保留旧的方法名
-    async def get_context(self, query: str = None, **kwargs):
-        """获取上下文 - 兼容旧接口"""
-        try:
-            query_result = await self.query(query, **kwargs)
-            if query_result.results:
-                context = "\n".join([mem.content for mem in query_result.results])
-                print(f"🔍 调试: 获取到上下文: {context[:100]}...")
-                return context
-            return ""
-        except Exception as e:
-            print(f"❌ get_context 失败: {e}")
-            return ""
-
 class Mem0EnhancedAgent:
     def __init__(self, name: str, user_id: str):
         self.name = name
@@ -344,9 +210,11 @@ async def demo_agent_with_memory():
         await Console(stream)
     except Exception as e:
         print(f"生成推荐时出错: {e}")
+    finally:
+        await mem0_adapter.close()
 
 def clear_vector_database():
-    """清空向量数据库中的所有数据"""
+    """清空向量数据库中的所有数据（只写删除记录，不删除索引文件）"""
     print("🧹 清空向量数据库...")
     try:
         # 直接使用 memory_client 清空所有记忆
@@ -355,18 +223,11 @@ def clear_vector_database():
     except Exception as e:
         print(f"❌ 使用 delete_all 清空失败: {e}")
         try:
-            # 尝试使用 reset 方法
-            result = memory_client.reset()
-            print(f"✅ 向量数据库已重置: {result}")
+            # 清空整个集合：截断元数据日志并停用旧快照，文件保留
+            memory_client.vector_store.clear()
+            print("✅ 向量数据库已清空")
         except Exception as e2:
-            print(f"❌ 使用 reset 也失败: {e2}")
-            # 最后尝试创建一个临时代理来清空
-            try:
-                temp_agent = Mem0EnhancedAgent("temp_clear_agent", "temp_user")
-                temp_agent.clear_all_memories()
-                print("✅ 通过代理清空向量数据库成功")
-            except Exception as e3:
-                print(f"❌ 所有清空方法都失败: {e3}")
+            print(f"❌ 清空集合也失败: {e2}")
 
 def demo_memory_categories():
     """演示记忆分类功能"""
@@ -0,0 +1,14 @@
+# -*- coding: utf-8 -*-
+"""
+autogen_study_demo 下可复用模块的测试
+
+演示脚本与 mem0_demo 中的模块按 `import xxx` 的方式引用，这里把两个目录加入 sys.path
+"""
+
+import os
+import sys
+
+DEMO_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+for path in (DEMO_DIR, os.path.join(DEMO_DIR, "mem0_demo")):
+    if path not in sys.path:
+        sys.path.insert(0, path)
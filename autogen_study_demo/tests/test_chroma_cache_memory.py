@@ -0,0 +1,171 @@
+# -*- coding: utf-8 -*-
+"""chroma_cache_memory：嵌入缓存、查询结果缓存的命中与失效、k 超过已取回条数时重新查询、耗时样本上限"""
+
+import asyncio
+
+import pytest
+from autogen_core.memory import MemoryContent, MemoryMimeType
+from autogen_ext.memory.chromadb import CustomEmbeddingFunctionConfig, PersistentChromaDBVectorMemoryConfig
+from chromadb import Documents, EmbeddingFunction, Embeddings
+
+from chroma_cache_memory import CachedChromaDBVectorMemory
+
+TOPICS = ["天气", "食谱", "旅行", "音乐"]
+
+
+class TopicEmbedding(EmbeddingFunction):
+    """按话题词出现次数生成向量，并记录每次请求的文本"""
+
+    calls = []
+
+    def __init__(self):
+        pass
+
+    @staticmethod
+    def name() -> str:
+        return "topic-test"
+
+    def __call__(self, input: Documents) -> Embeddings:
+        TopicEmbedding.calls.append(list(input))
+        return [[float(text.count(topic)) + 0.01 for topic in TOPICS] for text in input]
+
+
+@pytest.fixture
+def memory(tmp_path):
+    TopicEmbedding.calls = []
+    memories = []
+
+    def build(k=2, max_k=3, **kwargs):
+        config = PersistentChromaDBVectorMemoryConfig(
+            collection_name="preferences",
+            persistence_path=str(tmp_path),
+            k=k,
+            score_threshold=None,
+            embedding_function_config=CustomEmbeddingFunctionConfig(function=TopicEmbedding),
+        )
+        created = CachedChromaDBVectorMemory(config=config, max_k=max_k, **kwargs)
+        memories.append(created)
+        return created
+
+    yield build
+    for created in memories:
+        asyncio.run(created.close())
+
+
+def _contents(*texts):
+    return [MemoryContent(content=t, mime_type=MemoryMimeType.TEXT, metadata={"n": i}) for i, t in enumerate(texts)]
+
+
+def _count_queries(memory):
+    calls = []
+    original = memory._collection.query
+
+    def query(**kwargs):
+        calls.append(kwargs["n_results"])
+        return original(**kwargs)
+
+    memory._collection.query = query
+    return calls
+
+
+TEXTS = ["天气 天气", "天气 晴", "天气 食谱", "天气 旅行", "天气 音乐", "食谱", "旅行", "音乐"]
+
+
+def test_add_many_embeds_once_and_repeated_query_hits_cache(memory):
+    mem = memory()
+
+    async def main():
+        await mem.add_many(_contents(*TEXTS))
+        calls = _count_queries(mem)
+        first = await mem.query("天气？")
+        second = await mem.query("  天气 ")
+        return calls, first, second
+
+    calls, first, second = asyncio.run(main())
+
+    assert TopicEmbedding.calls[0] == TEXTS
+    assert calls == [3]
+    assert [m.content for m in first.results] == [m.content for m in second.results]
+    assert len(first.results) == 2
+    assert mem.stats()["query_hits"] == 1 and mem.stats()["query_misses"] == 1
+
+
+def test_larger_k_requeries_instead_of_returning_truncated_cache(memory):
+    mem = memory(k=2, max_k=3)
+
+    async def main():
+        await mem.add_many(_contents(*TEXTS))
+        calls = _count_queries(mem)
+        small = await mem.query("天气")
+        large = await mem.query("天气", k=8)
+        again = await mem.query("天气", k=2)
+        return calls, small, large, again
+
+    calls, small, large, again = asyncio.run(main())
+
+    assert len(small.results) == 2
+    assert len(large.results) == 8
+    assert calls == [3, 8]
+    # 取回 8 条的缓存条目足以回答更小的 k
+    assert len(again.results) == 2
+
+
+def test_small_collection_cache_covers_any_k(memory):
+    mem = memory(k=2, max_k=3)
+
+    async def main():
+        await mem.add_many(_contents("天气", "食谱"))
+        calls = _count_queries(mem)
+        await mem.query("天气")
+        result = await mem.query("天气", k=8)
+        return calls, result
+
+    calls, result = asyncio.run(main())
+    assert calls == [3]
+    assert len(result.results) == 2
+
+
+def test_add_invalidates_query_cache(memory):
+    mem = memory()
+
+    async def main():
+        await mem.add_many(_contents("天气"))
+        calls = _count_queries(mem)
+        await mem.query("天气")
+        await mem.add(_contents("天气 晴")[0])
+        result = await mem.query("天气")
+        return calls, result
+
+    calls, result = asyncio.run(main())
+    assert calls == [3, 3]
+    assert len(result.results) == 2
+
+
+def test_near_duplicate_reuses_results_only_when_enabled(memory):
+    mem = memory(near_duplicate=0.99)
+
+    async def main():
+        await mem.add_many(_contents(*TEXTS))
+        calls = _count_queries(mem)
+        await mem.query("今天天气")
+        await mem.query("明天天气")
+        await mem.query("明天天气", k=8)
+        return calls
+
+    assert asyncio.run(main()) == [3, 8]
+    assert mem.stats()["near_duplicate_hits"] == 1
+
+
+def test_latency_samples_are_bounded(memory):
+    mem = memory(latency_window=5)
+
+    async def main():
+        await mem.add_many(_contents("天气"))
+        for i in range(20):
+            await mem.query(f"天气 {i}")
+
+    asyncio.run(main())
+    stats = mem.stats()["latency"]
+    assert stats["query"]["count"] == 5
+    assert stats["chroma_query"]["count"] == 5
+    assert len(mem._latency["query"]) == 5
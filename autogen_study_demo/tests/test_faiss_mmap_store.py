@@ -0,0 +1,165 @@
+# -*- coding: utf-8 -*-
+"""faiss_mmap_store：追加日志、墓碑删除、快照合并与 mmap 挂载、重启后回放、旧格式迁移"""
+
+import json
+import os
+
+import faiss
+import numpy as np
+import pytest
+
+from faiss_mmap_store import MmapFAISS
+
+DIMS = 4
+
+
+def _vec(i: int):
+    vector = [0.0] * DIMS
+    vector[i % DIMS] = 1.0 + i // DIMS
+    return vector
+
+
+def _store(path, **kwargs):
+    return MmapFAISS("memories", path=str(path), embedding_model_dims=DIMS, **kwargs)
+
+
+def _log(store):
+    return store._conn.execute("SELECT op, vector_id, vector IS NOT NULL FROM log ORDER BY seq").fetchall()
+
+
+def _ids(results):
+    return [r.id for r in results]
+
+
+def test_insert_appends_log_rows_without_snapshot(tmp_path):
+    store = _store(tmp_path)
+    store.insert([_vec(0), _vec(1)], [{"data": "a"}, {"data": "b"}], ["a", "b"])
+
+    assert _log(store) == [("put", "a", 1), ("put", "b", 1)]
+    assert not os.path.exists(store._snapshot_path)
+    assert _ids(store.search("q", [_vec(1)], top_k=1)) == ["b"]
+    assert store.col_info()["count"] == 2
+
+
+def test_get_and_list_read_log_without_loading_index(tmp_path):
+    _store(tmp_path).insert([_vec(0), _vec(1)], [{"data": "a", "user_id": "u"}, {"data": "b"}], ["a", "b"])
+
+    store = _store(tmp_path)
+    assert store.get("a").payload == {"data": "a", "user_id": "u"}
+    assert store.get("missing") is None
+    assert _ids(store.list(filters={"user_id": "u"})[0]) == ["a"]
+    assert store.col_info()["count"] == 2
+    assert not store._loaded
+
+
+def test_delete_appends_tombstone_and_filters_search(tmp_path):
+    store = _store(tmp_path)
+    store.insert([_vec(0), _vec(1)], [{"data": "a"}, {"data": "b"}], ["a", "b"])
+
+    store.delete("a")
+
+    assert _log(store)[-1] == ("del", "a", 0)
+    assert store._delta.ntotal == 2  # 旧向量仍在索引中，只是被过滤
+    assert _ids(store.search("q", [_vec(0)], top_k=5)) == ["b"]
+    assert store.get("a") is None
+
+
+def test_update_payload_only_keeps_vector(tmp_path):
+    store = _store(tmp_path)
+    store.insert([_vec(0)], [{"data": "a"}], ["a"])
+
+    store.update("a", payload={"data": "a2"})
+
+    assert _log(store)[-1] == ("put", "a", 0)
+    hit = store.search("q", [_vec(0)], top_k=1)[0]
+    assert hit.id == "a" and hit.payload == {"data": "a2"}
+    with pytest.raises(ValueError):
+        store.update("missing", payload={})
+
+
+def test_reload_replays_log(tmp_path):
+    store = _store(tmp_path)
+    store.insert([_vec(i) for i in range(3)], [{"data": str(i)} for i in range(3)], ["a", "b", "c"])
+    store.delete("b")
+    store.update("c", vector=_vec(5), payload={"data": "moved"})
+
+    reopened = _store(tmp_path)
+    assert _ids(reopened.search("q", [_vec(5)], top_k=5))[0] == "c"
+    assert sorted(_ids(reopened.list()[0])) == ["a", "c"]
+    assert reopened._next_id == store._next_id
+
+
+def test_compact_writes_snapshot_and_prunes_log(tmp_path):
+    store = _store(tmp_path, compact_min=1000)
+    store.insert([_vec(i) for i in range(4)], [{"data": str(i)} for i in range(4)], ["a", "b", "c", "d"])
+    store.delete("b")
+    store.update("c", payload={"data": "c2"})
+
+    store.compact()
+
+    assert os.path.exists(store._snapshot_path)
+    assert store._base.ntotal == 3 and store._delta.ntotal == 0
+    # 只保留每条记忆的最新记录，向量已进入快照
+    assert sorted(_log(store)) == [("put", "a", 0), ("put", "c", 0), ("put", "d", 0)]
+    assert _ids(store.search("q", [_vec(3)], top_k=1)) == ["d"]
+
+    store.insert([_vec(6)], [{"data": "e"}], ["e"])
+    reopened = _store(tmp_path)
+    assert sorted(_ids(reopened.search("q", [_vec(0)], top_k=10))) == ["a", "c", "d", "e"]
+    assert reopened.get("c").payload == {"data": "c2"}
+    assert reopened._base.ntotal == 3 and reopened._delta.ntotal == 1
+
+
+def test_snapshot_is_memory_mapped(tmp_path):
+    store = _store(tmp_path)
+    store.insert([_vec(i) for i in range(8)], [{} for _ in range(8)], [str(i) for i in range(8)])
+    store.compact()
+
+    reopened = _store(tmp_path)
+    reopened.search("q", [_vec(0)], top_k=1)
+
+    with open("/proc/self/maps") as maps:
+        mapped = [line for line in maps if line.rstrip().endswith(reopened._snapshot_path)]
+    assert mapped, "snapshot should be mapped, not read into memory"
+
+
+def test_save_compacts_when_pending_exceeds_threshold(tmp_path):
+    store = _store(tmp_path, compact_min=3, compact_ratio=0.5)
+    store.insert([_vec(i) for i in range(3)], [{} for _ in range(3)], ["a", "b", "c"])
+    assert store._base is None
+
+    store.insert([_vec(3)], [{}], ["d"])
+    assert store._base is not None and store._base.ntotal == 4
+    assert store._delta.ntotal == 0
+
+
+def test_clear_keeps_files_and_hides_snapshot(tmp_path):
+    store = _store(tmp_path)
+    store.insert([_vec(0)], [{"data": "a"}], ["a"])
+    store.compact()
+
+    store.clear()
+
+    assert os.path.exists(store._snapshot_path)
+    assert store.search("q", [_vec(0)]) == []
+    reopened = _store(tmp_path)
+    assert reopened.list()[0] == []
+    reopened.insert([_vec(1)], [{"data": "b"}], ["b"])
+    assert _ids(reopened.search("q", [_vec(0)], top_k=5)) == ["b"]
+
+
+def test_migrates_legacy_files_once(tmp_path):
+    legacy = faiss.IndexFlatL2(DIMS)
+    legacy.add(np.array([_vec(0), _vec(1)], dtype=np.float32))
+    faiss.write_index(legacy, str(tmp_path / "memories.faiss"))
+    with open(tmp_path / "memories.json", "w", encoding="utf-8") as f:
+        json.dump({"docstore": {"a": {"data": "old a"}, "b": {"data": "old b"}},
+                   "index_to_id": {"0": "a", "1": "b"}}, f)
+
+    store = _store(tmp_path)
+    assert store.get("a").payload == {"data": "old a"}
+    assert _ids(store.search("q", [_vec(1)], top_k=1)) == ["b"]
+
+    store.delete("a")
+    # 日志已存在时不再重复导入旧文件
+    assert _ids(_store(tmp_path).list()[0]) == ["b"]
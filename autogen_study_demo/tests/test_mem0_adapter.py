@@ -0,0 +1,180 @@
+# -*- coding: utf-8 -*-
+"""mem0_adapter：后台顺序写入、读到自己的写、查询缓存与失效、写入失败不阻塞后续写入"""
+
+import asyncio
+import threading
+import time
+
+import pytest
+from autogen_core.memory import MemoryContent, MemoryMimeType
+
+from mem0_adapter import Mem0MemoryAdapter
+
+
+class FakeMem0:
+    """记录调用的同步 mem0 客户端；add 可设置延迟或对指定内容失败"""
+
+    def __init__(self, add_delay: float = 0.0, fail_on: str = ""):
+        self.add_delay = add_delay
+        self.fail_on = fail_on
+        self.memories = []
+        self.add_calls = []
+        self.search_calls = 0
+        self._lock = threading.Lock()
+
+    def add(self, messages, user_id, agent_id, metadata):
+        time.sleep(self.add_delay)
+        text = messages[0]["content"]
+        with self._lock:
+            self.add_calls.append((text, metadata))
+        if text == self.fail_on:
+            raise RuntimeError("extraction failed")
+        with self._lock:
+            self.memories.append({"memory": text, "metadata": metadata})
+        return {"results": [{"memory": text, "event": "ADD"}]}
+
+    def search(self, text, user_id, agent_id, filters):
+        with self._lock:
+            self.search_calls += 1
+            return {"results": [m for m in self.memories if text in m["memory"]]}
+
+    def get_all(self, user_id, agent_id, filters):
+        with self._lock:
+            return {"results": list(self.memories)}
+
+    def delete_all(self, user_id, agent_id):
+        with self._lock:
+            self.memories.clear()
+
+
+def _content(text, **metadata):
+    return MemoryContent(content=text, mime_type=MemoryMimeType.TEXT, metadata=metadata)
+
+
+def _texts(result):
+    return [str(m.content) for m in result.results]
+
+
+@pytest.fixture(autouse=True)
+def _quiet_print(monkeypatch):
+    monkeypatch.setattr("builtins.print", lambda *args, **kwargs: None)
+
+
+def test_add_returns_before_write_and_query_sees_pending():
+    client = FakeMem0(add_delay=0.2)
+    adapter = Mem0MemoryAdapter(client, user_id="u", agent_id="a")
+
+    async def main():
+        start = time.perf_counter()
+        await adapter.add(_content("likes green tea"))
+        elapsed = time.perf_counter() - start
+        during = await adapter.query("tea")
+        await adapter.flush()
+        after = await adapter.query("tea")
+        return elapsed, during, after
+
+    elapsed, during, after = asyncio.run(main())
+
+    assert elapsed < 0.1
+    assert _texts(during) == ["likes green tea"]
+    assert _texts(after) == ["likes green tea"]
+    assert adapter._pending == {}
+
+
+def test_writes_are_sequential_one_add_per_item_with_metadata():
+    client = FakeMem0(add_delay=0.02)
+    adapter = Mem0MemoryAdapter(client, user_id="u", agent_id="a")
+
+    async def main():
+        for i in range(5):
+            await adapter.add(_content(f"fact {i}", topic="t"))
+        await adapter.flush()
+
+    asyncio.run(main())
+
+    assert [text for text, _ in client.add_calls] == [f"fact {i}" for i in range(5)]
+    metadata = client.add_calls[0][1]
+    assert metadata["user_id"] == "u" and metadata["agent_id"] == "a" and metadata["topic"] == "t"
+
+
+def test_failed_write_does_not_stop_later_writes():
+    client = FakeMem0(fail_on="bad")
+    adapter = Mem0MemoryAdapter(client)
+
+    async def main():
+        await adapter.add(_content("bad"))
+        await adapter.add(_content("good"))
+        await adapter.flush()
+        return await adapter.query("")
+
+    assert _texts(asyncio.run(main())) == ["good"]
+    assert adapter._pending == {}
+
+
+def test_query_cache_hit_and_invalidation_on_write():
+    client = FakeMem0()
+    adapter = Mem0MemoryAdapter(client)
+
+    async def main():
+        await adapter.add(_content("tea in the morning"))
+        await adapter.flush()
+        first = await adapter.query("tea")
+        second = await adapter.query("tea")
+        calls_after_hit = client.search_calls
+        await adapter.add(_content("tea after lunch"))
+        await adapter.flush()
+        third = await adapter.query("tea")
+        return first, second, calls_after_hit, third
+
+    first, second, calls_after_hit, third = asyncio.run(main())
+
+    assert _texts(first) == _texts(second) == ["tea in the morning"]
+    assert calls_after_hit == 1
+    assert client.search_calls == 2
+    assert _texts(third) == ["tea in the morning", "tea after lunch"]
+
+
+def test_result_not_cached_when_write_completes_during_query():
+    client = FakeMem0()
+    adapter = Mem0MemoryAdapter(client)
+    original_search = client.search
+
+    def search_during_write(*args, **kwargs):
+        result = original_search(*args, **kwargs)
+        adapter._write_version += 1  # 模拟查询期间完成了一次写入
+        return result
+
+    client.search = search_during_write
+
+    async def main():
+        await adapter.query("tea")
+        await adapter.query("tea")
+
+    asyncio.run(main())
+    assert client.search_calls == 2
+
+
+def test_cache_expires_after_ttl():
+    client = FakeMem0()
+    adapter = Mem0MemoryAdapter(client, cache_ttl=0.05)
+
+    async def main():
+        await adapter.query("tea")
+        await asyncio.sleep(0.1)
+        await adapter.query("tea")
+
+    asyncio.run(main())
+    assert client.search_calls == 2
+
+
+def test_clear_flushes_pending_writes_first():
+    client = FakeMem0(add_delay=0.05)
+    adapter = Mem0MemoryAdapter(client)
+
+    async def main():
+        await adapter.add(_content("temporary"))
+        await adapter.clear()
+        return await adapter.query("")
+
+    assert _texts(asyncio.run(main())) == []
+    assert [text for text, _ in client.add_calls] == ["temporary"]
@@ -1,7 +1,7 @@
 # -*- coding: utf-8 -*-
 """
 LangGraph 条件路由示例
-学习要点：条件边、动态决策、路由函数
+学习要点：条件边、动态决策、路由函数、分层意图路由
 
 作者: AI Assistant
 来源: LangGraph 官方文档学习
@@ -20,6 +20,7 @@ from langchain_core.messages import HumanMessage, AIMessage
 from langchain_openai import ChatOpenAI
 
 import config
+from intent_router import IntentRouter, KeywordRules
 
 # 自定义模型配置
 os.environ["OPENAI_API_BASE"] = config.base_url
@@ -60,6 +61,90 @@ class RoutingState(TypedDict):
     response: str  # 最终响应内容
     processing_path: List[str]  # 处理路径记录（用于追踪执行流程）
 
+# ============================================================================
+# 路由引擎配置
+# ============================================================================
+
+# 可选的处理分支（model_info 只由关键词触发，不交给模型判断）
+ROUTE_LABELS = ["model_info", "calculator", "weather", "search", "translator", "general"]
+
+# 规则层关键词：命中后按命中数给出置信度
+ROUTE_KEYWORDS = {
+    "model_info": [
+        "模型", "model", "你是谁", "你是什么", "你叫什么", "你由什么", "你用什么", "你基于什么",
+        "你是什么模型", "你叫什么名字", "你的身份", "你的背景", "你来自哪里", "你是什么AI",
+        "你是什么人工智能", "你是什么助手", "你是什么工具", "你是什么系统"
+    ],
+    "calculator": ["计算", "算一下", "等于多少", "数学", "乘以", "除以", "平方", "开方", "求和", "calculate"],
+    "weather": ["天气", "气温", "温度", "下雨", "下雪", "晴天", "阴天", "刮风", "台风", "雾霾", "weather", "forecast"],
+    "search": ["搜索", "查找", "查一下", "资料", "信息", "search"],
+    "translator": ["翻译", "译成", "英文", "中文", "英语", "translate", "language"],
+}
+
+# 规则层正则：算式直接判定为计算
+ROUTE_PATTERNS = {
+    "calculator": [r"\d+(?:\.\d+)?\s*[\+\-\*/×÷\^%]\s*\d+"],
+}
+
+# 分类层的种子样例，运行中规则层和模型的决策会继续追加到决策日志里
+SEED_EXAMPLES = {
+    "calculator": ["请帮我计算 15 + 25", "3 乘以 7 等于多少", "100 除以 4", "帮我算一下这个数学题", "求 1 到 100 的和"],
+    "weather": ["查询北京的天气怎么样", "明天上海会下雨吗", "今天气温多少度", "广州这周天气预报", "外面冷不冷"],
+    "search": ["搜索关于人工智能的信息", "帮我查找 LangGraph 的资料", "查一下最新的新闻", "找一些机器学习的教程"],
+    "translator": ["翻译 hello 这个单词", "把这句话翻译成英文", "good morning 是什么意思", "用英语怎么说谢谢"],
+    "general": ["你好，我想了解一下 LangGraph", "给我讲个笑话", "今天心情不错", "推荐一本好书", "怎么学习编程"],
+}
+
+# 各来源的决策原因说明
+ROUTE_REASONS = {
+    "model_info": "检测到模型相关问题",
+    "calculator": "判断为数学计算需求",
+    "weather": "判断为天气查询需求",
+    "search": "判断为信息搜索需求",
+    "translator": "判断为翻译需求",
+    "general": "判断为通用处理需求",
+}
+ROUTE_SOURCES = {
+    "cache": "缓存命中",
+    "rules": "关键词规则",
+    "classifier": "本地分类器",
+    "llm": "模型决策",
+    "llm_invalid": "模型决策结果无效，使用通用处理",
+    "fallback": "回退模式",
+}
+
+
+def classify_with_llm(user_input: str) -> str:
+    """本地置信度不足时，调用模型判断分支（只返回标签）"""
+    decision_prompt = f"""
+    请分析以下用户输入，并决定应该使用哪个专业智能体来处理：
+    
+    用户输入: {user_input}
+    
+    可选的智能体:
+    1. calculator - 处理数学计算、数字运算相关请求
+    2. weather - 处理天气查询、温度、天气状况相关请求  
+    3. search - 处理信息搜索、查找资料相关请求
+    4. translator - 处理翻译、语言转换相关请求
+    5. general - 处理其他通用请求
+    
+    请只返回对应的智能体名称（calculator/weather/search/translator/general），不要包含其他内容。
+    """
+    response = llm.invoke([HumanMessage(content=decision_prompt)])
+    logger.info(f"模型输出:{response.content}")
+    return response.content
+
+
+# 路由引擎：缓存 → 关键词/正则 → 本地分类器 → 模型
+intent_router = IntentRouter(
+    ROUTE_LABELS,
+    KeywordRules(ROUTE_KEYWORDS, ROUTE_PATTERNS, priority_labels=["model_info"]),
+    llm_classify=classify_with_llm,
+    seed_examples=SEED_EXAMPLES,
+    confidence_threshold=0.75,
+    log_path=config.data_path("routing_decisions.jsonl"),
+)
+
 # ============================================================================
 # 决策节点定义
 # ============================================================================
@@ -68,87 +153,26 @@ def decision_maker(state: RoutingState) -> RoutingState:
     """
     决策制定节点 - 分析用户输入并决定处理路径
     作用：作为工作流的入口节点，分析用户意图并决定后续处理路径
-    学习要点：智能决策逻辑
+    学习要点：分层路由，明显的请求在本地判定，拿不准的才调用模型
     """
     logger.info("🧠 决策制定节点正在分析...")
-    logger.info(f"使用模型: {MODEL_NAME}")
     
-    user_input = state["user_input"].lower()
     processing_path = state.get("processing_path", [])
     processing_path.append("decision_maker")  # 记录执行路径
     
-    # 检查是否是模型相关问题 - 扩展关键词检测
-    model_keywords = [
-        "模型", "model", "你是谁", "你是什么", "你叫什么", "你由什么", "你用什么", "你基于什么",
-        "你是什么模型", "你叫什么名字", "你的身份", "你的背景", "你来自哪里", "你是什么AI",
-        "你是什么人工智能", "你是什么助手", "你是什么工具", "你是什么系统"
-    ]
-    if any(keyword in user_input for keyword in model_keywords):
-        decision = "model_info"
-        route_reason = "检测到模型相关问题"
+    decision = intent_router.route(state["user_input"])
+    route_reason = ROUTE_REASONS[decision.label]
+    if decision.source == "llm_invalid":
+        route_reason = ROUTE_SOURCES["llm_invalid"]
     else:
-        # 使用模型进行智能决策
-        decision_prompt = f"""
-        请分析以下用户输入，并决定应该使用哪个专业智能体来处理：
-        
-        用户输入: {state["user_input"]}
-        
-        可选的智能体:
-        1. calculator - 处理数学计算、数字运算相关请求
-        2. weather - 处理天气查询、温度、天气状况相关请求  
-        3. search - 处理信息搜索、查找资料相关请求
-        4. translator - 处理翻译、语言转换相关请求
-        5. general - 处理其他通用请求
-        
-        请只返回对应的智能体名称（calculator/weather/search/translator/general），不要包含其他内容。
-        """
-        
-        try:
-            # 调用模型进行决策
-            response = llm.invoke([HumanMessage(content=decision_prompt)])
-            logger.info(f"模型输出:{response.content}")
-            decision = response.content.strip().lower()
-            
-            # 验证决策结果
-            valid_decisions = ["calculator", "weather", "search", "translator", "general"]
-            if decision not in valid_decisions:
-                decision = "general"
-                route_reason = "模型决策结果无效，使用通用处理"
-            else:
-                # 根据决策结果设置原因
-                decision_reasons = {
-                    "calculator": "模型判断为数学计算需求",
-                    "weather": "模型判断为天气查询需求", 
-                    "search": "模型判断为信息搜索需求",
-                    "translator": "模型判断为翻译需求",
-                    "general": "模型判断为通用处理需求"
-                }
-                route_reason = decision_reasons.get(decision, "模型决策")
-                
-        except Exception as e:
-            logger.error(f"模型调用失败: {e}")
-            # 回退到关键词匹配
-            if any(word in user_input for word in ["计算", "数学", "数字", "+", "-", "*", "/"]):
-                decision = "calculator"
-                route_reason = "检测到数学计算需求（回退模式）"
-            elif any(word in user_input for word in ["天气", "温度", "下雨", "晴天"]):
-                decision = "weather"
-                route_reason = "检测到天气查询需求（回退模式）"
-            elif any(word in user_input for word in ["搜索", "查找", "信息", "资料"]):
-                decision = "search"
-                route_reason = "检测到信息搜索需求（回退模式）"
-            elif any(word in user_input for word in ["翻译", "英文", "中文", "language"]):
-                decision = "translator"
-                route_reason = "检测到翻译需求（回退模式）"
-            else:
-                decision = "general"
-                route_reason = "通用处理路径（回退模式）"
+        route_reason = f"{route_reason}（{ROUTE_SOURCES[decision.source]}，置信度 {decision.confidence:.2f}）"
     
-    logger.info(f"决策结果: {decision}")
+    logger.info(f"决策结果: {decision.label}")
     logger.info(f"决策原因: {route_reason}")
+    logger.info(f"决策耗时: {decision.latency_ms:.2f}ms")
     
     return {
-        "decision": decision,  # 传递给路由函数
+        "decision": decision.label,  # 传递给路由函数
         "route_reason": route_reason,  # 记录决策原因
         "processing_path": processing_path,  # 更新执行路径
         "messages": [AIMessage(content=f"决策完成: {route_reason}")]  # 添加决策消息
@@ -547,6 +571,11 @@ def test_conditional_routing():
             # logger.info(f"输出: {result['response']}")
         except Exception as e:
             logger.error(f"错误: {e}")
+    
+    # 再跑一遍相同的输入：全部命中决策缓存，不再调用模型
+    for test_input in test_inputs:
+        intent_router.route(test_input)
+    logger.info(f"路由统计: {intent_router.stats()}")
 
 if __name__ == "__main__":
     test_conditional_routing() 
\ No newline at end of file
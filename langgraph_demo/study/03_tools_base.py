@@ -19,7 +19,7 @@ LangGraph 工具集成示例 - 基于 Context7 文档的最佳实践
 import os
 import json
 import requests
-from typing import TypedDict, List
+from typing import TypedDict, List, Dict, Optional, Sequence
 from typing_extensions import Annotated
 
 # ============================================================================
@@ -353,6 +353,121 @@ tools = [
     analyze_text
 ]
 
+# 按名称索引工具，便于按子集绑定
+tools_by_name = {t.name: t for t in tools}
+
+# ============================================================================
+# 工具选择提示词与预绑定缓存
+# ============================================================================
+# 工具选择提示词较长，定义为模块常量，只构造一次
+TOOL_SELECTION_PROMPT = """你是一个智能助手，可以根据用户的需求选择合适的工具来帮助用户。
+
+重要原则：
+1. 仔细分析用户的问题，理解其真实意图
+2. 只选择最相关、最合适的工具
+3. 避免调用不相关的工具
+4. 优先选择专门针对用户需求的工具
+
+工具选择策略：
+
+get_weather 工具：
+- 用途：查询天气信息
+- 适用场景：用户询问天气、温度、气候、天气状况等
+- 关键词：天气、温度、下雨、晴天、气候、天气预报等
+
+calculate_math 工具：
+- 用途：进行数学计算
+- 适用场景：用户需要进行数字运算、数学计算、公式计算等
+- 关键词：计算、数学、数字、运算、公式、加减乘除等
+
+search_web 工具：
+- 用途：搜索和查找信息
+- 适用场景：用户想要了解、搜索、查找、获取信息等
+- 关键词：了解、搜索、查找、信息、资料、介绍、什么是等
+
+translate_text 工具：
+- 用途：翻译文本内容
+- 适用场景：用户明确要求翻译文本、单词、短语等
+- 关键词：翻译、英文、中文、语言转换等
+
+ask_llm 工具：
+- 用途：深度思考和复杂问题解答
+- 适用场景：用户询问需要深度思考、解释、分析的问题
+- 关键词：解释、什么是、为什么、如何、分析、思考等
+
+analyze_text 工具：
+- 用途：文本分析（情感、摘要、关键词等）
+- 适用场景：用户要求分析文本内容、情感、摘要、关键词等
+- 关键词：分析、情感、摘要、关键词、总结、文本分析等
+
+可用工具：
+- get_weather: 查询指定城市的天气信息
+- calculate_math: 计算数学表达式
+- search_web: 搜索网络信息
+- translate_text: 翻译文本
+- ask_llm: 使用大语言模型回答问题
+- analyze_text: 分析文本（情感、摘要、关键词等）
+
+决策流程：
+1. 仔细阅读用户的问题
+2. 识别问题的核心意图和关键词
+3. 根据工具用途和适用场景进行匹配
+4. 选择最合适的工具
+5. 避免调用不相关的工具
+
+请根据用户问题的实际内容和意图，选择最合适的工具来帮助用户。"""
+
+# 已绑定工具的模型缓存：按工具子集（排序后的工具名元组）缓存 bind_tools 结果，
+# 工具 schema 只转换一次
+_bound_llm_cache: Dict[tuple, object] = {}
+# ReAct 智能体缓存：按工具子集缓存编译好的图
+_react_agent_cache: Dict[tuple, object] = {}
+
+def _tool_key(tool_names: Optional[Sequence[str]]) -> tuple:
+    """工具子集缓存键，None 表示全部工具"""
+    if tool_names is None:
+        return tuple(sorted(tools_by_name))
+    return tuple(sorted(set(tool_names)))
+
+def get_bound_llm(tool_names: Optional[Sequence[str]] = None):
+    """
+    获取绑定了指定工具子集的模型
+    
+    Args:
+        tool_names: 工具名称列表，None 表示全部工具
+        
+    Returns:
+        已执行 bind_tools 的模型（按工具子集复用）
+    """
+    key = _tool_key(tool_names)
+    bound = _bound_llm_cache.get(key)
+    if bound is None:
+        bound = llm.bind_tools([tools_by_name[name] for name in key])
+        _bound_llm_cache[key] = bound
+        logger.info(f"🔗 预绑定工具: {list(key)}")
+    return bound
+
+def get_react_agent(tool_names: Optional[Sequence[str]] = None):
+    """
+    获取编译好的 ReAct 智能体（按工具子集编译一次并共享）
+    
+    传入已绑定工具的模型，create_react_agent 检测到工具已绑定时不会重复绑定
+    """
+    key = _tool_key(tool_names)
+    agent = _react_agent_cache.get(key)
+    if agent is None:
+        agent = create_react_agent(
+            get_bound_llm(key),
+            [tools_by_name[name] for name in key],
+            prompt=TOOL_SELECTION_PROMPT
+        )
+        _react_agent_cache[key] = agent
+        logger.info(f"🧩 编译 ReAct 智能体，工具: {list(key)}")
+    return agent
+
+# 工具执行节点同样只创建一次
+tool_node = ToolNode(tools)
+
 # ============================================================================
 # 状态定义
 # ============================================================================
@@ -418,8 +533,8 @@ def call_model(state: ToolState) -> ToolState:
     调用模型节点 - 使用 create_react_agent 和自定义提示词
     
     功能说明：
-    - 使用 LangGraph 的 create_react_agent 创建智能体
-    - 添加自定义提示词来优化工具选择逻辑
+    - 复用模块级编译好的 ReAct 智能体（见 get_react_agent）
+    - 使用 TOOL_SELECTION_PROMPT 优化工具选择逻辑
     - 将用户输入传递给智能体
     - 返回智能体的响应消息
     - 确保只调用相关的工具
@@ -432,66 +547,8 @@ def call_model(state: ToolState) -> ToolState:
     # 记录用户输入
     logger.info(f"📝 用户输入: {user_input}")
     
-    # 创建自定义系统提示词，优化工具选择逻辑
-    custom_prompt = """你是一个智能助手，可以根据用户的需求选择合适的工具来帮助用户。
-
-重要原则：
-1. 仔细分析用户的问题，理解其真实意图
-2. 只选择最相关、最合适的工具
-3. 避免调用不相关的工具
-4. 优先选择专门针对用户需求的工具
-
-工具选择策略：
-
-get_weather 工具：
-- 用途：查询天气信息
-- 适用场景：用户询问天气、温度、气候、天气状况等
-- 关键词：天气、温度、下雨、晴天、气候、天气预报等
-
-calculate_math 工具：
-- 用途：进行数学计算
-- 适用场景：用户需要进行数字运算、数学计算、公式计算等
-- 关键词：计算、数学、数字、运算、公式、加减乘除等
-
-search_web 工具：
-- 用途：搜索和查找信息
-- 适用场景：用户想要了解、搜索、查找、获取信息等
-- 关键词：了解、搜索、查找、信息、资料、介绍、什么是等
-
-translate_text 工具：
-- 用途：翻译文本内容
-- 适用场景：用户明确要求翻译文本、单词、短语等
-- 关键词：翻译、英文、中文、语言转换等
-
-ask_llm 工具：
-- 用途：深度思考和复杂问题解答
-- 适用场景：用户询问需要深度思考、解释、分析的问题
-- 关键词：解释、什么是、为什么、如何、分析、思考等
-
-analyze_text 工具：
-- 用途：文本分析（情感、摘要、关键词等）
-- 适用场景：用户要求分析文本内容、情感、摘要、关键词等
-- 关键词：分析、情感、摘要、关键词、总结、文本分析等
-
-可用工具：
-- get_weather: 查询指定城市的天气信息
-- calculate_math: 计算数学表达式
-- search_web: 搜索网络信息
-- translate_text: 翻译文本
-- ask_llm: 使用大语言模型回答问题
-- analyze_text: 分析文本（情感、摘要、关键词等）
-
-决策流程：
-1. 仔细阅读用户的问题
-2. 识别问题的核心意图和关键词
-3. 根据工具用途和适用场景进行匹配
-4. 选择最合适的工具
-5. 避免调用不相关的工具
-
-请根据用户问题的实际内容和意图，选择最合适的工具来帮助用户。"""
-    
-    # 使用自定义提示词创建智能体
-    agent = create_react_agent(llm, tools, prompt=custom_prompt)
+    # 获取预先编译好的 ReAct 智能体（全局共享，不再每条消息重建）
+    agent = get_react_agent()
     
     # 记录发送给模型的消息
     user_message = HumanMessage(content=user_input)
@@ -537,9 +594,8 @@ def call_tools(state: ToolState) -> ToolState:
     """
     logger.info("🔧 调用工具节点正在工作...")
     
-    # 使用 LangGraph 的 ToolNode 创建工具执行节点
+    # 使用模块级的 ToolNode 执行工具调用
     # ToolNode 会自动处理工具调用和结果返回
-    tool_node = ToolNode(tools)
     
     # 获取最后一条消息（应该是包含工具调用的 AI 消息）
     messages = state.get("messages", [])
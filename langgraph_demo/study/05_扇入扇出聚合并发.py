@@ -1,15 +1,16 @@
 # -*- coding: utf-8 -*-
 """
 LangGraph 扇入扇出示例
-学习要点：扇入和扇出模式的创建和使用
+学习要点：扇入和扇出模式的创建和使用，分支截止时间与 quorum 扇入
 
 作者: AI Assistant
 来源: LangGraph 官方文档学习
 """
 
 import os
+import time
 import operator
-from typing import TypedDict, List
+from typing import TypedDict, List, Dict
 from typing_extensions import Annotated
 
 # LangGraph 核心组件
@@ -20,6 +21,7 @@ from langgraph.graph.message import add_messages
 from langchain_core.messages import HumanMessage, AIMessage
 
 import config
+from branch_executor import ParallelBranchExecutor, sequential
 
 # 自定义模型配置
 os.environ["OPENAI_API_BASE"] = config.base_url
@@ -29,6 +31,19 @@ MODEL_NAME = config.model
 # 获取日志器
 logger = config.logger
 
+# 并行分支配置
+BRANCH_POOL_SIZE = 4        # 分支线程池大小（同时也作为图执行的 max_concurrency）
+BRANCH_TIMEOUT = 1.0        # 单个分支的截止时间（秒）
+MERGE_QUORUM = 2            # 扇入所需的最少终端分支数：到达后不再等待其余分支
+# 汇入 merge_node 的终端分支，都由 start_node 直接扇出、在同一超步内运行，quorum 才能放行慢分支
+MERGE_BRANCHES = ["parallel_1", "parallel_2", "parallel_3"]
+
+# 模拟慢的工具后端：节点名 -> 额外耗时（秒）
+SIMULATED_LATENCY = {"Worker3": 3.0}
+
+# 并行分支执行器：显式大小的线程池 + 每分支截止时间 + quorum 扇入
+branch_executor = ParallelBranchExecutor(max_workers=BRANCH_POOL_SIZE, default_timeout=BRANCH_TIMEOUT)
+
 # ============================================================================
 # 状态定义
 # ============================================================================
@@ -41,11 +56,19 @@ class EdgeDemoState(TypedDict):
     edge_history: Annotated[List[str], operator.add]
     response: Annotated[List[str], operator.add]
     parallel_results: Annotated[List[str], operator.add]
+    branch_group: str  # 本次扇出的分支组 id
+    branch_timings: Annotated[Dict[str, dict], operator.or_]  # 各分支的状态与耗时
 
 # ============================================================================
 # 节点定义
 # ============================================================================
 
+def simulate_backend(worker_name: str):
+    """模拟工具后端的调用耗时"""
+    delay = SIMULATED_LATENCY.get(worker_name, 0)
+    if delay:
+        time.sleep(delay)
+
 def node_a(state: EdgeDemoState) -> EdgeDemoState:
     """节点A"""
     logger.info("🅰️ 节点A正在工作...")
@@ -71,12 +94,21 @@ def node_d(state: EdgeDemoState) -> EdgeDemoState:
     user_input = state["user_input"]
     edge_history = ["D"]
     
+    # 关闭分支组：只合并已到达的分支，未到达的分支（超时/被跳过）不再等待
+    summary = branch_executor.close(state)
+    for branch, timing in state.get("branch_timings", {}).items():
+        logger.info(f"⏱️ 分支 {branch}: {timing['status']}，耗时 {timing['elapsed']}s")
+    if not summary["quorum_reached"]:
+        logger.warning(f"⚠️ 只有 {len(summary['arrived'])} 个分支到达，未达到 quorum {summary['quorum']}，按已有结果降级合并")
+    
     # 收集并行处理的结果
     parallel_results = state.get("parallel_results", [])
     if parallel_results:
         response = f"节点D合并结果: {user_input} + {' + '.join(parallel_results)}"
     else:
         response = f"节点D处理: {user_input}"
+    if summary["missing"]:
+        response += f"（未到达: {', '.join(summary['missing'])}）"
     logger.info(f"节点D合并结果: {response}")
     return {
         "current_node": ["D"],
@@ -105,6 +137,7 @@ def final_node(state: EdgeDemoState) -> EdgeDemoState:
 def parallel_worker_1(state: EdgeDemoState) -> EdgeDemoState:
     """并行工作节点1"""
     logger.info("🔧 并行工作节点1正在工作...")
+    simulate_backend("Worker1")
     
     user_input = state["user_input"]
     edge_history = ["Worker1"]
@@ -125,6 +158,7 @@ def parallel_worker_1(state: EdgeDemoState) -> EdgeDemoState:
 def parallel_worker_2(state: EdgeDemoState) -> EdgeDemoState:
     """并行工作节点2"""
     logger.info("🔧 并行工作节点2正在工作...")
+    simulate_backend("Worker2")
     
     user_input = state["user_input"]
     edge_history = ["Worker2"]
@@ -145,6 +179,7 @@ def parallel_worker_2(state: EdgeDemoState) -> EdgeDemoState:
 def parallel_worker_3(state: EdgeDemoState) -> EdgeDemoState:
     """并行工作节点3"""
     logger.info("🔧 并行工作节点3正在工作...")
+    simulate_backend("Worker3")
     
     user_input = state["user_input"]
     edge_history = ["Worker3"]
@@ -165,6 +200,7 @@ def parallel_worker_3(state: EdgeDemoState) -> EdgeDemoState:
 def parallel_worker_2_1(state: EdgeDemoState) -> EdgeDemoState:
     """并行工作节点2的分支节点"""
     logger.info("🔧 并行工作节点2_1正在工作...")
+    simulate_backend("Worker2_1")
     
     user_input = state["user_input"]
     edge_history = ["Worker2_1"]
@@ -187,35 +223,23 @@ def parallel_worker_2_1(state: EdgeDemoState) -> EdgeDemoState:
 # 扇入扇出组合演示
 # ============================================================================
 
-def demo_fan_in_fan_out():
-    """
-    演示扇入扇出组合模式
-    
-    先扇出并行处理，再扇入合并结果
-    """
-    logger.info("\n" + "="*60)
-    logger.info("🔄⚡ 扇入扇出组合演示")
-    logger.info("先扇出并行处理，再扇入合并结果")
-    logger.info("="*60)
-    
+def build_fan_in_fan_out_graph():
+    """构建扇入扇出工作流图"""
     # 创建状态图
     workflow = StateGraph(EdgeDemoState)
     
     # 添加节点
-    workflow.add_node("start_node", node_a)
-    workflow.add_node("parallel_1", parallel_worker_1)
-    workflow.add_node("parallel_2", parallel_worker_2)
-    workflow.add_node("parallel_2_1", parallel_worker_2_1) 
-    workflow.add_node("parallel_3", parallel_worker_3)
+    # 起点节点在执行 node_a 后打开分支组；并行节点由执行器包装，带截止时间并记录耗时
+    workflow.add_node("start_node", branch_executor.opener(MERGE_BRANCHES, quorum=MERGE_QUORUM, fn=node_a))
+    workflow.add_node("parallel_1", branch_executor.branch("parallel_1", parallel_worker_1))
+    # parallel_2 之后的 2_1 步骤合入同一个分支：若拆成后继节点，它要等下一超步才开始，
+    # 而下一超步要等 parallel_3 返回，quorum 就放行不了慢的 parallel_3
+    workflow.add_node("parallel_2", branch_executor.branch(
+        "parallel_2", sequential(parallel_worker_2, parallel_worker_2_1)))
+    workflow.add_node("parallel_3", branch_executor.branch("parallel_3", parallel_worker_3))
     workflow.add_node("merge_node", node_d)
     workflow.add_node("final_node", final_node)
     
-    # 组合模式示例
-    logger.info("📝 扇入扇出组合:")
-    logger.info("1. 扇出: start_node → parallel_1, parallel_2, parallel_3")
-    logger.info("2. 扇入: parallel_1, parallel_2, parallel_3 → merge_node")
-    logger.info("3. 继续: merge_node → final_node")
-    
     workflow.set_entry_point("start_node")
     
     # 扇出阶段
@@ -223,16 +247,37 @@ def demo_fan_in_fan_out():
     workflow.add_edge("start_node", "parallel_2")
     workflow.add_edge("start_node", "parallel_3")
     
-    workflow.add_edge("parallel_2", "parallel_2_1") # parallel_2的分支节点
     # 扇入阶段
-    workflow.add_edge(["parallel_1", "parallel_3", "parallel_2_1"], "merge_node") # 保证所有并行节点都执行完，再合并
+    # 所有并行节点都返回后再合并；quorum 达到后慢分支立即返回"跳过"，否则最多阻塞 BRANCH_TIMEOUT
+    workflow.add_edge(MERGE_BRANCHES, "merge_node")
     
     # 继续处理
     workflow.add_edge("merge_node", "final_node")
     workflow.add_edge("final_node", END)
     
+    return workflow.compile()
+
+
+def demo_fan_in_fan_out():
+    """
+    演示扇入扇出组合模式
+    
+    先扇出并行处理，再扇入合并结果
+    """
+    logger.info("\n" + "="*60)
+    logger.info("🔄⚡ 扇入扇出组合演示")
+    logger.info("先扇出并行处理，再扇入合并结果")
+    logger.info("="*60)
+    
+    # 组合模式示例
+    logger.info("📝 扇入扇出组合:")
+    logger.info("1. 扇出: start_node → parallel_1, parallel_2（Worker2 → Worker2_1）, parallel_3")
+    logger.info("2. 扇入: parallel_1, parallel_2, parallel_3 → merge_node")
+    logger.info("3. 继续: merge_node → final_node")
+    logger.info(f"4. 每个分支截止时间 {BRANCH_TIMEOUT}s，{MERGE_QUORUM}/{len(MERGE_BRANCHES)} 个终端分支到达即合并")
+    
     # 编译并测试
-    graph = workflow.compile()
+    graph = build_fan_in_fan_out_graph()
         # 可视化工作流程图
     from show_graph import show_workflow_graph
     
@@ -247,8 +292,14 @@ def demo_fan_in_fan_out():
     logger.info(f"\n🧪 测试输入: {test_input}")
     
     try:
-        result = graph.invoke({"user_input": test_input}, config={"configurable": {"thread_id": "foo"},"recursion_limit": 100})
+        start = time.perf_counter()
+        result = graph.invoke(
+            {"user_input": test_input},
+            config={"configurable": {"thread_id": "foo"}, "recursion_limit": 100, "max_concurrency": BRANCH_POOL_SIZE}
+        )
+        logger.info(f"总耗时: {time.perf_counter() - start:.2f}s")
         logger.info(f"执行路径: {' → '.join(result['edge_history'])}")
+        logger.info(f"分支耗时: {result.get('branch_timings', {})}")
         logger.info(f"并行结果: {result.get('parallel_results', [])}")
         logger.info(f"最终响应: {' | '.join(result['response'])}")
     except Exception as e:
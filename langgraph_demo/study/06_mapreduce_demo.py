@@ -24,13 +24,14 @@ from typing_extensions import Annotated
 # LangGraph 核心组件
 from langgraph.graph import StateGraph, START, END  # 状态图、开始/结束节点
 from langgraph.graph.message import add_messages    # 消息合并器
-from langgraph.types import Send                    # 发送类型，用于条件边
+from langgraph.types import Send, RetryPolicy       # 发送类型（用于条件边）、节点重试策略
 
 # LangChain 组件
 from langchain_core.messages import HumanMessage, AIMessage  # 消息类型
 from langchain_core.runnables import RunnablePassthrough, RunnableLambda  # 可运行组件
 
 import config  # 配置文件
+from map_reduce import with_timeout, tree_reduce  # worker 超时包装、分层归约
 
 # 自定义模型配置
 os.environ["OPENAI_API_BASE"] = config.base_url  # 设置 API 基础地址
@@ -40,6 +41,14 @@ MODEL_NAME = config.model                         # 获取模型名称
 # 获取日志器
 logger = config.logger  # 用于记录执行过程和调试信息
 
+# Map 阶段的并发与容错配置
+MAX_IN_FLIGHT = 4   # 同时运行的 worker 数（调用图时作为 max_concurrency 传入），主题很多时避免同时打满模型服务
+JOKE_TIMEOUT = 30   # 单个主题的超时时间（秒）
+JOKE_RETRIES = 1    # 单个主题失败/超时后的重试次数（由节点的 RetryPolicy 执行）
+
+# 分层归约配置：单次归约调用的输入 token 上限（演示用较小的值，便于看到多层归约）
+TREE_REDUCE_TOKEN_BUDGET = 40
+
 # ============================================================================
 # 状态定义
 # ============================================================================
@@ -180,6 +189,7 @@ def continue_to_jokes(state: MapReduceState) -> List[Send]:
     
     这是 MapReduce 模式中的关键函数，它实现了"扇出"（fan-out）功能
     将单个输入分解为多个并行任务，每个任务处理一个主题
+    同时运行的任务数由调用图时的 max_concurrency 限制，不会因主题很多而一次性全部发出
     
     Args:
         state: 当前工作流状态，包含要处理的主题列表
@@ -189,7 +199,7 @@ def continue_to_jokes(state: MapReduceState) -> List[Send]:
     """
     # 从状态中获取主题列表
     subjects = state.get("subjects", [])
-    logger.info(f"🎭 为 {len(subjects)} 个主题创建笑话生成任务")
+    logger.info(f"🎭 为 {len(subjects)} 个主题创建笑话生成任务（最多 {MAX_IN_FLIGHT} 个并发）")
     
     # 为每个主题创建一个 Send 任务，实现并行处理
     # Send("generate_joke", {"subject": subject}) 表示：
@@ -223,7 +233,12 @@ def demo_mapreduce():
     
     # 添加工作流节点
     workflow.add_node("generate_topics", generate_topics)      # 数据准备节点
-    workflow.add_node("generate_joke", generate_joke)          # Map 阶段节点（并行执行）
+    # Map 阶段节点（并行执行）：单个主题超时抛出 WorkerTimeout，失败或超时由 RetryPolicy 单独重试
+    workflow.add_node(
+        "generate_joke",
+        with_timeout(generate_joke, JOKE_TIMEOUT),
+        retry_policy=RetryPolicy(max_attempts=JOKE_RETRIES + 1)
+    )
     workflow.add_node("select_best_joke", select_best_joke)    # Reduce 阶段节点
     
     # 设置工作流的入口点
@@ -264,12 +279,20 @@ def demo_mapreduce():
         logger.info(f"\n🧪 测试主题: {topic}")
         
         try:
-            # 调用工作流，传入主题参数
-            # config 参数用于区分不同的执行线程，便于调试和日志追踪
-            result = graph.invoke(
+            # 流式调用工作流，传入主题参数
+            # config 参数用于区分不同的执行线程，便于调试和日志追踪；
+            # max_concurrency 限制同时运行的 generate_joke 任务数
+            # updates 模式在每个笑话生成完时就推送，values 模式接收最终状态
+            result = None
+            for mode, chunk in graph.stream(
                 {"topic": topic},  # 输入参数：用户选择的主题
-                config={"configurable": {"thread_id": f"mapreduce_{topic}"}}  # 线程配置
-            )
+                config={"configurable": {"thread_id": f"mapreduce_{topic}"}, "max_concurrency": MAX_IN_FLIGHT},
+                stream_mode=["updates", "values"]
+            ):
+                if mode == "values":
+                    result = chunk
+                elif "generate_joke" in chunk:
+                    logger.info(f"📨 笑话到达: {chunk['generate_joke']['jokes'][0]}")
             
             # 输出执行结果
             logger.info(f"执行历史: {' → '.join(result['execution_history'])}")  # 显示执行路径
@@ -292,6 +315,8 @@ def demo_advanced_mapreduce():
     - RunnablePassthrough: 用于数据传递和转换
     - RunnableLambda: 用于自定义处理逻辑
     - 链式调用: 将多个处理步骤组合成流水线
+    - 分层归约: 文档很多时，摘要按 token 预算分批并行合并，逐层递归成一份总摘要，
+      避免把所有结果拼成一个超出上下文的提示
     
     这种模式更适合处理复杂的文档处理、数据分析等任务
     """
@@ -303,7 +328,10 @@ def demo_advanced_mapreduce():
     documents = [
         {"id": 1, "content": "人工智能正在改变世界"},
         {"id": 2, "content": "机器学习是AI的核心技术"},
-        {"id": 3, "content": "深度学习在图像识别方面表现出色"}
+        {"id": 3, "content": "深度学习在图像识别方面表现出色"},
+        {"id": 4, "content": "自然语言处理让机器理解人类语言"},
+        {"id": 5, "content": "强化学习在游戏和机器人控制中取得突破"},
+        {"id": 6, "content": "大模型推动了生成式AI的普及"}
     ]
     
     def get_content(state):
@@ -375,14 +403,58 @@ def demo_advanced_mapreduce():
             ]
         }
     
+    def merge_summaries(summaries):
+        """
+        归约函数 - 把一批摘要合并为一段（分层归约的单次调用）
+        
+        模拟 LLM 归纳：在实际应用中，这里会调用 LLM 对这一批摘要做总结
+        
+        Args:
+            summaries: 同一批次的摘要列表，总 token 数不超过预算
+            
+        Returns:
+            合并后的摘要
+        """
+        # 去掉 "摘要: " / "综合N条: " 前缀，每条只保留开头部分，保证越归约越短
+        merged = "；".join(summary.split(": ", 1)[-1][:12] for summary in summaries)
+        return f"综合{len(summaries)}条: {merged}"
+    
+    def hierarchical_reduce(combined):
+        """
+        分层归约 - 把所有文档摘要归约为一份总摘要
+        
+        摘要按 token 预算分批，各批并行归约，逐层递归直到只剩一段，
+        每层开始和结束都会记录进度
+        
+        Args:
+            combined: 包含 final_results 的状态
+            
+        Returns:
+            增加了 overall_summary 字段的状态
+        """
+        def log_level(event):
+            if event.get("type") == "tree_reduce_level_done":
+                logger.info(f"🌲 第 {event['level']} 层归约完成: 剩余 {event['outputs']} 段，耗时 {event['elapsed']}s")
+        
+        summaries = [item["summary"] for item in combined["final_results"]]
+        overall_summary = tree_reduce(
+            summaries,
+            merge_summaries,
+            token_budget=TREE_REDUCE_TOKEN_BUDGET,
+            max_in_flight=MAX_IN_FLIGHT,
+            name="documents",
+            on_event=log_level
+        )
+        return {**combined, "overall_summary": overall_summary}
+    
     # 创建 MapReduce 处理链
     # RunnablePassthrough.assign() 用于在传递数据的同时添加新的字段
     map_step = RunnablePassthrough.assign(
         processed_results=get_content | RunnableLambda(process_content)  # Map 阶段：提取内容并处理
     )
     
-    # 将 Map 阶段和 Reduce 阶段组合成完整的处理链
-    map_reduce_chain = map_step | reduce_results
+    # 将 Map 阶段、Reduce 阶段和分层归约组合成完整的处理链
+    map_reduce_chain = map_step | reduce_results | RunnableLambda(hierarchical_reduce)
     
     # 执行 MapReduce 处理链
     try:
@@ -397,6 +469,7 @@ def demo_advanced_mapreduce():
             logger.info(f"处理: {item['processed']}")           # 处理后的内容
             logger.info(f"摘要: {item['summary']}")             # 生成的摘要
             logger.info("---")                                  # 分隔线
+        logger.info(f"📚 总摘要: {result['overall_summary']}")  # 分层归约得到的总摘要
             
     except Exception as e:
         logger.error(f"执行高级 MapReduce 时出错: {e}")
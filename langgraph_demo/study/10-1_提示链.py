@@ -9,6 +9,7 @@ LangGraph 复杂提示链示例
 - 迭代优化和质量评估
 - 结构化输出和反馈
 - 自动质量控制和改进
+- 推测式模式：每轮并行生成多个候选、批量评估、任一候选达标即进入润色（见 speculative.py）
 """
 
 import os
@@ -22,6 +23,7 @@ import operator
 # 添加路径以导入配置
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 import config
+from speculative import SpeculativeLoop
 
 # 导入必要的库
 from langchain_openai import ChatOpenAI
@@ -43,6 +45,22 @@ llm = ChatOpenAI(
     max_tokens=1000
 )
 
+# 质量达标分数：达到后进入润色
+QUALITY_THRESHOLD = 8.0
+
+# 推测式模式配置
+SPECULATIVE_CANDIDATES = 3        # 每轮并行生成的候选数
+SPECULATIVE_MAX_ROUNDS = 3        # 最多轮数（与串行模式的最大迭代次数一致）
+SPECULATIVE_LATENCY_BUDGET = 120  # 总耗时预算（秒）
+
+# 推测式候选使用较高温度，并按候选下标换一个切入角度，避免多个候选雷同
+creative_llm = ChatOpenAI(
+    model=config.model,
+    temperature=0.8,
+    max_tokens=1000
+)
+CONTENT_ANGLES = ["从现实案例切入", "从数据和趋势切入", "从个人视角和故事切入"]
+
 # ===== 1. 复杂提示链示例 (StateGraph API) =====
 
 
@@ -56,6 +74,8 @@ class PromptChainState(TypedDict):
     quality_score: float
     iteration_count: int
     final_result: str
+    candidates_generated: int
+    rounds_saved: int
 
 # 定义结构化输出模式
 class QualityFeedback(BaseModel):
@@ -124,13 +144,75 @@ def should_continue(state: PromptChainState) -> Literal["improve", "polish", "en
     
     print(f"📊 当前质量评分: {score}, 迭代次数: {iteration}")
     
-    if score >= 8.0:
+    if score >= QUALITY_THRESHOLD:
         return "polish"
     elif iteration < 3:
         return "improve"
     else:
         return "end"
 
+def generate_content_candidate(topic: str, round_index: int, index: int, previous) -> str:
+    """生成一个推测式候选：首轮按不同角度创作，之后按上一轮最佳候选的反馈改写"""
+    angle = CONTENT_ANGLES[index % len(CONTENT_ANGLES)]
+    if previous is None:
+        request = f"请为话题 '{topic}' 创作一段有趣、有深度的内容，{angle}。"
+    else:
+        request = (f"请根据反馈改进以下内容，{angle}：\n\n{previous.content}\n\n"
+                   f"反馈：{previous.evaluation.feedback}")
+    response = creative_llm.invoke([
+        SystemMessage(content="你是一个专业的内容创作者。请根据给定话题创作高质量的内容。"),
+        HumanMessage(content=request)
+    ])
+    return response.content
+
+def evaluate_contents_batch(contents):
+    """批量评估多个候选内容（一次 batch 调用，请求并发发出）"""
+    return quality_evaluator.batch([
+        [
+            SystemMessage(content="你是一个专业的内容评估专家。请评估以下内容的质量并提供改进建议。"),
+            HumanMessage(content=f"请评估以下内容：\n\n{content}")
+        ]
+        for content in contents
+    ])
+
+def speculative_draft(state: PromptChainState) -> PromptChainState:
+    """推测式起草：每轮并行生成多个候选、批量评估，第一个达标的候选直接进入润色"""
+    topic = state["topic"]
+    print(f"🎯 推测式起草：每轮 {SPECULATIVE_CANDIDATES} 个候选，最多 {SPECULATIVE_MAX_ROUNDS} 轮")
+    
+    loop = SpeculativeLoop(
+        lambda round_index, index, previous: generate_content_candidate(topic, round_index, index, previous),
+        evaluate_contents_batch,
+        accept=lambda feedback: feedback.score >= QUALITY_THRESHOLD,
+        score=lambda feedback: feedback.score,
+        n_candidates=SPECULATIVE_CANDIDATES,
+        max_rounds=SPECULATIVE_MAX_ROUNDS,
+        latency_budget=SPECULATIVE_LATENCY_BUDGET,
+        name="prompt_chain",
+    )
+    result = loop.run()
+    if result.best is None:
+        raise RuntimeError(f"推测式起草没有得到任何候选（{result.stop_reason}）")
+    
+    best = result.best
+    first_round = [c for c in result.candidates if c.round == 0]
+    print(f"📊 最佳候选评分: {best.score}, 结束原因: {result.stop_reason}, 统计: {result.stats}")
+    
+    update = {
+        "original_content": max(first_round, key=lambda c: c.score).content if first_round else best.content,
+        "quality_score": best.score,
+        "iteration_count": result.stats["rounds"],
+        "candidates_generated": result.stats["generated"],
+        "rounds_saved": result.stats["rounds_saved"]
+    }
+    if best.round > 0:
+        update["improved_content"] = best.content
+    return update
+
+def route_speculative(state: PromptChainState) -> Literal["polish", "end"]:
+    """推测式起草之后：达标则润色，否则直接输出最佳候选"""
+    return "polish" if state.get("quality_score", 0) >= QUALITY_THRESHOLD else "end"
+
 def finalize_result(state: PromptChainState) -> PromptChainState:
     """最终化结果"""
     final_content = state.get("polished_content", state.get("improved_content", state["original_content"]))
@@ -138,13 +220,37 @@ def finalize_result(state: PromptChainState) -> PromptChainState:
     
     return {"final_result": final_content}
 
-def build_complex_prompt_chain():
-    """构建复杂提示链图"""
+def build_complex_prompt_chain(speculative: bool = False):
+    """
+    构建复杂提示链图
+    
+    speculative=True 时用推测式起草节点替代 生成 → 评估 → 改进 的串行循环，
+    润色与最终化步骤保持不变
+    """
     print("🏗️ 构建复杂提示链图...")
     
     # 创建状态图
     workflow = StateGraph(PromptChainState)
     
+    if speculative:
+        workflow.add_node("speculative_draft", speculative_draft)
+        workflow.add_node("polish_content", polish_content)
+        workflow.add_node("finalize_result", finalize_result)
+        workflow.add_edge(START, "speculative_draft")
+        workflow.add_conditional_edges(
+            "speculative_draft",
+            route_speculative,
+            {
+                "polish": "polish_content",
+                "end": "finalize_result"
+            }
+        )
+        workflow.add_edge("polish_content", "finalize_result")
+        workflow.add_edge("finalize_result", END)
+        chain = workflow.compile()
+        print("✅ 复杂提示链图（推测式）构建完成！")
+        return chain
+    
     # 添加节点
     workflow.add_node("generate_initial", generate_initial_content)
     workflow.add_node("evaluate_quality", evaluate_quality)
@@ -178,24 +284,28 @@ def build_complex_prompt_chain():
 
 # ===== 2. 运行示例函数 =====
 
-def run_complex_example():
+def run_complex_example(speculative: bool = False):
     """运行复杂提示链示例"""
     print("=" * 60)
-    print("🚀 复杂提示链示例")
+    print(f"🚀 复杂提示链示例（{'推测式' if speculative else '串行'}模式）")
     print("=" * 60)
     
     # 构建图
-    chain = build_complex_prompt_chain()
+    chain = build_complex_prompt_chain(speculative=speculative)
     
     # 执行
     topic = "可持续发展"
+    start = time.perf_counter()
     state = chain.invoke({"topic": topic})
     
     print(f"\n🎉 最终结果:")
     print(f"原始内容: {state['original_content']}")
     print(f"质量评分: {state['quality_score']}")
     print(f"迭代次数: {state['iteration_count']}")
+    if speculative:
+        print(f"生成候选数: {state['candidates_generated']}，节省往返轮数（估算）: {state['rounds_saved']}")
     print(f"最终结果: {state['final_result']}")
+    print(f"总耗时: {time.perf_counter() - start:.2f}s")
 
 def main():
     """主函数"""
@@ -208,9 +318,10 @@ def main():
         print("   可以通过环境变量 OPENAI_API_KEY 设置")
         return
     
-    # 直接运行复杂提示链示例
+    # 先运行串行模式，再运行推测式模式，对比轮数与耗时
     print("\n🚀 运行复杂提示链示例...")
     run_complex_example()
+    run_complex_example(speculative=True)
 
 if __name__ == "__main__":
     main()
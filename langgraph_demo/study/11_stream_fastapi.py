@@ -7,7 +7,6 @@ LangGraph 节点名称自定义示例
 import os
 import sys
 import time
-import json
 from typing import TypedDict, Annotated
 import operator
 
@@ -20,6 +19,7 @@ from langgraph.graph import StateGraph, START, END
 from langchain_openai import ChatOpenAI
 from langchain_core.messages import HumanMessage
 import config
+import stream_codec
 # 获取日志器
 logger = config.logger
 # 设置环境变量
@@ -31,7 +31,8 @@ MODEL_NAME = config.model
 llm = ChatOpenAI(
     model=MODEL_NAME,
     temperature=0.1,
-    max_tokens=500
+    max_tokens=500,
+    streaming=True  # 逐 token 输出，配合 stream_mode="messages" 实时转发
 )
 
 # 定义状态结构
@@ -152,8 +153,8 @@ def ai_analyzer_node(state: NodeTrackingState) -> NodeTrackingState:
 提供简要的分析结果。
 """
     
-    response = llm.invoke([HumanMessage(content=prompt)])
-    analysis_result = response.content
+    # 流式调用：stream_mode="messages" 下该节点的 token 会实时转发给客户端
+    analysis_result = stream_codec.stream_llm_text(llm, [HumanMessage(content=prompt)])
     
     log_entry["result"] = analysis_result
     log_entry["status"] = "completed"
@@ -284,19 +285,8 @@ graph_app = create_node_tracking_workflow().compile(checkpointer=_memory_checkpo
 
 ALLOWED_STREAM_MODES = {"updates", "values", "messages", "debug"}
 
-def _safe_serialize(obj):
-    try:
-        json.dumps(obj)
-        return obj
-    except TypeError:
-        if isinstance(obj, dict):
-            return {k: _safe_serialize(v) for k, v in obj.items()}
-        if isinstance(obj, list):
-            return [_safe_serialize(v) for v in obj]
-        return str(obj)
-
-def _format_sse(data: dict, event: str = "message") -> str:
-    return f"event: {event}\ndata: {json.dumps(_safe_serialize(data), ensure_ascii=False)}\n\n"
+def _format_sse(data: dict, event: str = "message") -> bytes:
+    return stream_codec.sse_frame(data, event)
 
 def _parse_stream_modes(mode_param):
     if not mode_param:
@@ -319,90 +309,10 @@ def _parse_stream_modes(mode_param):
         valid = ["updates"]
     return valid, invalid
 
-def _normalize_content(content):
-    """将复杂 message content 规整为字符串，避免不可序列化/不可哈希对象向下游传播。"""
-    try:
-        if content is None:
-            return ""
-        if isinstance(content, str):
-            return content
-        if isinstance(content, (int, float, bool)):
-            return str(content)
-        # LangChain 常见：list[dict|str|obj]
-        if isinstance(content, list):
-            parts = []
-            for item in content:
-                if isinstance(item, str):
-                    parts.append(item)
-                elif isinstance(item, dict):
-                    # 优先提取 text 字段
-                    txt = item.get("text") or item.get("content")
-                    if isinstance(txt, str):
-                        parts.append(txt)
-                    else:
-                        parts.append(json.dumps(_safe_serialize(item), ensure_ascii=False))
-                else:
-                    # 兜底为字符串
-                    parts.append(str(item))
-            return "".join(parts)
-        if isinstance(content, dict):
-            # 尝试提取 text，否则整体序列化
-            txt = content.get("text") or content.get("content")
-            if isinstance(txt, str):
-                return txt
-            return json.dumps(_safe_serialize(content), ensure_ascii=False)
-        # 对象：尝试取 .text/.value/.content 等
-        for attr in ("text", "value", "content"):
-            if hasattr(content, attr):
-                val = getattr(content, attr)
-                return _normalize_content(val)
-        return str(content)
-    except Exception:
-        return str(content)
-
-def _extract_message_list(value):
-    messages = []
-    src = None
-    if isinstance(value, dict) and "messages" in value:
-        src = value["messages"]
-    elif isinstance(value, list):
-        src = value
-    else:
-        src = [value]
-    for m in src:
-        role = getattr(m, "type", None) or getattr(m, "role", None)
-        content = getattr(m, "content", None)
-        if isinstance(m, dict):
-            role = m.get("type") or m.get("role") or role
-            content = m.get("content") or content
-        content = _normalize_content(content)
-        messages.append({"role": role or "unknown", "content": content})
-    return messages
-
-def _iter_node_items(chunk):
-    """兼容性迭代：将 chunk 统一为 (node_name, node_value) 序列。
-    支持 dict、(node, value) 元组、[(node,value), ...] 列表、或其它类型。
-    """
-    if isinstance(chunk, dict):
-        for k, v in chunk.items():
-            yield k, v
-        return
-    if isinstance(chunk, tuple):
-        if len(chunk) == 2:
-            yield chunk[0], chunk[1]
-            return
-    if isinstance(chunk, list):
-        for item in chunk:
-            if isinstance(item, tuple) and len(item) == 2:
-                yield item[0], item[1]
-            elif isinstance(item, dict):
-                for k, v in item.items():
-                    yield k, v
-            else:
-                yield "unknown", item
-        return
-    # 其它未知类型，作为单个值输出
-    yield "unknown", chunk
+# 消息规整与节点迭代统一由编码层提供（按类型注册编码器，避免逐个 hasattr 试探）
+_normalize_content = stream_codec.normalize_content
+_extract_message_list = stream_codec.extract_message_list
+_iter_node_items = stream_codec.iter_node_items
 
 def _format_tuple_messages_chunk(msg_obj, meta: dict) -> dict:
     """将 (MessageChunk/Message, meta) 规范化为统一负载。"""
@@ -426,7 +336,7 @@ def _format_tuple_messages_chunk(msg_obj, meta: dict) -> dict:
     }
     return payload
 
-def _node_sse_generator(user_input: str, stream_mode = "updates", thread_id: str | None = None, checkpoint: str | None = None, replay_history: bool = True):
+def _node_sse_generator(user_input: str, stream_mode = "updates", thread_id: str | None = None, checkpoint: str | None = None, replay_history: bool = True, token_batch_ms: int = 0):
     modes, invalid = _parse_stream_modes(stream_mode)
     if invalid:
         yield _format_sse({"warning": "invalid_modes", "ignored": invalid, "allowed": sorted(list(ALLOWED_STREAM_MODES))}, event="warning")
@@ -513,58 +423,15 @@ def _node_sse_generator(user_input: str, stream_mode = "updates", thread_id: str
                                         }
                                         break
                             yield _format_sse(payload, event="node")
-            # elif mode == "messages":
-            #     for chunk in graph_app.stream(inputs, stream_mode=mode, **stream_kwargs):
-            #         logger.info(f"chunk: {chunk}")
-            #         # 优先处理 (msg, meta) 元组
-            #         if isinstance(chunk, tuple) and len(chunk) == 2 and isinstance(chunk[1], dict):
-            #             payload = _format_tuple_messages_chunk(chunk[0], chunk[1])
-            #             yield _format_sse(payload, event="node")
-            #             continue
-            #         # 处理列表：可能包含多个 (msg, meta)
-            #         if isinstance(chunk, list):
-            #             for item in chunk:
-            #                 if isinstance(item, tuple) and len(item) == 2 and isinstance(item[1], dict):
-            #                     payload = _format_tuple_messages_chunk(item[0], item[1])
-            #                     yield _format_sse(payload, event="node")
-            #                 else:
-            #                     # 回退到通用解析
-            #                     for node_name, node_value in _iter_node_items(item):
-            #                         derived_name = node_name if isinstance(node_name, str) else (
-            #                             node_value.get("langgraph_node") if isinstance(node_value, dict) else "unknown"
-            #                         )
-            #                         cfg = get_node_config(str(derived_name))
-            #                         messages = _extract_message_list(node_value)
-            #                         logger.info(f"messages: {messages}")
-            #                         logger.info(f"cfg: {cfg}")
-            #                         payload = {
-            #                             "node": derived_name,
-            #                             "display_name": cfg["display_name"],
-            #                             "description": cfg["description"],
-            #                             "messages": messages,
-            #                             "thread_id": thread_id,
-            #                             "checkpoint": checkpoint
-            #                         }
-            #                         yield _format_sse(payload, event="node")
-            #             continue
-            #         # 其它情况：使用通用解析
-            #         for node_name, node_value in _iter_node_items(chunk):
-            #             derived_name = node_name if isinstance(node_name, str) else (
-            #                 node_value.get("langgraph_node") if isinstance(node_value, dict) else "unknown"
-            #             )
-            #             cfg = get_node_config(str(derived_name))
-            #             messages = _extract_message_list(node_value)
-            #             logger.info(f"messages: {messages}")
-            #             logger.info(f"cfg: {cfg}")
-            #             payload = {
-            #                 "node": derived_name,
-            #                 "display_name": cfg["display_name"],
-            #                 "description": cfg["description"],
-            #                 "messages": messages,
-            #                 "thread_id": thread_id,
-            #                 "checkpoint": checkpoint
-            #             }
-            #             yield _format_sse(payload, event="node")
+            elif mode == "messages":
+                # 节点内 LLM 的 token 实时转发，附带节点归属与显示名称；
+                # token_batch_ms > 0 时按时间窗口合并同一节点的 token 小块
+                stream = graph_app.stream(inputs, stream_mode=mode, **stream_kwargs)
+                for text, meta in stream_codec.coalesce_messages(stream, interval_ms=token_batch_ms):
+                    payload = _format_tuple_messages_chunk(text, meta)
+                    payload["thread_id"] = thread_id
+                    payload["checkpoint"] = checkpoint
+                    yield _format_sse(payload, event="token")
             else:
                 for chunk in graph_app.stream(inputs, stream_mode=mode, **stream_kwargs):
                     yield _format_sse({"chunk": chunk, "thread_id": thread_id, "checkpoint": checkpoint}, event=mode)
@@ -585,11 +452,12 @@ def stream_post(body: dict = Body(...)):
     thread_id = body.get("thread_id")
     checkpoint = body.get("checkpoint")
     replay_history = bool(body.get("replay_history", False))
+    token_batch_ms = int(body.get("token_batch_ms") or 0)
     if not user_input:
         def _err():
             yield _format_sse({"status": "error", "message": "missing user_input"}, event="error")
         return StreamingResponse(_err(), media_type="text/event-stream")
-    return StreamingResponse(_node_sse_generator(user_input, stream_mode=stream_mode, thread_id=thread_id, checkpoint=checkpoint, replay_history=replay_history), media_type="text/event-stream")
+    return StreamingResponse(_node_sse_generator(user_input, stream_mode=stream_mode, thread_id=thread_id, checkpoint=checkpoint, replay_history=replay_history, token_batch_ms=token_batch_ms), media_type="text/event-stream")
 
 @app.get("/stream")
 def stream_get(
@@ -597,9 +465,10 @@ def stream_get(
     stream_mode: str = Query("updates", description="流模式：可用 updates,values,messages,debug；支持用逗号/竖线组合"),
     thread_id: str | None = Query(None, description="会话线程ID，用于持久化与断点续作"),
     checkpoint: str | None = Query(None, description="断点ID/名称，用于从指定断点恢复"),
-    replay_history: bool = Query(False, description="是否在开始时回放历史 execution_log")
+    replay_history: bool = Query(False, description="是否在开始时回放历史 execution_log"),
+    token_batch_ms: int = Query(0, description="messages 模式下合并 token 小块的时间窗口（毫秒），0 表示逐 token 输出")
 ):
-    return StreamingResponse(_node_sse_generator(user_input, stream_mode=stream_mode, thread_id=thread_id, checkpoint=checkpoint, replay_history=replay_history), media_type="text/event-stream")
+    return StreamingResponse(_node_sse_generator(user_input, stream_mode=stream_mode, thread_id=thread_id, checkpoint=checkpoint, replay_history=replay_history, token_batch_ms=token_batch_ms), media_type="text/event-stream")
 
 @app.get("/history")
 def history(
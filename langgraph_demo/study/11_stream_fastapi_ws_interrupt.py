@@ -8,6 +8,7 @@ import os
 import sys
 import time
 import json
+import uuid
 from typing import TypedDict, Annotated
 import operator
 
@@ -20,6 +21,8 @@ from langgraph.graph import StateGraph, START, END
 from langchain_openai import ChatOpenAI
 from langchain_core.messages import HumanMessage
 import config
+import stream_codec
+from interrupt_sessions import InterruptSessionManager
 # 获取日志器
 logger = config.logger
 # 设置环境变量
@@ -31,7 +34,8 @@ MODEL_NAME = config.model
 llm = ChatOpenAI(
     model=MODEL_NAME,
     temperature=0.1,
-    max_tokens=500
+    max_tokens=500,
+    streaming=True  # 逐 token 输出，配合 stream_mode="messages" 实时转发
 )
 
 # 定义状态结构
@@ -152,8 +156,8 @@ def ai_analyzer_node(state: NodeTrackingState) -> NodeTrackingState:
 提供简要的分析结果。
 """
     
-    response = llm.invoke([HumanMessage(content=prompt)])
-    analysis_result = response.content
+    # 流式调用：stream_mode="messages" 下该节点的 token 会实时转发给客户端
+    analysis_result = stream_codec.stream_llm_text(llm, [HumanMessage(content=prompt)])
     
     log_entry["result"] = analysis_result
     log_entry["status"] = "completed"
@@ -508,22 +512,14 @@ def _create_interrupt_workflow():
 # 以同一个 checkpointer 编译可跨消息恢复
 interrupt_graph_app = _create_interrupt_workflow().compile(checkpointer=_memory_checkpointer)
 
-ALLOWED_STREAM_MODES = {"updates", "values", "messages", "debug"}
+# ====== 人工介入会话管理 ======
+interrupt_sessions = InterruptSessionManager(interrupt_graph_app)
 
-def _safe_serialize(obj):
-    try:
-        json.dumps(obj)
-        return obj
-    except TypeError:
-        if isinstance(obj, dict):
-            return {k: _safe_serialize(v) for k, v in obj.items()}
-        if isinstance(obj, list):
-            return [_safe_serialize(v) for v in obj]
-        return str(obj)
+ALLOWED_STREAM_MODES = {"updates", "values", "messages", "debug"}
 
 def _format_sse(data: dict, event: str = "message") -> str:
-    payload = {"event": event, "data": _safe_serialize(data)}
-    return json.dumps(payload, ensure_ascii=False) + "\n"
+    # WebSocket 以文本帧发送：只编码一次，再解码为 str
+    return stream_codec.ndjson_frame(data, event).decode("utf-8")
 
 def _parse_stream_modes(mode_param):
     if not mode_param:
@@ -546,90 +542,10 @@ def _parse_stream_modes(mode_param):
         valid = ["updates"]
     return valid, invalid
 
-def _normalize_content(content):
-    """将复杂 message content 规整为字符串，避免不可序列化/不可哈希对象向下游传播。"""
-    try:
-        if content is None:
-            return ""
-        if isinstance(content, str):
-            return content
-        if isinstance(content, (int, float, bool)):
-            return str(content)
-        # LangChain 常见：list[dict|str|obj]
-        if isinstance(content, list):
-            parts = []
-            for item in content:
-                if isinstance(item, str):
-                    parts.append(item)
-                elif isinstance(item, dict):
-                    # 优先提取 text 字段
-                    txt = item.get("text") or item.get("content")
-                    if isinstance(txt, str):
-                        parts.append(txt)
-                    else:
-                        parts.append(json.dumps(_safe_serialize(item), ensure_ascii=False))
-                else:
-                    # 兜底为字符串
-                    parts.append(str(item))
-            return "".join(parts)
-        if isinstance(content, dict):
-            # 尝试提取 text，否则整体序列化
-            txt = content.get("text") or content.get("content")
-            if isinstance(txt, str):
-                return txt
-            return json.dumps(_safe_serialize(content), ensure_ascii=False)
-        # 对象：尝试取 .text/.value/.content 等
-        for attr in ("text", "value", "content"):
-            if hasattr(content, attr):
-                val = getattr(content, attr)
-                return _normalize_content(val)
-        return str(content)
-    except Exception:
-        return str(content)
-
-def _extract_message_list(value):
-    messages = []
-    src = None
-    if isinstance(value, dict) and "messages" in value:
-        src = value["messages"]
-    elif isinstance(value, list):
-        src = value
-    else:
-        src = [value]
-    for m in src:
-        role = getattr(m, "type", None) or getattr(m, "role", None)
-        content = getattr(m, "content", None)
-        if isinstance(m, dict):
-            role = m.get("type") or m.get("role") or role
-            content = m.get("content") or content
-        content = _normalize_content(content)
-        messages.append({"role": role or "unknown", "content": content})
-    return messages
-
-def _iter_node_items(chunk):
-    """兼容性迭代：将 chunk 统一为 (node_name, node_value) 序列。
-    支持 dict、(node, value) 元组、[(node,value), ...] 列表、或其它类型。
-    """
-    if isinstance(chunk, dict):
-        for k, v in chunk.items():
-            yield k, v
-        return
-    if isinstance(chunk, tuple):
-        if len(chunk) == 2:
-            yield chunk[0], chunk[1]
-            return
-    if isinstance(chunk, list):
-        for item in chunk:
-            if isinstance(item, tuple) and len(item) == 2:
-                yield item[0], item[1]
-            elif isinstance(item, dict):
-                for k, v in item.items():
-                    yield k, v
-            else:
-                yield "unknown", item
-        return
-    # 其它未知类型，作为单个值输出
-    yield "unknown", chunk
+# 消息规整与节点迭代统一由编码层提供（按类型注册编码器，避免逐个 hasattr 试探）
+_normalize_content = stream_codec.normalize_content
+_extract_message_list = stream_codec.extract_message_list
+_iter_node_items = stream_codec.iter_node_items
 
 def _format_tuple_messages_chunk(msg_obj, meta: dict) -> dict:
     """将 (MessageChunk/Message, meta) 规范化为统一负载。"""
@@ -653,7 +569,7 @@ def _format_tuple_messages_chunk(msg_obj, meta: dict) -> dict:
     }
     return payload
 
-def _node_sse_generator(user_input: str, stream_mode = "updates", thread_id: str | None = None, checkpoint: str | None = None, replay_history: bool = True):
+def _node_sse_generator(user_input: str, stream_mode = "updates", thread_id: str | None = None, checkpoint: str | None = None, replay_history: bool = True, token_batch_ms: int = 0):
     modes, invalid = _parse_stream_modes(stream_mode)
     if invalid:
         yield _format_sse({"warning": "invalid_modes", "ignored": invalid, "allowed": sorted(list(ALLOWED_STREAM_MODES))}, event="warning")
@@ -740,58 +656,15 @@ def _node_sse_generator(user_input: str, stream_mode = "updates", thread_id: str
                                         }
                                         break
                             yield _format_sse(payload, event="node")
-            # elif mode == "messages":
-            #     for chunk in graph_app.stream(inputs, stream_mode=mode, **stream_kwargs):
-            #         logger.info(f"chunk: {chunk}")
-            #         # 优先处理 (msg, meta) 元组
-            #         if isinstance(chunk, tuple) and len(chunk) == 2 and isinstance(chunk[1], dict):
-            #             payload = _format_tuple_messages_chunk(chunk[0], chunk[1])
-            #             yield _format_sse(payload, event="node")
-            #             continue
-            #         # 处理列表：可能包含多个 (msg, meta)
-            #         if isinstance(chunk, list):
-            #             for item in chunk:
-            #                 if isinstance(item, tuple) and len(item) == 2 and isinstance(item[1], dict):
-            #                     payload = _format_tuple_messages_chunk(item[0], item[1])
-            #                     yield _format_sse(payload, event="node")
-            #                 else:
-            #                     # 回退到通用解析
-            #                     for node_name, node_value in _iter_node_items(item):
-            #                         derived_name = node_name if isinstance(node_name, str) else (
-            #                             node_value.get("langgraph_node") if isinstance(node_value, dict) else "unknown"
-            #                         )
-            #                         cfg = get_node_config(str(derived_name))
-            #                         messages = _extract_message_list(node_value)
-            #                         logger.info(f"messages: {messages}")
-            #                         logger.info(f"cfg: {cfg}")
-            #                         payload = {
-            #                             "node": derived_name,
-            #                             "display_name": cfg["display_name"],
-            #                             "description": cfg["description"],
-            #                             "messages": messages,
-            #                             "thread_id": thread_id,
-            #                             "checkpoint": checkpoint
-            #                         }
-            #                         yield _format_sse(payload, event="node")
-            #             continue
-            #         # 其它情况：使用通用解析
-            #         for node_name, node_value in _iter_node_items(chunk):
-            #             derived_name = node_name if isinstance(node_name, str) else (
-            #                 node_value.get("langgraph_node") if isinstance(node_value, dict) else "unknown"
-            #             )
-            #             cfg = get_node_config(str(derived_name))
-            #             messages = _extract_message_list(node_value)
-            #             logger.info(f"messages: {messages}")
-            #             logger.info(f"cfg: {cfg}")
-            #             payload = {
-            #                 "node": derived_name,
-            #                 "display_name": cfg["display_name"],
-            #                 "description": cfg["description"],
-            #                 "messages": messages,
-            #                 "thread_id": thread_id,
-            #                 "checkpoint": checkpoint
-            #             }
-            #             yield _format_sse(payload, event="node")
+            elif mode == "messages":
+                # 节点内 LLM 的 token 实时转发，附带节点归属与显示名称；
+                # token_batch_ms > 0 时按时间窗口合并同一节点的 token 小块
+                stream = graph_app.stream(inputs, stream_mode=mode, **stream_kwargs)
+                for text, meta in stream_codec.coalesce_messages(stream, interval_ms=token_batch_ms):
+                    payload = _format_tuple_messages_chunk(text, meta)
+                    payload["thread_id"] = thread_id
+                    payload["checkpoint"] = checkpoint
+                    yield _format_sse(payload, event="token")
             else:
                 for chunk in graph_app.stream(inputs, stream_mode=mode, **stream_kwargs):
                     yield _format_sse({"chunk": chunk, "thread_id": thread_id, "checkpoint": checkpoint}, event=mode)
@@ -804,9 +677,9 @@ def _node_sse_generator(user_input: str, stream_mode = "updates", thread_id: str
 
 
 
-def _node_sse_generator_interrupt(user_input: str, stream_mode = "updates", thread_id: str | None = None, checkpoint: str | None = None, replay_history: bool = True, resume: str | None = None):
+async def _node_sse_generator_interrupt(user_input: str, stream_mode = "updates", thread_id: str | None = None, checkpoint: str | None = None, replay_history: bool = True, resume: str | None = None):
     """
-    中断工作流的 SSE 事件生成器
+    中断工作流的 SSE 事件生成器（异步）
     
     功能说明：
     1. 支持工作流中断和人工干预机制
@@ -814,6 +687,7 @@ def _node_sse_generator_interrupt(user_input: str, stream_mode = "updates", thre
     3. 支持历史记录回放，显示之前的执行步骤
     4. 支持工具调用结果的详细输出
     5. 支持调试模式，提供详细的执行信息
+    6. 通过 interrupt_sessions 串行化同一线程的执行/恢复，不阻塞其它线程
     
     参数说明：
     - user_input: 用户输入内容
@@ -833,6 +707,11 @@ def _node_sse_generator_interrupt(user_input: str, stream_mode = "updates", thre
     - error: 错误信息
     - end: 流程结束
     """
+    is_resume = resume is not None and resume != ""
+    # 初次执行未提供 thread_id 时自动生成，客户端据此恢复
+    if not thread_id and not is_resume:
+        thread_id = uuid.uuid4().hex
+
     # 构建配置对象，用于状态持久化和断点续传
     cfg = {}
     configurable = {}
@@ -848,7 +727,7 @@ def _node_sse_generator_interrupt(user_input: str, stream_mode = "updates", thre
     if replay_history and cfg.get("configurable"):
         try:
             # 获取当前会话的状态快照
-            snapshot = interrupt_graph_app.get_state(cfg)
+            snapshot = await interrupt_graph_app.aget_state(cfg)
             if snapshot and hasattr(snapshot, "values") and isinstance(snapshot.values, dict):
                 steps = snapshot.values.get("steps") or []           # 已执行的步骤列表
                 processed = snapshot.values.get("processed_result")  # 已处理的结果
@@ -878,16 +757,18 @@ def _node_sse_generator_interrupt(user_input: str, stream_mode = "updates", thre
         if (stream_mode or "updates") == "debug":
             yield _format_sse({
                 "phase": "before_invoke",      # 阶段：执行前
-                "intent": "resume" if (resume is not None and resume != "") else "initial",  # 意图：恢复或初始执行
+                "intent": "resume" if is_resume else "initial",  # 意图：恢复或初始执行
                 "config": cfg,                 # 配置信息
                 "thread_id": thread_id,        # 会话ID
                 "checkpoint": checkpoint,      # 检查点ID
             }, event="debug")
         
         # 根据是否有恢复数据决定执行方式
-        if resume is not None and resume != "":
+        if is_resume:
             # 恢复执行：从中断点继续
-            result = interrupt_graph_app.invoke(Command(resume=resume), config=cfg)
+            if not thread_id:
+                raise ValueError("恢复执行需要提供 thread_id")
+            result = await interrupt_sessions.resume(thread_id, resume, cfg)
         else:
             # 初次执行：创建新的输入状态
             inputs = {
@@ -896,7 +777,7 @@ def _node_sse_generator_interrupt(user_input: str, stream_mode = "updates", thre
                 "steps": [],                   # 执行步骤（初始为空）
                 "decision": "",                # 决策结果（初始为空）
             }
-            result = interrupt_graph_app.invoke(inputs, config=cfg)
+            result = await interrupt_sessions.start(thread_id, inputs, cfg)
 
         # 检查是否发生中断
         if isinstance(result, dict) and "__interrupt__" in result:
@@ -905,7 +786,7 @@ def _node_sse_generator_interrupt(user_input: str, stream_mode = "updates", thre
             yield _format_sse({
                 "type": "interrupt",           # 类型：中断
                 "node": "human_interaction",   # 中断节点：人工交互
-                "data": _safe_serialize(payload),  # 中断数据（安全序列化）
+                "data": payload,                # 中断数据（由编码层统一序列化）
                 "thread_id": thread_id,        # 会话ID
                 "checkpoint": checkpoint       # 检查点ID
             }, event="interrupt")
@@ -938,7 +819,7 @@ def _node_sse_generator_interrupt(user_input: str, stream_mode = "updates", thre
                         "tool": t.get("tool"),             # 工具名称
                         "duration_ms": t.get("duration_ms"), # 执行时长（毫秒）
                         "status": t.get("status"),         # 执行状态
-                        "data": _safe_serialize(t.get("output")),  # 工具输出数据
+                        "data": t.get("output"),           # 工具输出数据
                         "thread_id": thread_id,            # 会话ID
                         "checkpoint": checkpoint,          # 检查点ID
                     }, event="tool")
@@ -999,6 +880,7 @@ async def websocket_stream(websocket: WebSocket):
             thread_id = body.get("thread_id")
             checkpoint = body.get("checkpoint")
             replay_history = bool(body.get("replay_history", False))
+            token_batch_ms = int(body.get("token_batch_ms") or 0)
             if not user_input:
                 await websocket.send_text(_format_sse({"status": "error", "message": "missing user_input"}, event="error"))
                 continue
@@ -1009,6 +891,7 @@ async def websocket_stream(websocket: WebSocket):
                 thread_id=thread_id,
                 checkpoint=checkpoint,
                 replay_history=replay_history,
+                token_batch_ms=token_batch_ms,
             ):
                 await websocket.send_text(line)
     except WebSocketDisconnect:
@@ -1041,10 +924,12 @@ async def websocket_stream_interrupt(websocket: WebSocket):
     消息格式：
     - 初始请求：{"user_input": "用户输入", "thread_id": "会话ID", "checkpoint": "检查点ID"}
     - 恢复请求：{"resume": "恢复数据", "thread_id": "会话ID", "checkpoint": "检查点ID"}
+    - 待处理列表：{"action": "list_pending", "limit": 100}
     
     返回事件类型：
     - history: 历史记录回放
     - mode_start/mode_end: 模式开始/结束
+    - pending: 等待人工输入的线程列表
     - interrupt: 工作流中断，等待人工干预
     - debug: 调试信息
     - tool: 工具调用结果
@@ -1084,13 +969,20 @@ async def websocket_stream_interrupt(websocket: WebSocket):
             replay_history = bool(body.get("replay_history", False))  # 是否回放历史记录
             resume = body.get("resume")                         # 恢复数据，用于从中断点继续执行
             
+            # 批量查询等待人工输入的线程
+            if body.get("action") == "list_pending":
+                await websocket.send_text(_format_sse({
+                    "threads": interrupt_sessions.list_pending(body.get("limit")),
+                }, event="pending"))
+                continue
+            
             # 参数验证：必须提供用户输入或恢复数据
             if not user_input and not resume:
                 await websocket.send_text(_format_sse({"status": "error", "message": "missing user_input or resume"}, event="error"))
                 continue
             
             # 调用中断工作流生成器，逐条发送流式事件
-            for line in _node_sse_generator_interrupt(
+            async for line in _node_sse_generator_interrupt(
                 user_input,                    # 用户输入
                 stream_mode=stream_mode,       # 流式模式
                 thread_id=thread_id,           # 会话ID
@@ -15,8 +15,10 @@ import traceback
 from langchain.embeddings import init_embeddings
 from langchain.chat_models import init_chat_model
 from langchain_core.messages import HumanMessage, AIMessage
-from langgraph.store.memory import InMemoryStore
-from langgraph.store.base import BaseStore
+from vector_store import VectorIndexStore
+from embedding_service import CachedEmbeddings
+from hybrid_retrieval import HybridMemoryRetriever
+from langgraph.store.base import BaseStore, PutOp
 from langgraph.graph import START, MessagesState, StateGraph
 from langgraph.checkpoint.memory import InMemorySaver
 
@@ -85,6 +87,13 @@ class AdvancedMemoryDemo:
             # 使用默认配置
             self.embeddings = init_embeddings(f"{model_config.embedding_provider}:{model_config.embedding_model}")
         
+        # 包装为带缓存与请求合并的嵌入服务，重复的查询/记忆文本不再请求嵌入接口
+        self.embeddings = CachedEmbeddings(
+            self.embeddings,
+            model=f"{model_config.embedding_provider}:{model_config.embedding_model}",
+            cache_dir=config.data_path("embedding_cache"),
+        )
+        
         # 初始化聊天模型
         chat_config = model_config.get_chat_model_config()
         if chat_config:
@@ -107,8 +116,8 @@ class AdvancedMemoryDemo:
         # 获取嵌入模型的维度
         embedding_dims = model_config.get_embedding_dimensions()
         
-        # 创建带有多向量索引的InMemoryStore
-        self.store = InMemoryStore(
+        # 创建带有多向量索引的向量索引存储（每条记忆的多个字段各占一行，检索时取最高分）
+        self.store = VectorIndexStore(
             index={
                 "embed": self.embeddings,
                 "dims": embedding_dims,
@@ -120,6 +129,9 @@ class AdvancedMemoryDemo:
             }
         )
         
+        # 混合检索器：BM25 + 标签/情感倒排 + 向量，一次查询完成并用 RRF 融合
+        self.retriever = HybridMemoryRetriever(self.store, ("demo_user", "advanced_memories"))
+        
         # 创建检查点保存器
         self.checkpointer = InMemorySaver()
         
@@ -154,22 +166,8 @@ class AdvancedMemoryDemo:
         Returns:
             情感关键词列表
         """
-        # 情感关键词映射
-        emotional_keywords = {
-            "积极情感": ["开心", "高兴", "快乐", "兴奋", "满足", "自豪", "满意", "愉快", "喜悦", "激动"],
-            "消极情感": ["难过", "悲伤", "沮丧", "失望", "愤怒", "焦虑", "担心", "害怕", "痛苦", "绝望"],
-            "中性情感": ["平静", "冷静", "中性", "一般", "普通", "正常"],
-            "惊讶": ["惊讶", "震惊", "意外", "没想到", "出乎意料"],
-            "困惑": ["困惑", "迷茫", "不解", "疑惑", "不明白"]
-        }
-        
-        # 检测消息中的情感关键词
-        detected_emotions = []
-        for emotion_type, keywords in emotional_keywords.items():
-            for keyword in keywords:
-                if keyword in message:
-                    detected_emotions.append(keyword)
-                    break  # 每个情感类型只取第一个匹配的关键词
+        # Aho–Corasick 一次扫描，每个情感类别取第一个匹配的关键词
+        detected_emotions = self.retriever.detect_keywords(message)["emotions"]
         
         logger.info(f"从消息 '{message}' 中检测到情感关键词: {detected_emotions}")
         return detected_emotions
@@ -187,65 +185,23 @@ class AdvancedMemoryDemo:
             last_message = state["messages"][-1].content
             logger.info(f"处理用户消息: {last_message}")
             
-            # 搜索内容相关的记忆
-            content_results = store.search(
-                namespace, 
-                query=last_message, 
-                limit=3
-            )
-            
-            # 搜索情感相关的记忆 - 使用情感关键词
-            emotional_keywords = self._extract_emotional_keywords(last_message)
-            if emotional_keywords:
-                emotional_query = " ".join(emotional_keywords)
-                emotional_results = store.search(
-                    namespace, 
-                    query=emotional_query, 
-                    limit=2
-                )
-            else:
-                # 如果没有检测到情感关键词，使用原始消息
-                emotional_results = store.search(
-                    namespace, 
-                    query=last_message, 
-                    limit=2
-                )
+            # 一次混合检索同时覆盖内容、关键词、标签与情感
+            hits = self.retriever.search(last_message, limit=5)
+            source_names = {"vector": "内容相关", "bm25": "关键词", "tags": "标签相关", "emotion": "情感相关"}
             
             # 构建记忆上下文
             memories = []
-            seen_memories = set()
-            
-            # 处理内容相关记忆
-            for item in content_results:
-                if item.key not in seen_memories:
-                    memory_data = item.value
-                    similarity_score = item.score
-                    memories.append({
-                        "content": memory_data.get("content", ""),
-                        "emotional_context": memory_data.get("emotional_context", ""),
-                        "importance": memory_data.get("importance", 0.5),
-                        "tags": memory_data.get("tags", []),
-                        "score": similarity_score,
-                        "search_type": "内容相关"
-                    })
-                    seen_memories.add(item.key)
-                    logger.info(f"找到内容相关记忆: {memory_data.get('content', '')} (相似度: {similarity_score:.3f})")
-            
-            # 处理情感相关记忆
-            for item in emotional_results:
-                if item.key not in seen_memories:
-                    memory_data = item.value
-                    similarity_score = item.score
-                    memories.append({
-                        "content": memory_data.get("content", ""),
-                        "emotional_context": memory_data.get("emotional_context", ""),
-                        "importance": memory_data.get("importance", 0.5),
-                        "tags": memory_data.get("tags", []),
-                        "score": similarity_score,
-                        "search_type": "情感相关"
-                    })
-                    seen_memories.add(item.key)
-                    logger.info(f"找到情感相关记忆: {memory_data.get('content', '')} (相似度: {similarity_score:.3f})")
+            for hit in hits:
+                memory_data = hit.value
+                memories.append({
+                    "content": memory_data.get("content", ""),
+                    "emotional_context": memory_data.get("emotional_context", ""),
+                    "importance": memory_data.get("importance", 0.5),
+                    "tags": memory_data.get("tags", []),
+                    "score": hit.score,
+                    "search_type": "+".join(source_names[s] for s in hit.sources)
+                })
+                logger.info(f"找到相关记忆: {memory_data.get('content', '')} (融合分: {hit.score:.3f}, 通道: {hit.sources})")
             
             # 按重要性排序记忆
             memories.sort(key=lambda x: x["importance"], reverse=True)
@@ -259,7 +215,7 @@ class AdvancedMemoryDemo:
                     memory_context += f"   情感: {memory['emotional_context']}\n"
                     memory_context += f"   标签: {', '.join(memory['tags'])}\n"
                     memory_context += f"   重要性: {memory['importance']:.2f}\n"
-                    memory_context += f"   相似度: {memory['score']:.3f}\n"
+                    memory_context += f"   相关度: {memory['score']:.3f}\n"
                     memory_context += f"   搜索类型: {memory['search_type']}\n\n"
             
             logger.info(f"memory_context: {memory_context}")
@@ -297,20 +253,18 @@ class AdvancedMemoryDemo:
                     
                     memory_id = str(uuid.uuid4())
                     now = datetime.now().isoformat()
+                    memory_value = {
+                        "content": memory_content,
+                        "emotional_context": emotional_context,
+                        "importance": importance,
+                        "tags": tags,
+                        "created_at": now,
+                        "last_accessed": now,
+                        "access_count": 1
+                    }
                     
-                    store.put(
-                        namespace,
-                        memory_id,
-                        {
-                            "content": memory_content,
-                            "emotional_context": emotional_context,
-                            "importance": importance,
-                            "tags": tags,
-                            "created_at": now,
-                            "last_accessed": now,
-                            "access_count": 1
-                        }
-                    )
+                    store.put(namespace, memory_id, memory_value)
+                    self.retriever.add(memory_id, memory_value)
                     memory_context += f"已记住: {memory_content}\n"
                     logger.info(f"存储新记忆: {memory_content}")
             
@@ -371,6 +325,7 @@ class AdvancedMemoryDemo:
         memory_dict = asdict(memory_item)
         
         self.store.put(namespace, memory_id, memory_dict)
+        self.retriever.add(memory_id, memory_dict)
         
         print(f"✅ 已添加高级记忆: {memory_item.content}")
         print(f"   情感: {memory_item.emotional_context}")
@@ -379,6 +334,31 @@ class AdvancedMemoryDemo:
         
         return memory_id
     
+    def add_advanced_memories(self, memory_items: List[MemoryItem]) -> List[str]:
+        """
+        批量添加高级记忆，所有字段合并为一次嵌入请求
+        
+        Args:
+            memory_items: 记忆项列表
+            
+        Returns:
+            记忆ID列表
+        """
+        namespace = ("demo_user", "advanced_memories")
+        memory_ids = [str(uuid.uuid4()) for _ in memory_items]
+        
+        memory_dicts = [asdict(memory_item) for memory_item in memory_items]
+        
+        self.store.batch([
+            PutOp(namespace, memory_id, memory_dict)
+            for memory_id, memory_dict in zip(memory_ids, memory_dicts)
+        ])
+        
+        for memory_id, memory_dict in zip(memory_ids, memory_dicts):
+            self.retriever.add(memory_id, memory_dict)
+            print(f"✅ 已添加高级记忆: {memory_dict['content']}")
+        return memory_ids
+    
     def search_by_emotion(self, emotion_query: str, limit: int = 5) -> List[Dict[str, Any]]:
         """
         按情感搜索记忆
@@ -390,25 +370,24 @@ class AdvancedMemoryDemo:
         Returns:
             搜索结果列表
         """
-        namespace = ("demo_user", "advanced_memories")
-        results = self.store.search(namespace, query=emotion_query, limit=limit)
+        # 情感词倒排与向量、BM25 融合排序
+        hits = self.retriever.search(emotion_query, limit=limit)
         
         memories = []
-        for item in results:
+        for hit in hits:
             memories.append({
-                "id": item.key,
-                "content": item.value.get("content", ""),
-                "emotional_context": item.value.get("emotional_context", ""),
-                "importance": item.value.get("importance", 0.5),
-                "tags": item.value.get("tags", []),
-                "score": item.score,
+                "id": hit.key,
+                "content": hit.value.get("content", ""),
+                "emotional_context": hit.value.get("emotional_context", ""),
+                "importance": hit.value.get("importance", 0.5),
+                "tags": hit.value.get("tags", []),
+                "matched_emotions": hit.matched_emotions,
+                "score": hit.score,
                 "search_type": "情感搜索",
-                "created_at": item.value.get("created_at", ""),
-                "access_count": item.value.get("access_count", 0)
+                "created_at": hit.value.get("created_at", ""),
+                "access_count": hit.value.get("access_count", 0)
             })
         
-        # 按相似度排序
-        memories.sort(key=lambda x: x["score"], reverse=True)
         return memories
     
     def search_by_tags(self, tags: List[str], limit: int = 5) -> List[Dict[str, Any]]:
@@ -422,30 +401,24 @@ class AdvancedMemoryDemo:
         Returns:
             搜索结果列表
         """
-        namespace = ("demo_user", "advanced_memories")
-        # 使用标签作为查询
-        query = " ".join(tags)
-        results = self.store.search(namespace, query=query, limit=limit)
+        # 标签倒排与向量、BM25 融合排序，只保留确有匹配标签的记忆
+        hits = self.retriever.search(" ".join(tags), tags=tags, limit=limit)
         
         memories = []
-        for item in results:
-            item_tags = item.value.get("tags", [])
-            # 检查是否有匹配的标签
-            if any(tag in item_tags for tag in tags):
+        for hit in hits:
+            if hit.matched_tags:
                 memories.append({
-                    "id": item.key,
-                    "content": item.value.get("content", ""),
-                    "emotional_context": item.value.get("emotional_context", ""),
-                    "importance": item.value.get("importance", 0.5),
-                    "tags": item_tags,
-                    "score": item.score,
+                    "id": hit.key,
+                    "content": hit.value.get("content", ""),
+                    "emotional_context": hit.value.get("emotional_context", ""),
+                    "importance": hit.value.get("importance", 0.5),
+                    "tags": hit.value.get("tags", []),
+                    "score": hit.score,
                     "search_type": "标签搜索",
-                    "created_at": item.value.get("created_at", ""),
-                    "access_count": item.value.get("access_count", 0)
+                    "created_at": hit.value.get("created_at", ""),
+                    "access_count": hit.value.get("access_count", 0)
                 })
         
-        # 按相似度排序
-        memories.sort(key=lambda x: x["score"], reverse=True)
         return memories
     
     def search_by_tags_direct(self, tags: List[str], limit: int = 5) -> List[Dict[str, Any]]:
@@ -459,33 +432,22 @@ class AdvancedMemoryDemo:
         Returns:
             搜索结果列表
         """
-        namespace = ("demo_user", "advanced_memories")
-        
-        # 使用tag作为查询词，专门搜索tags字段
-        results = self.store.search(
-            namespace, 
-            query=" ".join(tags),  # 使用标签组合作为查询
-            limit=limit
-        )
-        
+        # 直接查标签倒排表，不经过向量检索
         memories = []
-        for item in results:
-            item_tags = item.value.get("tags", [])
-            # 检查是否有匹配的标签
-            matched_tags = [tag for tag in tags if tag in item_tags]
-            if matched_tags:  # 只返回有匹配标签的记忆
-                memories.append({
-                    "id": item.key,
-                    "content": item.value.get("content", ""),
-                    "emotional_context": item.value.get("emotional_context", ""),
-                    "importance": item.value.get("importance", 0.5),
-                    "tags": item_tags,
-                    "matched_tags": matched_tags,
-                    "score": item.score,
-                    "search_type": "Tag直接搜索",
-                    "created_at": item.value.get("created_at", ""),
-                    "access_count": item.value.get("access_count", 0)
-                })
+        for key, matched_tags in self.retriever.match_tags(tags):
+            value = self.retriever.get(key)
+            memories.append({
+                "id": key,
+                "content": value.get("content", ""),
+                "emotional_context": value.get("emotional_context", ""),
+                "importance": value.get("importance", 0.5),
+                "tags": value.get("tags", []),
+                "matched_tags": matched_tags,
+                "score": len(matched_tags) / len(set(tags)),  # 标签命中比例
+                "search_type": "Tag直接搜索",
+                "created_at": value.get("created_at", ""),
+                "access_count": value.get("access_count", 0)
+            })
         
         # 按重要性排序
         memories.sort(key=lambda x: x["importance"], reverse=True)
@@ -502,32 +464,22 @@ class AdvancedMemoryDemo:
         Returns:
             搜索结果列表
         """
-        namespace = ("demo_user", "advanced_memories")
-        
-        # 使用tag作为查询词
-        results = self.store.search(
-            namespace, 
-            query=tag,
-            limit=limit
-        )
-        
+        # 单个标签直接查倒排表
         memories = []
-        for item in results:
-            item_tags = item.value.get("tags", [])
-            # 检查是否包含指定的标签
-            if tag in item_tags:
-                memories.append({
-                    "id": item.key,
-                    "content": item.value.get("content", ""),
-                    "emotional_context": item.value.get("emotional_context", ""),
-                    "importance": item.value.get("importance", 0.5),
-                    "tags": item_tags,
-                    "matched_tags": [tag],
-                    "score": item.score,
-                    "search_type": "Tag字段搜索",
-                    "created_at": item.value.get("created_at", ""),
-                    "access_count": item.value.get("access_count", 0)
-                })
+        for key, matched_tags in self.retriever.match_tags([tag]):
+            value = self.retriever.get(key)
+            memories.append({
+                "id": key,
+                "content": value.get("content", ""),
+                "emotional_context": value.get("emotional_context", ""),
+                "importance": value.get("importance", 0.5),
+                "tags": value.get("tags", []),
+                "matched_tags": matched_tags,
+                "score": 1.0,
+                "search_type": "Tag字段搜索",
+                "created_at": value.get("created_at", ""),
+                "access_count": value.get("access_count", 0)
+            })
         
         # 按重要性排序
         memories.sort(key=lambda x: x["importance"], reverse=True)
@@ -544,29 +496,22 @@ class AdvancedMemoryDemo:
         Returns:
             搜索结果列表
         """
-        namespace = ("demo_user", "advanced_memories")
-        
-        # 获取所有记忆
-        all_results = self.store.search(namespace, query="", limit=100)
-        
+        # 标签倒排表求并集，无需遍历全部记忆
         memories = []
-        for item in all_results:
-            item_tags = item.value.get("tags", [])
-            # 检查是否有匹配的标签
-            matched_tags = [tag for tag in tags if tag in item_tags]
-            if matched_tags:  # 只返回有匹配标签的记忆
-                memories.append({
-                    "id": item.key,
-                    "content": item.value.get("content", ""),
-                    "emotional_context": item.value.get("emotional_context", ""),
-                    "importance": item.value.get("importance", 0.5),
-                    "tags": item_tags,
-                    "matched_tags": matched_tags,
-                    "score": item.score,
-                    "search_type": "Tag精确筛选",
-                    "created_at": item.value.get("created_at", ""),
-                    "access_count": item.value.get("access_count", 0)
-                })
+        for key, matched_tags in self.retriever.match_tags(tags):
+            value = self.retriever.get(key)
+            memories.append({
+                "id": key,
+                "content": value.get("content", ""),
+                "emotional_context": value.get("emotional_context", ""),
+                "importance": value.get("importance", 0.5),
+                "tags": value.get("tags", []),
+                "matched_tags": matched_tags,
+                "score": None,
+                "search_type": "Tag精确筛选",
+                "created_at": value.get("created_at", ""),
+                "access_count": value.get("access_count", 0)
+            })
         
         # 按重要性排序
         memories.sort(key=lambda x: x["importance"], reverse=True)
@@ -583,29 +528,24 @@ class AdvancedMemoryDemo:
         Returns:
             搜索结果列表
         """
-        namespace = ("demo_user", "advanced_memories")
-        
-        # 获取所有记忆
-        all_results = self.store.search(namespace, query="", limit=100)
+        # 只在已知标签名上做部分匹配，再查标签倒排表，无需遍历全部记忆
+        matching_tags = [tag for tag in self.retriever.tags() if partial_tag in tag]
         
         memories = []
-        for item in all_results:
-            item_tags = item.value.get("tags", [])
-            # 检查是否有部分匹配的标签
-            matched_tags = [tag for tag in item_tags if partial_tag in tag]
-            if matched_tags:  # 只返回有匹配标签的记忆
-                memories.append({
-                    "id": item.key,
-                    "content": item.value.get("content", ""),
-                    "emotional_context": item.value.get("emotional_context", ""),
-                    "importance": item.value.get("importance", 0.5),
-                    "tags": item_tags,
-                    "matched_tags": matched_tags,
-                    "score": item.score,
-                    "search_type": "Tag部分匹配",
-                    "created_at": item.value.get("created_at", ""),
-                    "access_count": item.value.get("access_count", 0)
-                })
+        for key, matched_tags in self.retriever.match_tags(matching_tags):
+            value = self.retriever.get(key)
+            memories.append({
+                "id": key,
+                "content": value.get("content", ""),
+                "emotional_context": value.get("emotional_context", ""),
+                "importance": value.get("importance", 0.5),
+                "tags": value.get("tags", []),
+                "matched_tags": matched_tags,
+                "score": None,
+                "search_type": "Tag部分匹配",
+                "created_at": value.get("created_at", ""),
+                "access_count": value.get("access_count", 0)
+            })
         
         # 按重要性排序
         memories.sort(key=lambda x: x["importance"], reverse=True)
@@ -632,21 +572,14 @@ class AdvancedMemoryDemo:
         Returns:
             筛选结果列表
         """
-        namespace = ("demo_user", "advanced_memories")
-        
-        # 获取所有记忆
-        all_results = self.store.search(namespace, query="", limit=100)
+        # 有标签条件时先用标签倒排表缩小候选集，否则读取索引中的全部记忆（不调用 store.search）
+        if tags:
+            candidates = [(key, self.retriever.get(key)) for key, _ in self.retriever.match_tags(tags)]
+        else:
+            candidates = self.retriever.items()
         
         memories = []
-        for item in all_results:
-            memory_data = item.value
-            
-            # 检查标签条件
-            if tags:
-                item_tags = memory_data.get("tags", [])
-                if not any(tag in item_tags for tag in tags):
-                    continue
-            
+        for key, memory_data in candidates:
             # 检查情感条件
             if emotional_context:
                 item_emotional = memory_data.get("emotional_context", "")
@@ -667,13 +600,13 @@ class AdvancedMemoryDemo:
                     continue
             
             memories.append({
-                "id": item.key,
+                "id": key,
                 "content": memory_data.get("content", ""),
                 "emotional_context": memory_data.get("emotional_context", ""),
                 "importance": importance,
                 "tags": memory_data.get("tags", []),
                 "memory_type": memory_data.get("memory_type", ""),
-                "score": item.score,
+                "score": None,
                 "search_type": "多条件筛选",
                 "created_at": memory_data.get("created_at", ""),
                 "access_count": memory_data.get("access_count", 0)
@@ -690,17 +623,8 @@ class AdvancedMemoryDemo:
         Returns:
             标签列表
         """
-        namespace = ("demo_user", "advanced_memories")
-        
-        # 获取所有记忆
-        all_results = self.store.search(namespace, query="", limit=100)
-        
-        all_tags = set()
-        for item in all_results:
-            tags = item.value.get("tags", [])
-            all_tags.update(tags)
-        
-        return sorted(list(all_tags))
+        # 标签倒排表的键即全部标签
+        return self.retriever.tags()
     
     def get_high_importance_memories(self, threshold: float = 0.8) -> List[Dict[str, Any]]:
         """
@@ -712,23 +636,19 @@ class AdvancedMemoryDemo:
         Returns:
             高重要性记忆列表
         """
-        namespace = ("demo_user", "advanced_memories")
-        # 获取所有记忆
-        all_results = self.store.search(namespace, query="", limit=100)
-        
         high_importance = []
-        for item in all_results:
-            importance = item.value.get("importance", 0.5)
+        for key, value in self.retriever.items():
+            importance = value.get("importance", 0.5)
             if importance >= threshold:
                 high_importance.append({
-                    "id": item.key,
-                    "content": item.value.get("content", ""),
-                    "emotional_context": item.value.get("emotional_context", ""),
+                    "id": key,
+                    "content": value.get("content", ""),
+                    "emotional_context": value.get("emotional_context", ""),
                     "importance": importance,
-                    "tags": item.value.get("tags", []),
-                    "score": item.score,
-                    "created_at": item.value.get("created_at", ""),
-                    "access_count": item.value.get("access_count", 0)
+                    "tags": value.get("tags", []),
+                    "score": None,
+                    "created_at": value.get("created_at", ""),
+                    "access_count": value.get("access_count", 0)
                 })
         
         # 按重要性排序
@@ -770,20 +690,18 @@ class AdvancedMemoryDemo:
         Returns:
             所有记忆的列表
         """
-        namespace = ("demo_user", "advanced_memories")
-        results = self.store.search(namespace, query="", limit=100)
-        
+        # 直接读取混合检索器的索引快照，不再以空查询全量 search
         memories = []
-        for item in results:
+        for key, value in self.retriever.items():
             memories.append({
-                "id": item.key,
-                "content": item.value.get("content", ""),
-                "emotional_context": item.value.get("emotional_context", ""),
-                "importance": item.value.get("importance", 0.5),
-                "tags": item.value.get("tags", []),
-                "score": item.score,
-                "created_at": item.value.get("created_at", ""),
-                "access_count": item.value.get("access_count", 0)
+                "id": key,
+                "content": value.get("content", ""),
+                "emotional_context": value.get("emotional_context", ""),
+                "importance": value.get("importance", 0.5),
+                "tags": value.get("tags", []),
+                "score": None,
+                "created_at": value.get("created_at", ""),
+                "access_count": value.get("access_count", 0)
             })
         
         # 按重要性排序
@@ -856,9 +774,8 @@ def main():
         )
     ]
     
-    # 添加记忆
-    for memory in memories:
-        demo.add_advanced_memory(memory)
+    # 批量添加记忆
+    demo.add_advanced_memories(memories)
     
     print("\n🔍 3. 高级搜索演示...")
     
@@ -949,6 +866,8 @@ def main():
         print(f"     创建时间: {memory['created_at']}")
         print()
     
+    print(f"\n📊 嵌入缓存统计: {demo.embeddings.stats()}")
+    
     print("\n✅ 高级演示完成！")
 
 
@@ -3,20 +3,29 @@
 LangGraph InMemoryStore 示例
 包含语义搜索、添加和删除消息的功能
 支持自定义模型配置
+
+每轮对话只执行一个节点：
+- 消息通道自带长度上限（bounded_add_messages），写入时即丢弃旧消息，不需要单独的清理节点和额外的检查点
+- 记忆上下文按命名空间缓存，store 写入该命名空间时失效
 """
 
 import os
+import threading
 import uuid
-from typing import Optional, List, Dict, Any
+from collections import OrderedDict
+from typing import Optional, List, Dict, Any, Tuple, Callable, Iterable, TypedDict
+from typing_extensions import Annotated
 from datetime import datetime
 import traceback
 
 from langchain.embeddings import init_embeddings
 from langchain.chat_models import init_chat_model
-from langchain_core.messages import HumanMessage, AIMessage, RemoveMessage
-from langgraph.store.memory import InMemoryStore
-from langgraph.store.base import BaseStore
-from langgraph.graph import START, MessagesState, StateGraph
+from langchain_core.messages import HumanMessage, AIMessage, AnyMessage
+from vector_store import VectorIndexStore
+from embedding_service import CachedEmbeddings
+from langgraph.store.base import BaseStore, PutOp
+from langgraph.graph import START, StateGraph
+from langgraph.graph.message import add_messages
 from langgraph.checkpoint.memory import InMemorySaver
 
 import config
@@ -25,6 +34,72 @@ from config import ModelConfig
 logger = config.logger
 
 
+def bounded_add_messages(max_messages: int) -> Callable[[List[AnyMessage], List[AnyMessage]], List[AnyMessage]]:
+    """
+    带长度上限的消息 reducer：按 add_messages 合并后只保留最近 max_messages 条
+
+    旧消息在写入通道时就被丢弃，检查点里保存的始终是截断后的列表
+    """
+    def reducer(left: List[AnyMessage], right: List[AnyMessage]) -> List[AnyMessage]:
+        merged = add_messages(left, right)
+        if len(merged) > max_messages:
+            logger.info(f"丢弃旧消息: {len(merged) - max_messages} 条")
+            merged = merged[-max_messages:]
+        return merged
+    return reducer
+
+
+class MemoryContextCache:
+    """
+    记忆上下文缓存：命名空间 -> (查询, 条数) -> 拼好的记忆上下文
+
+    作为 store 的写入监听注册，命名空间被写入（新增/修改/删除记忆）时整体失效。
+    每个命名空间有一个版本号，失效时加一；构建前记下版本，构建期间发生失效则结果不写入缓存，
+    避免用失效前读到的旧记忆覆盖掉这次失效
+    """
+
+    def __init__(self, max_entries_per_namespace: int = 128):
+        self.max_entries = max_entries_per_namespace
+        self._cache: Dict[Tuple[str, ...], "OrderedDict[Tuple[str, int], str]"] = {}
+        self._versions: Dict[Tuple[str, ...], int] = {}
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get_or_build(self, namespace: Tuple[str, ...], query: str, limit: int,
+                     build: Callable[[], str]) -> str:
+        key = (query.strip(), limit)
+        with self._lock:
+            entries = self._cache.get(namespace)
+            if entries is not None and key in entries:
+                entries.move_to_end(key)
+                self.hits += 1
+                return entries[key]
+            version = self._versions.get(namespace, 0)
+        context = build()
+        with self._lock:
+            self.misses += 1
+            if self._versions.get(namespace, 0) != version:
+                return context
+            entries = self._cache.setdefault(namespace, OrderedDict())
+            entries[key] = context
+            if len(entries) > self.max_entries:
+                entries.popitem(last=False)
+        return context
+
+    def invalidate(self, namespaces: Iterable[Tuple[str, ...]]) -> None:
+        with self._lock:
+            for namespace in namespaces:
+                namespace = tuple(namespace)
+                self._versions[namespace] = self._versions.get(namespace, 0) + 1
+                if self._cache.pop(namespace, None) is not None:
+                    logger.info(f"记忆上下文缓存失效: {namespace}")
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            return {"hits": self.hits, "misses": self.misses,
+                    "entries": sum(len(entries) for entries in self._cache.values())}
+
 
 class LangGraphMemoryDemo:
     """LangGraph InMemoryStore 演示类"""
@@ -65,6 +140,13 @@ class LangGraphMemoryDemo:
             # 使用默认配置
             self.embeddings = init_embeddings(f"{model_config.embedding_provider}:{model_config.embedding_model}")
         
+        # 包装为带缓存与请求合并的嵌入服务，重复的查询/记忆文本不再请求嵌入接口
+        self.embeddings = CachedEmbeddings(
+            self.embeddings,
+            model=f"{model_config.embedding_provider}:{model_config.embedding_model}",
+            cache_dir=config.data_path("embedding_cache"),
+        )
+        
         # 初始化聊天模型
         chat_config = model_config.get_chat_model_config()
         if chat_config:
@@ -87,8 +169,8 @@ class LangGraphMemoryDemo:
         # 获取嵌入模型的维度
         embedding_dims = model_config.get_embedding_dimensions()
         
-        # 创建带有语义搜索的InMemoryStore
-        self.store = InMemoryStore(
+        # 创建带有语义搜索的向量索引存储（接口同 InMemoryStore，向量按命名空间存为 float32 矩阵）
+        self.store = VectorIndexStore(
             index={
                 "embed": self.embeddings,
                 "dims": embedding_dims,
@@ -96,6 +178,10 @@ class LangGraphMemoryDemo:
             }
         )
         
+        # 记忆上下文缓存：store 写入某个命名空间时，该命名空间的缓存失效
+        self.memory_cache = MemoryContextCache()
+        self.store.add_write_listener(self.memory_cache.invalidate)
+        
         # 创建检查点保存器
         self.checkpointer = InMemorySaver()
         
@@ -123,19 +209,15 @@ class LangGraphMemoryDemo:
     def _build_graph(self):
         """构建LangGraph工作流"""
         
-        def chat_with_memory(state, *, store: BaseStore):
-            """带有记忆功能的聊天节点"""
-            logger.info(f"graph chat_with_memory: {state}")
-            user_id = "demo_user"
-            namespace = (user_id, "memories")
-            
-            # 基于用户最后一条消息进行语义搜索
-            last_message = state["messages"][-1].content
-            logger.info(f"处理用户消息: {last_message}")
-            
+        # 消息通道最多保留最近 limit_history + 1 条消息，写入时截断
+        class ChatState(TypedDict):
+            messages: Annotated[List[AnyMessage], bounded_add_messages(self.limit_history + 1)]
+        
+        def build_memory_context(store: BaseStore, namespace: Tuple[str, ...], query: str) -> str:
+            """语义搜索记忆并拼接为上下文（结果由 memory_cache 缓存）"""
             items = store.search(
                 namespace, 
-                query=last_message, 
+                query=query, 
                 limit=self.limit_history
             )
             
@@ -149,9 +231,24 @@ class LangGraphMemoryDemo:
                     memories.append(f"{memory_text}")
                     logger.info(f"找到记忆: {memory_text} (相似度: {similarity_score:.3f})")
             
-            memory_context = ""
             if memories:
-                memory_context = f"\n## 用户记忆:\n" + "\n".join(memories)
+                return f"\n## 用户记忆:\n" + "\n".join(memories)
+            return ""
+        
+        def chat_with_memory(state, *, store: BaseStore):
+            """带有记忆功能的聊天节点"""
+            logger.info(f"graph chat_with_memory: {state}")
+            user_id = "demo_user"
+            namespace = (user_id, "memories")
+            
+            # 基于用户最后一条消息进行语义搜索（命中缓存时不再检索）
+            last_message = state["messages"][-1].content
+            logger.info(f"处理用户消息: {last_message}")
+            
+            memory_context = self.memory_cache.get_or_build(
+                namespace, last_message, self.limit_history,
+                lambda: build_memory_context(store, namespace, last_message)
+            )
             logger.info(f"memory_context: {memory_context}")
             
             # 检查是否需要存储新记忆
@@ -203,21 +300,10 @@ class LangGraphMemoryDemo:
                 error_response = AIMessage(content=f"抱歉，模型调用失败: {str(e)}")
                 return {"messages": [error_response]}
         
-        def delete_old_messages(state):
-            """删除旧消息的节点"""
-            messages = state["messages"]
-            if len(messages) > self.limit_history + 1:  # 保留最近4条消息
-                # 删除最早的消息
-                logger.info(f"删除旧消息: {messages[:-(self.limit_history + 1)]}")
-                return {"messages": [RemoveMessage(id=m.id) for m in messages[:-(self.limit_history + 1)]]}
-            return {}
-        
-        # 构建图
-        builder = StateGraph(MessagesState)
+        # 构建图：每轮只执行 chat 一个节点，旧消息由消息通道在写入时丢弃
+        builder = StateGraph(ChatState)
         builder.add_node("chat", chat_with_memory)
-        builder.add_node("cleanup", delete_old_messages)
         builder.add_edge(START, "chat")
-        builder.add_edge("chat", "cleanup")
         
         return builder.compile(
             checkpointer=self.checkpointer,
@@ -251,6 +337,29 @@ class LangGraphMemoryDemo:
         print(f"✅ 已添加记忆: {content}")
         return memory_id
     
+    def add_memories(self, memories: List[Tuple[str, str]]) -> List[str]:
+        """
+        批量添加记忆，所有内容合并为一次嵌入请求
+        
+        Args:
+            memories: (记忆内容, 记忆类型) 列表
+            
+        Returns:
+            记忆ID列表
+        """
+        namespace = ("demo_user", "memories")
+        memory_ids = [str(uuid.uuid4()) for _ in memories]
+        timestamp = datetime.now().isoformat()
+        
+        self.store.batch([
+            PutOp(namespace, memory_id, {"text": content, "timestamp": timestamp, "type": memory_type})
+            for memory_id, (content, memory_type) in zip(memory_ids, memories)
+        ])
+        
+        for content, _ in memories:
+            print(f"✅ 已添加记忆: {content}")
+        return memory_ids
+    
     def search_memories(self, query: str, limit: int = 5) -> List[Dict[str, Any]]:
         """
         搜索记忆
@@ -393,11 +502,13 @@ def main():
     demo = demo_default
     
     print("\n📝 4. 添加一些示例记忆...")
-    demo.add_memory("我喜欢吃披萨", "preference")
-    demo.add_memory("我是一个程序员", "personal")
-    demo.add_memory("我住在北京", "personal")
-    demo.add_memory("我喜欢Python编程语言", "preference")
-    demo.add_memory("我有一只叫小白的猫", "personal")
+    demo.add_memories([
+        ("我喜欢吃披萨", "preference"),
+        ("我是一个程序员", "personal"),
+        ("我住在北京", "personal"),
+        ("我喜欢Python编程语言", "preference"),
+        ("我有一只叫小白的猫", "personal"),
+    ])
     
     print("\n🔍 5. 语义搜索演示...")
     
@@ -473,6 +584,9 @@ def main():
     print("\n🧹 9. 清空所有记忆...")
     demo.clear_all_memories()
     
+    print(f"\n📊 嵌入缓存统计: {demo.embeddings.stats()}")
+    print(f"📊 记忆上下文缓存统计: {demo.memory_cache.stats()}")
+    
     print("\n✅ 演示完成！")
 
 
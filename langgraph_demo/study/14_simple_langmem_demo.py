@@ -7,20 +7,20 @@
 
 import os
 import sys
-from typing import Optional, Dict, Any
+from typing import Optional, Dict, Any, Iterator, Tuple
 
 # 添加当前目录到路径
 sys.path.append(os.path.dirname(os.path.abspath(__file__)))
 
 from langchain.embeddings import init_embeddings
 from langchain.chat_models import init_chat_model
-from langgraph.store.memory import InMemoryStore
+from vector_store import VectorIndexStore
+from embedding_service import CachedEmbeddings
 from langgraph.prebuilt import create_react_agent
 from langgraph.checkpoint.memory import InMemorySaver
 from langmem import create_manage_memory_tool, create_search_memory_tool
 
-import config
-from config import ModelConfig, custom_config
+from config import ModelConfig, custom_config, data_path
 from config import logger
 
 class LangMemDemo:
@@ -60,6 +60,13 @@ class LangMemDemo:
                 # 使用默认配置
                 self.embeddings = init_embeddings(f"{model_config.embedding_provider}:{model_config.embedding_model}")
             
+            # 包装为带缓存与请求合并的嵌入服务，重复的查询/记忆文本不再请求嵌入接口
+            self.embeddings = CachedEmbeddings(
+                self.embeddings,
+                model=f"{model_config.embedding_provider}:{model_config.embedding_model}",
+                cache_dir=data_path("embedding_cache"),
+            )
+            
             logger.info(f"嵌入模型初始化成功: {model_config.embedding_provider}:{model_config.embedding_model}")
             
             # 初始化聊天模型
@@ -88,7 +95,7 @@ class LangMemDemo:
             logger.info(f"嵌入维度: {embedding_dims}")
             
             # 设置内存存储
-            self.store = InMemoryStore(
+            self.store = VectorIndexStore(
                 index={
                     "dims": embedding_dims,
                     "embed": self.embeddings,
@@ -118,7 +125,7 @@ class LangMemDemo:
             print(f"   聊天模型: {model_config.model_provider}:{model_config.model_name}")
             print(f"   嵌入模型: {model_config.embedding_provider}:{model_config.embedding_model}")
             print(f"   嵌入维度: {embedding_dims}")
-            print(f"   存储: InMemoryStore")
+            print(f"   存储: VectorIndexStore")
             print(f"   命名空间: ('memories',)")
             
         except Exception as e:
@@ -150,10 +157,10 @@ class LangMemDemo:
         try:
             logger.info(f"添加记忆: {content}, 线程: {org_id}, {user_id}")
             # 使用智能体添加记忆，使用线程特定的配置
-            config = {"configurable": {"org_id": org_id, "user_id": user_id}}
+            run_config = {"configurable": {"org_id": org_id, "user_id": user_id}}
             response = self.agent.invoke({
                 "messages": [{"role": "user", "content": f"记住这个信息: {content}"}]
-            }, config=config)
+            }, config=run_config)
             result = response["messages"][-1].content
             logger.info(f"记忆添加成功: {result}")
             return result
@@ -162,14 +169,27 @@ class LangMemDemo:
             logger.error(error_msg)
             return error_msg
     
-    def search_memories(self, query: str, limit: int = 5, org_id: str = "acme", user_id: str = "alice") -> list:
+    def _iter_memories(self, namespace: Tuple[str, ...], filter: Optional[Dict[str, Any]] = None,
+                       page_size: int = 100) -> Iterator[Any]:
+        """按游标分页遍历某个命名空间前缀下的记忆，不做向量检索"""
+        cursor = None
+        while True:
+            items, cursor = self.store.list_items(namespace, filter=filter, limit=page_size, cursor=cursor)
+            yield from items
+            if cursor is None:
+                break
+    
+    def search_memories(self, query: str, limit: int = 5, org_id: str = "acme", user_id: str = "alice",
+                        filter: Optional[Dict[str, Any]] = None) -> list:
         """
         搜索记忆
         
         Args:
             query: 搜索查询
             limit: 结果数量限制
-            thread_id: 线程ID，用于搜索特定线程的记忆
+            org_id: 组织ID
+            user_id: 用户ID
+            filter: 记忆值上的元数据过滤条件，如 {"kind": "Memory"}
             
         Returns:
             搜索结果列表
@@ -177,25 +197,21 @@ class LangMemDemo:
         try:
             logger.info(f"开始搜索记忆: {query}, 限制: {limit}, 线程: {org_id}, {user_id}")
             
-            # 首先搜索所有记忆
-            all_results = self.store.search(("memories",org_id,user_id), query=query, limit=limit*2)
-            logger.info(f"搜索到 {len(all_results)} 条原始结果")
+            # 命名空间前缀与过滤条件直接下推到存储层，只检索该用户的子树
+            results = self.store.search(("memories", org_id, user_id), query=query, filter=filter, limit=limit)
             
-            # 然后按线程ID过滤
             memories = []
-            for item in all_results:
-                # 检查命名空间是否匹配线程ID
-                if len(item.namespace) > 1 and item.namespace[1] == org_id and item.namespace[2] == user_id:
-                    memories.append({
-                        "id": item.key,
-                        "content": item.value.get("content", ""),
-                        "created_at": item.created_at,
-                        "updated_at": item.updated_at,
-                        "score": item.score,
-                        "org_id": org_id,
-                        "user_id": user_id
-                    })
-                    logger.info(f"找到匹配的记忆: {item.value.get('content', '')}")
+            for item in results:
+                memories.append({
+                    "id": item.key,
+                    "content": item.value.get("content", ""),
+                    "created_at": item.created_at,
+                    "updated_at": item.updated_at,
+                    "score": item.score,
+                    "org_id": org_id,
+                    "user_id": user_id
+                })
+                logger.info(f"找到匹配的记忆: {item.value.get('content', '')}")
             
             logger.info(f"在线程 {org_id}, {user_id} 中搜索到 {len(memories)} 条记忆")
             return memories
@@ -204,39 +220,33 @@ class LangMemDemo:
             logger.error(error_msg)
             return []
     
-    def list_all_memories(self, org_id: str = "acme", user_id: str ="") -> list:
+    def list_all_memories(self, org_id: str = "acme", user_id: str ="", filter: Optional[Dict[str, Any]] = None) -> list:
         """
         列出所有记忆
         
         Args:
-            thread_id: 线程ID，用于列出特定线程的记忆
+            org_id: 组织ID
+            user_id: 用户ID，为空时列出整个组织的记忆
+            filter: 记忆值上的元数据过滤条件
             
         Returns:
             所有记忆列表
         """
         try:
             logger.info(f"列出线程 {org_id}, {user_id} 的所有记忆")
-            if user_id:
-                # 搜索所有记忆
-                all_results = self.store.search(("memories",org_id,user_id), query="", limit=1000)
-            else:
-                # 搜索所有记忆
-                all_results = self.store.search(("memories",org_id), query="", limit=1000)
-            logger.info(f"总共有 {len(all_results)} 条记忆")
+            namespace = ("memories", org_id, user_id) if user_id else ("memories", org_id)
             
-            # 按线程ID过滤
             memories = []
-            for item in all_results:
-                if len(item.namespace) > 1 and item.namespace[1] == org_id and item.namespace[2] == user_id:
-                    memories.append({
-                        "id": item.key,
-                        "content": item.value.get("content", ""),
-                        "created_at": item.created_at,
-                        "updated_at": item.updated_at,
-                        "org_id": org_id,
-                        "user_id": user_id
-                    })
-                    logger.info(f"线程 {org_id}, {user_id} 的记忆: {item.value.get('content', '')}")
+            for item in self._iter_memories(namespace, filter=filter):
+                memories.append({
+                    "id": item.key,
+                    "content": item.value.get("content", ""),
+                    "created_at": item.created_at,
+                    "updated_at": item.updated_at,
+                    "org_id": item.namespace[1],
+                    "user_id": item.namespace[2] if len(item.namespace) > 2 else ""
+                })
+                logger.info(f"线程 {item.namespace[1:]} 的记忆: {item.value.get('content', '')}")
             
             logger.info(f"线程 {org_id}, {user_id} 总共有 {len(memories)} 条记忆")
             return memories
@@ -290,15 +300,9 @@ class LangMemDemo:
         """
         try:
             logger.info("获取所有线程ID")
-            # 搜索所有记忆，然后提取唯一的线程ID
-            all_results = self.store.search(("memories",), query="", limit=1000)
-            
-            thread_ids = set()
-            for item in all_results:
-                if len(item.namespace) > 1:
-                    thread_ids.add(item.namespace[1])
-            
-            thread_ids_list = sorted(list(thread_ids))
+            # 直接在命名空间树上取第二层，不再枚举记忆本身
+            namespaces = self.store.list_namespaces(prefix=("memories",), max_depth=2, limit=10000)
+            thread_ids_list = [ns[1] for ns in namespaces if len(ns) > 1]
             logger.info(f"找到 {len(thread_ids_list)} 个线程: {thread_ids_list}")
             return thread_ids_list
         except Exception as e:
@@ -306,6 +310,19 @@ class LangMemDemo:
             logger.error(error_msg)
             return []
     
+    def list_user_ids(self, org_id: str = "acme") -> list:
+        """
+        获取组织下所有有记忆的用户ID
+        
+        Args:
+            org_id: 组织ID
+            
+        Returns:
+            用户ID列表
+        """
+        namespaces = self.store.list_namespaces(prefix=("memories", org_id), max_depth=3, limit=10000)
+        return [ns[2] for ns in namespaces if len(ns) > 2]
+    
     def chat_with_memory(self, message: str, org_id: str = "acme", user_id: str = "alice") -> str:
         """
         与智能体对话（带记忆）
@@ -328,12 +345,12 @@ class LangMemDemo:
             print(f"   用户原始消息: {message}")
             
             # 创建线程特定的配置
-            config = {"configurable": {"org_id": org_id, "user_id": user_id}}
+            run_config = {"configurable": {"org_id": org_id, "user_id": user_id}}
             
             # 获取当前对话的完整消息历史
             response = self.agent.invoke({
                 "messages": [{"role": "user", "content": message}]
-            }, config=config)
+            }, config=run_config)
             
             # 打印实际发送给模型的完整消息
             print(f"\n📤 实际发送给模型的完整消息:")
@@ -364,17 +381,15 @@ class LangMemDemo:
         """
         try:
             logger.info("调试：查看所有存储的记忆")
-            all_results = self.store.search(("memories",), query="", limit=1000)
             
             debug_info = []
-            for item in all_results:
+            for item in self._iter_memories(("memories",)):
                 debug_info.append({
                     "id": item.key,
                     "namespace": item.namespace,
                     "content": item.value.get("content", ""),
                     "created_at": item.created_at,
-                    "updated_at": item.updated_at,
-                    "score": item.score
+                    "updated_at": item.updated_at
                 })
                 logger.info(f"记忆: {item.value.get('content', '')} | 命名空间: {item.namespace}")
             
@@ -418,13 +433,13 @@ class LangMemDemo:
             print(f"   用户消息: {message}")
             
             # 创建线程特定的配置
-            config = {"configurable": {"org_id": org_id, "user_id": user_id}}
+            run_config = {"configurable": {"org_id": org_id, "user_id": user_id}}
             
             # 使用stream模式来查看详细的调用过程
             print(f"\n📤 开始调用智能体...")
             for chunk in self.agent.stream({
                 "messages": [{"role": "user", "content": message}]
-            }, config=config):
+            }, config=run_config):
                 print(f"   步骤: {type(chunk).__name__}")
                 
                 if hasattr(chunk, 'messages') and chunk.messages:
@@ -514,6 +529,7 @@ def demo_basic_memory(model_config: Optional[ModelConfig] = None):
     print(f"   用户A总共有 {len(all_memories_all)} 条记忆:")
     for i, memory in enumerate(all_memories_all, 1):
         print(f"   {i}. {memory['content']} (org_id: {memory['org_id']})")
+    print(f"   org_id=acme 下的用户: {demo.list_user_ids(org_id='acme')}")
 
 
     # 列出所有记忆
@@ -554,6 +570,8 @@ def demo_basic_memory(model_config: Optional[ModelConfig] = None):
     # 调试智能体调用过程
     print("\n🔍 调试智能体调用过程...")
     demo.debug_agent_invoke("你是谁？", org_id="acme", user_id="alice")
+    
+    print(f"\n📊 嵌入缓存统计: {demo.embeddings.stats()}")
 
 
 
@@ -1,16 +1,22 @@
-from typing import Any, TypedDict, List
+from typing import Any, Dict, Optional, TypedDict, List
+from concurrent.futures import Future, ThreadPoolExecutor
+import sys
+import threading
+import time
 import uuid
 
 from langchain_core.messages import BaseMessage
 from langchain_openai import ChatOpenAI
-from langchain_openai.chat_models.base import BaseChatOpenAI
 
 from langchain_core.messages import AnyMessage
+from langchain_core.runnables import RunnableConfig
 from langchain_core.tools import tool
 from langgraph.graph import StateGraph, START, END, MessagesState
 from langgraph.prebuilt import ToolNode
 from langgraph.checkpoint.memory import InMemorySaver
-from langmem.short_term import SummarizationNode, RunningSummary
+from langgraph.store.base import BaseStore
+from langgraph.store.memory import InMemoryStore
+from langmem.short_term import summarize_messages, RunningSummary
 
 
 def add_message_ids(messages: List[BaseMessage]) -> List[BaseMessage]:
@@ -25,47 +31,9 @@ class ChildChatOpenAI(ChatOpenAI):
     def get_num_tokens_from_messages(self, messages: List[BaseMessage]) -> int:
         """
         自定义token计算方法，支持多种模型
-        优先使用OpenAI的tiktoken，失败时使用字符估算
+        使用本地分词器服务（按模型家族加载一次，单条消息计数带缓存）
         """
-        try:
-            # 尝试使用OpenAI的tiktoken
-            model, encoding = self._get_encoding_model()
-            if model.startswith("cl100k_base"):
-                # 调用祖父类的函数
-                return super(BaseChatOpenAI, self).get_num_tokens_from_messages(messages)
-            else:
-                return super().get_num_tokens_from_messages(messages)
-        except Exception as e:
-            # 如果tiktoken失败，使用字符估算
-            try:
-                contents = []
-                for m in messages:
-                    if hasattr(m, "content"):
-                        content = getattr(m, "content")
-                        if isinstance(content, str):
-                            contents.append(content)
-                        elif isinstance(content, list):
-                            # 处理多模态内容
-                            for item in content:
-                                if hasattr(item, "text"):
-                                    contents.append(getattr(item, "text"))
-                                elif isinstance(item, dict) and "text" in item:
-                                    contents.append(item["text"])
-                        else:
-                            contents.append(str(content))
-                    elif isinstance(m, dict) and "content" in m:
-                        contents.append(str(m["content"]))
-                    else:
-                        contents.append(str(m))
-                
-                text = " ".join(contents)
-                # 粗略估算：约每4字符≈1token（适用于中文和英文混合）
-                estimated_tokens = max(1, len(text) // 4)
-                print(f"⚠️  使用字符估算token数量: {estimated_tokens} (文本长度: {len(text)})")
-                return estimated_tokens
-            except Exception as fallback_error:
-                print(f"❌ Token计算完全失败，使用默认值1: {fallback_error}")
-                return 1
+        return get_token_service(self.model_name).count_messages(messages)
 
 
 def print_messages_summary(messages: List[BaseMessage], title: str = "消息内容"):
@@ -118,6 +86,7 @@ def print_messages_summary(messages: List[BaseMessage], title: str = "消息内
 
 import config
 import os
+from token_counter import TokenCounterService
 # 自定义模型配置
 os.environ["OPENAI_API_BASE"] = config.base_url
 os.environ["OPENAI_API_KEY"] = config.api_key
@@ -138,6 +107,15 @@ def search(query: str):
 
 tools = [search]
 
+_token_services = {}
+
+def get_token_service(model_name: str) -> TokenCounterService:
+    """按模型名复用 token 计数服务"""
+    service = _token_services.get(model_name)
+    if service is None:
+        service = _token_services[model_name] = TokenCounterService(model_name)
+    return service
+
 # 初始化模型 - 支持自定义模型
 def create_llm(model_name=None, temperature=0.1):
     """
@@ -156,43 +134,139 @@ def create_llm(model_name=None, temperature=0.1):
 model = create_llm()
 summarization_model = model.bind(max_tokens=128)
 
-# 创建安全的token计数器
+# token 计数服务：SummarizationNode 每一步都会统计整段历史，已计数的消息直接命中缓存
+token_service = get_token_service(MODEL_NAME)
+
 def safe_token_counter(messages: List[BaseMessage]) -> int:
     """
-    安全的token计数器，使用自定义的ChildChatOpenAI
+    安全的token计数器，使用本地分词器服务
     """
-    try:
-        return model.get_num_tokens_from_messages(messages)
-    except Exception as e:
-        print(f"⚠️  Token计数器异常，使用字符估算: {e}")
-        # 字符估算回退
-        try:
-            contents = []
-            for m in messages:
-                if hasattr(m, "content"):
-                    content = getattr(m, "content")
-                    if isinstance(content, str):
-                        contents.append(content)
-                    else:
-                        contents.append(str(content))
-                elif isinstance(m, dict) and "content" in m:
-                    contents.append(str(m["content"]))
-                else:
-                    contents.append(str(m))
-            
-            text = " ".join(contents)
-            return max(1, len(text) // 4)
-        except Exception:
-            return 1
-
-summarization_node = SummarizationNode(
-    token_counter=safe_token_counter,
-    model=summarization_model,
+    return token_service.count_messages(messages)
+
+SUMMARY_SETTINGS = dict(
     max_tokens=256,
     max_tokens_before_summary=1024,
     max_summary_tokens=128,
 )
 
+
+class BackgroundSummarizer:
+    """
+    后台增量摘要
+
+    - 回复返回给用户之后才提交摘要任务，摘要 LLM 调用不在用户等待的路径上
+    - 运行摘要（RunningSummary）保存在 store 中，下一轮构建输入时直接套用，不触发 LLM
+    - summarize_messages 只处理 last_summarized_message_id 之后的新消息，摘要是增量更新的
+    - 同一会话同时最多一个摘要任务；未摘要部分过长（后台跟不上）时，下一轮会等待进行中的任务，
+      该任务失败时沿用上一次成功的运行摘要继续回复
+    """
+
+    namespace = ("summaries",)
+
+    def __init__(self, store: BaseStore, model, token_counter, max_workers: int = 2,
+                 lag_factor: int = 2, **settings):
+        self.store = store
+        self.model = model
+        self.token_counter = token_counter
+        self.settings = settings
+        self.lag_tokens = settings["max_tokens_before_summary"] * lag_factor
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="summarizer")
+        self._inflight: Dict[str, Future] = {}
+        self._lock = threading.Lock()
+
+    def get_summary(self, thread_id: str) -> Optional[RunningSummary]:
+        item = self.store.get(self.namespace, thread_id)
+        if item is None:
+            return None
+        value = item.value
+        return RunningSummary(
+            summary=value["summary"],
+            summarized_message_ids=set(value["summarized_message_ids"]),
+            last_summarized_message_id=value["last_summarized_message_id"],
+        )
+
+    def _save_summary(self, thread_id: str, running_summary: RunningSummary) -> None:
+        self.store.put(self.namespace, thread_id, {
+            "summary": running_summary.summary,
+            "summarized_message_ids": sorted(running_summary.summarized_message_ids),
+            "last_summarized_message_id": running_summary.last_summarized_message_id,
+        })
+
+    def apply(self, thread_id: str, messages: List[BaseMessage]) -> List[BaseMessage]:
+        """用已有的运行摘要替换已摘要的消息，返回模型输入（不调用摘要模型）"""
+        running_summary = self.get_summary(thread_id)
+        if self._unsummarized_tokens(messages, running_summary) > self.lag_tokens:
+            future = self._inflight.get(thread_id)
+            if future is not None:
+                print("⏳ 未摘要的消息过多，等待后台摘要完成")
+                try:
+                    future.result()
+                    running_summary = self.get_summary(thread_id)
+                except Exception as e:
+                    # 摘要失败不影响本轮回复：沿用上一次成功的运行摘要，失败已由 _finish 记录
+                    logger.warning(f"等待的后台摘要失败，沿用上一次的运行摘要: {e}")
+        result = summarize_messages(
+            messages,
+            running_summary=running_summary,
+            model=self.model,
+            token_counter=self.token_counter,
+            **{**self.settings, "max_tokens_before_summary": sys.maxsize},
+        )
+        return result.messages
+
+    def schedule(self, thread_id: str, messages: List[BaseMessage]) -> bool:
+        """回复完成后调用：未摘要部分超过阈值时提交后台摘要任务"""
+        if self._unsummarized_tokens(messages, self.get_summary(thread_id)) < self.settings["max_tokens_before_summary"]:
+            return False
+        with self._lock:
+            if thread_id in self._inflight:
+                return False
+            future = self._inflight[thread_id] = self._executor.submit(self._summarize, thread_id, list(messages))
+        future.add_done_callback(lambda f: self._finish(thread_id, f))
+        print("📝 已提交后台摘要任务")
+        return True
+
+    def _finish(self, thread_id: str, future: Future) -> None:
+        with self._lock:
+            self._inflight.pop(thread_id, None)
+        if future.exception() is not None:
+            logger.error(f"后台摘要失败: {future.exception()}")
+
+    def _summarize(self, thread_id: str, messages: List[BaseMessage]) -> None:
+        running_summary = self.get_summary(thread_id)
+        result = summarize_messages(
+            messages,
+            running_summary=running_summary,
+            model=self.model,
+            token_counter=self.token_counter,
+            **self.settings,
+        )
+        if result.running_summary is not None and result.running_summary is not running_summary:
+            self._save_summary(thread_id, result.running_summary)
+
+    def _unsummarized_tokens(self, messages: List[BaseMessage], running_summary: Optional[RunningSummary]) -> int:
+        start = 0
+        if running_summary is not None:
+            for i in range(len(messages) - 1, -1, -1):
+                if messages[i].id == running_summary.last_summarized_message_id:
+                    start = i + 1
+                    break
+        return sum(self.token_counter.count_batch(messages[start:]))
+
+    def wait(self) -> None:
+        """等待所有进行中的摘要任务完成"""
+        with self._lock:
+            futures = list(self._inflight.values())
+        for future in futures:
+            try:
+                future.result()
+            except Exception:
+                pass
+
+
+store = InMemoryStore()
+summarizer = BackgroundSummarizer(store, summarization_model, token_service, **SUMMARY_SETTINGS)
+
 class State(MessagesState):
     context: dict[str, Any]
 
@@ -200,6 +274,14 @@ class LLMInputState(TypedDict):
     summarized_messages: list[AnyMessage]
     context: dict[str, Any]
 
+def _thread_id(config: RunnableConfig) -> str:
+    return config["configurable"]["thread_id"]
+
+def prepare_context(state: State, config: RunnableConfig):
+    """套用最近一次完成的运行摘要，构造模型输入"""
+    messages = add_message_ids(state["messages"])
+    return {"summarized_messages": summarizer.apply(_thread_id(config), messages)}
+
 def call_model(state: LLMInputState):
     # 为消息添加ID
     summarized_messages = add_message_ids(state["summarized_messages"])
@@ -210,25 +292,32 @@ def call_model(state: LLMInputState):
     response = model.bind_tools(tools).invoke(summarized_messages)
     return {"messages": [response]}
 
+def schedule_summary(state: State, config: RunnableConfig):
+    """回复已生成，在后台更新运行摘要，供下一轮使用"""
+    summarizer.schedule(_thread_id(config), state["messages"])
+    return {}
+
 # Define a router that determines whether to execute tools or exit
 def should_continue(state: MessagesState):
     messages = state["messages"]
     last_message = messages[-1]
     if not last_message.tool_calls:
-        return END
+        return "schedule_summary"
     else:
         return "tools"
 
 checkpointer = InMemorySaver()
 builder = StateGraph(State)
-builder.add_node("summarize_node", summarization_node)
+builder.add_node("prepare_context", prepare_context)
 builder.add_node("call_model", call_model)
 builder.add_node("tools", ToolNode(tools))
-builder.set_entry_point("summarize_node")
-builder.add_edge("summarize_node", "call_model")
-builder.add_conditional_edges("call_model", should_continue, path_map=["tools", END])
-builder.add_edge("tools", "summarize_node")  
-graph = builder.compile(checkpointer=checkpointer)
+builder.add_node("schedule_summary", schedule_summary)
+builder.set_entry_point("prepare_context")
+builder.add_edge("prepare_context", "call_model")
+builder.add_conditional_edges("call_model", should_continue, path_map=["tools", "schedule_summary"])
+builder.add_edge("tools", "prepare_context")
+builder.add_edge("schedule_summary", END)
+graph = builder.compile(checkpointer=checkpointer, store=store)
 
 # 测试token计算功能
 def test_token_counter():
@@ -257,6 +346,10 @@ def test_token_counter():
         model_token_count = model.get_num_tokens_from_messages(test_messages)
         print(f"✅ 模型Token计算成功: {model_token_count}")
         
+        # 批量计数：每条消息各自的 token 数
+        print(f"✅ 逐条Token数: {token_service.count_batch(test_messages)}")
+        print(f"📈 计数缓存: {token_service.stats()}")
+        
         return True
     except Exception as e:
         print(f"❌ Token计算测试失败: {e}")
@@ -306,26 +399,29 @@ def main():
                 print_messages_summary(current_messages, f"当前对话历史 (第{i}轮前)")
             
             # 调用图
+            started = time.perf_counter()
             response = graph.invoke({"messages": message}, config=config)
+            elapsed = time.perf_counter() - started
             
             # 打印响应
             result = response["messages"][-1].content
             print(f"\n🤖 助手回复: {result}")
+            print(f"⏱️ 本轮耗时: {elapsed:.2f}s")
             
             # 每3轮检查一次摘要状态
             if i % 3 == 0:
                 print(f"\n📝 第{i}轮后的摘要状态:")
-                state = checkpointer.get(config)
-                if state and "summary" in state:
-                    summary = state["summary"]
-                    if summary and hasattr(summary, 'summary'):
-                        print(f"运行摘要: {summary.summary}")
-                        print(f"摘要字符数: {len(summary.summary)}")
+                summary = summarizer.get_summary(config["configurable"]["thread_id"])
+                if summary:
+                    print(f"运行摘要: {summary.summary}")
+                    print(f"摘要字符数: {len(summary.summary)}")
                 else:
-                    print("暂无摘要")
+                    print("暂无摘要（后台任务可能仍在进行）")
             
             print("\n" + "="*50)
         
+        summarizer.wait()
+        print(f"\n📈 Token计数缓存: {token_service.stats()}")
         print("\n✅ 演示完成！")
     else:
         print("\n❌ Token计算功能异常，无法继续演示")
@@ -0,0 +1,201 @@
+# -*- coding: utf-8 -*-
+"""
+并行分支执行器
+供 05_扇入扇出聚合并发.py 使用：给扇出的每个分支加截止时间，扇入时"到多少合并多少"
+
+设计要点：
+1. 分支函数在显式指定大小的线程池中运行，节点本身只负责等待，不依赖 LangGraph 默认线程池的大小；
+   线程池为 ContextThreadPoolExecutor，分支内的 LLM 调用继承节点的运行配置（回调、流式输出、追踪）
+2. 每个分支有自己的截止时间：超时的分支立即返回一个"超时"更新，扇入节点不会被慢分支无限阻塞
+3. quorum（first-k）：同一次执行中，汇入扇入节点的终端分支成功数达到 quorum 后，
+   仍在等待的分支立即返回"跳过"更新，扇入节点用已到达的结果合并。
+   quorum 只能放行同一超步内的分支：排在其他节点之后的终端分支要等上一超步的所有分支返回才会开始，
+   慢分支不会因它而被放行。因此所有终端分支应直接由起点节点扇出；
+   分支内部的串行步骤用 sequential() 合成一个分支，而不是拆成图中前后相连的节点
+4. 每个分支的状态（ok / timeout / skipped / error）和耗时写入状态字段 branch_timings
+   （建议声明为 Annotated[Dict[str, dict], operator.or_]）
+
+注意：线程无法被强制中断，超时或被跳过的分支会在线程池中跑完，其结果被丢弃。
+"""
+
+import threading
+import time
+import uuid
+from concurrent.futures import wait
+from typing import Any, Callable, Dict, Iterable, List, Optional
+
+from langchain_core.runnables.config import ContextThreadPoolExecutor
+
+import config
+
+logger = config.logger
+
+BranchFn = Callable[[Dict[str, Any]], Dict[str, Any]]
+
+
+def sequential(*fns: BranchFn) -> BranchFn:
+    """
+    把多个分支函数串成一个分支：依次执行，合并各自的更新
+
+    每个函数都读取分支入口的状态；更新按顺序合并（列表拼接、字典合并、其他值后者覆盖）
+    """
+    def fn(state: Dict[str, Any]) -> Dict[str, Any]:
+        merged: Dict[str, Any] = {}
+        for step in fns:
+            for key, value in (step(state) or {}).items():
+                previous = merged.get(key)
+                if isinstance(previous, list) and isinstance(value, list):
+                    merged[key] = previous + value
+                elif isinstance(previous, dict) and isinstance(value, dict):
+                    merged[key] = {**previous, **value}
+                else:
+                    merged[key] = value
+        return merged
+
+    fn.__name__ = "_".join(getattr(step, "__name__", "step") for step in fns)
+    return fn
+
+
+class BranchGroup:
+    """一次扇出/扇入执行的分支组：记录终端分支的到达情况，到达 quorum 时唤醒所有等待者"""
+
+    def __init__(self, group_id: str, terminals: Iterable[str], quorum: Optional[int] = None):
+        self.group_id = group_id
+        self.terminals = list(terminals)
+        self.quorum = quorum if quorum is not None else len(self.terminals)
+        self.arrived: List[str] = []
+        self.created = time.perf_counter()
+        self._cond = threading.Condition()
+
+    @property
+    def quorum_reached(self) -> bool:
+        return len(self.arrived) >= self.quorum
+
+    def arrive(self, branch: str) -> None:
+        with self._cond:
+            if branch in self.terminals and branch not in self.arrived:
+                self.arrived.append(branch)
+                if self.quorum_reached:
+                    self._cond.notify_all()
+
+    def notify(self) -> None:
+        with self._cond:
+            self._cond.notify_all()
+
+    def wait_for(self, predicate: Callable[[], bool], timeout: Optional[float]) -> bool:
+        with self._cond:
+            return self._cond.wait_for(predicate, timeout=timeout)
+
+
+class ParallelBranchExecutor:
+    """
+    带截止时间与 quorum 的并行分支执行器
+
+    用法：
+        branches = ParallelBranchExecutor(max_workers=4, default_timeout=1.0)
+        workflow.add_node("start_node", branches.opener(["p1", "p2", "p3"], quorum=2))
+        workflow.add_node("p1", branches.branch("p1", worker_1))
+        workflow.add_node("p2", branches.branch("p2", sequential(worker_2, worker_2_1)))
+        ...
+        # 扇入节点中：summary = branches.close(state)
+    """
+
+    def __init__(self, max_workers: int = 8, default_timeout: Optional[float] = None,
+                 group_key: str = "branch_group", timings_key: str = "branch_timings"):
+        self.max_workers = max_workers
+        self.default_timeout = default_timeout
+        self.group_key = group_key
+        self.timings_key = timings_key
+        self._pool = ContextThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="branch")
+        self._groups: Dict[str, BranchGroup] = {}
+        self._lock = threading.Lock()
+
+    # ---------- 分支组生命周期 ----------
+
+    def open(self, terminals: Iterable[str], quorum: Optional[int] = None) -> Dict[str, Any]:
+        """创建分支组，返回需要写入状态的更新（分支组 id）"""
+        group = BranchGroup(uuid.uuid4().hex, terminals, quorum)
+        with self._lock:
+            self._groups[group.group_id] = group
+        return {self.group_key: group.group_id}
+
+    def opener(self, terminals: Iterable[str], quorum: Optional[int] = None,
+               fn: Optional[BranchFn] = None) -> BranchFn:
+        """把扇出起点节点包装为：先执行 fn，再打开分支组"""
+        terminals = list(terminals)
+
+        def node(state: Dict[str, Any]) -> Dict[str, Any]:
+            update = dict(fn(state)) if fn is not None else {}
+            update.update(self.open(terminals, quorum))
+            return update
+
+        return node
+
+    def close(self, state: Dict[str, Any]) -> Dict[str, Any]:
+        """扇入节点调用：关闭分支组，返回到达情况摘要"""
+        with self._lock:
+            group = self._groups.pop(state.get(self.group_key), None)
+        if group is None:
+            return {"arrived": [], "missing": [], "quorum": 0, "quorum_reached": True}
+        arrived = list(group.arrived)
+        return {
+            "arrived": arrived,
+            "missing": [b for b in group.terminals if b not in arrived],
+            "quorum": group.quorum,
+            "quorum_reached": group.quorum_reached,
+            "elapsed": round(time.perf_counter() - group.created, 3),
+        }
+
+    # ---------- 分支包装 ----------
+
+    def branch(self, name: str, fn: BranchFn, timeout: Optional[float] = None) -> BranchFn:
+        """
+        把分支函数包装为 LangGraph 节点
+
+        返回的更新总是包含 branch_timings[name]；超时、跳过或出错时只返回这一项，
+        不会向结果字段写入任何内容
+        """
+        timeout = timeout if timeout is not None else self.default_timeout
+
+        def node(state: Dict[str, Any]) -> Dict[str, Any]:
+            start = time.perf_counter()
+            group = self._groups.get(state.get(self.group_key))
+
+            def timing(status: str, **extra) -> Dict[str, Any]:
+                entry = {"status": status, "elapsed": round(time.perf_counter() - start, 3), **extra}
+                return {self.timings_key: {name: entry}}
+
+            if group is not None and group.quorum_reached:
+                logger.info(f"⏭️ 分支 {name} 跳过：已达到 quorum {group.quorum}")
+                return timing("skipped")
+
+            future = self._pool.submit(fn, state)
+            if group is not None:
+                future.add_done_callback(lambda _: group.notify())
+                group.wait_for(lambda: future.done() or group.quorum_reached, timeout)
+            else:
+                wait([future], timeout=timeout)
+
+            if not future.done():
+                if group is not None and group.quorum_reached:
+                    logger.info(f"⏭️ 分支 {name} 放弃等待：已达到 quorum {group.quorum}")
+                    return timing("skipped")
+                logger.warning(f"⏰ 分支 {name} 超时（>{timeout}s），扇入节点将不等待它")
+                return timing("timeout", timeout=timeout)
+
+            error = future.exception()
+            if error is not None:
+                logger.error(f"❌ 分支 {name} 执行失败: {error}")
+                return timing("error", error=f"{type(error).__name__}: {error}")
+
+            update = dict(future.result() or {})
+            if group is not None:
+                group.arrive(name)
+            update.update(timing("ok"))
+            return update
+
+        node.__name__ = name
+        return node
+
+    def shutdown(self) -> None:
+        self._pool.shutdown(wait=False)
@@ -59,6 +59,16 @@ def setup_logging():
 # 初始化日志
 logger = setup_logging()
 
+# 演示运行时产生的数据文件（路由决策日志、会话库等）的存放目录，不写进源码目录
+# 可通过环境变量 LANGGRAPH_DEMO_DATA_DIR 指定
+data_dir = os.environ.get("LANGGRAPH_DEMO_DATA_DIR", os.path.join(os.path.expanduser("~"), ".langgraph_demo"))
+
+
+def data_path(filename: str) -> str:
+    """返回数据目录下的文件路径，目录不存在时创建"""
+    os.makedirs(data_dir, exist_ok=True)
+    return os.path.join(data_dir, filename)
+
 
 
 
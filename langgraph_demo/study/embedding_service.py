@@ -0,0 +1,276 @@
+# -*- coding: utf-8 -*-
+"""
+嵌入服务层
+供 13_/14_ 记忆演示共用：包装任意 LangChain Embeddings，减少嵌入接口的往返次数
+
+设计要点：
+1. 两级缓存：进程内 LRU + 可选磁盘缓存（diskcache），键为 模型名 + 文本哈希
+2. 并发请求合并：未命中的文本进入队列，有其它并发请求时后台线程在 max_wait_ms 内凑批，一次 HTTP 调用完成；
+   队列中只有一次调用的文本时立即发送，不额外等待
+3. 相同文本的并发请求共享同一个 Future，不会重复嵌入
+4. 可选 float16 存储，缓存占用减半；对外始终返回 float 列表
+5. stats() 提供命中/未命中/批次等指标
+"""
+
+import asyncio
+import hashlib
+import queue
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import Future
+from typing import Callable, Dict, List, Optional, Tuple
+
+import numpy as np
+from langchain_core.embeddings import Embeddings
+
+from config import logger
+
+try:
+    import diskcache
+except ImportError:  # diskcache 为可选依赖，缺失时只使用内存缓存
+    diskcache = None
+
+
+class _MicroBatcher:
+    """将短时间内到达的单条文本合并为批量请求的后台线程"""
+
+    def __init__(self, embed_fn: Callable[[List[str]], List[List[float]]], max_batch_size: int,
+                 max_wait_ms: float, on_batch: Callable[[int], None]):
+        self._embed_fn = embed_fn
+        self._max_batch_size = max_batch_size
+        self._max_wait = max_wait_ms / 1000.0
+        self._on_batch = on_batch
+        self._queue: "queue.Queue[tuple]" = queue.Queue()
+        self._thread: Optional[threading.Thread] = None
+        self._start_lock = threading.Lock()
+
+    def submit(self, items: List[Tuple[str, Future]]) -> None:
+        """提交一次调用中全部未命中的 (文本, Future)，它们总是进入同一批"""
+        if not items:
+            return
+        self._queue.put(items)
+        if self._thread is None:
+            with self._start_lock:
+                if self._thread is None:
+                    self._thread = threading.Thread(target=self._run, name="embedding-batcher", daemon=True)
+                    self._thread.start()
+
+    def _run(self) -> None:
+        while True:
+            batch = list(self._queue.get())
+            # 队列中没有其它并发请求时直接发送，单次未命中不必等待凑批
+            if not self._queue.empty():
+                deadline = time.monotonic() + self._max_wait
+                while len(batch) < self._max_batch_size:
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        break
+                    try:
+                        batch.extend(self._queue.get(timeout=remaining))
+                    except queue.Empty:
+                        break
+            for start in range(0, len(batch), self._max_batch_size):
+                self._embed(batch[start:start + self._max_batch_size])
+
+    def _embed(self, batch: List[Tuple[str, Future]]) -> None:
+        texts = [text for text, _ in batch]
+        try:
+            vectors = self._embed_fn(texts)
+            if len(vectors) != len(texts):
+                raise ValueError(f"嵌入结果数量 {len(vectors)} 与文本数量 {len(texts)} 不一致")
+        except Exception as e:
+            # 每个等待者都必须收到结果或异常，否则调用方会在 result() 上永久阻塞
+            for _, future in batch:
+                future.set_exception(e)
+            return
+        self._on_batch(len(texts))
+        for (_, future), vector in zip(batch, vectors):
+            future.set_result(vector)
+
+
+class CachedEmbeddings(Embeddings):
+    """
+    带缓存与请求合并的嵌入服务，可直接作为 store 的 index["embed"] 使用
+
+    用法：
+        embeddings = CachedEmbeddings(init_embeddings("openai:text-embedding-3-small"),
+                                      model="openai:text-embedding-3-small", cache_dir=config.data_path("embedding_cache"))
+    """
+
+    def __init__(self, embeddings: Embeddings, *, model: Optional[str] = None, cache_size: int = 10000,
+                 cache_dir: Optional[str] = None, use_float16: bool = False, max_batch_size: int = 64,
+                 max_wait_ms: float = 10, batch_queries: bool = True):
+        """
+        Args:
+            embeddings: 实际发起请求的嵌入模型
+            model: 缓存键中的模型标识，默认取 embeddings.model
+            cache_size: 内存 LRU 的条目上限
+            cache_dir: 磁盘缓存目录，None 表示不落盘
+            use_float16: 以 float16 保存向量
+            max_batch_size: 单次请求的最大文本数
+            max_wait_ms: 凑批的最长等待时间
+            batch_queries: 查询也走 embed_documents 合并请求（OpenAI 兼容接口查询与文档嵌入相同）；
+                           查询需要单独指令前缀的模型应设为 False
+        """
+        self.embeddings = embeddings
+        self.model = model or getattr(embeddings, "model", None) or type(embeddings).__name__
+        self.cache_size = cache_size
+        self.dtype = np.float16 if use_float16 else np.float32
+        self.batch_queries = batch_queries
+
+        self._lock = threading.Lock()
+        self._memory: "OrderedDict[str, np.ndarray]" = OrderedDict()
+        self._inflight: Dict[str, Future] = {}
+        self._disk = None
+        if cache_dir:
+            if diskcache is not None:
+                self._disk = diskcache.Cache(cache_dir)
+            else:
+                logger.warning("未安装 diskcache，嵌入缓存仅保存在内存中")
+        self._batcher = _MicroBatcher(embeddings.embed_documents, max_batch_size, max_wait_ms, self._record_batch)
+        self._metrics = {
+            "memory_hits": 0,
+            "disk_hits": 0,
+            "misses": 0,
+            "inflight_joins": 0,
+            "batches": 0,
+            "embedded_texts": 0,
+        }
+
+    # ------------------------------------------------------------------
+    # 缓存
+    # ------------------------------------------------------------------
+
+    def _key(self, kind: str, text: str) -> str:
+        digest = hashlib.sha1(text.encode("utf-8")).hexdigest()
+        return f"{self.model}:{kind}:{digest}"
+
+    def _remember(self, key: str, vector: np.ndarray) -> None:
+        """写入内存 LRU（调用方持有锁）"""
+        self._memory[key] = vector
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.cache_size:
+            self._memory.popitem(last=False)
+
+    def _store(self, key: str, vector: List[float]) -> np.ndarray:
+        array = np.asarray(vector, dtype=self.dtype)
+        with self._lock:
+            self._remember(key, array)
+        if self._disk is not None:
+            self._disk.set(key, array)
+        return array
+
+    def _record_batch(self, size: int) -> None:
+        with self._lock:
+            self._metrics["batches"] += 1
+            self._metrics["embedded_texts"] += size
+
+    def _resolve(self, kind: str, texts: List[str]) -> List:
+        """
+        返回与 texts 对齐的列表：命中缓存的位置为 ndarray，未命中的位置为 Future
+
+        未命中的文本提交给批处理线程；同一文本的并发请求复用同一个 Future。
+        """
+        out: List = [None] * len(texts)
+        pending: List[int] = []
+        to_batch: List[Tuple[str, Future]] = []
+        with self._lock:
+            for i, text in enumerate(texts):
+                key = self._key(kind, text)
+                cached = self._memory.get(key)
+                if cached is not None:
+                    self._memory.move_to_end(key)
+                    self._metrics["memory_hits"] += 1
+                    out[i] = cached
+                else:
+                    pending.append(i)
+
+        for i in pending:
+            key = self._key(kind, texts[i])
+            if self._disk is not None:
+                cached = self._disk.get(key)
+                if cached is not None:
+                    with self._lock:
+                        self._remember(key, cached)
+                        self._metrics["disk_hits"] += 1
+                    out[i] = cached
+                    continue
+            with self._lock:
+                future = self._inflight.get(key)
+                owner = future is None
+                if owner:
+                    self._metrics["misses"] += 1
+                    future = self._inflight[key] = Future()
+                else:
+                    self._metrics["inflight_joins"] += 1
+            if owner and self._submit(kind, key, texts[i], future):
+                to_batch.append((texts[i], future))
+            out[i] = future
+        self._batcher.submit(to_batch)
+        return out
+
+    def _submit(self, kind: str, key: str, text: str, future: Future) -> bool:
+        """为未命中的文本发起嵌入，完成后写入缓存；返回 True 表示需要交给批处理线程"""
+        def _done(f: Future) -> None:
+            if f.exception() is None:
+                self._store(key, f.result())
+            with self._lock:
+                self._inflight.pop(key, None)
+
+        future.add_done_callback(_done)
+        if kind == "query":
+            # 查询需要单独的 embed_query 请求，在调用线程中完成
+            try:
+                future.set_result(self.embeddings.embed_query(text))
+            except Exception as e:
+                future.set_exception(e)
+            return False
+        return True
+
+    def _cache_kind(self, is_query: bool) -> str:
+        # 查询与文档共用同一接口时共享缓存
+        return "query" if is_query and not self.batch_queries else "doc"
+
+    # ------------------------------------------------------------------
+    # Embeddings 接口
+    # ------------------------------------------------------------------
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        return [self._to_list(v) for v in self._resolve("doc", texts)]
+
+    def embed_query(self, text: str) -> List[float]:
+        return self._to_list(self._resolve(self._cache_kind(True), [text])[0])
+
+    async def aembed_documents(self, texts: List[str]) -> List[List[float]]:
+        resolved = self._resolve("doc", texts)
+        return [await self._ato_list(v) for v in resolved]
+
+    async def aembed_query(self, text: str) -> List[float]:
+        return await self._ato_list(self._resolve(self._cache_kind(True), [text])[0])
+
+    @staticmethod
+    def _to_list(value) -> List[float]:
+        if isinstance(value, Future):
+            value = value.result()
+        return np.asarray(value, dtype=np.float32).tolist()
+
+    @staticmethod
+    async def _ato_list(value) -> List[float]:
+        if isinstance(value, Future):
+            value = await asyncio.wrap_future(value)
+        return np.asarray(value, dtype=np.float32).tolist()
+
+    # ------------------------------------------------------------------
+    # 指标
+    # ------------------------------------------------------------------
+
+    def stats(self) -> Dict[str, float]:
+        """缓存命中与批处理指标"""
+        with self._lock:
+            stats = dict(self._metrics)
+            stats["memory_entries"] = len(self._memory)
+        lookups = stats["memory_hits"] + stats["disk_hits"] + stats["misses"] + stats["inflight_joins"]
+        stats["hit_rate"] = round((lookups - stats["misses"]) / lookups, 4) if lookups else 0.0
+        stats["avg_batch_size"] = round(stats["embedded_texts"] / stats["batches"], 2) if stats["batches"] else 0.0
+        return stats
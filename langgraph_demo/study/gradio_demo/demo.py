@@ -12,6 +12,9 @@ import time
 import json
 import os
 import base64
+import hashlib
+import threading
+from collections import OrderedDict
 from typing import List, Tuple, Optional, Union, TypedDict, Annotated, Dict, Any
 from dataclasses import dataclass, field
 from datetime import datetime
@@ -27,7 +30,7 @@ try:
     from langchain_openai import ChatOpenAI
     from langchain_core.messages import HumanMessage, AIMessage
     from langchain_core.tools import tool
-    from langgraph.config import get_stream_writer
+    from langgraph.config import get_stream_writer, get_config
     from langchain_core.runnables.graph import MermaidDrawMethod
     import config
     LANGGRAPH_AVAILABLE = True
@@ -70,7 +73,7 @@ class ModelConfig:
 
 @dataclass 
 class ChatState:
-    """聊天状态管理"""
+    """聊天状态管理（每个浏览器会话一份，保存在 gr.State 中）"""
     messages: List[Tuple[str, str]] = field(default_factory=list)
     current_model: Optional[str] = None
     workflow_graph: Optional[object] = None
@@ -78,6 +81,57 @@ class ChatState:
     execution_logs: List[Dict[str, Any]] = field(default_factory=list)
     workflow_diagram: str = ""
 
+# ===== 模型客户端与编译图缓存 =====
+# 客户端按模型配置复用（底层 HTTP 连接池随之复用），图结构只编译一次，
+# 模型与提示词通过 config["configurable"] 按会话注入，不再写入进程环境变量
+_client_cache: Dict[tuple, Any] = {}
+_workflow_cache: "OrderedDict[tuple, Any]" = OrderedDict()
+_WORKFLOW_CACHE_SIZE = 64
+_compiled_workflow = None
+_cache_lock = threading.Lock()
+
+def _model_cache_key(model_config: ModelConfig) -> tuple:
+    """模型配置缓存键"""
+    return (
+        model_config.model_name,
+        model_config.base_url,
+        model_config.api_key,
+        model_config.temperature,
+        model_config.max_tokens,
+    )
+
+def _prompt_hash(prompt: str) -> str:
+    """系统提示词哈希"""
+    return hashlib.sha256((prompt or "").encode("utf-8")).hexdigest()[:16]
+
+def get_chat_client(model_config: ModelConfig):
+    """获取（或创建）与模型配置对应的 ChatOpenAI 客户端"""
+    key = _model_cache_key(model_config)
+    client = _client_cache.get(key)
+    if client is None:
+        with _cache_lock:
+            client = _client_cache.get(key)
+            if client is None:
+                client = ChatOpenAI(
+                    model=model_config.model_name,
+                    base_url=model_config.base_url,
+                    api_key=model_config.api_key,
+                    temperature=model_config.temperature,
+                    max_tokens=model_config.max_tokens
+                )
+                _client_cache[key] = client
+                logger.info(f"创建模型客户端: {model_config.name} ({model_config.model_name})")
+    return client
+
+def _default_model_config() -> ModelConfig:
+    """未注入模型配置时使用 config.py 中的默认模型"""
+    return ModelConfig(
+        name="default",
+        model_name=config.model,
+        base_url=config.base_url,
+        api_key=config.api_key
+    )
+
 # 定义工具函数
 @tool
 def analyze_user_input(text: str) -> str:
@@ -197,10 +251,12 @@ def analysis_node(state: ConversationState) -> ConversationState:
 def ai_response_node(state: ConversationState) -> ConversationState:
     """
 AI响应生成节点
+    模型配置与系统提示词从 configurable 中的 model_config / system_prompt 注入，客户端从缓存获取
     """
+    configurable = get_config().get("configurable", {}) if LANGGRAPH_AVAILABLE else {}
     user_input = state["user_input"]
     analysis_result = state.get("analysis_result", "")
-    system_prompt = state.get("system_prompt", "你是一个有用的AI助手")
+    system_prompt = configurable.get("system_prompt") or state.get("system_prompt") or "你是一个有用的AI助手"
     step_count = state.get("step_count", 0) + 1
     
     node_name = "ai_response_node"
@@ -218,17 +274,9 @@ AI响应生成节点
     
     try:
         if LANGGRAPH_AVAILABLE:
-            # 初始化LLM
-            from langchain_openai import ChatOpenAI
-            from langchain_core.messages import HumanMessage
-            import config as local_config
-            
-            llm = ChatOpenAI(
-                model=local_config.model,
-                base_url=local_config.base_url,
-                api_key=local_config.api_key,
-                temperature=0.7
-            )
+            # 复用会话注入的模型客户端
+            model_config = configurable.get("model_config") or _default_model_config()
+            llm = get_chat_client(model_config)
             
             prompt = f"""
 {system_prompt}
@@ -314,14 +362,56 @@ def response_finalizer(state: ConversationState) -> ConversationState:
         "conversation_history": state.get("conversation_history", []) + [conversation_entry],
         "system_prompt": state.get("system_prompt", "")
     }
+
+def _get_base_workflow():
+    """编译工作流（结构与模型/提示词无关，全局只编译一次）"""
+    global _compiled_workflow
+    if _compiled_workflow is None:
+        with _cache_lock:
+            if _compiled_workflow is None:
+                workflow = StateGraph(ConversationState)
+                
+                # 添加节点
+                workflow.add_node("input_processor", input_processor)
+                workflow.add_node("analysis_node", analysis_node)
+                workflow.add_node("ai_response_node", ai_response_node)
+                workflow.add_node("response_finalizer", response_finalizer)
+                
+                # 设置边
+                workflow.set_entry_point("input_processor")
+                workflow.add_edge("input_processor", "analysis_node")
+                workflow.add_edge("analysis_node", "ai_response_node")
+                workflow.add_edge("ai_response_node", "response_finalizer")
+                workflow.add_edge("response_finalizer", END)
+                
+                _compiled_workflow = workflow.compile()
+    return _compiled_workflow
+
+def get_workflow(model_config: ModelConfig, system_prompt: str):
+    """按 (模型配置, 提示词哈希) 缓存已绑定会话配置的工作流"""
+    key = (_model_cache_key(model_config), _prompt_hash(system_prompt))
+    with _cache_lock:
+        bound = _workflow_cache.get(key)
+        if bound is not None:
+            _workflow_cache.move_to_end(key)
+            return bound
+    base = _get_base_workflow()
+    bound = base.with_config(configurable={
+        "model_config": model_config,
+        "system_prompt": system_prompt
+    })
+    with _cache_lock:
+        _workflow_cache[key] = bound
+        if len(_workflow_cache) > _WORKFLOW_CACHE_SIZE:
+            _workflow_cache.popitem(last=False)
+    return bound
+
 class LangGraphChatInterface:
     """LangGraph智能对话界面"""
     
     def __init__(self):
-        self.chat_state = ChatState()
+        # 模型配置表在所有会话间共享；模型选择、提示词、执行日志等放在每个会话自己的 ChatState 中
         self.models = self._load_model_configs()
-        self.current_workflow = None
-        self.workflow_diagram = ""
         
     def _load_model_configs(self) -> dict:
         """加载预设模型配置"""
@@ -358,30 +448,8 @@ class LangGraphChatInterface:
             return None
             
         try:
-            # 设置环境变量
-            os.environ["OPENAI_API_BASE"] = model_config.base_url
-            os.environ["OPENAI_API_KEY"] = model_config.api_key
-            
-            # 创建状态图
-            workflow = StateGraph(ConversationState)
-            
-            # 添加节点
-            workflow.add_node("input_processor", input_processor)
-            workflow.add_node("analysis_node", analysis_node)
-            workflow.add_node("ai_response_node", ai_response_node)
-            workflow.add_node("response_finalizer", response_finalizer)
-            
-            # 设置边
-            workflow.set_entry_point("input_processor")
-            workflow.add_edge("input_processor", "analysis_node")
-            workflow.add_edge("analysis_node", "ai_response_node")
-            workflow.add_edge("ai_response_node", "response_finalizer")
-            workflow.add_edge("response_finalizer", END)
-            
-            # 编译图
-            graph = workflow.compile()
-            
-            logger.info(f"成功创建 LangGraph 工作流，使用模型: {model_config.name}")
+            graph = get_workflow(model_config, system_prompt)
+            logger.info(f"成功获取 LangGraph 工作流，使用模型: {model_config.name}")
             return graph
             
         except Exception as e:
@@ -401,32 +469,26 @@ class LangGraphChatInterface:
             logger.error(f"生成工作流图表失败: {e}")
             return ""
     
-    def select_model(self, model_name: str, system_prompt: str):
-        """选择并初始化模型"""
+    def select_model(self, model_name: str, system_prompt: str, session: Optional[ChatState] = None):
+        """选择并初始化模型（为当前会话创建新的 ChatState，会话之间互不影响）"""
         if model_name not in self.models:
-            return f"❌ 未找到模型配置: {model_name}", [], gr.update(), "", ""
+            return f"❌ 未找到模型配置: {model_name}", [], gr.update(), "", "", session
         
         model_config = self.models[model_name]
-        self.chat_state.current_model = model_name
-        self.chat_state.system_prompt = system_prompt or self.chat_state.system_prompt
+        # 重新加载模型即开始新的会话状态（聊天历史与执行日志清空）
+        session = ChatState(current_model=model_name, system_prompt=system_prompt or ChatState.system_prompt)
         
         if LANGGRAPH_AVAILABLE:
-            self.current_workflow = self._create_workflow(model_config, self.chat_state.system_prompt)
-            if self.current_workflow:
-                self.workflow_diagram = self._generate_workflow_diagram(self.current_workflow)
+            workflow = self._create_workflow(model_config, session.system_prompt)
+            if workflow:
+                session.workflow_diagram = self._generate_workflow_diagram(workflow)
                 status_msg = f"✅ 已成功加载模型: {model_config.name}\n📍 服务地址: {model_config.base_url}\n🎯 模型: {model_config.model_name}\n🛠️ 工作流: 已创建 4 个节点的 LangGraph 工作流"
             else:
                 status_msg = f"❌ 模型加载失败: {model_config.name}"
-                self.workflow_diagram = ""
         else:
             status_msg = f"⚠️ 模拟模式 - 已选择模型: {model_config.name}\n请安装LangGraph库以获得完整功能"
-            self.workflow_diagram = ""
-        
-        # 清空聊天历史
-        self.chat_state.messages = []
-        self.chat_state.execution_logs = []
         
-        return status_msg, [], gr.update(interactive=True), self.workflow_diagram, ""
+        return status_msg, [], gr.update(interactive=True), session.workflow_diagram, "", session
     
     def add_custom_model(self, name: str, model_name: str, base_url: str, api_key: str, description: str):
         """添加自定义模型配置"""
@@ -443,12 +505,14 @@ class LangGraphChatInterface:
         
         model_choices = list(self.models.keys())
         return f"✅ 已添加自定义模型: {name}", gr.update(choices=model_choices, value=name)
-    def chat_response(self, message: str, history: List[Tuple[str, Optional[str]]]):
+    def chat_response(self, message: str, history: List[Tuple[str, Optional[str]]], session: Optional[ChatState] = None):
         """处理聊天响应"""
         if not message.strip():
             return history, "", ""
         
-        if not self.chat_state.current_model:
+        model_name = session.current_model if session else None
+        system_prompt = session.system_prompt if session else ChatState.system_prompt
+        if not model_name or model_name not in self.models:
             history.append((message, "❌ 请先选择一个模型配置"))
             return history, "", ""
         
@@ -457,11 +521,12 @@ class LangGraphChatInterface:
         execution_log_text = ""
         
         try:
-            if LANGGRAPH_AVAILABLE and self.current_workflow:
+            workflow = get_workflow(self.models[model_name], system_prompt) if LANGGRAPH_AVAILABLE else None
+            if workflow:
                 # 使用LangGraph工作流处理
                 initial_state = {
                     "user_input": message,
-                    "system_prompt": self.chat_state.system_prompt,
+                    "system_prompt": system_prompt,
                     "step_count": 0,
                     "execution_log": [],
                     "conversation_history": []
@@ -471,7 +536,7 @@ class LangGraphChatInterface:
                 execution_logs = []
                 final_response = ""
                 
-                for chunk in self.current_workflow.stream(initial_state, stream_mode="values"):
+                for chunk in workflow.stream(initial_state, stream_mode="values"):
                     if "current_node" in chunk:
                         node_info = {
                             "node": chunk.get("current_node", ""),
@@ -525,6 +590,9 @@ class LangGraphChatInterface:
             
             # 更新历史记录
             history[-1] = (message, response)
+            session.messages.append((message, response))
+            if workflow:
+                session.execution_logs.extend(log for log in execution_logs if isinstance(log, dict))
             
         except Exception as e:
             logger.error(f"聊天响应出错: {e}")
@@ -556,28 +624,30 @@ class LangGraphChatInterface:
         ]
         return "\n".join(logs)
     
-    def clear_chat(self):
+    def clear_chat(self, session: Optional[ChatState] = None):
         """清空聊天记录"""
-        self.chat_state.messages = []
-        self.chat_state.execution_logs = []
+        if session is not None:
+            session.messages = []
+            session.execution_logs = []
         return [], ""
     
-    def export_chat(self, history: List[Tuple[str, str]]):
+    def export_chat(self, history: List[Tuple[str, str]], session: Optional[ChatState] = None):
         """导出聊天记录"""
         if not history:
             return None
+        session = session or ChatState()
         
         timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
         filename = f"langgraph_chat_export_{timestamp}.json"
         
         export_data = {
             "timestamp": timestamp,
-            "model": self.chat_state.current_model,
-            "system_prompt": self.chat_state.system_prompt,
+            "model": session.current_model,
+            "system_prompt": session.system_prompt,
             "workflow_type": "LangGraph",
             "conversations": [{"user": user, "assistant": assistant} for user, assistant in history if user and assistant],
-            "execution_logs": self.chat_state.execution_logs,
-            "workflow_diagram": self.workflow_diagram
+            "execution_logs": session.execution_logs,
+            "workflow_diagram": session.workflow_diagram
         }
         
         # 确保 logs 目录存在
@@ -598,6 +668,9 @@ class LangGraphChatInterface:
             基于 LangGraph 框架的对话界面，支持可视化工作流、节点执行监控和实时日志
             """)
             
+            # 每个浏览器会话独立的模型/提示词选择
+            session_state = gr.State(None)
+            
             with gr.Row():
                 with gr.Column(scale=1):
                     gr.Markdown("## ⚙️ 模型配置")
@@ -612,7 +685,7 @@ class LangGraphChatInterface:
                     
                     system_prompt = gr.Textbox(
                         label="系统提示词",
-                        value=self.chat_state.system_prompt,
+                        value=ChatState.system_prompt,
                         lines=3,
                         placeholder="定义AI助手的角色和行为..."
                     )
@@ -680,8 +753,8 @@ class LangGraphChatInterface:
             # 事件绑定
             select_btn.click(
                 fn=self.select_model,
-                inputs=[model_dropdown, system_prompt],
-                outputs=[status_display, chatbot, msg_input, workflow_diagram, execution_log]
+                inputs=[model_dropdown, system_prompt, session_state],
+                outputs=[status_display, chatbot, msg_input, workflow_diagram, execution_log, session_state]
             )
             
             add_custom_btn.click(
@@ -691,29 +764,30 @@ class LangGraphChatInterface:
             )
             
             # 聊天功能
-            def submit_message(message, history):
-                return self.chat_response(message, history)
+            def submit_message(message, history, session):
+                return self.chat_response(message, history, session)
             
             msg_input.submit(
                 fn=submit_message,
-                inputs=[msg_input, chatbot],
+                inputs=[msg_input, chatbot, session_state],
                 outputs=[chatbot, msg_input, execution_log]
             )
             
             send_btn.click(
                 fn=submit_message,
-                inputs=[msg_input, chatbot],
+                inputs=[msg_input, chatbot, session_state],
                 outputs=[chatbot, msg_input, execution_log]
             )
             
             clear_btn.click(
                 fn=self.clear_chat,
+                inputs=[session_state],
                 outputs=[chatbot, execution_log]
             )
             
             export_btn.click(
                 fn=self.export_chat,
-                inputs=[chatbot],
+                inputs=[chatbot, session_state],
                 outputs=[gr.File()]
             )
             
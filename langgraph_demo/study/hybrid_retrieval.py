@@ -0,0 +1,428 @@
+# -*- coding: utf-8 -*-
+"""
+混合检索引擎
+供 13_base_memory_demo.py 的 AdvancedMemoryDemo 使用：一次查询同时完成关键词、标签/情感与向量检索
+
+设计要点：
+1. 倒排索引：内容按词（英文单词 / 中文二元组）建 BM25 倒排表，标签、情感词各有精确倒排表
+2. Aho–Corasick 自动机：一次扫描即可从消息中找出所有情感词与已知标签，替代逐词子串匹配
+3. 向量检索只调用一次 store.search，与 BM25、标签、情感三路排名用 RRF（倒数排名融合）合并
+4. 索引随写入增量维护，调用方在写入 store 后调用 add()/remove() 即可；
+   创建时从 store 重建一次，store 从持久化目录加载或已有数据时索引与之保持一致
+5. items() / tags() 直接读取索引中的记忆与标签，列举、筛选类操作不必再 search(query="") 全量扫描
+"""
+
+import math
+import re
+import threading
+from collections import Counter, defaultdict, deque
+from dataclasses import dataclass, field
+from typing import Any, Dict, Iterable, List, Optional, Set, Tuple
+
+from langgraph.store.base import BaseStore
+
+
+# 默认情感词典：类别 -> 关键词
+DEFAULT_EMOTION_LEXICON: Dict[str, List[str]] = {
+    "积极情感": ["开心", "高兴", "快乐", "兴奋", "满足", "自豪", "满意", "愉快", "喜悦", "激动", "成就感"],
+    "消极情感": ["难过", "悲伤", "沮丧", "失望", "愤怒", "焦虑", "担心", "害怕", "痛苦", "绝望", "怀念"],
+    "中性情感": ["平静", "冷静", "中性", "一般", "普通", "正常"],
+    "惊讶": ["惊讶", "震惊", "意外", "没想到", "出乎意料"],
+    "困惑": ["困惑", "迷茫", "不解", "疑惑", "不明白"],
+}
+
+_TOKEN_RE = re.compile(r"[a-z0-9]+|[\u4e00-\u9fff]+")
+
+
+def tokenize(text: str) -> List[str]:
+    """英文/数字按单词切分，中文连续片段切为二元组（单字片段保留单字）"""
+    tokens = []
+    for match in _TOKEN_RE.finditer(text.lower()):
+        run = match.group()
+        if run[0].isascii() or len(run) == 1:
+            tokens.append(run)
+        else:
+            tokens.extend(run[i:i + 2] for i in range(len(run) - 1))
+    return tokens
+
+
+# ============================================================================
+# Aho–Corasick 多模式匹配
+# ============================================================================
+
+class AhoCorasick:
+    """Aho–Corasick 自动机：一次线性扫描找出文本中出现的所有模式串"""
+
+    def __init__(self, patterns: Iterable[Tuple[str, Any]] = ()):
+        self._goto: List[Dict[str, int]] = [{}]
+        self._fail: List[int] = [0]
+        self._out: List[List[Tuple[str, Any]]] = [[]]
+        for pattern, payload in patterns:
+            self._add(pattern, payload)
+        self._build()
+
+    def _add(self, pattern: str, payload: Any) -> None:
+        if not pattern:
+            return
+        state = 0
+        for ch in pattern:
+            nxt = self._goto[state].get(ch)
+            if nxt is None:
+                nxt = len(self._goto)
+                self._goto[state][ch] = nxt
+                self._goto.append({})
+                self._fail.append(0)
+                self._out.append([])
+            state = nxt
+        self._out[state].append((pattern, payload))
+
+    def _build(self) -> None:
+        queue = deque(self._goto[0].values())
+        while queue:
+            state = queue.popleft()
+            for ch, nxt in self._goto[state].items():
+                queue.append(nxt)
+                fail = self._fail[state]
+                while fail and ch not in self._goto[fail]:
+                    fail = self._fail[fail]
+                self._fail[nxt] = self._goto[fail].get(ch, 0)
+                self._out[nxt] = self._out[nxt] + self._out[self._fail[nxt]]
+
+    def find_all(self, text: str) -> List[Tuple[str, Any]]:
+        """返回按出现位置排序的 (模式串, payload) 列表"""
+        found = []
+        state = 0
+        for ch in text:
+            while state and ch not in self._goto[state]:
+                state = self._fail[state]
+            state = self._goto[state].get(ch, 0)
+            if self._out[state]:
+                found.extend(self._out[state])
+        return found
+
+
+# ============================================================================
+# 混合检索
+# ============================================================================
+
+@dataclass
+class HybridHit:
+    """一条融合后的检索结果"""
+    key: str
+    value: Dict[str, Any]
+    score: float  # RRF 融合分
+    vector_score: Optional[float] = None
+    bm25_score: Optional[float] = None
+    matched_tags: List[str] = field(default_factory=list)
+    matched_emotions: List[str] = field(default_factory=list)
+    sources: List[str] = field(default_factory=list)  # 命中的检索通道
+
+
+class HybridMemoryRetriever:
+    """
+    针对单个命名空间的混合检索器
+
+    用法：
+        retriever = HybridMemoryRetriever(store, ("demo_user", "advanced_memories"))
+        store.put(namespace, key, value); retriever.add(key, value)
+        hits = retriever.search("我最近有什么让我兴奋的事情？", limit=3)
+    """
+
+    def __init__(self, store: BaseStore, namespace: Tuple[str, ...], *,
+                 text_fields: Tuple[str, ...] = ("content", "emotional_context", "tags"),
+                 tag_field: str = "tags", emotion_field: str = "emotional_context",
+                 emotion_lexicon: Optional[Dict[str, List[str]]] = None,
+                 k1: float = 1.5, b: float = 0.75, rrf_k: int = 60):
+        self.store = store
+        self.namespace = namespace
+        self.text_fields = text_fields
+        self.tag_field = tag_field
+        self.emotion_field = emotion_field
+        self.emotion_lexicon = emotion_lexicon or DEFAULT_EMOTION_LEXICON
+        self.k1 = k1
+        self.b = b
+        self.rrf_k = rrf_k
+
+        self._lock = threading.RLock()
+        self._values: Dict[str, Dict[str, Any]] = {}
+        # BM25
+        self._postings: Dict[str, Dict[str, int]] = defaultdict(dict)
+        self._doc_terms: Dict[str, Counter] = {}
+        self._doc_len: Dict[str, int] = {}
+        self._total_len = 0
+        # 标签 / 情感倒排
+        self._tag_postings: Dict[str, Set[str]] = defaultdict(set)
+        self._emotion_postings: Dict[str, Set[str]] = defaultdict(set)
+        self._category_postings: Dict[str, Set[str]] = defaultdict(set)
+        self._doc_emotions: Dict[str, List[Tuple[str, str]]] = {}
+
+        self._emotion_matcher = AhoCorasick(
+            (word, category) for category, words in self.emotion_lexicon.items() for word in words
+        )
+        self._keyword_matcher: Optional[AhoCorasick] = None  # 情感词 + 已知标签，标签变化时重建
+
+        # store 中可能已有数据（如从 persist_dir 加载），先与之对齐
+        self.rebuild()
+
+    # ------------------------------------------------------------------
+    # 索引维护
+    # ------------------------------------------------------------------
+
+    def add(self, key: str, value: Dict[str, Any]) -> None:
+        """索引一条记忆；key 已存在时先移除旧索引"""
+        with self._lock:
+            if key in self._values:
+                self.remove(key)
+            self._values[key] = value
+
+            terms = Counter(tokenize(self._document_text(value)))
+            self._doc_terms[key] = terms
+            self._doc_len[key] = sum(terms.values())
+            self._total_len += self._doc_len[key]
+            for term, tf in terms.items():
+                self._postings[term][key] = tf
+
+            for tag in self._tags_of(value):
+                if tag not in self._tag_postings:
+                    self._keyword_matcher = None
+                self._tag_postings[tag].add(key)
+
+            emotions = self._emotion_matcher.find_all(str(value.get(self.emotion_field, "")))
+            self._doc_emotions[key] = emotions
+            for word, category in emotions:
+                self._emotion_postings[word].add(key)
+                self._category_postings[category].add(key)
+
+    def remove(self, key: str) -> None:
+        with self._lock:
+            value = self._values.pop(key, None)
+            if value is None:
+                return
+            for term in self._doc_terms.pop(key):
+                postings = self._postings[term]
+                postings.pop(key, None)
+                if not postings:
+                    del self._postings[term]
+            self._total_len -= self._doc_len.pop(key)
+            for tag in self._tags_of(value):
+                keys = self._tag_postings.get(tag)
+                if keys is not None:
+                    keys.discard(key)
+                    if not keys:
+                        del self._tag_postings[tag]
+                        self._keyword_matcher = None
+            for word, category in self._doc_emotions.pop(key, []):
+                for postings, term in ((self._emotion_postings, word), (self._category_postings, category)):
+                    keys = postings.get(term)
+                    if keys is not None:
+                        keys.discard(key)
+                        if not keys:
+                            del postings[term]
+
+    def rebuild(self) -> int:
+        """从 store 全量重建索引（如从持久化目录加载后），返回条目数"""
+        with self._lock:
+            for key in list(self._values):
+                self.remove(key)
+            if hasattr(self.store, "list_items"):
+                cursor = None
+                while True:
+                    items, cursor = self.store.list_items(self.namespace, limit=500, cursor=cursor)
+                    for item in items:
+                        if item.namespace == self.namespace:
+                            self.add(item.key, item.value)
+                    if cursor is None:
+                        break
+            else:
+                for item in self.store.search(self.namespace, limit=100000):
+                    if item.namespace == self.namespace:
+                        self.add(item.key, item.value)
+            return len(self._values)
+
+    def get(self, key: str) -> Optional[Dict[str, Any]]:
+        """返回已索引的记忆值"""
+        return self._values.get(key)
+
+    def items(self) -> List[Tuple[str, Dict[str, Any]]]:
+        """已索引的全部 (key, 记忆值) 快照"""
+        with self._lock:
+            return list(self._values.items())
+
+    def tags(self) -> List[str]:
+        """已索引的全部标签（排序）"""
+        with self._lock:
+            return sorted(self._tag_postings)
+
+    def _document_text(self, value: Dict[str, Any]) -> str:
+        parts = []
+        for name in self.text_fields:
+            raw = value.get(name)
+            if isinstance(raw, (list, tuple)):
+                parts.extend(str(x) for x in raw)
+            elif raw:
+                parts.append(str(raw))
+        return " ".join(parts)
+
+    def _tags_of(self, value: Dict[str, Any]) -> List[str]:
+        tags = value.get(self.tag_field) or []
+        return [tags] if isinstance(tags, str) else list(tags)
+
+    # ------------------------------------------------------------------
+    # 关键词识别
+    # ------------------------------------------------------------------
+
+    def _matcher(self) -> AhoCorasick:
+        if self._keyword_matcher is None:
+            patterns = [(word, ("emotion", category)) for category, words in self.emotion_lexicon.items() for word in words]
+            patterns.extend((tag, ("tag", tag)) for tag in self._tag_postings)
+            self._keyword_matcher = AhoCorasick(patterns)
+        return self._keyword_matcher
+
+    def detect_keywords(self, text: str) -> Dict[str, List[str]]:
+        """
+        一次扫描识别文本中的情感词与已知标签
+
+        Returns:
+            {"emotions": 情感词（每个类别取首个）, "categories": 情感类别, "tags": 标签}
+        """
+        with self._lock:
+            found = self._matcher().find_all(text)
+        emotions, categories, tags = [], [], []
+        for word, (kind, label) in found:
+            if kind == "emotion":
+                if label not in categories:
+                    categories.append(label)
+                    emotions.append(word)
+            elif label not in tags:
+                tags.append(label)
+        return {"emotions": emotions, "categories": categories, "tags": tags}
+
+    # ------------------------------------------------------------------
+    # 单路检索
+    # ------------------------------------------------------------------
+
+    def bm25(self, query: str, limit: int = 20) -> List[Tuple[str, float]]:
+        """BM25 关键词检索，只遍历查询词的倒排表"""
+        with self._lock:
+            n_docs = len(self._values)
+            if not n_docs:
+                return []
+            avgdl = self._total_len / n_docs or 1.0
+            scores: Dict[str, float] = defaultdict(float)
+            for term in set(tokenize(query)):
+                postings = self._postings.get(term)
+                if not postings:
+                    continue
+                df = len(postings)
+                idf = math.log(1 + (n_docs - df + 0.5) / (df + 0.5))
+                for key, tf in postings.items():
+                    norm = self.k1 * (1 - self.b + self.b * self._doc_len[key] / avgdl)
+                    scores[key] += idf * tf * (self.k1 + 1) / (tf + norm)
+        return sorted(scores.items(), key=lambda x: x[1], reverse=True)[:limit]
+
+    def match_tags(self, tags: Iterable[str], require_all: bool = False) -> List[Tuple[str, List[str]]]:
+        """标签精确匹配，按命中标签数降序返回 (key, 命中标签)"""
+        tags = list(dict.fromkeys(tags))
+        with self._lock:
+            matched: Dict[str, List[str]] = defaultdict(list)
+            for tag in tags:
+                for key in self._tag_postings.get(tag, ()):
+                    matched[key].append(tag)
+        wanted = len(tags)
+        ranked = [(key, hit) for key, hit in matched.items() if not require_all or len(hit) == wanted]
+        ranked.sort(key=lambda x: (len(x[1]), self._importance(x[0])), reverse=True)
+        return ranked
+
+    def match_emotions(self, emotions: Iterable[str], categories: Iterable[str] = ()) -> List[Tuple[str, List[str]]]:
+        """情感匹配：同一情感词计 2 分，同一情感类别计 1 分"""
+        with self._lock:
+            scores: Dict[str, int] = defaultdict(int)
+            matched: Dict[str, List[str]] = defaultdict(list)
+            for word in emotions:
+                for key in self._emotion_postings.get(word, ()):
+                    scores[key] += 2
+                    matched[key].append(word)
+            for category in categories:
+                for key in self._category_postings.get(category, ()):
+                    scores[key] += 1
+        ranked = sorted(scores, key=lambda k: (scores[k], self._importance(k)), reverse=True)
+        return [(key, matched[key]) for key in ranked]
+
+    def _importance(self, key: str) -> float:
+        value = self._values.get(key) or {}
+        return float(value.get("importance", 0.0) or 0.0)
+
+    # ------------------------------------------------------------------
+    # 融合检索
+    # ------------------------------------------------------------------
+
+    def search(self, query: str, *, tags: Optional[List[str]] = None, emotions: Optional[List[str]] = None,
+               limit: int = 5, candidate_k: int = 20, use_vector: bool = True) -> List[HybridHit]:
+        """
+        一次查询完成向量、BM25、标签、情感四路检索，并用 RRF 融合
+
+        Args:
+            query: 查询文本
+            tags: 额外指定的标签（与查询中识别出的标签合并）
+            emotions: 额外指定的情感词（与查询中识别出的情感词合并）
+            limit: 返回条数
+            candidate_k: 每一路的候选条数
+            use_vector: 是否调用向量检索（store.search）
+        """
+        detected = self.detect_keywords(query)
+        query_tags = list(dict.fromkeys((tags or []) + detected["tags"]))
+        query_emotions = list(dict.fromkeys((emotions or []) + detected["emotions"]))
+        categories = list(detected["categories"])
+        if emotions:
+            for word, category in self._emotion_matcher.find_all(" ".join(emotions)):
+                if category not in categories:
+                    categories.append(category)
+
+        hits: Dict[str, HybridHit] = {}
+
+        def hit(key: str, value: Optional[Dict[str, Any]] = None) -> Optional[HybridHit]:
+            entry = hits.get(key)
+            if entry is None:
+                value = value if value is not None else self._values.get(key)
+                if value is None:
+                    return None
+                entry = hits[key] = HybridHit(key=key, value=value, score=0.0)
+            return entry
+
+        def fuse(channel: str, rank: int, entry: Optional[HybridHit]) -> None:
+            if entry is not None:
+                entry.score += 1.0 / (self.rrf_k + rank + 1)
+                entry.sources.append(channel)
+
+        if use_vector and query:
+            # store.search 按命名空间前缀检索，子命名空间中的同名 key 不属于本检索器
+            vector_items = [item for item in self.store.search(self.namespace, query=query, limit=candidate_k)
+                            if item.namespace == self.namespace]
+            for rank, item in enumerate(vector_items):
+                entry = hit(item.key, item.value)
+                if entry is not None:
+                    entry.vector_score = item.score
+                fuse("vector", rank, entry)
+
+        for rank, (key, score) in enumerate(self.bm25(query, candidate_k)):
+            entry = hit(key)
+            if entry is not None:
+                entry.bm25_score = score
+            fuse("bm25", rank, entry)
+
+        if query_tags:
+            for rank, (key, matched) in enumerate(self.match_tags(query_tags)[:candidate_k]):
+                entry = hit(key)
+                if entry is not None:
+                    entry.matched_tags = matched
+                fuse("tags", rank, entry)
+
+        if query_emotions or categories:
+            for rank, (key, matched) in enumerate(self.match_emotions(query_emotions, categories)[:candidate_k]):
+                entry = hit(key)
+                if entry is not None:
+                    entry.matched_emotions = matched
+                fuse("emotion", rank, entry)
+
+        ranked = sorted(hits.values(), key=lambda h: (h.score, self._importance(h.key)), reverse=True)
+        return ranked[:limit]
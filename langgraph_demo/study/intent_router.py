@@ -0,0 +1,436 @@
+# -*- coding: utf-8 -*-
+"""
+分层意图路由引擎
+供 02_conditional_routing.py 的 decision_maker 使用：大部分明显的请求在本地完成路由，只有拿不准的才调用 LLM
+
+设计要点：
+1. 决策缓存：按归一化后的输入做 LRU 缓存，重复请求直接命中；
+   分类层的结论带模型版本，重训后旧版本的结论失效；回退和无效的 LLM 结论不缓存，下次仍会重试
+2. 第一层（本地，微秒级）：
+   - 规则层：关键词用 Aho–Corasick 自动机一次扫描，正则合并成一个带命名分组的表达式，按命中数给出置信度
+   - 分类层：稀疏 TF-IDF + 多分类逻辑回归（numpy 实现），用种子样例和历史决策日志训练；
+     启动时和日志增长后在后台线程重训，训练完成后整体替换分类器，路由请求不等待训练
+3. 第二层：本地置信度低于阈值时才调用 LLM；LLM 失败时退回本地最优猜测
+4. 规则层、LLM 以及调用方通过 remember 确认的决策写入 JSONL 日志，作为分类层的训练数据（分类层自己的结论不回写，避免自我强化）
+"""
+
+import json
+import math
+import os
+import re
+import threading
+import time
+from collections import Counter, OrderedDict, deque
+from concurrent.futures import Future, ThreadPoolExecutor, wait
+from dataclasses import dataclass, field
+from typing import Callable, Dict, Iterable, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from config import logger
+from hybrid_retrieval import AhoCorasick, tokenize
+
+
+@dataclass
+class RouteDecision:
+    """一次路由决策"""
+    label: str
+    confidence: float
+    source: str  # cache / rules / classifier / llm / fallback / observed
+    matched: List[str] = field(default_factory=list)  # 规则层命中的关键词/正则
+    latency_ms: float = 0.0
+
+
+# ============================================================================
+# 规则层：关键词自动机 + 合并正则
+# ============================================================================
+
+class KeywordRules:
+    """
+    关键词 / 正则规则
+
+    keywords: 标签 -> 关键词列表（统一小写匹配）
+    patterns: 标签 -> 正则列表
+    priority_labels: 一旦命中即直接判定（置信度 1.0）的标签，如 "model_info"
+    """
+
+    def __init__(self, keywords: Dict[str, Sequence[str]], patterns: Optional[Dict[str, Sequence[str]]] = None,
+                 priority_labels: Iterable[str] = ()):
+        self.priority_labels = set(priority_labels)
+        self._automaton = AhoCorasick(
+            (kw.lower(), label) for label, kws in keywords.items() for kw in kws
+        )
+        self._group_labels: Dict[str, str] = {}
+        parts = []
+        for label, regexes in (patterns or {}).items():
+            for regex in regexes:
+                group = f"g{len(self._group_labels)}"
+                self._group_labels[group] = label
+                parts.append(f"(?P<{group}>{regex})")
+        self._regex = re.compile("|".join(parts), re.IGNORECASE) if parts else None
+
+    def match(self, text: str) -> Dict[str, List[str]]:
+        """返回 标签 -> 命中的关键词/正则片段（去重）"""
+        hits: Dict[str, List[str]] = {}
+        for keyword, label in self._automaton.find_all(text):
+            bucket = hits.setdefault(label, [])
+            if keyword not in bucket:
+                bucket.append(keyword)
+        if self._regex is not None:
+            for m in self._regex.finditer(text):
+                label = self._group_labels[m.lastgroup]
+                bucket = hits.setdefault(label, [])
+                if m.group() not in bucket:
+                    bucket.append(m.group())
+        return hits
+
+    def decide(self, text: str) -> Optional[Tuple[str, float, List[str]]]:
+        """
+        返回 (标签, 置信度, 命中项)，没有任何命中时返回 None
+
+        置信度 = 命中占比 × 命中强度：只命中一个标签且命中 1 项时为 0.85，
+        多个标签各命中 1 项时降到 0.5 以下，交给后续层判断
+        """
+        hits = self.match(text)
+        if not hits:
+            return None
+        for label in self.priority_labels:
+            if label in hits:
+                return label, 1.0, hits[label]
+        ranked = sorted(hits.items(), key=lambda item: len(item[1]), reverse=True)
+        label, matched = ranked[0]
+        total = sum(len(m) for _, m in ranked)
+        strength = min(1.0, 0.7 + 0.15 * len(matched))
+        return label, round(len(matched) / total * strength, 4), matched
+
+
+# ============================================================================
+# 分类层：TF-IDF + 逻辑回归
+# ============================================================================
+
+class TfidfLogisticClassifier:
+    """
+    极小的本地文本分类器，特征为 hybrid_retrieval.tokenize 的词 / 中文二元组
+
+    特征矩阵按稀疏三元组（行号, 列号, 值）存储，每条文本只占它实际包含的特征数；
+    训练每轮的开销与非零元素数成正比，不随词表大小增长
+    """
+
+    def __init__(self, epochs: int = 300, learning_rate: float = 2.0, l2: float = 1e-3):
+        self.epochs = epochs
+        self.learning_rate = learning_rate
+        self.l2 = l2
+        self.classes: List[str] = []
+        self._vocab: Dict[str, int] = {}
+        self._idf: Optional[np.ndarray] = None
+        self._weights: Optional[np.ndarray] = None
+        self._bias: Optional[np.ndarray] = None
+
+    @property
+    def ready(self) -> bool:
+        return self._weights is not None
+
+    def _vectorize(self, tokens_list: Sequence[List[str]]) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+        """按行 L2 归一化的 TF-IDF，返回非零元素的 (行号, 列号, 值)"""
+        rows, cols, values = [], [], []
+        for row, tokens in enumerate(tokens_list):
+            for token, tf in Counter(tokens).items():
+                col = self._vocab.get(token)
+                if col is not None:
+                    rows.append(row)
+                    cols.append(col)
+                    values.append(1.0 + math.log(tf))
+        rows = np.array(rows, dtype=np.int64)
+        cols = np.array(cols, dtype=np.int64)
+        values = np.array(values, dtype=np.float32) * self._idf[cols]
+        norms = np.sqrt(np.bincount(rows, weights=values * values, minlength=len(tokens_list)))
+        return rows, cols, (values / norms[rows]).astype(np.float32)
+
+    @staticmethod
+    def _scatter(index: np.ndarray, contrib: np.ndarray, size: int) -> np.ndarray:
+        """按 index 把 contrib（nnz × 类别数）的行累加到 size 行的结果中"""
+        return np.stack(
+            [np.bincount(index, weights=contrib[:, c], minlength=size) for c in range(contrib.shape[1])], axis=1
+        ).astype(np.float32)
+
+    def fit(self, texts: Sequence[str], labels: Sequence[str]) -> "TfidfLogisticClassifier":
+        classes = sorted(set(labels))
+        if len(classes) < 2:
+            raise ValueError("训练数据至少需要两个类别")
+        tokens_list = [tokenize(t) for t in texts]
+        df = Counter()
+        for tokens in tokens_list:
+            df.update(set(tokens))
+        self._vocab = {token: i for i, token in enumerate(sorted(df))}
+        n = len(tokens_list)
+        self._idf = (np.log((1 + n) / (1 + np.array([df[t] for t in self._vocab], dtype=np.float32))) + 1.0)
+
+        rows, cols, values = self._vectorize(tokens_list)
+        index = {label: i for i, label in enumerate(classes)}
+        y = np.zeros((n, len(classes)), dtype=np.float32)
+        y[np.arange(n), [index[label] for label in labels]] = 1.0
+
+        weights = np.zeros((len(self._vocab), len(classes)), dtype=np.float32)
+        bias = np.zeros(len(classes), dtype=np.float32)
+        for _ in range(self.epochs):
+            # x @ weights 与 x.T @ grad 都只遍历非零元素
+            logits = self._scatter(rows, weights[cols] * values[:, None], n) + bias
+            grad = (self._softmax(logits) - y) / n
+            weights -= self.learning_rate * (self._scatter(cols, grad[rows] * values[:, None], len(self._vocab))
+                                             + self.l2 * weights)
+            bias -= self.learning_rate * grad.sum(axis=0)
+
+        self.classes = classes
+        self._weights, self._bias = weights, bias
+        return self
+
+    @staticmethod
+    def _softmax(logits: np.ndarray) -> np.ndarray:
+        logits = logits - logits.max(axis=1, keepdims=True)
+        exp = np.exp(logits)
+        return exp / exp.sum(axis=1, keepdims=True)
+
+    def predict(self, text: str) -> Optional[Tuple[str, float]]:
+        """返回 (标签, 概率)；未训练或输入不含任何已知特征时返回 None"""
+        if not self.ready:
+            return None
+        _, cols, values = self._vectorize([tokenize(text)])
+        if not len(cols):
+            return None
+        probs = self._softmax((values @ self._weights[cols] + self._bias)[None, :])[0]
+        best = int(probs.argmax())
+        return self.classes[best], float(probs[best])
+
+
+# ============================================================================
+# 路由引擎
+# ============================================================================
+
+_PUNCT_RE = re.compile(r"[\s？?。!！,，.、~～]+$")
+_SPACE_RE = re.compile(r"\s+")
+
+
+def normalize_query(text: str) -> str:
+    """缓存键：小写、合并空白、去掉结尾标点"""
+    text = _SPACE_RE.sub(" ", text.strip().lower())
+    return _PUNCT_RE.sub("", text)
+
+
+class IntentRouter:
+    """
+    缓存 → 规则层 → 分类层 → LLM 的分层路由
+
+    用法：
+        router = IntentRouter(labels, rules, llm_classify=classify_with_llm,
+                              seed_examples=SEED_EXAMPLES, log_path=config.data_path("routing_decisions.jsonl"))
+        decision = router.route(user_input)
+
+    llm_classify(text) -> str 返回模型给出的原始标签，非法标签按 default_label 处理
+    分类层在后台线程训练：训练完成前 route 只用规则层和 LLM；需要等首次训练结束时调用 wait_for_retrain()
+    """
+
+    def __init__(self, labels: Sequence[str], rules: KeywordRules, *,
+                 llm_classify: Optional[Callable[[str], str]] = None,
+                 classifier: Optional[TfidfLogisticClassifier] = None,
+                 seed_examples: Optional[Dict[str, Sequence[str]]] = None,
+                 confidence_threshold: float = 0.75,
+                 default_label: str = "general",
+                 cache_size: int = 2048,
+                 log_path: Optional[str] = None,
+                 max_samples: int = 5000,
+                 retrain_every: int = 50):
+        self.labels = list(labels)
+        self.rules = rules
+        self.llm_classify = llm_classify
+        self.classifier = classifier or TfidfLogisticClassifier()
+        self.confidence_threshold = confidence_threshold
+        self.default_label = default_label
+        self.cache_size = cache_size
+        self.log_path = log_path
+        self.retrain_every = retrain_every
+
+        # 归一化输入 -> (决策, 分类器版本)；版本只对分类层的结论有意义，其余为 None
+        self._cache: "OrderedDict[str, Tuple[RouteDecision, Optional[int]]]" = OrderedDict()
+        self.model_version = 0
+        self._lock = threading.Lock()
+        # 重训串行执行，数据快照较新的模型总是最后替换
+        self._train_lock = threading.Lock()
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="intent-retrain")
+        self._retrain_future: Optional[Future] = None
+        self._seeds: List[Tuple[str, str]] = [
+            (text, label) for label, texts in (seed_examples or {}).items() for text in texts
+        ]
+        self._samples: deque = deque(maxlen=max_samples)
+        self._new_samples = 0
+        self.counters: Counter = Counter()
+
+        self._load_log()
+        self.retrain_in_background()
+
+    # ---------- 训练数据 ----------
+
+    def _load_log(self) -> None:
+        if not self.log_path or not os.path.exists(self.log_path):
+            return
+        with open(self.log_path, "r", encoding="utf-8") as f:
+            for line in f:
+                try:
+                    record = json.loads(line)
+                except json.JSONDecodeError:
+                    continue
+                if record.get("label") in self.labels:
+                    self._samples.append((record["text"], record["label"]))
+        logger.info(f"🧭 已加载 {len(self._samples)} 条历史路由决策")
+
+    def _record(self, text: str, decision: RouteDecision) -> None:
+        """记录可作为训练数据的决策，积累到 retrain_every 条后在后台重训分类层"""
+        with self._lock:
+            self._samples.append((text, decision.label))
+            self._new_samples += 1
+            should_retrain = self._new_samples >= self.retrain_every
+            if self.log_path:
+                with open(self.log_path, "a", encoding="utf-8") as f:
+                    f.write(json.dumps({"text": text, "label": decision.label, "source": decision.source,
+                                        "ts": time.time()}, ensure_ascii=False) + "\n")
+        if should_retrain:
+            self.retrain_in_background()
+
+    def retrain(self) -> bool:
+        """用种子样例 + 历史决策重训分类层（同步执行）；类别不足两个时跳过"""
+        with self._train_lock:
+            with self._lock:
+                data = self._seeds + list(self._samples)
+                self._new_samples = 0
+            if len({label for _, label in data}) < 2:
+                return False
+            start = time.perf_counter()
+            classifier = TfidfLogisticClassifier(self.classifier.epochs, self.classifier.learning_rate,
+                                                 self.classifier.l2)
+            classifier.fit([t for t, _ in data], [label for _, label in data])
+            with self._lock:
+                self.classifier = classifier
+                self.model_version += 1
+            self.counters["retrain"] += 1
+        logger.info(f"🧭 路由分类器训练完成: {len(data)} 条样本，耗时 {(time.perf_counter() - start) * 1000:.1f}ms")
+        return True
+
+    def retrain_in_background(self) -> Future:
+        """提交后台重训；已有重训在进行时直接返回它，新样本留到下一次"""
+        with self._lock:
+            if self._retrain_future is None or self._retrain_future.done():
+                self._retrain_future = self._executor.submit(self._retrain_logged)
+            return self._retrain_future
+
+    def _retrain_logged(self) -> bool:
+        try:
+            return self.retrain()
+        except Exception as e:
+            logger.error(f"路由分类器训练失败，继续使用旧模型: {e}")
+            return False
+
+    def wait_for_retrain(self, timeout: Optional[float] = None) -> bool:
+        """等待进行中的后台重训结束，超时返回 False"""
+        future = self._retrain_future
+        if future is None:
+            return True
+        done, _ = wait([future], timeout=timeout)
+        return bool(done)
+
+    # ---------- 路由 ----------
+
+    def route(self, text: str) -> RouteDecision:
+        start = time.perf_counter()
+        key = normalize_query(text)
+
+        with self._lock:
+            cached = self._cache.get(key)
+            if cached is not None:
+                if cached[1] is not None and cached[1] != self.model_version:
+                    # 分类器已重训，旧模型的结论作废
+                    del self._cache[key]
+                    cached = None
+                else:
+                    self._cache.move_to_end(key)
+            version = self.model_version
+        if cached is not None:
+            cached = cached[0]
+            self.counters["cache"] += 1
+            return RouteDecision(cached.label, cached.confidence, "cache", cached.matched,
+                                 (time.perf_counter() - start) * 1000)
+
+        decision = self._decide(key)
+        decision.latency_ms = (time.perf_counter() - start) * 1000
+        self.counters[decision.source] += 1
+
+        if decision.source not in ("fallback", "llm_invalid"):
+            # LLM 失败或返回无效标签时的临时结论不缓存，下次仍会重试
+            with self._lock:
+                self._cache[key] = (decision, version if decision.source == "classifier" else None)
+                if len(self._cache) > self.cache_size:
+                    self._cache.popitem(last=False)
+        if decision.source in ("rules", "llm"):
+            self._record(key, decision)
+        return decision
+
+    def remember(self, text: str, label: str, source: str = "observed") -> None:
+        """把调用方事后确认的路由写回：更新决策缓存，并作为分类层的训练样本"""
+        if label not in self.labels:
+            return
+        key = normalize_query(text)
+        decision = RouteDecision(label, 1.0, source)
+        with self._lock:
+            self._cache[key] = (decision, None)
+            self._cache.move_to_end(key)
+            if len(self._cache) > self.cache_size:
+                self._cache.popitem(last=False)
+        self._record(key, decision)
+
+    def _decide(self, text: str) -> RouteDecision:
+        candidates: List[RouteDecision] = []
+
+        ruled = self.rules.decide(text)
+        if ruled is not None:
+            label, confidence, matched = ruled
+            candidates.append(RouteDecision(label, confidence, "rules", matched))
+            if confidence >= self.confidence_threshold:
+                return candidates[-1]
+
+        predicted = self.classifier.predict(text)
+        if predicted is not None:
+            label, confidence = predicted
+            candidates.append(RouteDecision(label, round(confidence, 4), "classifier"))
+            if confidence >= self.confidence_threshold:
+                return candidates[-1]
+
+        best_local = max(candidates, key=lambda d: d.confidence, default=None)
+        if self.llm_classify is None:
+            if best_local is not None:
+                return best_local
+            return RouteDecision(self.default_label, 0.0, "fallback")
+
+        self.counters["llm_calls"] += 1
+        try:
+            label = self.llm_classify(text).strip().lower()
+        except Exception as e:
+            logger.error(f"LLM 路由失败，使用本地结果: {e}")
+            if best_local is not None:
+                return RouteDecision(best_local.label, best_local.confidence, "fallback", best_local.matched)
+            return RouteDecision(self.default_label, 0.0, "fallback")
+
+        if label not in self.labels:
+            logger.warning(f"LLM 返回了无效标签: {label}，使用 {self.default_label}")
+            return RouteDecision(self.default_label, 0.0, "llm_invalid")
+        return RouteDecision(label, 1.0, "llm")
+
+    def stats(self) -> Dict[str, object]:
+        by_source = {k: v for k, v in self.counters.items() if k not in ("retrain", "llm_calls")}
+        routed = sum(by_source.values())
+        return {
+            "routed": routed,
+            "by_source": by_source,
+            "llm_call_rate": round(self.counters["llm_calls"] / routed, 4) if routed else 0.0,
+            "cache_size": len(self._cache),
+            "model_version": self.model_version,
+            "training_samples": len(self._seeds) + len(self._samples),
+            "retrain_count": self.counters["retrain"],
+        }
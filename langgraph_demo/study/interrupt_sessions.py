@@ -0,0 +1,121 @@
+# -*- coding: utf-8 -*-
+"""
+人工介入会话管理
+供 11_stream_fastapi_ws_interrupt.py 的 /ws/interrupt 使用：同一线程的执行与恢复串行化，并登记待处理的中断
+
+设计要点：
+1. 每个 thread_id 一把 asyncio.Lock，按引用计数回收，锁表不随线程数增长
+2. 待处理中断带过期时间，过期或已被恢复过的中断拒绝再次恢复
+3. 恢复执行失败时保留登记，客户端可以重试；恢复值已随失败的任务写入检查点，
+   重试时节点拿到的仍是第一次提交的恢复值（适用于 LLM 超时等临时失败）
+"""
+
+import asyncio
+import time
+from contextlib import asynccontextmanager
+from typing import List
+
+from langgraph.types import Command
+
+
+class InterruptSessionManager:
+    """
+    人工介入（human-in-the-loop）会话管理器，进程内存储
+    
+    功能说明：
+    1. 每个 thread_id 一把 asyncio.Lock：同一线程的初次执行/恢复串行化，不同线程互不阻塞
+    2. 待处理中断登记表：记录中断数据与过期时间，过期或已被处理的中断拒绝恢复
+    3. 批量列出所有等待人工输入的线程
+    4. 使用 ainvoke 异步执行，同步节点由 LangGraph 放入线程池，不阻塞事件循环
+    """
+
+    def __init__(self, graph, pending_timeout: float = 1800.0, lock_timeout: float = 30.0):
+        self.graph = graph
+        self.pending_timeout = pending_timeout  # 中断等待人工输入的有效期（秒）
+        self.lock_timeout = lock_timeout        # 同一线程排队等待锁的上限（秒）
+        self._locks: dict = {}                  # thread_id -> [asyncio.Lock, 引用计数]
+        self._pending: dict = {}                # thread_id -> 待处理中断信息
+
+    @asynccontextmanager
+    async def _thread_lock(self, thread_id: str):
+        entry = self._locks.get(thread_id)
+        if entry is None:
+            entry = self._locks[thread_id] = [asyncio.Lock(), 0]
+        entry[1] += 1
+        try:
+            try:
+                await asyncio.wait_for(entry[0].acquire(), timeout=self.lock_timeout)
+            except asyncio.TimeoutError:
+                raise TimeoutError(f"线程 {thread_id} 正在处理中，请稍后重试")
+            try:
+                yield
+            finally:
+                entry[0].release()
+        finally:
+            entry[1] -= 1
+            if entry[1] == 0:
+                # 无人持有或等待时回收，避免锁表随线程数增长
+                self._locks.pop(thread_id, None)
+
+    def _record(self, thread_id: str, cfg: dict, result) -> None:
+        """根据执行结果登记或清除待处理中断"""
+        if isinstance(result, dict) and "__interrupt__" in result:
+            now = time.time()
+            self._pending[thread_id] = {
+                "thread_id": thread_id,
+                "checkpoint": cfg.get("configurable", {}).get("checkpoint_id"),
+                "payload": result["__interrupt__"],
+                "created_at": now,
+                "expires_at": now + self.pending_timeout,
+            }
+        else:
+            self._pending.pop(thread_id, None)
+
+    def purge_expired(self) -> List[str]:
+        """清理过期的待处理中断，返回被清理的 thread_id"""
+        now = time.time()
+        expired = [tid for tid, item in self._pending.items() if item["expires_at"] <= now]
+        for tid in expired:
+            del self._pending[tid]
+        return expired
+
+    def get_pending(self, thread_id: str) -> dict | None:
+        item = self._pending.get(thread_id)
+        if item is not None and item["expires_at"] <= time.time():
+            del self._pending[thread_id]
+            return None
+        return item
+
+    def list_pending(self, limit: int | None = None) -> List[dict]:
+        """批量列出等待人工输入的线程（按中断时间先后）"""
+        self.purge_expired()
+        items = sorted(self._pending.values(), key=lambda x: x["created_at"])
+        if limit:
+            items = items[:limit]
+        return [
+            {
+                "thread_id": item["thread_id"],
+                "checkpoint": item["checkpoint"],
+                "data": item["payload"],
+                "waiting_seconds": round(time.time() - item["created_at"], 1),
+                "expires_in": round(item["expires_at"] - time.time(), 1),
+            }
+            for item in items
+        ]
+
+    async def start(self, thread_id: str, inputs: dict, cfg: dict):
+        """初次执行，可能在人工交互节点中断"""
+        async with self._thread_lock(thread_id):
+            result = await self.graph.ainvoke(inputs, config=cfg)
+            self._record(thread_id, cfg, result)
+            return result
+
+    async def resume(self, thread_id: str, resume, cfg: dict):
+        """从中断点恢复；同一中断只会被恢复一次"""
+        async with self._thread_lock(thread_id):
+            if self.get_pending(thread_id) is None:
+                raise LookupError(f"线程 {thread_id} 没有待处理的中断（可能已被处理或已过期）")
+            # 执行失败时保留登记，允许客户端重试
+            result = await self.graph.ainvoke(Command(resume=resume), config=cfg)
+            self._record(thread_id, cfg, result)
+            return result
@@ -8,8 +8,9 @@ LangGraph Orchestrator-Worker 模式示例
 
 主要特点：
 1. 使用Send API进行动态任务分配
-2. 并行执行多个工作者任务
-3. 状态管理和结果聚合
+2. 并行执行多个工作者任务，同时运行的数量由调用图时的 max_concurrency（MAX_IN_FLIGHT）限制
+3. 单个章节超时（with_timeout）或失败时由节点的 RetryPolicy 单独重试
+4. 每个章节完成即通过 updates 流推送；合成器在所有章节返回后执行
 """
 
 import operator
@@ -19,7 +20,7 @@ from langchain_core.messages import SystemMessage, HumanMessage
 from pydantic import BaseModel, Field
 from langchain_core.runnables import RunnableConfig
 from langgraph.graph import StateGraph, START, END
-from langgraph.types import Send
+from langgraph.types import Send, RetryPolicy
 import os
 from dotenv import load_dotenv
 
@@ -29,6 +30,7 @@ load_dotenv()
 import sys
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 import config
+from map_reduce import with_timeout
 
 # 获取日志器
 logger = config.logger
@@ -45,6 +47,11 @@ llm = ChatOpenAI(
     max_retries=2
 )
 
+# 工作者并发与容错配置：章节很多时避免同时打满模型服务
+MAX_IN_FLIGHT = 4      # 同时运行的章节数（作为 max_concurrency 传给图）
+SECTION_TIMEOUT = 120  # 单个章节的超时时间（秒）
+SECTION_RETRIES = 1    # 单个章节失败/超时后的重试次数
+
 # 定义报告章节的结构化输出模式
 class Section(BaseModel):
     name: str = Field(description="章节名称")
@@ -137,9 +144,10 @@ def synthesizer(state: State):
 
 def assign_workers(state: State):
     """分配工作者：为每个章节创建并行工作者"""
-    print(f"🚀 正在为 {len(state['sections'])} 个章节分配工作者...")
+    print(f"🚀 正在为 {len(state['sections'])} 个章节分配工作者（最多 {MAX_IN_FLIGHT} 个并发）...")
     
     # 使用Send API为每个章节创建并行工作者
+    # 同时运行的工作者数由调用图时 config 中的 max_concurrency 限制
     # todo workstats 与stats 转换
     return [Send("llm_call", {"section": s}) for s in state["sections"]]
 
@@ -160,7 +168,13 @@ def build_orchestrator_worker_graph():
     
     # 添加节点
     orchestrator_worker_builder.add_node("orchestrator", orchestrator)
-    orchestrator_worker_builder.add_node("llm_call", llm_call)
+    # 单个章节超时抛出 WorkerTimeout，超时或失败由 RetryPolicy 重试；
+    # 每个章节是独立任务，配置检查点后已完成章节的结果单独保存，失败恢复时只重跑未完成的章节
+    orchestrator_worker_builder.add_node(
+        "llm_call",
+        with_timeout(llm_call, SECTION_TIMEOUT),
+        retry_policy=RetryPolicy(max_attempts=SECTION_RETRIES + 1)
+    )
     orchestrator_worker_builder.add_node("synthesizer", synthesizer)
     
     # 添加边连接节点
@@ -185,8 +199,22 @@ def create_debug_graph():
     return build_orchestrator_worker_graph()
 
 
+def stream_report(graph, input_state, config=None):
+    """流式执行图：章节完成即打印进度，返回最终状态"""
+    config = {**(config or {}), "max_concurrency": MAX_IN_FLIGHT}
+    final_state = None
+    done = 0
+    for mode, chunk in graph.stream(input_state, config=config, stream_mode=["updates", "values"]):
+        if mode == "values":
+            final_state = chunk
+        elif "llm_call" in chunk:
+            done += 1
+            print(f"📄 第 {done}/{len(final_state['sections'])} 个章节已完成")
+    return final_state
+
+
 def run_simple_example():
-    """运行简化示例（不使用流式输出）"""
+    """运行简化示例（流式打印章节进度）"""
     print("=" * 60)
     print("🚀 LangGraph 协调者-工作者模式简化示例")
     print("=" * 60)
@@ -216,8 +244,7 @@ def run_simple_example():
         # 构建输入状态
         input_state: State = {"topic": topic, "sections": [], "completed_sections": [], "final_report": ""}
         
-        final_state = graph.invoke(input_state, config=config)
-        graph.stream
+        final_state = stream_report(graph, input_state, config=config)
         
         print("\n" + "=" * 60)
         print("📄 最终报告")
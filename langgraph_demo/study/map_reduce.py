@@ -0,0 +1,323 @@
+# -*- coding: utf-8 -*-
+"""
+Map-Reduce 辅助工具
+供 06_mapreduce_demo.py、multi_agent/12-1_协调者工作者.py、langsmith_demo/demo.py 共用
+
+Map 阶段仍然用 Send 为每个条目派发一个 worker 任务，并发、重试和推送交给 LangGraph：
+1. 在途上限：调用图时传 config={"max_concurrency": N}，同时运行的 worker 不超过 N 个
+2. 重试：worker 节点挂 RetryPolicy，失败的条目单独按指数退避重试
+3. 超时：with_timeout 包装 worker，超时抛出 WorkerTimeout，交给 RetryPolicy 重试
+4. 逐个推送：stream_mode="updates" 在每个 worker 完成时发出它的结果，不等整个超步
+5. 每个 worker 是独立任务，有检查点时各自的结果单独写入，失败后恢复只重跑未完成的条目
+
+Reduce 阶段要等 Map 超步的所有 worker 都返回后才开始（超步屏障），最慢的条目决定 Reduce 的开始时间。
+结果太多、拼成一个提示会超出上下文时用 tree_reduce：按 token 预算分批，各批在节点内由
+MapReduceExecutor 有界并发归约，逐层递归直到只剩一个结果。MapReduceExecutor 在一个节点内运行所有条目，
+没有逐条目的检查点，适合这种短小、可整体重做的归约步骤。
+
+注意：线程无法被强制中断，超时的尝试会在后台跑完（结果被丢弃）。
+      with_timeout 的重试会在旧尝试结束前开始，对模型服务的实际并发可能短暂超过 max_concurrency；
+      MapReduceExecutor 把被放弃的尝试计入在途数量，它的并发上限是严格的。
+"""
+
+import time
+from concurrent.futures import FIRST_COMPLETED, Future, wait
+from concurrent.futures import TimeoutError as FutureTimeoutError
+from dataclasses import dataclass, field
+from typing import Any, Callable, Dict, List, Optional, Sequence
+
+from langchain_core.runnables.config import ContextThreadPoolExecutor
+
+import config
+
+logger = config.logger
+
+Event = Dict[str, Any]
+
+
+def _stream_writer() -> Optional[Callable[[Any], None]]:
+    """在 LangGraph 节点内返回 custom 流写入器，否则返回 None"""
+    try:
+        from langgraph.config import get_stream_writer
+        return get_stream_writer()
+    except Exception:
+        return None
+
+
+def _make_emitter(name: str, on_event: Optional[Callable[[Event], None]]) -> Callable[[Event], None]:
+    """事件同时发往 custom 流（若在节点内）和 on_event 回调"""
+    writer = _stream_writer()
+
+    def emit(event: Event) -> None:
+        event.setdefault("name", name)
+        if writer is not None:
+            writer(event)
+        if on_event is not None:
+            on_event(event)
+
+    return emit
+
+
+# ============================================================================
+# Send worker 的超时
+# ============================================================================
+
+class WorkerTimeout(Exception):
+    """
+    worker 超时
+
+    不继承 TimeoutError：它是 OSError 的子类，RetryPolicy 默认的 retry_on 不会重试 OSError
+    """
+
+
+def with_timeout(fn: Callable[[Any], Any], timeout: Optional[float]) -> Callable[[Any], Any]:
+    """
+    包装 Send 的 worker 节点：fn(state) 在单独的线程里执行，超过 timeout 秒抛出 WorkerTimeout
+
+    线程继承调用方的 contextvars，worker 内的 LLM 调用仍出现在 stream_mode="messages" 和追踪里。
+    timeout 为 None 时原样返回 fn。
+    """
+    if timeout is None:
+        return fn
+
+    def worker(state: Any) -> Any:
+        pool = ContextThreadPoolExecutor(max_workers=1, thread_name_prefix=f"worker-{fn.__name__}")
+        try:
+            return pool.submit(fn, state).result(timeout=timeout)
+        except FutureTimeoutError:
+            raise WorkerTimeout(f"{fn.__name__} 超时（>{timeout}s）") from None
+        finally:
+            # 不等待超时的尝试，它结束后线程自行退出
+            pool.shutdown(wait=False)
+
+    worker.__name__ = fn.__name__
+    worker.__doc__ = fn.__doc__
+    return worker
+
+
+# ============================================================================
+# 执行器
+# ============================================================================
+
+@dataclass
+class MapReduceResult:
+    """一次 map-reduce 的结果"""
+    results: List[Any]                           # 按原始顺序的 worker 结果，失败为 None
+    failures: Dict[int, str] = field(default_factory=dict)  # 下标 -> 最后一次错误
+    stats: Dict[str, Any] = field(default_factory=dict)
+
+
+@dataclass
+class _Attempt:
+    index: int
+    attempt: int
+    started: float
+    abandoned: bool = False
+
+
+class MapReduceExecutor:
+    """
+    有界并发、带超时与重试的 map 执行器
+
+    用法（在 LangGraph 节点内）：
+        executor = MapReduceExecutor(max_in_flight=4, timeout=60, retries=1, name="batches")
+        outcome = executor.run(batches, summarize_batch)
+
+    推送的事件（custom 流）：
+        {"type": "map_result", "name", "index", "ok", "attempts", "elapsed", "result" | "error", "done", "total"}
+        {"type": "map_retry", ...}
+    """
+
+    def __init__(self, max_in_flight: int = 4, timeout: Optional[float] = None, retries: int = 0,
+                 backoff: float = 0.5, name: str = "map"):
+        if max_in_flight < 1:
+            raise ValueError("max_in_flight 至少为 1")
+        self.max_in_flight = max_in_flight
+        self.timeout = timeout
+        self.retries = retries
+        self.backoff = backoff
+        self.name = name
+
+    def run(self, items: Sequence[Any], worker: Callable[[Any], Any],
+            on_event: Optional[Callable[[Event], None]] = None,
+            emit_results: bool = True) -> MapReduceResult:
+        """
+        对 items 逐个调用 worker，按完成顺序推送结果
+
+        emit_results=False 时 map_result 事件不携带结果正文（结果很大时使用）
+        """
+        items = list(items)
+        total = len(items)
+        emit = _make_emitter(self.name, on_event)
+
+        results: List[Any] = [None] * total
+        failures: Dict[int, str] = {}
+        attempts = [0] * total
+        queue: List[tuple] = [(0.0, i) for i in range(total)]  # (最早可开始时间, 下标)
+        running: Dict[Future, _Attempt] = {}
+        done_count = 0
+        timeouts = 0
+        peak = 0
+        started = time.perf_counter()
+
+        def finish_item(index: int, ok: bool, payload: Any, elapsed: float) -> None:
+            nonlocal done_count
+            done_count += 1
+            event = {"type": "map_result", "index": index, "ok": ok, "attempts": attempts[index],
+                     "elapsed": round(elapsed, 3), "done": done_count, "total": total}
+            if ok:
+                results[index] = payload
+                if emit_results:
+                    event["result"] = payload
+            else:
+                failures[index] = payload
+                event["error"] = payload
+            emit(event)
+
+        def fail_or_retry(index: int, error: str, elapsed: float) -> None:
+            if attempts[index] <= self.retries:
+                delay = self.backoff * (2 ** (attempts[index] - 1))
+                queue.append((time.perf_counter() + delay, index))
+                logger.warning(f"[{self.name}] 条目 {index} 第 {attempts[index]} 次尝试失败，{delay:.1f}s 后重试: {error}")
+                emit({"type": "map_retry", "index": index, "attempts": attempts[index], "error": error, "delay": delay})
+            else:
+                logger.error(f"[{self.name}] 条目 {index} 最终失败: {error}")
+                finish_item(index, False, error, elapsed)
+
+        pool = ContextThreadPoolExecutor(max_workers=self.max_in_flight, thread_name_prefix=f"mapreduce-{self.name}")
+        try:
+            while done_count < total:
+                now = time.perf_counter()
+                # 补位：在途数（含已放弃但仍在运行的尝试）低于上限时启动可开始的条目
+                queue.sort()
+                while queue and len(running) < self.max_in_flight and queue[0][0] <= now:
+                    _, index = queue.pop(0)
+                    attempts[index] += 1
+                    running[pool.submit(worker, items[index])] = _Attempt(index, attempts[index], now)
+                peak = max(peak, len(running))
+
+                # 等到：有尝试完成 / 最近的超时时刻 / 最近的重试时刻
+                wake_at = [a.started + self.timeout for a in running.values()
+                           if self.timeout is not None and not a.abandoned]
+                if queue and len(running) < self.max_in_flight:
+                    wake_at.append(queue[0][0])
+                wait_for = max(0.0, min(wake_at) - time.perf_counter()) if wake_at else None
+                if running:
+                    completed, _ = wait(list(running), timeout=wait_for, return_when=FIRST_COMPLETED)
+                else:
+                    time.sleep(wait_for or 0)
+                    completed = set()
+
+                for future in completed:
+                    attempt = running.pop(future)
+                    if attempt.abandoned:
+                        continue  # 超时后才返回的结果直接丢弃
+                    elapsed = time.perf_counter() - attempt.started
+                    error = future.exception()
+                    if error is None:
+                        finish_item(attempt.index, True, future.result(), elapsed)
+                    else:
+                        fail_or_retry(attempt.index, f"{type(error).__name__}: {error}", elapsed)
+
+                if self.timeout is not None:
+                    now = time.perf_counter()
+                    for attempt in running.values():
+                        if not attempt.abandoned and now - attempt.started >= self.timeout:
+                            attempt.abandoned = True
+                            timeouts += 1
+                            fail_or_retry(attempt.index, f"超时（>{self.timeout}s）", now - attempt.started)
+        finally:
+            # 不等待被放弃的尝试，它们结束后线程自行退出
+            pool.shutdown(wait=False)
+
+        stats = {
+            "total": total,
+            "succeeded": total - len(failures),
+            "failed": len(failures),
+            "attempts": sum(attempts),
+            "timeouts": timeouts,
+            "peak_in_flight": peak,
+            "elapsed": round(time.perf_counter() - started, 3),
+        }
+        logger.info(f"[{self.name}] map-reduce 完成: {stats}")
+        return MapReduceResult(results, failures, stats)
+
+
+# ============================================================================
+# 树形归约
+# ============================================================================
+
+def plan_batches(token_counts: Sequence[int], token_budget: int) -> List[List[int]]:
+    """
+    按原始顺序把相邻片段装入批次，每批 token 总数不超过 token_budget
+
+    单个片段本身超出预算时独占一批（由归约函数负责压缩）；
+    若因此每批都只有一个片段，则改为两两合并，保证每层片段数至少减半。
+    """
+    batches: List[List[int]] = []
+    current: List[int] = []
+    current_tokens = 0
+    for index, tokens in enumerate(token_counts):
+        if current and current_tokens + tokens > token_budget:
+            batches.append(current)
+            current, current_tokens = [], 0
+        current.append(index)
+        current_tokens += tokens
+    if current:
+        batches.append(current)
+    if len(batches) == len(token_counts) > 1:
+        batches = [list(range(i, min(i + 2, len(token_counts)))) for i in range(0, len(token_counts), 2)]
+    return batches
+
+
+def tree_reduce(parts: Sequence[str], reduce_fn: Callable[[List[str]], str], *,
+                token_budget: int, count_tokens: Optional[Callable[[str], int]] = None,
+                max_in_flight: int = 4, timeout: Optional[float] = None, retries: int = 0,
+                max_levels: int = 8, name: str = "tree_reduce",
+                on_event: Optional[Callable[[Event], None]] = None) -> str:
+    """
+    分层归约：把 parts 按 token 预算分批，各批并行调用 reduce_fn，逐层递归直到只剩一个结果
+
+    reduce_fn(texts) -> str 负责把一批文本归约为一段（如摘要），输入已保证不超过预算（单段超预算时除外）。
+    即使所有片段一次就能装下，也会调用一次 reduce_fn，保证输出形式一致。
+
+    推送的事件：
+        {"type": "tree_reduce_level", "level", "inputs", "batches", "input_tokens"}       每层开始
+        {"type": "tree_reduce_level_done", "level", "outputs", "output_tokens", "elapsed"} 每层结束
+        以及每批的 map_result 事件（name 为 "{name}_l{level}"，不携带结果正文）
+
+    某一批重试后仍失败时抛出 RuntimeError
+    """
+    if not parts:
+        raise ValueError("tree_reduce 至少需要一个片段")
+    if count_tokens is None:
+        from token_counter import TokenCounterService
+        count_tokens = TokenCounterService(config.model).count_text
+
+    emit = _make_emitter(name, on_event)
+    parts = list(parts)
+    level = 0
+    while level == 0 or len(parts) > 1:
+        if level >= max_levels:
+            raise RuntimeError(f"tree_reduce 超过最大层数 {max_levels}，仍剩 {len(parts)} 个片段")
+        level += 1
+        token_counts = [count_tokens(p) for p in parts]
+        batches = plan_batches(token_counts, token_budget)
+        emit({"type": "tree_reduce_level", "level": level, "inputs": len(parts),
+              "batches": len(batches), "input_tokens": sum(token_counts)})
+        logger.info(f"🌲 [{name}] 第 {level} 层: {len(parts)} 段（{sum(token_counts)} tokens）→ {len(batches)} 批")
+
+        started = time.perf_counter()
+        executor = MapReduceExecutor(max_in_flight=max_in_flight, timeout=timeout, retries=retries,
+                                     name=f"{name}_l{level}")
+        outcome = executor.run([[parts[i] for i in batch] for batch in batches], reduce_fn,
+                               on_event=on_event, emit_results=False)
+        if outcome.failures:
+            raise RuntimeError(f"tree_reduce 第 {level} 层有 {len(outcome.failures)} 批归约失败: "
+                               f"{next(iter(outcome.failures.values()))}")
+        parts = outcome.results
+
+        output_tokens = sum(count_tokens(p) for p in parts)
+        emit({"type": "tree_reduce_level_done", "level": level, "outputs": len(parts),
+              "output_tokens": output_tokens, "elapsed": round(time.perf_counter() - started, 3)})
+    return parts[0]
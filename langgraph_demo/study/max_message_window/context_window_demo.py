@@ -14,7 +14,7 @@ LangGraph 上下文最大窗口设置演示
 """
 
 import os
-from typing import Annotated, TypedDict, List
+from typing import Annotated, TypedDict, List, Dict, Optional
 from typing_extensions import TypedDict
 
 # LangGraph 核心组件
@@ -23,10 +23,12 @@ from langgraph.graph.message import add_messages
 from langgraph.checkpoint.memory import InMemorySaver
 
 # LangChain 组件
-from langchain_core.messages import BaseMessage, HumanMessage, AIMessage, SystemMessage
+from langchain_core.messages import BaseMessage, AIMessage
+from langgraph.config import get_config
 from langchain_openai import ChatOpenAI
 
 import config
+from token_window import TokenWindowManager
 
 # 自定义模型配置
 os.environ["OPENAI_API_BASE"] = config.base_url
@@ -55,35 +57,48 @@ class ContextWindowManager:
     上下文窗口管理器
     
     功能说明：
-    1. 管理上下文窗口大小
+    1. 管理上下文窗口大小（消息条数 + 可选的 token 预算）
     2. 提供不同的窗口策略
     3. 动态调整窗口大小
     4. 监控窗口使用情况
+    
+    裁剪由 token_window.TokenWindowManager 增量完成：每条消息的 token 只计算一次，
+    系统消息固定保留，工具调用与工具结果成对进出窗口。
     """
     
-    def __init__(self, max_window_size: int = 10, strategy: str = "sliding_window"):
+    def __init__(self, max_window_size: int = 10, strategy: str = "sliding_window",
+                 max_tokens: Optional[int] = None, tokenizer: str = "auto"):
         """
         初始化窗口管理器
         
         参数：
-            max_window_size: 最大窗口大小
+            max_window_size: 最大窗口大小（消息条数）
             strategy: 窗口策略 ("sliding_window", "fixed_window", "adaptive_window")
+            max_tokens: 窗口 token 上限，None 表示只按条数限制
+            tokenizer: 分词器名称，见 token_window.get_tokenizer
         """
         self.max_window_size = max_window_size
         self.strategy = strategy
+        self.max_tokens = max_tokens
         self.current_window_size = 0
         self.window_history = []
+        self.engine = TokenWindowManager(max_tokens=max_tokens, max_messages=max_window_size, tokenizer=tokenizer)
+        self._last_session = "default"
+        # 自适应策略的压缩副本，按消息 id 缓存，避免每轮重复创建 AIMessage
+        self._compressed: Dict[str, AIMessage] = {}
         
         logger.info(f"🪟 初始化上下文窗口管理器")
         logger.info(f"  • 最大窗口大小: {max_window_size}")
+        logger.info(f"  • 最大 token 数: {max_tokens}")
         logger.info(f"  • 窗口策略: {strategy}")
         
-    def apply_window_strategy(self, messages: List[BaseMessage]) -> List[BaseMessage]:
+    def apply_window_strategy(self, messages: List[BaseMessage], session_id: str = "default") -> List[BaseMessage]:
         """
         应用窗口策略
         
         参数：
             messages: 原始消息列表
+            session_id: 会话标识（通常为 thread_id），每个会话单独维护增量窗口
             
         返回：
             处理后的消息列表
@@ -91,18 +106,19 @@ class ContextWindowManager:
         logger.info(f"🪟 应用窗口策略: {self.strategy}")
         logger.info(f"原始消息数量: {len(messages)}")
         logger.info(f"最大窗口大小: {self.max_window_size}")
+        self._last_session = session_id
         
         if self.strategy == "sliding_window":
-            return self._sliding_window_strategy(messages)
+            return self._sliding_window_strategy(messages, session_id)
         elif self.strategy == "fixed_window":
-            return self._fixed_window_strategy(messages)
+            return self._fixed_window_strategy(messages, session_id)
         elif self.strategy == "adaptive_window":
-            return self._adaptive_window_strategy(messages)
+            return self._adaptive_window_strategy(messages, session_id)
         else:
             logger.warning(f"未知策略: {self.strategy}, 使用默认策略")
-            return self._sliding_window_strategy(messages)
+            return self._sliding_window_strategy(messages, session_id)
     
-    def _sliding_window_strategy(self, messages: List[BaseMessage]) -> List[BaseMessage]:
+    def _sliding_window_strategy(self, messages: List[BaseMessage], session_id: str) -> List[BaseMessage]:
         """
         滑动窗口策略 - 保留最近的N条消息
         
@@ -113,23 +129,20 @@ class ContextWindowManager:
         """
         logger.info("📊 应用滑动窗口策略")
         
-        if len(messages) <= self.max_window_size:
-            self.current_window_size = len(messages)
-            logger.info(f"消息数量在窗口范围内，无需处理")
-            return messages
-        
-        # 保留最近的N条消息
-        recent_messages = messages[-self.max_window_size:]
+        recent_messages = self.engine.apply(messages, session_id)
         self.current_window_size = len(recent_messages)
         
         # 记录被丢弃的消息数量
         discarded_count = len(messages) - len(recent_messages)
-        logger.info(f"保留最近 {len(recent_messages)} 条消息")
-        logger.info(f"丢弃 {discarded_count} 条旧消息")
+        if discarded_count == 0:
+            logger.info(f"消息数量在窗口范围内，无需处理")
+        else:
+            logger.info(f"保留最近 {len(recent_messages)} 条消息")
+            logger.info(f"丢弃 {discarded_count} 条旧消息")
         
         return recent_messages
     
-    def _fixed_window_strategy(self, messages: List[BaseMessage]) -> List[BaseMessage]:
+    def _fixed_window_strategy(self, messages: List[BaseMessage], session_id: str) -> List[BaseMessage]:
         """
         固定窗口策略 - 严格限制窗口大小
         
@@ -140,20 +153,16 @@ class ContextWindowManager:
         """
         logger.info("🔒 应用固定窗口策略")
         
-        if len(messages) <= self.max_window_size:
-            self.current_window_size = len(messages)
-            return messages
-        
-        # 严格截断到最大窗口大小
-        fixed_messages = messages[-self.max_window_size:]
+        fixed_messages = self.engine.apply(messages, session_id)
         self.current_window_size = len(fixed_messages)
         
-        logger.info(f"固定窗口大小: {len(fixed_messages)}")
-        logger.info(f"截断 {len(messages) - len(fixed_messages)} 条消息")
+        if len(fixed_messages) < len(messages):
+            logger.info(f"固定窗口大小: {len(fixed_messages)}")
+            logger.info(f"截断 {len(messages) - len(fixed_messages)} 条消息")
         
         return fixed_messages
     
-    def _adaptive_window_strategy(self, messages: List[BaseMessage]) -> List[BaseMessage]:
+    def _adaptive_window_strategy(self, messages: List[BaseMessage], session_id: str) -> List[BaseMessage]:
         """
         自适应窗口策略 - 根据消息重要性动态调整
         
@@ -164,50 +173,49 @@ class ContextWindowManager:
         """
         logger.info("🧠 应用自适应窗口策略")
         
+        window = self.engine.apply(messages, session_id)
         if len(messages) <= self.max_window_size:
-            self.current_window_size = len(messages)
-            return messages
+            self.current_window_size = len(window)
+            return window
         
-        # 分析消息重要性
+        # 系统消息、用户消息、长回复和带工具调用的回复原样保留；短回复使用压缩副本
         important_messages = []
-        
-        for msg in messages:
-            if isinstance(msg, SystemMessage):
-                # 系统消息很重要，保留
+        for msg in window:
+            if isinstance(msg, AIMessage) and not msg.tool_calls and len(msg.content) <= 100:
+                important_messages.append(self._compress(msg))
+            else:
                 important_messages.append(msg)
-            elif isinstance(msg, HumanMessage):
-                # 用户消息很重要，保留
-                important_messages.append(msg)
-            elif isinstance(msg, AIMessage):
-                # AI消息根据长度判断重要性
-                if len(msg.content) > 100:
-                    # 长回复很重要，保留
-                    important_messages.append(msg)
-                else:
-                    # 短回复可以压缩
-                    compressed_content = msg.content[:50] + "..." if len(msg.content) > 50 else msg.content
-                    compressed_msg = AIMessage(content=compressed_content)
-                    important_messages.append(compressed_msg)
-        
-        # 如果重要消息仍然超过窗口大小，使用滑动窗口
-        if len(important_messages) > self.max_window_size:
-            important_messages = important_messages[-self.max_window_size:]
         
         self.current_window_size = len(important_messages)
         logger.info(f"自适应窗口大小: {len(important_messages)}")
         
         return important_messages
     
-    def get_window_stats(self) -> dict:
+    def _compress(self, msg: AIMessage) -> AIMessage:
+        """返回短回复的压缩版本（每条消息只创建一次）"""
+        if len(msg.content) <= 50:
+            return msg
+        text = msg.content[:50] + "..."
+        compressed = self._compressed.get(msg.id) if msg.id else None
+        if compressed is None or compressed.content != text:
+            # 同一 id 的消息被替换过时重新生成
+            compressed = AIMessage(content=text, id=msg.id)
+            if msg.id:
+                self._compressed[msg.id] = compressed
+        return compressed
+    
+    def get_window_stats(self, session_id: Optional[str] = None) -> dict:
         """
         获取窗口统计信息
         """
-        return {
+        stats = {
             "max_window_size": self.max_window_size,
             "current_window_size": self.current_window_size,
             "strategy": self.strategy,
             "utilization_rate": self.current_window_size / self.max_window_size if self.max_window_size > 0 else 0
         }
+        stats.update(self.engine.stats(session_id or self._last_session))
+        return stats
 
 # ============================================================================
 # 聊天机器人节点 - 支持窗口管理
@@ -231,11 +239,13 @@ def create_window_managed_chatbot(window_manager: ContextWindowManager = None):
         
         # 应用窗口策略
         if window_manager:
-            messages = window_manager.apply_window_strategy(messages)
+            # 会话 id 取自运行配置；调用方未传 configurable 时使用默认会话
+            session_id = get_config().get("configurable", {}).get("thread_id", "default")
+            messages = window_manager.apply_window_strategy(messages, session_id)
             logger.info(f"窗口处理后消息数量: {len(messages)}")
             
             # 显示窗口统计信息
-            stats = window_manager.get_window_stats()
+            stats = window_manager.get_window_stats(session_id)
             logger.info(f"窗口统计: {stats}")
         
         # 初始化聊天模型
@@ -408,9 +418,9 @@ def demonstrate_window_strategies():
     
     # 创建不同的窗口策略
     strategies = {
-        "滑动窗口": ContextWindowManager(max_window_size=8, strategy="sliding_window"),
-        "固定窗口": ContextWindowManager(max_window_size=8, strategy="fixed_window"),
-        "自适应窗口": ContextWindowManager(max_window_size=8, strategy="adaptive_window")
+        "滑动窗口": ContextWindowManager(max_window_size=8, strategy="sliding_window", max_tokens=2000),
+        "固定窗口": ContextWindowManager(max_window_size=8, strategy="fixed_window", max_tokens=2000),
+        "自适应窗口": ContextWindowManager(max_window_size=8, strategy="adaptive_window", max_tokens=2000)
     }
     
     # 测试每种策略
@@ -12,7 +12,7 @@ LangGraph 上下文最大窗口设置 - 简化示例
 """
 
 import os
-from typing import Annotated, TypedDict, List
+from typing import Annotated, TypedDict, List, Optional
 from typing_extensions import TypedDict
 
 # LangGraph 核心组件
@@ -22,9 +22,11 @@ from langgraph.checkpoint.memory import InMemorySaver
 
 # LangChain 组件
 from langchain_core.messages import BaseMessage, HumanMessage, AIMessage
+from langgraph.config import get_config
 from langchain_openai import ChatOpenAI
 
 import config
+from token_window import TokenWindowManager
 
 # 自定义模型配置
 os.environ["OPENAI_API_BASE"] = config.base_url
@@ -53,27 +55,31 @@ class SimpleWindowManager:
     简化的上下文窗口管理器
     
     功能说明：
-    1. 设置最大窗口大小
-    2. 保留最近的N条消息
-    3. 丢弃超出窗口的消息
+    1. 设置最大窗口大小（消息条数，可选 token 上限）
+    2. 保留最近的N条消息，系统消息始终保留
+    3. 丢弃超出窗口的消息，工具调用与工具结果成对丢弃
     """
     
-    def __init__(self, max_window_size: int = 10):
+    def __init__(self, max_window_size: int = 10, max_tokens: Optional[int] = None):
         """
         初始化窗口管理器
         
         参数：
             max_window_size: 最大窗口大小（保留最近的消息数量）
+            max_tokens: 窗口 token 上限，None 表示只按条数限制
         """
         self.max_window_size = max_window_size
-        logger.info(f"🪟 设置上下文最大窗口: {max_window_size}")
+        self.max_tokens = max_tokens
+        self.engine = TokenWindowManager(max_tokens=max_tokens, max_messages=max_window_size)
+        logger.info(f"🪟 设置上下文最大窗口: {max_window_size}，token 上限: {max_tokens}")
         
-    def apply_window(self, messages: List[BaseMessage]) -> List[BaseMessage]:
+    def apply_window(self, messages: List[BaseMessage], session_id: str = "default") -> List[BaseMessage]:
         """
         应用窗口限制
         
         参数：
             messages: 原始消息列表
+            session_id: 会话标识（通常为 thread_id）
             
         返回：
             处理后的消息列表（不超过最大窗口大小）
@@ -81,17 +87,15 @@ class SimpleWindowManager:
         logger.info(f"📊 原始消息数量: {len(messages)}")
         logger.info(f"🪟 最大窗口大小: {self.max_window_size}")
         
-        # 如果消息数量在窗口范围内，直接返回
-        if len(messages) <= self.max_window_size:
-            logger.info(f"✅ 消息数量在窗口范围内，无需处理")
-            return messages
-        
-        # 保留最近的N条消息
-        recent_messages = messages[-self.max_window_size:]
+        # 增量更新窗口：只统计新消息的 token，从队首弹出超出部分
+        recent_messages = self.engine.apply(messages, session_id)
         discarded_count = len(messages) - len(recent_messages)
         
-        logger.info(f"📝 保留最近 {len(recent_messages)} 条消息")
-        logger.info(f"🗑️ 丢弃 {discarded_count} 条旧消息")
+        if discarded_count == 0:
+            logger.info(f"✅ 消息数量在窗口范围内，无需处理")
+        else:
+            logger.info(f"📝 保留最近 {len(recent_messages)} 条消息")
+            logger.info(f"🗑️ 丢弃 {discarded_count} 条旧消息")
         
         return recent_messages
 
@@ -116,7 +120,9 @@ def create_window_chatbot(window_manager: SimpleWindowManager = None):
         
         # 应用窗口限制
         if window_manager:
-            messages = window_manager.apply_window(messages)
+            # 会话 id 取自运行配置；调用方未传 configurable 时使用默认会话
+            session_id = get_config().get("configurable", {}).get("thread_id", "default")
+            messages = window_manager.apply_window(messages, session_id)
             logger.info(f"窗口处理后消息数量: {len(messages)}")
         
         # 初始化聊天模型
@@ -0,0 +1,305 @@
+# -*- coding: utf-8 -*-
+"""
+按 token 计算的增量上下文窗口
+
+供 context_window_demo.py / simple_window_demo.py 共用
+
+设计要点：
+1. 每条消息的 token 数按消息 id 缓存，同一条消息只计算一次
+2. 每个会话维护一个前缀和队列：新消息只追加到队尾，超出预算时从队首弹出，整体摊还 O(1)
+3. 系统消息固定保留（pinned），其 token 先从预算中扣除
+4. 带 tool_calls 的 AI 消息与其后的 ToolMessage 作为一个整体进出窗口，不会出现孤立的工具结果
+5. 分词器可插拔：register_tokenizer 注册，get_tokenizer 按名称加载且只加载一次；
+   内置分词器的加载与估算都来自 ../token_counter.py，两处共用同一份实现
+6. start_on_human：窗口首条非系统消息总是用户消息；仅剩的单元也不是以用户消息开头时，
+   回退到它之前最近的一条用户消息（此时可能超出预算，会记录警告）
+"""
+
+import json
+from collections import OrderedDict, deque
+from typing import Callable, Deque, Dict, List, Optional, Tuple
+
+from langchain_core.messages import AIMessage, BaseMessage, HumanMessage, SystemMessage, ToolMessage
+
+import config
+from token_counter import approx_count, get_encoder, load_tiktoken_encoder
+
+logger = config.logger
+
+Tokenizer = Callable[[str], int]
+
+# ============================================================================
+# 分词器注册表
+# ============================================================================
+
+_TOKENIZER_FACTORIES: Dict[str, Callable[[], Tokenizer]] = {}
+_TOKENIZERS: Dict[str, Tokenizer] = {}
+
+
+def register_tokenizer(name: str):
+    """注册分词器工厂（装饰器），工厂在首次使用时调用一次"""
+    def decorator(factory: Callable[[], Tokenizer]) -> Callable[[], Tokenizer]:
+        _TOKENIZER_FACTORIES[name] = factory
+        _TOKENIZERS.pop(name, None)
+        return factory
+    return decorator
+
+
+def get_tokenizer(name: str = "auto") -> Tokenizer:
+    """
+    按名称获取分词器
+
+    "auto" 按 config.model 的模型家族选择（本地 tokenizer.json → tiktoken → 近似估算），
+    与 token_counter.TokenCounterService 共用同一份已加载的分词器
+    """
+    tokenizer = _TOKENIZERS.get(name)
+    if tokenizer is not None:
+        return tokenizer
+    if name == "auto":
+        _, encode = get_encoder(config.model)
+        tokenizer = lambda text: encode([text])[0]
+    else:
+        factory = _TOKENIZER_FACTORIES.get(name)
+        if factory is None:
+            raise ValueError(f"未注册的分词器: {name}")
+        tokenizer = factory()
+    _TOKENIZERS[name] = tokenizer
+    return tokenizer
+
+
+@register_tokenizer("approx")
+def _approx_tokenizer() -> Tokenizer:
+    """近似估算：中日韩字符按 1 个 token，其余按 4 个字符 1 个 token"""
+    return approx_count
+
+
+@register_tokenizer("tiktoken")
+def _tiktoken_tokenizer() -> Tokenizer:
+    encode = load_tiktoken_encoder()
+    if encode is None:
+        raise RuntimeError("tiktoken 不可用")
+    return lambda text: encode([text])[0]
+
+
+# ============================================================================
+# 消息 token 计数（按 id 缓存）
+# ============================================================================
+
+class MessageTokenCounter:
+    """
+    消息级 token 计数器：按消息 id 缓存结果，没有 id 的消息每次现算
+
+    缓存同时记录消息内容的签名，同一 id 的消息被替换（内容变化）时重新计数
+    """
+
+    def __init__(self, tokenizer: "str | Tokenizer" = "auto", per_message_overhead: int = 4, cache_size: int = 50000):
+        self.tokenizer = get_tokenizer(tokenizer) if isinstance(tokenizer, str) else tokenizer
+        self.per_message_overhead = per_message_overhead
+        self.cache_size = cache_size
+        # 消息 id -> (内容签名, token 数)
+        self._cache: "OrderedDict[str, Tuple[int, int]]" = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def signature(message: BaseMessage) -> int:
+        """消息类型 + 内容 + 工具调用的签名；str 的哈希值会缓存在对象上，重复计算几乎没有开销"""
+        content = message.content
+        if not isinstance(content, str):
+            content = json.dumps(content, ensure_ascii=False, sort_keys=True, default=str)
+        tool_calls = getattr(message, "tool_calls", None)
+        if tool_calls:
+            return hash((message.type, content, json.dumps(tool_calls, ensure_ascii=False, sort_keys=True, default=str)))
+        return hash((message.type, content))
+
+    def count(self, message: BaseMessage) -> int:
+        msg_id = message.id
+        if msg_id is not None:
+            signature = self.signature(message)
+            cached = self._cache.get(msg_id)
+            if cached is not None and cached[0] == signature:
+                self.hits += 1
+                self._cache.move_to_end(msg_id)
+                return cached[1]
+        self.misses += 1
+        tokens = self._count_uncached(message)
+        if msg_id is not None:
+            self._cache[msg_id] = (signature, tokens)
+            self._cache.move_to_end(msg_id)
+            if len(self._cache) > self.cache_size:
+                self._cache.popitem(last=False)
+        return tokens
+
+    def _count_uncached(self, message: BaseMessage) -> int:
+        content = message.content
+        if not isinstance(content, str):
+            content = json.dumps(content, ensure_ascii=False)
+        tokens = self.tokenizer(content) + self.per_message_overhead
+        tool_calls = getattr(message, "tool_calls", None)
+        if tool_calls:
+            tokens += self.tokenizer(json.dumps(tool_calls, ensure_ascii=False, default=str))
+        return tokens
+
+
+# ============================================================================
+# 单个会话的增量窗口
+# ============================================================================
+
+class TokenWindow:
+    """
+    单个会话的滑动窗口
+
+    _units 中每个元素是一个不可拆分的消息单元（普通消息，或 AI 工具调用 + 其工具结果），
+    记录 (截至该单元末尾的累计 token, 累计消息数, 单元首条消息下标)。
+    窗口 token 数 = 总累计 - 已弹出部分的累计，因此追加与弹出都是 O(1)。
+    """
+
+    def __init__(self, counter: MessageTokenCounter, max_tokens: Optional[int] = None,
+                 max_messages: Optional[int] = None, start_on_human: bool = True):
+        self.counter = counter
+        self.max_tokens = max_tokens
+        self.max_messages = max_messages
+        self.start_on_human = start_on_human
+        self._reset()
+
+    def _reset(self) -> None:
+        self._units: Deque[Tuple[int, int, int]] = deque()
+        self._total_tokens = 0
+        self._total_messages = 0
+        self._base_tokens = 0
+        self._base_messages = 0
+        self._pinned: List[int] = []
+        self._pinned_tokens = 0
+        self._pending_tool_ids: set = set()
+        self._synced = 0
+        self._last_message: Optional[BaseMessage] = None
+        self._last_signature: Optional[int] = None
+
+    @property
+    def window_tokens(self) -> int:
+        return self._total_tokens - self._base_tokens + self._pinned_tokens
+
+    @property
+    def window_messages(self) -> int:
+        return self._total_messages - self._base_messages + len(self._pinned)
+
+    def apply(self, messages: List[BaseMessage]) -> List[BaseMessage]:
+        """同步新增消息、按预算裁剪，返回窗口内的消息（固定的系统消息在前）"""
+        in_sync = self._synced <= len(messages) and (
+            self._synced == 0 or self._is_last_synced(messages[self._synced - 1])
+        )
+        if not in_sync:
+            # 历史被改写（如 RemoveMessage），退化为一次全量重建
+            self._reset()
+        for index in range(self._synced, len(messages)):
+            self._push(index, messages[index])
+        self._synced = len(messages)
+        self._last_message = messages[-1] if messages else None
+        self._last_signature = self.counter.signature(messages[-1]) if messages else None
+        self._trim(messages)
+
+        start = self._units[0][2] if self._units else len(messages)
+        if self.start_on_human and start < len(messages) and not isinstance(messages[start], HumanMessage):
+            start = self._latest_human_before(messages, start)
+        window = [messages[i] for i in self._pinned]
+        window.extend(m for m in messages[start:] if not isinstance(m, SystemMessage))
+        return window
+
+    def _is_last_synced(self, message: BaseMessage) -> bool:
+        """
+        判断 message 是否仍是上次同步的最后一条消息：同一对象直接通过；
+        否则要求 id 相同且内容签名一致（没有 id 的消息只比较内容），同 id 替换视为历史改写
+        """
+        if message is self._last_message:
+            return True
+        return (self._last_message is not None and message.id == self._last_message.id
+                and self.counter.signature(message) == self._last_signature)
+
+    @staticmethod
+    def _latest_human_before(messages: List[BaseMessage], start: int) -> int:
+        """
+        仅剩的单元不以用户消息开头（例如预算只容得下工具调用那一段）时，
+        窗口回退到它之前最近的一条用户消息，避免以 AI / 工具消息开头被模型接口拒绝
+        """
+        for index in range(start - 1, -1, -1):
+            if isinstance(messages[index], HumanMessage):
+                logger.warning(f"窗口回退到第 {index} 条用户消息开始，可能超出预算")
+                return index
+        return start
+
+    def _push(self, index: int, message: BaseMessage) -> None:
+        tokens = self.counter.count(message)
+        if isinstance(message, SystemMessage):
+            self._pinned.append(index)
+            self._pinned_tokens += tokens
+            return
+        self._total_tokens += tokens
+        self._total_messages += 1
+        if isinstance(message, ToolMessage) and message.tool_call_id in self._pending_tool_ids and self._units:
+            # 工具结果并入发起调用的单元
+            self._pending_tool_ids.discard(message.tool_call_id)
+            self._units[-1] = (self._total_tokens, self._total_messages, self._units[-1][2])
+            return
+        self._units.append((self._total_tokens, self._total_messages, index))
+        tool_calls = getattr(message, "tool_calls", None) if isinstance(message, AIMessage) else None
+        self._pending_tool_ids = {call["id"] for call in tool_calls if call.get("id")} if tool_calls else set()
+
+    def _pop(self) -> None:
+        end_tokens, end_messages, _ = self._units.popleft()
+        self._base_tokens = end_tokens
+        self._base_messages = end_messages
+
+    def _trim(self, messages: List[BaseMessage]) -> None:
+        # 始终保留最后一个单元（当前这轮输入），即使它本身超出预算
+        if self.max_tokens is not None:
+            budget = self.max_tokens - self._pinned_tokens
+            while len(self._units) > 1 and self._total_tokens - self._base_tokens > budget:
+                self._pop()
+            if self._total_tokens - self._base_tokens > budget:
+                logger.warning(f"最新一轮消息已超出 token 预算: {self.window_tokens} > {self.max_tokens}")
+        if self.max_messages is not None:
+            budget = self.max_messages - len(self._pinned)
+            while len(self._units) > 1 and self._total_messages - self._base_messages > budget:
+                self._pop()
+        if self.start_on_human:
+            # 窗口首条非系统消息应为用户消息
+            while len(self._units) > 1 and not isinstance(messages[self._units[0][2]], HumanMessage):
+                self._pop()
+
+
+# ============================================================================
+# 多会话管理
+# ============================================================================
+
+class TokenWindowManager:
+    """按会话（thread_id）维护 TokenWindow，所有会话共享一个 token 计数缓存"""
+
+    def __init__(self, max_tokens: Optional[int] = None, max_messages: Optional[int] = None,
+                 tokenizer: "str | Tokenizer" = "auto", start_on_human: bool = True):
+        self.max_tokens = max_tokens
+        self.max_messages = max_messages
+        self.start_on_human = start_on_human
+        self.counter = MessageTokenCounter(tokenizer)
+        self._sessions: Dict[str, TokenWindow] = {}
+
+    def session(self, session_id: str = "default") -> TokenWindow:
+        window = self._sessions.get(session_id)
+        if window is None:
+            window = self._sessions[session_id] = TokenWindow(
+                self.counter, self.max_tokens, self.max_messages, self.start_on_human
+            )
+        return window
+
+    def apply(self, messages: List[BaseMessage], session_id: str = "default") -> List[BaseMessage]:
+        return self.session(session_id).apply(messages)
+
+    def stats(self, session_id: str = "default") -> dict:
+        window = self.session(session_id)
+        return {
+            "window_tokens": window.window_tokens,
+            "window_messages": window.window_messages,
+            "max_tokens": self.max_tokens,
+            "max_messages": self.max_messages,
+            "token_cache_hits": self.counter.hits,
+            "token_cache_misses": self.counter.misses,
+        }
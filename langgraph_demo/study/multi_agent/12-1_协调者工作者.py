@@ -8,8 +8,10 @@ LangGraph Orchestrator-Worker 模式示例
 
 主要特点：
 1. 使用Send API进行动态任务分配
-2. 并行执行多个工作者任务
-3. 状态管理和结果聚合
+2. 并行执行多个工作者任务，同时运行的数量由调用图时的 max_concurrency（MAX_IN_FLIGHT）限制
+3. 单个章节超时（with_timeout）或失败时由节点的 RetryPolicy 单独重试
+4. 每个章节完成即通过 updates 流推送；合成器在所有章节返回后执行
+5. 报告总结按 token 预算分层归约（tree_reduce），章节再多也不会超出单次调用的上下文
 """
 
 import operator
@@ -18,12 +20,13 @@ from langchain_openai import ChatOpenAI
 from langchain_core.messages import SystemMessage, HumanMessage
 from langchain_core.pydantic_v1 import BaseModel, Field
 from langgraph.graph import StateGraph, START, END
-from langgraph.types import Send
+from langgraph.types import Send, RetryPolicy
 import os
 
 import sys
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 import config
+from map_reduce import with_timeout, tree_reduce
 
 # 获取日志器
 logger = config.logger
@@ -41,6 +44,13 @@ llm = ChatOpenAI(
     max_tokens=1000   # 限制输出长度
 )
 
+# 工作者并发与容错配置：章节很多时避免同时打满模型服务
+MAX_IN_FLIGHT = 4      # 同时运行的章节数（作为 max_concurrency 传给图）
+SECTION_TIMEOUT = 120  # 单个章节的超时时间（秒）
+SECTION_RETRIES = 1    # 单个章节失败/超时后的重试次数
+SECTION_SEPARATOR = "\n\n---\n\n"
+SUMMARY_TOKEN_BUDGET = 3000  # 报告总结时单次归约调用的输入 token 上限
+
 # 定义报告章节的结构化输出模式
 class Section(BaseModel):
     name: str = Field(description="章节名称")
@@ -91,27 +101,51 @@ def llm_call(state: WorkerState):
     print(f"✅ 章节 '{section.name}' 撰写完成")
     return {"completed_sections": [section_content.content]}
 
+def summarize_batch(texts: List[str]) -> str:
+    """归约函数：把一批章节（或下一层的摘要）压缩为一段总结"""
+    response = llm.invoke([
+        SystemMessage(content="你是一个专业的报告编辑。请把下面的多段内容归纳为一段精炼的总结，保留关键结论、数据和建议，不要逐段复述。"),
+        HumanMessage(content=SECTION_SEPARATOR.join(texts))
+    ])
+    return response.content
+
 def synthesizer(state: State):
-    """合成器：整合完整报告"""
+    """合成器：整合完整报告，总结部分分层归约生成"""
     print("🔗 合成器正在整合所有章节...")
     
     # 获取所有完成的章节
     completed_sections = state["completed_sections"]
     
     # 格式化章节内容
-    completed_report_sections = "\n\n---\n\n".join(completed_sections)
+    completed_report_sections = SECTION_SEPARATOR.join(completed_sections)
+    
+    # 分层归约生成报告总结：按 token 预算分批并行总结，逐层合并直到只剩一段
+    try:
+        summary = tree_reduce(
+            completed_sections,
+            summarize_batch,
+            token_budget=SUMMARY_TOKEN_BUDGET,
+            max_in_flight=MAX_IN_FLIGHT,
+            timeout=SECTION_TIMEOUT,
+            retries=SECTION_RETRIES,
+            name="summary"
+        )
+    except Exception as e:
+        print(f"⚠️ 报告总结生成失败，使用默认总结: {e}")
+        summary = f"本报告涵盖了关于 {state['topic']} 的全面分析，包含 {len(completed_sections)} 个主要章节。"
     
     # 添加报告标题和总结
-    final_report = f"# {state['topic']}\n\n{completed_report_sections}\n\n---\n\n## 报告总结\n\n本报告涵盖了关于 {state['topic']} 的全面分析，包含 {len(completed_sections)} 个主要章节。"
+    final_report = f"# {state['topic']}\n\n{completed_report_sections}\n\n---\n\n## 报告总结\n\n{summary}"
     
     print("🎉 报告整合完成！")
     return {"final_report": final_report}
 
 def assign_workers(state: State):
     """分配工作者：为每个章节创建并行工作者"""
-    print(f"🚀 正在为 {len(state['sections'])} 个章节分配工作者...")
+    print(f"🚀 正在为 {len(state['sections'])} 个章节分配工作者（最多 {MAX_IN_FLIGHT} 个并发）...")
     
     # 使用Send API为每个章节创建并行工作者
+    # 同时运行的工作者数由调用图时 config 中的 max_concurrency 限制
     # todo workstats 与stats 转换
     return [Send("llm_call", {"section": s}) for s in state["sections"]]
 
@@ -132,7 +166,13 @@ def build_orchestrator_worker_graph():
     
     # 添加节点
     orchestrator_worker_builder.add_node("orchestrator", orchestrator)
-    orchestrator_worker_builder.add_node("llm_call", llm_call)
+    # 单个章节超时抛出 WorkerTimeout，超时或失败由 RetryPolicy 重试；
+    # 每个章节是独立任务，配置检查点后已完成章节的结果单独保存，失败恢复时只重跑未完成的章节
+    orchestrator_worker_builder.add_node(
+        "llm_call",
+        with_timeout(llm_call, SECTION_TIMEOUT),
+        retry_policy=RetryPolicy(max_attempts=SECTION_RETRIES + 1)
+    )
     orchestrator_worker_builder.add_node("synthesizer", synthesizer)
     
     # 添加边连接节点
@@ -152,8 +192,27 @@ def build_orchestrator_worker_graph():
     return graph
 
 
+def stream_report(graph, input_state, config=None):
+    """流式执行图：章节完成即打印进度，返回最终状态"""
+    config = {**(config or {}), "max_concurrency": MAX_IN_FLIGHT}
+    final_state = None
+    done = 0
+    for mode, chunk in graph.stream(input_state, config=config, stream_mode=["updates", "custom", "values"]):
+        if mode == "values":
+            final_state = chunk
+        elif mode == "updates":
+            if "llm_call" in chunk:
+                done += 1
+                print(f"📄 第 {done} 个章节已完成")
+        elif chunk.get("type") == "tree_reduce_level":
+            print(f"🌲 总结第 {chunk['level']} 层: {chunk['inputs']} 段 → {chunk['batches']} 批（{chunk['input_tokens']} tokens）")
+        elif chunk.get("type") == "tree_reduce_level_done":
+            print(f"🌲 总结第 {chunk['level']} 层完成，剩余 {chunk['outputs']} 段，耗时 {chunk['elapsed']}s")
+    return final_state
+
+
 def run_simple_example():
-    """运行简化示例（不使用流式输出）"""
+    """运行简化示例（流式打印章节进度）"""
     print("=" * 60)
     print("🚀 LangGraph 协调者-工作者模式简化示例")
     print("=" * 60)
@@ -168,7 +227,7 @@ def run_simple_example():
     
     # 执行图
     try:
-        final_state = graph.invoke({"topic": topic})
+        final_state = stream_report(graph, {"topic": topic})
         
         print("\n" + "=" * 60)
         print("📄 最终报告")
@@ -15,15 +15,18 @@ LangGraph Supervisor-Worker 模式示例 (使用 langgraph-supervisor 库)
 # todo https://github.com/langchain-ai/langgraph-supervisor-py
 import os
 import sys
+import time
 from langchain_openai import ChatOpenAI
 from langgraph_supervisor import create_supervisor, create_handoff_tool
 from langgraph.prebuilt import create_react_agent
-from langchain_core.tools import tool
 from langchain_core.messages import HumanMessage
 
 # 添加路径以导入配置
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 import config
+# 工具统一由共享工具运行时提供（async 实现、并发执行、TTL 缓存、超时与并发限制）
+# 见 shared_tools.py / ../tool_runtime.py
+from shared_tools import agent_tools, tool_runtime
 
 # 设置环境变量
 os.environ["OPENAI_API_BASE"] = config.base_url
@@ -36,63 +39,11 @@ model = ChatOpenAI(
     max_tokens=1000
 )
 
-# 定义工具函数
-@tool
-def get_weather(location: str) -> str:
-    """获取指定地点的天气信息"""
-    weather_data = {
-        "北京": "晴天，温度25°C，湿度60%",
-        "上海": "多云，温度28°C，湿度70%",
-        "广州": "雨天，温度30°C，湿度80%",
-        "深圳": "晴天，温度29°C，湿度65%",
-        "杭州": "多云，温度26°C，湿度65%",
-        "成都": "阴天，温度24°C，湿度70%"
-    }
-    return weather_data.get(location, f"无法获取{location}的天气信息")
-
-@tool
-def calculate_math(expression: str) -> str:
-    """计算数学表达式"""
-    try:
-        # 安全的数学表达式计算
-        allowed_chars = set('0123456789+-*/(). ')
-        if all(c in allowed_chars for c in expression):
-            result = eval(expression)
-            return f"计算结果: {expression} = {result}"
-        else:
-            return "表达式包含不允许的字符"
-    except Exception as e:
-        return f"计算错误: {str(e)}"
-
-@tool
-def search_web(query: str) -> str:
-    """搜索网络信息"""
-    search_results = {
-        "人工智能": "人工智能是计算机科学的一个分支，致力于创建能够执行通常需要人类智能的任务的系统。主要技术包括机器学习、深度学习、自然语言处理等。",
-        "机器学习": "机器学习是人工智能的一个子集，它使计算机能够在没有明确编程的情况下学习和改进。主要算法包括监督学习、无监督学习、强化学习等。",
-        "深度学习": "深度学习是机器学习的一个分支，使用多层神经网络来模拟人脑的学习过程。在图像识别、语音识别、自然语言处理等领域取得了突破性进展。",
-        "自然语言处理": "自然语言处理是人工智能的一个重要分支，致力于让计算机理解、解释和生成人类语言。应用包括机器翻译、情感分析、问答系统等。",
-        "计算机视觉": "计算机视觉是人工智能的一个分支，致力于让计算机理解和分析视觉信息。应用包括图像识别、目标检测、人脸识别等。"
-    }
-    return search_results.get(query, f"未找到关于'{query}'的相关信息")
-
-@tool
-def get_company_info(company: str) -> str:
-    """获取公司信息"""
-    company_data = {
-        "苹果公司": "苹果公司（Apple Inc.）是一家总部位于美国加利福尼亚州的跨国科技公司，主要产品包括iPhone、iPad、Mac、Apple Watch等。",
-        "谷歌": "谷歌（Google）是Alphabet公司的子公司，是全球最大的搜索引擎公司，主要业务包括搜索、广告、云计算、人工智能等。",
-        "微软": "微软公司（Microsoft Corporation）是一家总部位于美国的跨国科技公司，主要产品包括Windows操作系统、Office办公软件、Azure云服务等。",
-        "亚马逊": "亚马逊（Amazon）是全球最大的电子商务公司之一，业务涵盖电商、云计算、人工智能、物流等多个领域。",
-        "特斯拉": "特斯拉（Tesla）是一家专注于电动汽车、能源存储和太阳能板的公司，致力于推动可持续能源的发展。"
-    }
-    return company_data.get(company, f"未找到关于'{company}'的公司信息")
-
 # 创建专门的智能体
 def create_research_agent():
     """创建研究智能体"""
     print("🔍 创建研究智能体...")
-    research_tools = [search_web, get_company_info]
+    research_tools = agent_tools(["search_web", "get_company_info"])
     return create_react_agent(
         model=model,
         tools=research_tools,
@@ -103,7 +54,7 @@ def create_research_agent():
 def create_math_agent():
     """创建数学智能体"""
     print("🧮 创建数学智能体...")
-    math_tools = [calculate_math]
+    math_tools = agent_tools(["calculate_math"])
     return create_react_agent(
         model=model,
         tools=math_tools,
@@ -114,7 +65,7 @@ def create_math_agent():
 def create_weather_agent():
     """创建天气智能体"""
     print("🌤️ 创建天气智能体...")
-    weather_tools = [get_weather]
+    weather_tools = agent_tools(["get_weather"])
     return create_react_agent(
         model=model,
         tools=weather_tools,
@@ -202,9 +153,11 @@ def run_supervisor_workflow_example():
         
         try:
             # 执行工作流
+            start = time.perf_counter()
             result = app.invoke({
                 "messages": [HumanMessage(content=query)]
             })
+            print(f"⏱️ 耗时: {time.perf_counter() - start:.2f}s")
             
             # 显示结果
             print("\n📋 处理结果:")
@@ -217,6 +170,8 @@ def run_supervisor_workflow_example():
         except Exception as e:
             print(f"❌ 处理失败: {e}")
 
+    tool_runtime.print_stats()
+
 def run_interactive_example():
     """运行交互式示例"""
     print("=" * 60)
@@ -299,6 +254,8 @@ def run_streaming_example():
     except Exception as e:
         print(f"❌ 处理失败: {e}")
 
+    tool_runtime.print_stats()
+
 def main():
     """主函数"""
     print("🎯 LangGraph Supervisor工作流示例")
@@ -10,15 +10,18 @@ LangGraph 笑话评估优化器示例
 - 使用StateGraph API构建工作流
 - 结构化评估反馈
 - 迭代优化直到达到目标质量
+- 推测式模式：每轮并行生成多个候选、批量评估、任一候选通过即结束（见 ../speculative.py）
 """
 
 import os
 import sys
+import time
 from typing import TypedDict, Literal
 
 # 添加路径以导入配置
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 import config
+from speculative import SpeculativeLoop
 
 # 导入必要的库
 from langchain_openai import ChatOpenAI
@@ -37,6 +40,19 @@ llm = ChatOpenAI(
     max_tokens=1000
 )
 
+# 推测式模式配置
+SPECULATIVE_CANDIDATES = 3        # 每轮并行生成的候选数
+SPECULATIVE_MAX_ROUNDS = 2        # 最多轮数
+SPECULATIVE_LATENCY_BUDGET = 60   # 总耗时预算（秒）
+
+# 推测式候选使用较高温度，并按候选下标换一种笑话风格，避免多个候选雷同
+creative_llm = ChatOpenAI(
+    model=config.model,
+    temperature=0.9,
+    max_tokens=1000
+)
+JOKE_STYLES = ["谐音梗", "剧情反转", "夸张对比", "冷笑话", "自嘲"]
+
 
 
 # 定义状态
@@ -46,6 +62,9 @@ class JokeState(TypedDict):
     feedback: str
     funny_or_not: str
     iteration_count: int
+    score: int
+    candidates_generated: int
+    rounds_saved: int
 
 # 定义结构化输出模式
 class JokeFeedback(BaseModel):
@@ -98,7 +117,8 @@ def evaluate_joke(state: JokeState) -> JokeState:
     
     return {
         "funny_or_not": feedback.grade,
-        "feedback": feedback.feedback
+        "feedback": feedback.feedback,
+        "score": feedback.score
     }
 
 def route_joke(state: JokeState) -> Literal["Accepted", "Rejected + Feedback"]:
@@ -115,13 +135,77 @@ def route_joke(state: JokeState) -> Literal["Accepted", "Rejected + Feedback"]:
     else:
         return "Rejected + Feedback"
 
-def build_joke_evaluator_optimizer():
-    """构建笑话评估优化器图"""
+def generate_joke_candidate(topic: str, round_index: int, index: int, previous) -> str:
+    """生成一个推测式候选：每个候选一种风格，非首轮参考上一轮最佳候选的反馈"""
+    style = JOKE_STYLES[index % len(JOKE_STYLES)]
+    prompt = f"请用{style}的方式，为话题 '{topic}' 写一个有趣的笑话。"
+    if previous is not None:
+        prompt += f"\n上一轮最好的笑话是：{previous.content}\n评估反馈：{previous.evaluation.feedback}\n请在此基础上改进。"
+    return creative_llm.invoke(prompt).content
+
+def evaluate_jokes_batch(jokes):
+    """批量评估多个候选笑话（一次 batch 调用，请求并发发出）"""
+    return joke_evaluator.batch([
+        [
+            SystemMessage(content="你是一个专业的笑话评估专家。请评估以下笑话的质量，并提供具体的改进建议。"),
+            HumanMessage(content=f"请评估这个笑话：\n\n{joke}")
+        ]
+        for joke in jokes
+    ])
+
+def speculative_jokes(state: JokeState) -> JokeState:
+    """推测式生成：每轮并行生成多个候选、批量评估，第一个被评为 funny 的候选直接采用"""
+    topic = state["topic"]
+    print(f"🎭 推测式生成：每轮 {SPECULATIVE_CANDIDATES} 个候选，最多 {SPECULATIVE_MAX_ROUNDS} 轮")
+    
+    loop = SpeculativeLoop(
+        lambda round_index, index, previous: generate_joke_candidate(topic, round_index, index, previous),
+        evaluate_jokes_batch,
+        accept=lambda feedback: feedback.grade == "funny",
+        score=lambda feedback: feedback.score,
+        n_candidates=SPECULATIVE_CANDIDATES,
+        max_rounds=SPECULATIVE_MAX_ROUNDS,
+        latency_budget=SPECULATIVE_LATENCY_BUDGET,
+        name="jokes",
+    )
+    result = loop.run()
+    if result.best is None:
+        raise RuntimeError(f"推测式生成没有得到任何候选（{result.stop_reason}）")
+    
+    best = result.best
+    print(f"📊 最佳候选评分: {best.score}/10, 等级: {best.evaluation.grade}, 结束原因: {result.stop_reason}")
+    print(f"⏱️ 统计: {result.stats}")
+    
+    return {
+        "joke": best.content,
+        "feedback": best.evaluation.feedback,
+        "funny_or_not": best.evaluation.grade,
+        "score": best.evaluation.score,
+        "iteration_count": result.stats["rounds"],
+        "candidates_generated": result.stats["generated"],
+        "rounds_saved": result.stats["rounds_saved"]
+    }
+
+def build_joke_evaluator_optimizer(speculative: bool = False):
+    """
+    构建笑话评估优化器图
+    
+    speculative=True 时使用推测式模式：单个节点内完成多轮"并行生成 + 批量评估"，
+    不再逐个候选地在 生成 → 评估 之间往返
+    """
     print("🏗️ 构建笑话评估优化器图...")
     
     # 创建状态图
     workflow = StateGraph(JokeState)
     
+    if speculative:
+        workflow.add_node("speculative_jokes", speculative_jokes)
+        workflow.add_edge(START, "speculative_jokes")
+        workflow.add_edge("speculative_jokes", END)
+        chain = workflow.compile()
+        print("✅ 笑话评估优化器图（推测式）构建完成！")
+        return chain
+    
     # 添加节点
     workflow.add_node("generate_joke", generate_joke)
     workflow.add_node("evaluate_joke", evaluate_joke)
@@ -148,17 +232,18 @@ def build_joke_evaluator_optimizer():
 
 # ===== 2. 运行示例函数 =====
 
-def run_joke_evaluator_optimizer():
+def run_joke_evaluator_optimizer(speculative: bool = False):
     """运行笑话评估优化器示例"""
     print("=" * 60)
-    print("🚀 笑话评估优化器示例")
+    print(f"🚀 笑话评估优化器示例（{'推测式' if speculative else '串行'}模式）")
     print("=" * 60)
     
     # 构建图
-    chain = build_joke_evaluator_optimizer()
+    chain = build_joke_evaluator_optimizer(speculative=speculative)
     
     # 执行
     topic = "人工智能"
+    start = time.perf_counter()
     state = chain.invoke({"topic": topic})
     
     print(f"\n🎉 最终结果:")
@@ -166,6 +251,9 @@ def run_joke_evaluator_optimizer():
     print(f"最终笑话: {state['joke']}")
     print(f"迭代次数: {state['iteration_count']}")
     print(f"最终评估: {state['funny_or_not']}")
+    if speculative:
+        print(f"生成候选数: {state['candidates_generated']}，节省往返轮数（估算）: {state['rounds_saved']}")
+    print(f"总耗时: {time.perf_counter() - start:.2f}s")
 
 
 
@@ -180,9 +268,10 @@ def main():
         print("   可以通过环境变量 OPENAI_API_KEY 设置")
         exit()
     
-    # 直接运行笑话评估优化器示例
+    # 先运行串行模式，再运行推测式模式，对比轮数与耗时
     print("\n🚀 运行笑话评估优化器示例...")
     run_joke_evaluator_optimizer()
+    run_joke_evaluator_optimizer(speculative=True)
 
 
 if __name__ == "__main__":
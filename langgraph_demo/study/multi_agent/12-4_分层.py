@@ -15,15 +15,22 @@ LangGraph 分层多智能体示例 (使用 create_supervisor)
 
 import os
 import sys
+import threading
+import time
+from collections import Counter, defaultdict
+from typing import Dict, List, Optional
 from langchain_openai import ChatOpenAI
+from langchain_core.callbacks import BaseCallbackHandler, BaseCallbackManager
+from langchain_core.runnables.config import ensure_config
 from langgraph_supervisor import create_supervisor, create_handoff_tool
+from langgraph.graph import StateGraph, MessagesState, START, END
 from langgraph.prebuilt import create_react_agent
-from langchain_core.tools import tool
-from langchain_core.messages import HumanMessage
+from langchain_core.messages import AIMessage, HumanMessage
 
 # 添加路径以导入配置
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 import config
+from intent_router import IntentRouter, KeywordRules, normalize_query
 logger = config.logger
 # 设置环境变量
 os.environ["OPENAI_API_BASE"] = config.base_url
@@ -46,185 +53,12 @@ logger.info("   - LANGGRAPH_DISABLE_PARALLEL=true")
 logger.info("   - LANGGRAPH_DISABLE_CONCURRENCY=true")
 
 # ==================== 工具函数定义 ====================
+# 工具统一由共享工具运行时提供（async 实现、同一轮的多个工具调用并发执行、TTL 缓存、超时与并发限制）
+# 见 shared_tools.py / ../tool_runtime.py；预设数据未命中时，搜索与公司信息工具使用本文件的模型生成内容
+import shared_tools
+from shared_tools import agent_tools, tool_runtime
 
-@tool
-def search_web(query: str) -> str:
-    """搜索网络信息"""
-    logger.info(f"🔍 工具调用: search_web(query='{query}')")
-    
-    search_results = {
-        "人工智能": "人工智能是计算机科学的一个分支，致力于创建能够执行通常需要人类智能的任务的系统。主要技术包括机器学习、深度学习、自然语言处理等。",
-        "机器学习": "机器学习是人工智能的一个子集，它使计算机能够在没有明确编程的情况下学习和改进。主要算法包括监督学习、无监督学习、强化学习等。",
-        "深度学习": "深度学习是机器学习的一个分支，使用多层神经网络来模拟人脑的学习过程。在图像识别、语音识别、自然语言处理等领域取得了突破性进展。",
-        "自然语言处理": "自然语言处理是人工智能的一个重要分支，致力于让计算机理解、解释和生成人类语言。应用包括机器翻译、情感分析、问答系统等。",
-        "计算机视觉": "计算机视觉是人工智能的一个分支，致力于让计算机理解和分析视觉信息。应用包括图像识别、目标检测、人脸识别等。",
-        "苹果公司": "苹果公司（Apple Inc.）。参与了人工智能的前沿研究，如Siri、Face ID等。",
-    }
-    
-    # 首先尝试从预设结果中查找
-    if query in search_results:
-        result = search_results[query]
-        logger.info(f"🔍 工具结果: search_web (预设) -> {result[:100]}...")
-        print(f"🔍 搜索工具: 查询 '{query}' -> {result[:100]}...")
-        return result
-    
-    # 如果没有找到，使用LLM生成内容
-    # logger.info(f"🔍 未找到预设结果，使用LLM生成关于 '{query}' 的内容")
-    print(f"🔍 搜索工具: 查询 '{query}' -> 使用LLM生成内容...")
-    
-    try:
-        # 使用LLM生成相关内容
-        prompt = f"""请提供关于"{query}"的详细、准确的信息。请包括以下方面：
-1. 基本定义和概念
-2. 主要特点或技术要点
-3. 应用领域或实际用途
-4. 相关的发展趋势或重要性
-
-请用中文回答，内容要详细、专业且易于理解。"""
-        
-        # 调用LLM生成内容
-        from langchain_core.messages import HumanMessage
-        response = model.invoke([HumanMessage(content=prompt)])
-        
-        result = response.content
-        logger.info(f"🔍 工具结果: search_web (LLM生成) -> {result[:100]}...")
-        print(f"🔍 搜索工具: 查询 '{query}' -> {result[:100]}...")
-        
-        return result
-        
-    except Exception as e:
-        error_msg = f"LLM生成内容失败: {str(e)}"
-        logger.error(f"🔍 {error_msg}")
-        print(f"🔍 搜索工具: 查询 '{query}' -> {error_msg}")
-        return f"抱歉，无法获取关于'{query}'的信息。错误: {str(e)}"
-
-@tool
-def get_company_info(company: str) -> str:
-    """获取公司信息"""
-    logger.info(f"🏢 工具调用: get_company_info(company='{company}')")
-    
-    company_data = {
-        "苹果公司": "苹果公司（Apple Inc.）是一家总部位于美国加利福尼亚州的跨国科技公司，主要产品包括iPhone、iPad、Mac、Apple Watch等。",
-        "谷歌": "谷歌（Google）是Alphabet公司的子公司，是全球最大的搜索引擎公司，主要业务包括搜索、广告、云计算、人工智能等。",
-        "微软": "微软公司（Microsoft Corporation）是一家总部位于美国的跨国科技公司，主要产品包括Windows操作系统、Office办公软件、Azure云服务等。",
-        "亚马逊": "亚马逊（Amazon）是全球最大的电子商务公司之一，业务涵盖电商、云计算、人工智能、物流等多个领域。",
-        "特斯拉": "特斯拉（Tesla）是一家专注于电动汽车、能源存储和太阳能板的公司，致力于推动可持续能源的发展。"
-    }
-    
-    # 首先尝试从预设结果中查找
-    if company in company_data:
-        result = company_data[company]
-        logger.info(f"🏢 工具结果: get_company_info (预设) -> {result[:100]}...")
-        print(f"🏢 公司信息工具: 查询 '{company}' -> {result[:100]}...")
-        return result
-    
-    # 如果没有找到，使用LLM生成内容
-    # logger.info(f"🏢 未找到预设结果，使用LLM生成关于 '{company}' 的公司信息")
-    print(f"🏢 公司信息工具: 查询 '{company}' -> 使用LLM生成内容...")
-    
-    try:
-        # 使用LLM生成相关内容
-        prompt = f"""请提供关于"{company}"公司的详细、准确的信息。请包括以下方面：
-1. 公司基本信息和背景
-2. 主要业务和产品
-3. 市场地位和影响力
-4. 技术实力和创新能力
-5. 财务状况和发展前景
-
-请用中文回答，内容要详细、专业且客观。如果信息不确定，请说明。"""
-        
-        # 调用LLM生成内容
-        from langchain_core.messages import HumanMessage
-        response = model.invoke([HumanMessage(content=prompt)])
-        
-        result = response.content
-        logger.info(f"🏢 工具结果: get_company_info (LLM生成) -> {result[:100]}...")
-        print(f"🏢 公司信息工具: 查询 '{company}' -> {result[:100]}...")
-        
-        return result
-        
-    except Exception as e:
-        error_msg = f"LLM生成内容失败: {str(e)}"
-        logger.error(f"🏢 {error_msg}")
-        print(f"🏢 公司信息工具: 查询 '{company}' -> {error_msg}")
-        return f"抱歉，无法获取关于'{company}'的公司信息。错误: {str(e)}"
-
-@tool
-def calculate_math(expression: str) -> str:
-    """计算数学表达式"""
-    logger.info(f"🧮 工具调用: calculate_math(expression='{expression}')")
-    
-    try:
-        allowed_chars = set('0123456789+-*/(). ')
-        if all(c in allowed_chars for c in expression):
-            result = eval(expression)
-            output = f"计算结果: {expression} = {result}"
-            logger.info(f"🧮 工具结果: calculate_math -> {output}")
-            print(f"🧮 数学计算工具: {expression} -> {result}")
-            return output
-        else:
-            output = "表达式包含不允许的字符"
-            logger.warning(f"🧮 工具错误: calculate_math -> {output}")
-            print(f"🧮 数学计算工具: 错误 - {output}")
-            return output
-    except Exception as e:
-        output = f"计算错误: {str(e)}"
-        logger.error(f"🧮 工具异常: calculate_math -> {output}")
-        print(f"🧮 数学计算工具: 异常 - {output}")
-        return output
-
-@tool
-def get_weather(location: str) -> str:
-    """获取指定地点的天气信息"""
-    logger.info(f"🌤️ 工具调用: get_weather(location='{location}')")
-    
-    weather_data = {
-        "北京": "晴天，温度25°C，湿度60%",
-        "上海": "多云，温度28°C，湿度70%",
-        "广州": "雨天，温度30°C，湿度80%",
-        "深圳": "晴天，温度29°C，湿度65%",
-        "杭州": "多云，温度26°C，湿度65%",
-        "成都": "阴天，温度24°C，湿度70%"
-    }
-    
-    result = weather_data.get(location, f"无法获取{location}的天气信息")
-    logger.info(f"🌤️ 工具结果: get_weather -> {result}")
-    print(f"🌤️ 天气查询工具: {location} -> {result}")
-    
-    return result
-
-@tool
-def write_document(content: str, title: str) -> str:
-    """创建文档"""
-    logger.info(f"📝 工具调用: write_document(title='{title}', content='{content[:50]}...')")
-    
-    result = f"已创建文档 '{title}'，内容：{content}"
-    logger.info(f"📝 工具结果: write_document -> {result[:100]}...")
-    print(f"📝 文档创建工具: '{title}' -> 已创建")
-    
-    return result
-
-@tool
-def edit_document(content: str, suggestions: str) -> str:
-    """编辑文档"""
-    logger.info(f"✏️ 工具调用: edit_document(suggestions='{suggestions[:50]}...', content='{content[:50]}...')")
-    
-    result = f"根据建议 '{suggestions}' 编辑了文档，新内容：{content}"
-    logger.info(f"✏️ 工具结果: edit_document -> {result[:100]}...")
-    print(f"✏️ 文档编辑工具: 根据建议编辑 -> 已完成")
-    
-    return result
-
-@tool
-def create_chart(data: str, chart_type: str) -> str:
-    """创建图表"""
-    logger.info(f"📊 工具调用: create_chart(chart_type='{chart_type}', data='{data[:50]}...')")
-    
-    result = f"已创建 {chart_type} 类型的图表，数据：{data}"
-    logger.info(f"📊 工具结果: create_chart -> {result[:100]}...")
-    print(f"📊 图表创建工具: {chart_type} 类型图表 -> 已创建")
-    
-    return result
+shared_tools.configure_fallback_llm(model)
 
 # ==================== 第一层：专门智能体 ====================
 
@@ -237,7 +71,7 @@ def create_research_agents():
     logger.info("创建搜索专家智能体...")
     search_expert = create_react_agent(
         model=model,
-        tools=[search_web],
+        tools=agent_tools(["search_web"]),
         name="search_expert",
         prompt="你是一个专业的搜索专家，擅长信息检索和知识查询。请帮助用户找到准确、详细的信息。"
     )
@@ -247,7 +81,7 @@ def create_research_agents():
     # logger.info("创建公司分析师智能体...")
     # company_analyst = create_react_agent(
     #     model=model,
-    #     tools=[get_company_info],
+    #     tools=agent_tools(["get_company_info"]),
     #     name="company_analyst",
     #     prompt="你是一个专业的公司分析师，擅长公司信息分析和市场研究。请提供详细的公司分析报告。"
     # )
@@ -265,7 +99,7 @@ def create_math_agents():
     logger.info("创建计算专家智能体...")
     calculation_expert = create_react_agent(
         model=model,
-        tools=[calculate_math],
+        tools=agent_tools(["calculate_math"]),
         name="calculation_expert",
         prompt="你是一个专业的计算专家，擅长各种数学计算和公式求解。请帮助用户解决数学问题，并解释计算过程。"
     )
@@ -283,7 +117,7 @@ def create_weather_agents():
     logger.info("创建天气专家智能体...")
     weather_expert = create_react_agent(
         model=model,
-        tools=[get_weather],
+        tools=agent_tools(["get_weather"]),
         name="weather_expert",
         prompt="你是一个专业的天气专家，擅长天气查询和气候信息分析。请帮助用户获取准确的天气信息，并提供相关建议。"
     )
@@ -301,7 +135,7 @@ def create_writing_agents():
     logger.info("创建文档编写专家智能体...")
     document_writer = create_react_agent(
         model=model,
-        tools=[write_document, edit_document],
+        tools=agent_tools(["write_document", "edit_document"]),
         name="document_writer",
         prompt="你是一个专业的文档编写专家，擅长创建和编辑各种类型的文档。请帮助用户创建高质量的内容。"
     )
@@ -311,7 +145,7 @@ def create_writing_agents():
     logger.info("创建图表制作专家智能体...")
     chart_maker = create_react_agent(
         model=model,
-        tools=[create_chart],
+        tools=agent_tools(["create_chart"]),
         name="chart_maker",
         prompt="你是一个专业的图表制作专家，擅长创建各种类型的图表和可视化。请帮助用户制作清晰、美观的图表。"
     )
@@ -625,6 +459,191 @@ def create_top_level_supervisor():
     
     return compiled_system
 
+# ==================== 路由加速：直达派发 ====================
+# 完整分层路径：顶层Supervisor -> 团队Supervisor -> 专家 -> 团队Supervisor -> 顶层Supervisor，
+# 即使是简单的天气查询也要 4 次以上 Supervisor 的 LLM 调用。
+# 加速层在进入分层系统之前先做本地路由（规则 + 分类器 + 缓存，见 ../intent_router.py）：
+# 1. 置信度足够且只涉及一个专家时，直接把请求交给该专家，专家的回答直接返回给调用方，
+#    不再回到团队/顶层 Supervisor（它们对单一专家的结果没有可补充的内容）
+# 2. 多意图或拿不准的请求走完整分层路径；完成后按实际回答的专家回写路由，
+#    相同/相似的请求下次直接派发
+# 3. 统计直达次数与实测节省的 LLM 调用：完整分层路径中只由一个专家回答的请求记录其 LLM 调用数作为该专家的基线，
+#    直达同一专家时用基线均值减去本次 LLM 调用数；还没有基线的专家不计入
+
+# 可直达的专家（路由标签即专家名），"hierarchy" 表示走完整分层路径
+WORKER_ROUTES = ["search_expert", "calculation_expert", "weather_expert", "document_writer", "chart_maker"]
+HIERARCHY_ROUTE = "hierarchy"
+
+# 本地路由置信度达到该阈值才直达派发
+DIRECT_DISPATCH_THRESHOLD = 0.8
+
+ROUTE_KEYWORDS = {
+    "weather_expert": ["天气", "气温", "温度", "湿度", "下雨", "预报", "weather"],
+    "calculation_expert": ["计算", "算一下", "等于多少", "乘以", "除以", "加上", "减去"],
+    "search_expert": ["搜索", "查找", "检索", "什么是", "介绍一下", "公司信息", "基本信息"],
+    "document_writer": ["文档", "报告", "撰写", "写一篇", "编辑"],
+    "chart_maker": ["图表", "柱状图", "折线图", "饼图", "可视化"],
+}
+
+ROUTE_PATTERNS = {
+    "calculation_expert": [r"\d+(?:\.\d+)?\s*[\+\-\*/×÷\^%]\s*\d+"],
+}
+
+SEED_EXAMPLES = {
+    "weather_expert": ["查询北京的天气", "上海今天会下雨吗", "杭州的气温是多少", "深圳的天气适合出行吗"],
+    "calculation_expert": ["计算 25 * 16 + 8", "帮我算一下 100 除以 4", "2 的 10 次方是多少"],
+    "search_expert": ["搜索关于人工智能的信息", "什么是深度学习", "获取苹果公司的基本信息", "介绍一下机器学习"],
+    "document_writer": ["写一篇关于人工智能的文档", "帮我撰写一份项目报告", "编辑这份文档"],
+    "chart_maker": ["把销售数据做成柱状图", "创建一个饼图", "数据可视化"],
+    HIERARCHY_ROUTE: ["搜索人工智能的资料并写成报告", "查询天气后计算出行费用", "收集数据并制作图表和文档"],
+}
+
+fast_router = IntentRouter(
+    WORKER_ROUTES + [HIERARCHY_ROUTE],
+    KeywordRules(ROUTE_KEYWORDS, ROUTE_PATTERNS),
+    seed_examples=SEED_EXAMPLES,
+    confidence_threshold=DIRECT_DISPATCH_THRESHOLD,
+    default_label=HIERARCHY_ROUTE,
+    log_path=config.data_path("hierarchy_routes.jsonl"),
+)
+
+# 路由加速统计：requests / direct / hierarchy / learned / measured_direct / llm_calls_saved
+routing_stats: Counter = Counter()
+# 专家 -> 完整分层路径中由该专家单独回答时的 LLM 调用数（实测基线）
+hierarchy_llm_calls: Dict[str, List[int]] = defaultdict(list)
+
+
+class LLMCallCounter(BaseCallbackHandler):
+    """统计一次调用中发出的 LLM 请求数（包括嵌套的 Supervisor 与专家）"""
+
+    def __init__(self):
+        self.count = 0
+        self._lock = threading.Lock()
+
+    def on_chat_model_start(self, serialized, messages, **kwargs) -> None:
+        with self._lock:
+            self.count += 1
+
+    def on_llm_start(self, serialized, prompts, **kwargs) -> None:
+        with self._lock:
+            self.count += 1
+
+
+def counted(counter: LLMCallCounter) -> Dict[str, object]:
+    """在当前节点的回调之上挂上计数器，返回子调用使用的 config（不影响流式输出与追踪）"""
+    callbacks = ensure_config().get("callbacks")
+    if isinstance(callbacks, BaseCallbackManager):
+        callbacks = callbacks.copy()
+        callbacks.add_handler(counter, inherit=True)
+    else:
+        callbacks = list(callbacks or []) + [counter]
+    return {"callbacks": callbacks}
+
+
+class AcceleratedState(MessagesState):
+    """加速层状态：在消息之外记录路由结论"""
+    route: str
+    route_source: str
+    route_confidence: float
+
+
+def route_request(query: str) -> Dict[str, object]:
+    """本地判断请求能否直达某个专家：多意图请求总是走完整分层路径"""
+    hits = fast_router.rules.match(normalize_query(query))
+    if len(hits) > 1:
+        return {"route": HIERARCHY_ROUTE, "route_source": "multi_intent", "route_confidence": 0.0}
+    decision = fast_router.route(query)
+    route = decision.label
+    if route not in WORKER_ROUTES or decision.confidence < DIRECT_DISPATCH_THRESHOLD:
+        route = HIERARCHY_ROUTE
+    return {"route": route, "route_source": decision.source, "route_confidence": decision.confidence}
+
+
+def responding_workers(messages: List) -> List[str]:
+    """找出分层路径中实际给出回答的专家"""
+    names = []
+    for msg in messages:
+        if isinstance(msg, AIMessage) and msg.name in WORKER_ROUTES and msg.name not in names:
+            names.append(msg.name)
+    return names
+
+
+def build_worker_index() -> Dict[str, object]:
+    """专家名 -> 专家智能体，供直达派发使用"""
+    agents = create_research_agents() + create_math_agents() + create_weather_agents() + create_writing_agents()
+    return {agent.name: agent for agent in agents}
+
+
+def create_accelerated_system(hierarchical_system=None, workers: Optional[Dict[str, object]] = None):
+    """在分层系统之前加一层本地路由：能直达的请求不经过任何 Supervisor"""
+    logger.info("开始创建路由加速层...")
+    hierarchical_system = hierarchical_system or create_top_level_supervisor()
+    workers = workers or build_worker_index()
+
+    def fast_route(state: AcceleratedState):
+        query = state["messages"][-1].content
+        result = route_request(query)
+        routing_stats["requests"] += 1
+        logger.info(f"🧭 加速路由: {result['route']}（{result['route_source']}，置信度 {result['route_confidence']:.2f}）")
+        return result
+
+    def direct_dispatch(state: AcceleratedState):
+        """直达专家，专家的回答直接返回给调用方（return-to-caller）"""
+        route = state["route"]
+        counter = LLMCallCounter()
+        result = workers[route].invoke({"messages": state["messages"]}, counted(counter))
+        routing_stats["direct"] += 1
+        baseline = hierarchy_llm_calls.get(route)
+        if baseline:
+            routing_stats["measured_direct"] += 1
+            routing_stats["llm_calls_saved"] += round(sum(baseline) / len(baseline) - counter.count)
+        return {"messages": result["messages"]}
+
+    def full_hierarchy(state: AcceleratedState):
+        """完整分层路径；只有一个专家参与时回写路由，相似请求下次直达"""
+        query = state["messages"][-1].content
+        counter = LLMCallCounter()
+        result = hierarchical_system.invoke({"messages": state["messages"]}, counted(counter))
+        routing_stats["hierarchy"] += 1
+        workers_used = responding_workers(result["messages"])
+        if len(workers_used) == 1:
+            hierarchy_llm_calls[workers_used[0]].append(counter.count)
+        if len(workers_used) == 1 and state["route_source"] != "multi_intent":
+            fast_router.remember(query, workers_used[0])
+            routing_stats["learned"] += 1
+            logger.info(f"🧭 已记录路由: {query} -> {workers_used[0]}")
+        return {"messages": result["messages"]}
+
+    def select_path(state: AcceleratedState) -> str:
+        return "direct_dispatch" if state["route"] in WORKER_ROUTES else "full_hierarchy"
+
+    workflow = StateGraph(AcceleratedState)
+    workflow.add_node("fast_route", fast_route)
+    workflow.add_node("direct_dispatch", direct_dispatch)
+    workflow.add_node("full_hierarchy", full_hierarchy)
+    workflow.add_edge(START, "fast_route")
+    workflow.add_conditional_edges("fast_route", select_path, ["direct_dispatch", "full_hierarchy"])
+    workflow.add_edge("direct_dispatch", END)
+    workflow.add_edge("full_hierarchy", END)
+
+    compiled = workflow.compile(name="accelerated_hierarchical_system")
+    logger.info("路由加速层创建完成")
+    return compiled
+
+
+def log_routing_stats() -> None:
+    """输出路由加速统计"""
+    requests = routing_stats["requests"]
+    direct_rate = routing_stats["direct"] / requests if requests else 0.0
+    if routing_stats["measured_direct"]:
+        saved = (f"节省 LLM 调用 {routing_stats['llm_calls_saved']}"
+                 f"（{routing_stats['measured_direct']} 次直达有完整分层基线）")
+    else:
+        saved = "节省 LLM 调用: 尚无完整分层基线，未统计"
+    logger.info(f"🧭 路由加速统计: 请求 {requests}，直达 {routing_stats['direct']}（{direct_rate:.0%}），"
+                f"完整分层 {routing_stats['hierarchy']}，{saved}，回写路由 {routing_stats['learned']}")
+    logger.info(f"🧭 本地路由器统计: {fast_router.stats()}")
+
 # ==================== 运行示例 ====================
 
 def validate_tool_configuration():
@@ -752,16 +771,17 @@ def run_hierarchical_example():
     
     logger.info("开始构建分层多智能体系统...")
     
-    # 构建分层系统
-    hierarchical_system = create_top_level_supervisor()
+    # 构建分层系统，并在前面加上路由加速层
+    hierarchical_system = create_accelerated_system(create_top_level_supervisor())
     
     logger.info("分层系统构建完成，开始执行测试用例...")
     
-    # 测试用例 - 简化为单一任务，避免循环调用
+    # 测试用例 - 多意图任务走完整分层路径，单一专家任务直达；重复的请求命中路由缓存
     test_cases = [
         "搜索关于人工智能的信息,并创建一个综合分析报告",
-        # "获取苹果公司的基本信息",
-        # "计算 2^10 + 3^3 - 5*7"
+        "查询北京的天气",
+        "计算 (15 * 8 + 23) / 4",
+        "查询北京的天气",
     ]
     
     for i, query in enumerate(test_cases, 1):
@@ -776,16 +796,18 @@ def run_hierarchical_example():
             logger.info(f"调用分层系统处理查询: {query}")
             
             # 执行分层系统
+            start = time.perf_counter()
             result = hierarchical_system.invoke({
                 "messages": [HumanMessage(content=query)],
                 "stream_mode":"values"
             })
             
-            logger.info(f"测试用例 {i} 执行完成，开始显示结果")
+            logger.info(f"测试用例 {i} 执行完成（路由: {result.get('route')}，耗时 {time.perf_counter() - start:.2f}s），开始显示结果")
             
             # 使用专门的函数打印完整结果
             message_count, team_executions = print_complete_result(result, f"测试用例 {i} 完整处理结果")
             logger.info(f"测试用例 {i} 完成，共处理 {message_count} 条消息")
+            tool_runtime.log_stats()
                     
         except Exception as e:
             error_msg = f"❌ 测试用例 {i} 处理失败: {e}"
@@ -807,6 +829,8 @@ def run_hierarchical_example():
                 print("   - 确认层级结构设置")
                 print("   - 运行工具配置验证 (选项4)")
 
+    log_routing_stats()
+
 def run_streaming_example():
     """运行流式输出示例"""
     print("=" * 60)
@@ -8,11 +8,13 @@ LangGraph Swarm 简化示例
 2. 智能体之间的切换 - 如何使用 handoff 工具实现智能体切换
 3. 状态管理 - 如何使用检查点保存器管理会话状态
 4. 流式输出 - 如何实时观察智能体的执行过程
+5. 会话持久化 - 会话保存在本地 SQLite，重启后按活跃智能体批量恢复（见 ../swarm_sessions.py）
 
 架构特点：
 - 模块化设计：每个智能体专注于特定任务
 - 灵活切换：智能体之间可以无缝切换
 - 状态保持：会话状态在切换过程中得到保持
+- 紧凑交接：切换时每个智能体只看到自己需要的最近几轮，不再重复发送整段历史
 - 可扩展性：易于添加新的智能体和功能
 """
 
@@ -34,12 +36,28 @@ from langgraph_swarm import create_handoff_tool, create_swarm  # Swarm 核心功
 # 配置相关导入
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 import config
+from swarm_sessions import SwarmSessionStore, history_hook
+# 工具统一由共享工具运行时提供（async 实现、同一轮的多个工具调用并发执行、TTL 缓存、超时与并发限制）
+# 见 shared_tools.py / ../tool_runtime.py
+from shared_tools import agent_tools, tool_runtime
 
 # 设置 OpenAI API 环境变量
 os.environ["OPENAI_API_BASE"] = config.base_url  # API 基础URL
 os.environ["OPENAI_API_KEY"] = config.api_key    # API 密钥
 MODEL_NAME = config.model                        # 模型名称
 
+# 会话持久化配置
+SESSION_DB_PATH = config.data_path("swarm_sessions.sqlite")
+SESSION_MAX_TURNS = 6      # 持久化时保留的最近用户轮次
+DEFAULT_AGENT = "assistant_agent"
+
+# 每个智能体送入模型的最近轮次：主助手只负责分流，看当前轮即可；专业智能体保留少量上下文
+AGENT_HISTORY_TURNS = {
+    "assistant_agent": 1,
+    "math_agent": 3,
+    "weather_agent": 2,
+}
+
 # 初始化语言模型
 # 使用 ChatOpenAI 作为所有智能体的基础模型
 llm = ChatOpenAI(
@@ -49,50 +67,7 @@ llm = ChatOpenAI(
 )
 
 # ==================== 工具函数定义 ====================
-# 这些工具函数将被智能体调用来执行具体的任务
-
-def add_numbers(a: int, b: int) -> int:
-    """
-    加法运算工具
-    
-    Args:
-        a: 第一个数字
-        b: 第二个数字
-        
-    Returns:
-        两个数字的和
-    """
-    return a + b
-
-def multiply_numbers(a: int, b: int) -> int:
-    """
-    乘法运算工具
-    
-    Args:
-        a: 第一个数字
-        b: 第二个数字
-        
-    Returns:
-        两个数字的积
-    """
-    return a * b
-
-def get_weather(location: str) -> str:
-    """
-    获取天气信息工具
-    
-    Args:
-        location: 城市名称
-        
-    Returns:
-        该城市的天气信息
-    """
-    if location == "北京":
-        return "北京今天天气晴朗，温度 25°C"
-    elif location == "上海":
-        return "上海今天多云，温度 28°C"
-    else:
-        return f"{location}的天气信息暂时不可用"
+add_numbers, multiply_numbers, get_weather = agent_tools(["add_numbers", "multiply_numbers", "get_weather"])
 
 # ==================== 智能体切换工具定义 ====================
 # Handoff 工具允许智能体之间进行切换，实现协作
@@ -135,7 +110,8 @@ assistant_agent = create_react_agent(
     当用户需要查询天气时，请切换到 weather_agent
     
     请始终保持友好和专业的服务态度。""",
-    name="assistant_agent"  # 智能体名称，用于识别和切换
+    name="assistant_agent",  # 智能体名称，用于识别和切换
+    pre_model_hook=history_hook(AGENT_HISTORY_TURNS["assistant_agent"])  # 只把压缩后的最近几轮发给模型
 )
 
 # 数学智能体 - 专门处理数学计算任务
@@ -158,7 +134,8 @@ math_agent = create_react_agent(
     如果需要切换到其他智能体，请使用相应的切换工具。
     
     请提供准确和详细的数学计算。""",
-    name="math_agent"  # 智能体名称
+    name="math_agent",  # 智能体名称
+    pre_model_hook=history_hook(AGENT_HISTORY_TURNS["math_agent"])  # 只把压缩后的最近几轮发给模型
 )
 
 # 天气智能体 - 专门处理天气查询任务
@@ -180,18 +157,23 @@ weather_agent = create_react_agent(
     如果需要切换到其他智能体，请使用相应的切换工具。
     
     请提供准确和有用的天气信息。""",
-    name="weather_agent"  # 智能体名称
+    name="weather_agent",  # 智能体名称
+    pre_model_hook=history_hook(AGENT_HISTORY_TURNS["weather_agent"])  # 只把压缩后的最近几轮发给模型
 )
 
 # ==================== Swarm 构建 ====================
 # 将多个智能体组合成一个协作系统
 
-def create_simple_swarm():
+def create_simple_swarm(checkpointer=None):
     """
     创建简单的 Swarm 系统
     
     这个函数将多个智能体组合成一个协作系统，实现智能体之间的切换和状态管理。
     
+    Args:
+        checkpointer: 检查点保存器，默认使用 InMemorySaver；
+            进程重启后由 SwarmSessionStore 中的持久化会话恢复
+    
     Returns:
         编译后的 Swarm 应用程序
     """
@@ -204,12 +186,12 @@ def create_simple_swarm():
             math_agent,       # 数学智能体
             weather_agent     # 天气智能体
         ],
-        default_active_agent="assistant_agent"  # 默认从主助手开始，作为系统入口点
+        default_active_agent=DEFAULT_AGENT  # 默认从主助手开始，作为系统入口点
     )
     
     # 设置检查点保存器 - 用于管理会话状态
     # InMemorySaver 将状态保存在内存中，支持会话的持久化
-    checkpointer = InMemorySaver()
+    checkpointer = checkpointer or InMemorySaver()
     
     # 编译 Swarm - 生成可执行的应用程序
     # 编译过程会建立智能体之间的连接和切换机制
@@ -292,8 +274,9 @@ def demo_agent_interaction():
     print("\n=== 智能体交互演示 ===")
     print("=" * 40)
     
-    # 创建 Swarm 应用程序
+    # 创建 Swarm 应用程序和会话存储
     app = create_simple_swarm()
+    store = SwarmSessionStore(SESSION_DB_PATH, default_agent=DEFAULT_AGENT, max_turns=SESSION_MAX_TURNS)
     
     # 生成唯一的会话ID，用于标识这次交互会话
     thread_id = str(uuid.uuid4())
@@ -330,6 +313,47 @@ def demo_agent_interaction():
                 subgraphs=True  # 显示详细的执行过程
             )
         )
+        
+        # 每轮结束后持久化：压缩历史 + 当前活跃智能体
+        session = store.save(thread_id, app.get_state(config_dict).values)
+        print(f"已保存会话：活跃智能体 {session.active_agent}，持久化消息 {len(session.messages)} 条")
+
+    # 工具运行统计：调用次数、缓存命中、超时与平均耗时
+    tool_runtime.print_stats()
+    
+    return thread_id
+
+def demo_session_resume(thread_ids):
+    """
+    演示会话恢复
+    
+    模拟进程重启：用全新的检查点保存器重新编译 Swarm，
+    从 SQLite 批量取出会话，每个会话直接从上次的活跃智能体继续（不经过主助手重新路由）
+    
+    Args:
+        thread_ids: 需要恢复的会话ID列表
+    """
+    print("\n=== 会话恢复演示（模拟重启） ===")
+    print("=" * 40)
+    
+    app = create_simple_swarm(InMemorySaver())
+    store = SwarmSessionStore(SESSION_DB_PATH, default_agent=DEFAULT_AGENT, max_turns=SESSION_MAX_TURNS)
+    
+    # 按活跃智能体查看已持久化的会话（走索引，不读取消息历史）
+    for agent_name in AGENT_HISTORY_TURNS:
+        sessions = store.list_sessions(active_agent=agent_name, limit=5)
+        print(f"{agent_name}: {len(sessions)} 个会话")
+    
+    # 批量恢复：每个会话处理一条新消息，新会话ID按新会话处理
+    requests = {thread_id: "再帮我计算 6 × 7" for thread_id in thread_ids}
+    requests[str(uuid.uuid4())] = "北京的天气怎么样"
+    results = store.resume_many(app, requests)
+    
+    for thread_id, result in results.items():
+        if isinstance(result, Exception):
+            print(f"会话 {thread_id}: 恢复失败 - {result}")
+            continue
+        print(f"会话 {thread_id}: 活跃智能体 {result.get('active_agent')}，回答: {result['messages'][-1].content}")
 
 def main():
     """
@@ -345,7 +369,10 @@ def main():
     
     try:
         # 演示智能体交互 - 展示智能体之间的协作过程
-        demo_agent_interaction()
+        thread_id = demo_agent_interaction()
+        
+        # 演示会话恢复 - 模拟重启后从 SQLite 批量恢复会话
+        demo_session_resume([thread_id])
         
     except Exception as e:
         # 异常处理，确保程序不会因为错误而崩溃
@@ -12,12 +12,14 @@ LangGraph 多智能体示例 - 子图方式实现
 2. 每个智能体子图有独立的状态空间
 3. 智能体间通过共享消息传递最终结果
 4. 支持流式执行和实时状态监控
+5. 子图通过注册表只编译一次，作为原生子节点挂到主图上，与主图共享 checkpointer
 """
 
 import os
 import sys
 import time
 import json
+import threading
 from typing import TypedDict, Annotated, Literal
 import operator
 
@@ -32,6 +34,7 @@ from langchain_openai import ChatOpenAI
 from langchain_core.messages import HumanMessage, AIMessage, SystemMessage
 from langchain_core.tools import tool
 from langgraph.types import Command
+from langgraph.checkpoint.memory import InMemorySaver
 import sys
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 import config
@@ -374,6 +377,10 @@ class MainState(TypedDict):
     - step_count: 步骤计数
     - next_agent: 下一个智能体
     - task_description: 任务描述
+    
+    子图作为原生子节点运行时，只会读写主图中声明过的字段，
+    因此主图还需要声明与子图交接的输入/输出字段；
+    子图内部的笔记、来源等字段不在此声明，保持各自独立。
     """
     user_input: str                    # 用户输入
     shared_messages: Annotated[list, operator.add]  # 共享消息列表（仅最终结果）
@@ -382,6 +389,16 @@ class MainState(TypedDict):
     step_count: int                    # 步骤计数
     next_agent: str                    # 下一个智能体
     task_description: str              # 任务描述
+    # --- 与子图交接的字段 ---
+    planning_start_time: float         # 规划者子图输入
+    planning_result: str               # 规划者子图输出
+    task: str                          # 研究者子图输入
+    research_start_time: float         # 研究者子图输入
+    research_result: str               # 研究者子图输出
+    requirements: str                  # 写作者子图输入
+    research_data: str                 # 写作者子图输入
+    writing_start_time: float          # 写作者子图输入
+    final_content: str                 # 写作者子图输出
 
 class PlannerState(TypedDict):
     """
@@ -864,6 +881,7 @@ def create_planner_subgraph():
     workflow.add_edge("analyzer", "finalizer")
     workflow.add_edge("finalizer", END)
     
+    # 不单独指定 checkpointer：作为主图子节点运行时自动继承主图的 checkpointer
     return workflow.compile()
 
 def create_researcher_subgraph():
@@ -914,23 +932,87 @@ def create_writer_subgraph():
     
     return workflow.compile()
 
-# ===== 主图节点函数 =====
+# ===== 子图注册表 =====
+
+class SubgraphRegistry:
+    """
+    子图注册表
+    
+    按名称登记子图构建函数，首次获取时编译一次并缓存，
+    之后所有主图（以及同一主图的每一步）都复用同一个编译结果，
+    不再在节点内部反复构建、编译 StateGraph。
+    """
+    
+    def __init__(self):
+        self._builders = {}
+        self._compiled = {}
+        self._lock = threading.Lock()
+        self.compile_count = 0
+    
+    def register(self, name: str, builder):
+        """登记子图构建函数（只登记，不编译）"""
+        with self._lock:
+            self._builders[name] = builder
+            self._compiled.pop(name, None)
+        return builder
+    
+    def get(self, name: str):
+        """获取编译后的子图，首次调用时编译"""
+        compiled = self._compiled.get(name)
+        if compiled is not None:
+            return compiled
+        with self._lock:
+            compiled = self._compiled.get(name)
+            if compiled is None:
+                if name not in self._builders:
+                    raise KeyError(f"未注册的子图: {name}")
+                start = time.perf_counter()
+                compiled = self._builders[name]()
+                self._compiled[name] = compiled
+                self.compile_count += 1
+                log_message(
+                    f"子图 {name} 编译完成，耗时 {(time.perf_counter() - start) * 1000:.1f}ms",
+                    "DEBUG", "SYSTEM"
+                )
+            return compiled
+    
+    def names(self) -> list:
+        return list(self._builders)
+    
+    def stats(self) -> dict:
+        return {
+            "registered": self.names(),
+            "compiled": list(self._compiled),
+            "compile_count": self.compile_count
+        }
+
+SUBGRAPHS = SubgraphRegistry()
+SUBGRAPHS.register("planner", create_planner_subgraph)
+SUBGRAPHS.register("researcher", create_researcher_subgraph)
+SUBGRAPHS.register("writer", create_writer_subgraph)
 
-def main_planner(state: MainState) -> Command[Literal["researcher", "writer", END]]:
+# ===== 主图节点函数 =====
+#
+# 每个智能体在主图中由三部分组成：
+#   <agent>           准备子图输入（写入交接字段）
+#   <agent>_subgraph  编译后的子图本身，作为原生子节点运行
+#   <agent>_router    读取子图输出、记录日志并决定路由
+# 子图作为原生子节点时，事件会随主图一起流式输出（stream(..., subgraphs=True)），
+# 并与主图共享 checkpointer。
+
+def main_planner(state: MainState) -> dict:
     """
     主图规划者节点
     
     这个节点负责：
-    1. 创建并执行规划者子图
-    2. 根据规划结果决定路由
-    3. 更新主图状态
-    4. 记录执行日志
+    1. 更新步骤计数
+    2. 准备规划者子图输入
     
     Args:
         state: 主图状态
-        
+    
     Returns:
-        Command 对象，指定下一个节点
+        状态更新（子图输入字段）
     """
     user_input = state["user_input"]
     step_count = state.get("step_count", 0) + 1
@@ -940,37 +1022,50 @@ def main_planner(state: MainState) -> Command[Literal["researcher", "writer", EN
     
     log_message(f"=== 主图规划者节点执行 (步骤 {step_count}) ===", "START", "MAIN")
     log_message(f"用户输入: {user_input}", "INFO", "MAIN")
-    
-    # 创建执行日志
-    log_entry = create_execution_log(
-        agent_name="planner",
-        action="开始任务规划",
-        step_count=step_count,
-        input=user_input
-    )
+    log_message("准备执行规划者子图...", "INFO", "MAIN")
     
     # 准备规划者子图输入
-    planner_input = {
-        "user_input": user_input,
-        "planning_start_time": time.time()
+    return {
+        "current_agent": "planner",
+        "planning_start_time": time.time(),
+        "step_count": step_count
     }
+
+def planner_router(state: MainState) -> Command[Literal["researcher", "writer", END]]:
+    """
+    规划者路由节点
     
-    log_message("准备执行规划者子图...", "INFO", "MAIN")
+    这个节点负责：
+    1. 提取规划者子图的结果
+    2. 根据规划结果决定路由
+    3. 更新主图状态
+    4. 记录执行日志
     
-    # 执行规划者子图
-    planner_graph = create_planner_subgraph()
-    planner_result = planner_graph.invoke(planner_input)
+    Args:
+        state: 主图状态（已包含子图输出）
+    
+    Returns:
+        Command 对象，指定下一个节点
+    """
+    step_count = state.get("step_count", 0)
     
     log_message("规划者子图执行完成", "SUCCESS", "MAIN")
     
     # 提取结果
-    next_agent = planner_result.get("next_agent", "researcher")
-    task_description = planner_result.get("task_description", "执行任务")
-    planning_result = planner_result.get("planning_result", "")
+    next_agent = state.get("next_agent") or "researcher"
+    task_description = state.get("task_description") or "执行任务"
+    planning_result = state.get("planning_result", "")
     
     log_message(f"规划结果: 下一个智能体 = {next_agent}", "INFO", "MAIN")
     log_message(f"任务描述: {task_description}", "INFO", "MAIN")
     
+    # 创建执行日志
+    log_entry = create_execution_log(
+        agent_name="planner",
+        action="开始任务规划",
+        step_count=step_count,
+        input=state["user_input"]
+    )
     log_entry["result"] = planning_result[:200] + "..." if len(planning_result) > 200 else planning_result
     log_entry["status"] = "completed"
     
@@ -988,7 +1083,6 @@ def main_planner(state: MainState) -> Command[Literal["researcher", "writer", EN
                 "current_agent": "researcher",
                 "next_agent": next_agent,
                 "task_description": task_description,
-                "step_count": step_count,
                 "execution_log": [log_entry]
             }
         )
@@ -1005,7 +1099,6 @@ def main_planner(state: MainState) -> Command[Literal["researcher", "writer", EN
                 "current_agent": "writer",
                 "next_agent": next_agent,
                 "task_description": task_description,
-                "step_count": step_count,
                 "execution_log": [log_entry]
             }
         )
@@ -1021,63 +1114,73 @@ def main_planner(state: MainState) -> Command[Literal["researcher", "writer", EN
             update={
                 "current_agent": "completed",
                 "shared_messages": [AIMessage(content=planning_result)],
-                "step_count": step_count,
                 "execution_log": [log_entry]
             }
         )
 
-def main_researcher(state: MainState) -> Command[Literal["writer", END]]:
+def main_researcher(state: MainState) -> dict:
     """
     主图研究者节点
     
     这个节点负责：
-    1. 创建并执行研究者子图
-    2. 将研究结果添加到共享消息
-    3. 路由到写作者智能体
-    4. 记录执行日志
+    1. 更新步骤计数
+    2. 准备研究者子图输入
     
     Args:
         state: 主图状态
-        
+    
     Returns:
-        Command 对象，指定下一个节点
+        状态更新（子图输入字段）
     """
     step_count = state.get("step_count", 0) + 1
-    task_description = state.get("task_description", "执行研究任务")
+    task_description = state.get("task_description") or "执行研究任务"
     
     # 打印主图状态快照
     print_main_state_snapshot(state, f"步骤 {step_count} 开始")
     
     log_message(f"=== 主图研究者节点执行 (步骤 {step_count}) ===", "START", "MAIN")
     log_message(f"研究任务: {task_description}", "INFO", "MAIN")
-    
-    # 创建执行日志
-    log_entry = create_execution_log(
-        agent_name="researcher",
-        action="开始信息研究",
-        step_count=step_count,
-        task=task_description
-    )
+    log_message("准备执行研究者子图...", "INFO", "MAIN")
     
     # 准备研究者子图输入
-    researcher_input = {
+    return {
         "task": task_description,
-        "research_start_time": time.time()
+        "research_start_time": time.time(),
+        "step_count": step_count
     }
+
+def researcher_router(state: MainState) -> Command[Literal["writer", END]]:
+    """
+    研究者路由节点
     
-    log_message("准备执行研究者子图...", "INFO", "MAIN")
+    这个节点负责：
+    1. 提取研究者子图的结果
+    2. 将研究结果添加到共享消息
+    3. 路由到写作者智能体
+    4. 记录执行日志
+    
+    Args:
+        state: 主图状态（已包含子图输出）
     
-    # 执行研究者子图
-    researcher_graph = create_researcher_subgraph()
-    researcher_result = researcher_graph.invoke(researcher_input)
+    Returns:
+        Command 对象，指定下一个节点
+    """
+    step_count = state.get("step_count", 0)
     
     log_message("研究者子图执行完成", "SUCCESS", "MAIN")
     
     # 提取结果
-    research_result = researcher_result.get("research_result", "")
+    research_result = state.get("research_result", "")
     
     log_message(f"研究结果长度: {len(research_result)} 字符", "INFO", "MAIN")
     
+    # 创建执行日志
+    log_entry = create_execution_log(
+        agent_name="researcher",
+        action="开始信息研究",
+        step_count=step_count,
+        task=state.get("task", "")
+    )
     log_entry["result"] = research_result[:200] + "..." if len(research_result) > 200 else research_result
     log_entry["status"] = "completed"
     
@@ -1093,64 +1196,73 @@ def main_researcher(state: MainState) -> Command[Literal["writer", END]]:
         update={
             "current_agent": "writer",
             "shared_messages": [AIMessage(content=f"研究结果: {research_result[:500]}...")],
-            "step_count": step_count,
             "execution_log": [log_entry]
         }
     )
 
-def main_writer(state: MainState) -> Command[Literal[END]]:
+def main_writer(state: MainState) -> dict:
     """
     主图写作者节点
     
     这个节点负责：
-    1. 创建并执行写作者子图
-    2. 生成最终内容
-    3. 完成任务
-    4. 记录执行日志
+    1. 更新步骤计数
+    2. 准备写作者子图输入
     
     Args:
         state: 主图状态
-        
+    
     Returns:
-        Command 对象，结束执行
+        状态更新（子图输入字段）
     """
     step_count = state.get("step_count", 0) + 1
-    task_description = state.get("task_description", "生成内容")
+    task_description = state.get("task_description") or "生成内容"
     
     # 打印主图状态快照
     print_main_state_snapshot(state, f"步骤 {step_count} 开始")
     
     log_message(f"=== 主图写作者节点执行 (步骤 {step_count}) ===", "START", "MAIN")
     log_message(f"创作要求: {task_description}", "INFO", "MAIN")
-    
-    # 创建执行日志
-    log_entry = create_execution_log(
-        agent_name="writer",
-        action="开始内容创作",
-        step_count=step_count,
-        requirements=task_description
-    )
+    log_message("准备执行写作者子图...", "INFO", "MAIN")
     
     # 准备写作者子图输入
-    writer_input = {
+    return {
         "requirements": task_description,
         "research_data": "基于前面的研究结果",
-        "writing_start_time": time.time()
+        "writing_start_time": time.time(),
+        "step_count": step_count
     }
+
+def writer_router(state: MainState) -> Command[Literal[END]]:
+    """
+    写作者路由节点
     
-    log_message("准备执行写作者子图...", "INFO", "MAIN")
+    这个节点负责：
+    1. 提取写作者子图生成的最终内容
+    2. 完成任务
+    3. 记录执行日志
+    
+    Args:
+        state: 主图状态（已包含子图输出）
     
-    # 执行写作者子图
-    writer_graph = create_writer_subgraph()
-    writer_result = writer_graph.invoke(writer_input)
+    Returns:
+        Command 对象，结束执行
+    """
+    step_count = state.get("step_count", 0)
     
     log_message("写作者子图执行完成", "SUCCESS", "MAIN")
     
     # 提取结果
-    final_content = writer_result.get("final_content", "")
+    final_content = state.get("final_content", "")
     
     log_message(f"最终内容长度: {len(final_content)} 字符", "INFO", "MAIN")
     
+    # 创建执行日志
+    log_entry = create_execution_log(
+        agent_name="writer",
+        action="开始内容创作",
+        step_count=step_count,
+        requirements=state.get("requirements", "")
+    )
     log_entry["result"] = final_content[:200] + "..." if len(final_content) > 200 else final_content
     log_entry["status"] = "completed"
     
@@ -1166,25 +1278,26 @@ def main_writer(state: MainState) -> Command[Literal[END]]:
         update={
             "current_agent": "completed",
             "shared_messages": [AIMessage(content=final_content)],
-            "step_count": step_count,
             "execution_log": [log_entry]
         }
     )
 
 # ===== 主图工作流创建 =====
 
-def create_multi_agent_workflow():
+def create_multi_agent_workflow(checkpointer=None):
     """
     创建多智能体工作流（使用子图）
     
     工作流结构：
-    START → planner → researcher → writer → END
+    START → planner → planner_subgraph → planner_router
+          → researcher → researcher_subgraph → researcher_router
+          → writer → writer_subgraph → writer_router → END
+    
+    子图从注册表获取，整个进程只编译一次；子图作为原生子节点挂到主图上，
+    与主图共享 checkpointer，执行事件可通过 stream(..., subgraphs=True) 获取。
     
-    每个节点都会：
-    1. 创建对应的子图
-    2. 执行子图逻辑
-    3. 根据结果决定路由
-    4. 更新主图状态
+    Args:
+        checkpointer: 主图检查点存储，默认使用 InMemorySaver
     
     Returns:
         编译后的多智能体工作流
@@ -1192,16 +1305,28 @@ def create_multi_agent_workflow():
     log_message("创建多智能体工作流", "DEBUG", "SYSTEM")
     workflow = StateGraph(MainState)
     
-    # 添加主图节点
+    # 添加主图节点：输入准备 → 子图 → 路由
     workflow.add_node("planner", main_planner)
+    workflow.add_node("planner_subgraph", SUBGRAPHS.get("planner"))
+    workflow.add_node("planner_router", planner_router)
+    
     workflow.add_node("researcher", main_researcher)
+    workflow.add_node("researcher_subgraph", SUBGRAPHS.get("researcher"))
+    workflow.add_node("researcher_router", researcher_router)
+    
     workflow.add_node("writer", main_writer)
+    workflow.add_node("writer_subgraph", SUBGRAPHS.get("writer"))
+    workflow.add_node("writer_router", writer_router)
+    
+    for agent_name in ("planner", "researcher", "writer"):
+        workflow.add_edge(agent_name, f"{agent_name}_subgraph")
+        workflow.add_edge(f"{agent_name}_subgraph", f"{agent_name}_router")
     
     # 设置入口点
     workflow.set_entry_point("planner")
     
     # 编译工作流
-    return workflow.compile()
+    return workflow.compile(checkpointer=checkpointer or InMemorySaver())
 
 # ===== 测试和演示函数 =====
 
@@ -1253,22 +1378,34 @@ def test_multi_agent_system():
             log_message(f"开始执行测试 {i}", "START", "SYSTEM")
             if JSON_STREAM:
                 sse_send("start", {"test_index": i, "input": user_input})
-            config = {}
-            config["thread_id"] = "test"
-            # 执行工作流
+            # 每个测试使用独立的会话，主图与子图的检查点都记录在该会话下
+            config = {"configurable": {"thread_id": f"test-{i}"}}
+            # 执行工作流（subgraphs=True 时子图内部的状态变化也会流式输出）
             log_message("开始流式执行工作流...", "INFO", "SYSTEM")
-            stream_result = graph.stream(inputs, config=config, stream_mode="values")
+            stream_result = graph.stream(inputs, config=config, stream_mode="values", subgraphs=True)
             
             # 处理流式结果
             final_result = None
             chunk_count = 0
-            for chunk in stream_result:
+            for namespace, chunk in stream_result:
                 chunk_count += 1
                 log_message(f"接收到流式数据块 {chunk_count}", "DEBUG", "SYSTEM")
                 
                 # 使用专门的函数分析chunk内容
                 analyze_chunk_content(chunk, chunk_count)
                 
+                if namespace:
+                    # 子图内部的状态，namespace 形如 ("planner_subgraph:<task_id>",)
+                    subgraph_name = namespace[-1].split(":")[0]
+                    log_message(f"子图 {subgraph_name} 状态更新: {list(chunk.keys())}", "DEBUG", "SYSTEM")
+                    if JSON_STREAM:
+                        sse_send("subgraph_state", {
+                            "subgraph": subgraph_name,
+                            "namespace": list(namespace),
+                            "keys": list(chunk.keys())
+                        })
+                    continue
+                
                 # 获取最后一个chunk作为最终结果
                 if isinstance(chunk, dict):
                     final_result = chunk
@@ -1358,6 +1495,7 @@ def demonstrate_subgraph_structure():
     
     print("\n🎯 主图结构:")
     print("  START → planner → researcher → writer → END")
+    print("  每个智能体展开为: <agent> → <agent>_subgraph → <agent>_router")
     print("  功能: 智能体协调、状态管理、结果聚合")
     
     print("\n💡 子图优势:")
@@ -1366,6 +1504,7 @@ def demonstrate_subgraph_structure():
     print("✅ 便于测试和维护单个智能体")
     print("✅ 可以独立扩展和优化")
     print("✅ 支持状态隔离和隐私保护")
+    print("✅ 注册表只编译一次，作为原生子节点共享 checkpointer 与流式事件")
 
 def show_agent_configurations():
     """
@@ -1427,4 +1566,5 @@ if __name__ == "__main__":
         print("3. 模块化设计: 便于测试和维护")
         print("4. 主图协调: 统一的状态管理和路由")
         print("5. 最终结果共享: 智能体间只传递必要信息")
-        print("6. 可扩展性: 支持复杂的内部逻辑") 
\ No newline at end of file
+        print(f"6. 子图注册表: {SUBGRAPHS.stats()}")
+        print("7. 可扩展性: 支持复杂的内部逻辑") 
\ No newline at end of file
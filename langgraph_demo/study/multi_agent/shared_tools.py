@@ -0,0 +1,222 @@
+"""
+多智能体示例共用的工具集
+
+12-2_supervisor_worker.py、12-4_分层.py、12-5_swarm_simple.py 原先各自声明了一份同名工具，
+这里统一以 async 函数实现一次，注册到共享的 ToolRuntime（见 ../tool_runtime.py）：
+- 各团队通过 agent_tools([...]) 按名字取用，得到同时支持同步/异步调用的 StructuredTool
+- 同一轮里的多个工具调用并发执行，整轮耗时取决于最慢的工具
+- 查询类工具按 TTL 缓存结果；写文档、画图等有副作用的工具不缓存
+- 每个工具有独立的超时时间与并发上限
+
+search_web / get_company_info 在预设数据未命中时，可以用 configure_fallback_llm 注入的模型生成内容
+（12-4 使用该能力；未注入时直接返回"未找到"）。
+"""
+
+import asyncio
+import os
+import sys
+from typing import Iterable, List, Optional
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from config import logger
+from tool_runtime import ToolRuntime
+
+from langchain_core.messages import HumanMessage
+
+tool_runtime = ToolRuntime()
+
+# 模拟外部服务的网络耗时（秒），用于观察并发执行的效果
+SIMULATED_LATENCY = {
+    "get_weather": 0.3,
+    "search_web": 0.5,
+    "get_company_info": 0.5,
+}
+
+# 预设数据未命中时用于生成内容的模型（由 configure_fallback_llm 设置）
+_fallback_llm = None
+
+
+def configure_fallback_llm(model) -> None:
+    """设置 search_web / get_company_info 的兜底生成模型"""
+    global _fallback_llm
+    _fallback_llm = model
+
+
+def agent_tools(names: Iterable[str]) -> List:
+    """按名字取出工具，供 create_react_agent 使用"""
+    return tool_runtime.as_tools(names)
+
+
+async def _simulate_io(name: str) -> None:
+    await asyncio.sleep(SIMULATED_LATENCY.get(name, 0))
+
+
+async def _generate(prompt: str) -> Optional[str]:
+    if _fallback_llm is None:
+        return None
+    response = await _fallback_llm.ainvoke([HumanMessage(content=prompt)])
+    return response.content
+
+
+# ==================== 查询类工具（结果可缓存） ====================
+
+WEATHER_DATA = {
+    "北京": "晴天，温度25°C，湿度60%",
+    "上海": "多云，温度28°C，湿度70%",
+    "广州": "雨天，温度30°C，湿度80%",
+    "深圳": "晴天，温度29°C，湿度65%",
+    "杭州": "多云，温度26°C，湿度65%",
+    "成都": "阴天，温度24°C，湿度70%"
+}
+
+SEARCH_RESULTS = {
+    "人工智能": "人工智能是计算机科学的一个分支，致力于创建能够执行通常需要人类智能的任务的系统。主要技术包括机器学习、深度学习、自然语言处理等。",
+    "机器学习": "机器学习是人工智能的一个子集，它使计算机能够在没有明确编程的情况下学习和改进。主要算法包括监督学习、无监督学习、强化学习等。",
+    "深度学习": "深度学习是机器学习的一个分支，使用多层神经网络来模拟人脑的学习过程。在图像识别、语音识别、自然语言处理等领域取得了突破性进展。",
+    "自然语言处理": "自然语言处理是人工智能的一个重要分支，致力于让计算机理解、解释和生成人类语言。应用包括机器翻译、情感分析、问答系统等。",
+    "计算机视觉": "计算机视觉是人工智能的一个分支，致力于让计算机理解和分析视觉信息。应用包括图像识别、目标检测、人脸识别等。",
+    "苹果公司": "苹果公司（Apple Inc.）。参与了人工智能的前沿研究，如Siri、Face ID等。",
+}
+
+COMPANY_DATA = {
+    "苹果公司": "苹果公司（Apple Inc.）是一家总部位于美国加利福尼亚州的跨国科技公司，主要产品包括iPhone、iPad、Mac、Apple Watch等。",
+    "谷歌": "谷歌（Google）是Alphabet公司的子公司，是全球最大的搜索引擎公司，主要业务包括搜索、广告、云计算、人工智能等。",
+    "微软": "微软公司（Microsoft Corporation）是一家总部位于美国的跨国科技公司，主要产品包括Windows操作系统、Office办公软件、Azure云服务等。",
+    "亚马逊": "亚马逊（Amazon）是全球最大的电子商务公司之一，业务涵盖电商、云计算、人工智能、物流等多个领域。",
+    "特斯拉": "特斯拉（Tesla）是一家专注于电动汽车、能源存储和太阳能板的公司，致力于推动可持续能源的发展。"
+}
+
+
+@tool_runtime.tool(ttl=600, timeout=5, max_concurrency=8)
+async def get_weather(location: str) -> str:
+    """获取指定地点的天气信息"""
+    logger.info(f"🌤️ 工具调用: get_weather(location='{location}')")
+    await _simulate_io("get_weather")
+    result = WEATHER_DATA.get(location, f"无法获取{location}的天气信息")
+    logger.info(f"🌤️ 工具结果: get_weather -> {result}")
+    return result
+
+
+@tool_runtime.tool(ttl=3600, timeout=60, max_concurrency=4)
+async def search_web(query: str) -> str:
+    """搜索网络信息"""
+    logger.info(f"🔍 工具调用: search_web(query='{query}')")
+    await _simulate_io("search_web")
+    if query in SEARCH_RESULTS:
+        result = SEARCH_RESULTS[query]
+        logger.info(f"🔍 工具结果: search_web (预设) -> {result[:100]}...")
+        return result
+
+    try:
+        result = await _generate(f"""请提供关于"{query}"的详细、准确的信息。请包括以下方面：
+1. 基本定义和概念
+2. 主要特点或技术要点
+3. 应用领域或实际用途
+4. 相关的发展趋势或重要性
+
+请用中文回答，内容要详细、专业且易于理解。""")
+    except Exception as e:
+        logger.error(f"🔍 LLM生成内容失败: {e}")
+        return f"抱歉，无法获取关于'{query}'的信息。错误: {str(e)}"
+    if result is None:
+        return f"未找到关于'{query}'的相关信息"
+    logger.info(f"🔍 工具结果: search_web (LLM生成) -> {result[:100]}...")
+    return result
+
+
+@tool_runtime.tool(ttl=3600, timeout=60, max_concurrency=4)
+async def get_company_info(company: str) -> str:
+    """获取公司信息"""
+    logger.info(f"🏢 工具调用: get_company_info(company='{company}')")
+    await _simulate_io("get_company_info")
+    if company in COMPANY_DATA:
+        result = COMPANY_DATA[company]
+        logger.info(f"🏢 工具结果: get_company_info (预设) -> {result[:100]}...")
+        return result
+
+    try:
+        result = await _generate(f"""请提供关于"{company}"公司的详细、准确的信息。请包括以下方面：
+1. 公司基本信息和背景
+2. 主要业务和产品
+3. 市场地位和影响力
+4. 技术实力和创新能力
+5. 财务状况和发展前景
+
+请用中文回答，内容要详细、专业且客观。如果信息不确定，请说明。""")
+    except Exception as e:
+        logger.error(f"🏢 LLM生成内容失败: {e}")
+        return f"抱歉，无法获取关于'{company}'的公司信息。错误: {str(e)}"
+    if result is None:
+        return f"未找到关于'{company}'的公司信息"
+    logger.info(f"🏢 工具结果: get_company_info (LLM生成) -> {result[:100]}...")
+    return result
+
+
+# ==================== 计算类工具（纯函数，结果可缓存） ====================
+
+@tool_runtime.tool(ttl=3600, timeout=2, max_concurrency=8)
+async def calculate_math(expression: str) -> str:
+    """计算数学表达式"""
+    logger.info(f"🧮 工具调用: calculate_math(expression='{expression}')")
+    try:
+        # 安全的数学表达式计算
+        allowed_chars = set('0123456789+-*/(). ')
+        if all(c in allowed_chars for c in expression):
+            result = eval(expression)
+            return f"计算结果: {expression} = {result}"
+        return "表达式包含不允许的字符"
+    except Exception as e:
+        return f"计算错误: {str(e)}"
+
+
+@tool_runtime.tool(ttl=3600, timeout=2, max_concurrency=8)
+async def add_numbers(a: int, b: int) -> int:
+    """
+    加法运算工具
+
+    Args:
+        a: 第一个数字
+        b: 第二个数字
+
+    Returns:
+        两个数字的和
+    """
+    return a + b
+
+
+@tool_runtime.tool(ttl=3600, timeout=2, max_concurrency=8)
+async def multiply_numbers(a: int, b: int) -> int:
+    """
+    乘法运算工具
+
+    Args:
+        a: 第一个数字
+        b: 第二个数字
+
+    Returns:
+        两个数字的积
+    """
+    return a * b
+
+
+# ==================== 写作类工具（有副作用，不缓存） ====================
+
+@tool_runtime.tool(timeout=10, max_concurrency=2)
+async def write_document(content: str, title: str) -> str:
+    """创建文档"""
+    logger.info(f"📝 工具调用: write_document(title='{title}', content='{content[:50]}...')")
+    return f"已创建文档 '{title}'，内容：{content}"
+
+
+@tool_runtime.tool(timeout=10, max_concurrency=2)
+async def edit_document(content: str, suggestions: str) -> str:
+    """编辑文档"""
+    logger.info(f"✏️ 工具调用: edit_document(suggestions='{suggestions[:50]}...', content='{content[:50]}...')")
+    return f"根据建议 '{suggestions}' 编辑了文档，新内容：{content}"
+
+
+@tool_runtime.tool(timeout=10, max_concurrency=2)
+async def create_chart(data: str, chart_type: str) -> str:
+    """创建图表"""
+    logger.info(f"📊 工具调用: create_chart(chart_type='{chart_type}', data='{data[:50]}...')")
+    return f"已创建 {chart_type} 类型的图表，数据：{data}"
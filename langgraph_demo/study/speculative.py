@@ -0,0 +1,205 @@
+# -*- coding: utf-8 -*-
+"""
+推测式生成循环
+供 multi_agent/12-3_evaluator-optimizer评估优化器.py 和 10-1_提示链.py 使用：
+把"生成 → 评估 → 改进"的串行往返改为每轮并行生成多个候选、批量评估、先通过先结束
+
+设计要点：
+1. 每轮并行生成 n_candidates 个候选（不同的候选下标可对应不同的风格/温度）
+2. 批量评估：第一个候选完成后再等 batch_window 秒，把这段时间内完成的候选凑成一批调用 evaluate_batch；
+   batch_window=None 时等本轮全部候选完成后一次评估
+3. 任一候选通过 accept 即提前结束，仍在生成的候选直接放弃
+4. 一轮没有候选通过时，把本轮得分最高的候选及其评估交给下一轮生成（作为改进依据）
+5. 预算：最多 max_rounds 轮，总耗时超过 latency_budget 后不再开启新一轮、本轮也不再等待；
+   还没有任何已评估候选时预算不生效（latency_budget=0 也会返回第一批评估中最好的候选）
+6. 生成或评估失败只记录并跳过该批候选，不会中断循环；evaluate_batch 返回数量不符按失败处理
+7. 生成在 ContextThreadPoolExecutor 中执行，候选生成里的 LLM 调用继承调用方节点的回调（流式输出、追踪）
+8. 统计：轮数、生成/评估次数、放弃的候选数，以及相对串行循环节省的往返轮数（估算）
+
+注意：线程无法被强制中断，被放弃的候选会在后台生成完毕，其结果被丢弃。
+"""
+
+import time
+from concurrent.futures import ALL_COMPLETED, FIRST_COMPLETED, Future, wait
+from dataclasses import dataclass, field
+from typing import Any, Callable, Dict, List, Optional
+
+from langchain_core.runnables.config import ContextThreadPoolExecutor
+
+from config import logger
+
+
+@dataclass
+class Candidate:
+    """一个候选草稿"""
+    round: int
+    index: int
+    content: str
+    evaluation: Any = None
+    score: float = 0.0
+    accepted: bool = False
+
+
+@dataclass
+class SpeculativeResult:
+    """推测式循环的结果"""
+    best: Optional[Candidate]          # 通过的候选；都未通过时为得分最高的候选
+    accepted: bool
+    stop_reason: str                   # accepted / max_rounds / latency_budget / no_candidates
+    candidates: List[Candidate] = field(default_factory=list)  # 已评估的候选（按评估顺序）
+    stats: Dict[str, Any] = field(default_factory=dict)
+
+
+class SpeculativeLoop:
+    """
+    推测式 生成-评估 循环
+
+    generate(round, index, previous) -> str
+        previous 为上一轮得分最高的候选（第一轮为 None），可据其 evaluation 改进
+    evaluate_batch(contents) -> List[evaluation]
+        一次评估一批候选，返回与输入等长的评估结果
+    accept(evaluation) -> bool / score(evaluation) -> float
+
+    用法：
+        loop = SpeculativeLoop(generate, evaluate_batch, accept=..., score=..., n_candidates=3, max_rounds=3,
+                               batch_window=0.3)
+        result = loop.run()
+    """
+
+    def __init__(self, generate: Callable[[int, int, Optional[Candidate]], str],
+                 evaluate_batch: Callable[[List[str]], List[Any]], *,
+                 accept: Callable[[Any], bool],
+                 score: Callable[[Any], float],
+                 n_candidates: int = 3,
+                 max_rounds: int = 3,
+                 latency_budget: Optional[float] = None,
+                 batch_window: Optional[float] = 0.3,
+                 name: str = "speculative"):
+        if n_candidates < 1:
+            raise ValueError("n_candidates 至少为 1")
+        self.generate = generate
+        self.evaluate_batch = evaluate_batch
+        self.accept = accept
+        self.score = score
+        self.n_candidates = n_candidates
+        self.max_rounds = max_rounds
+        self.latency_budget = latency_budget
+        self.batch_window = batch_window
+        self.name = name
+
+    def _remaining(self, started: float) -> Optional[float]:
+        if self.latency_budget is None:
+            return None
+        return max(0.0, self.latency_budget - (time.perf_counter() - started))
+
+    def _collect_batch(self, pending: Dict[Future, int], first_done: set, started: float) -> set:
+        """第一个候选完成后，在批量窗口（且不超过剩余预算）内继续收集已完成的候选"""
+        rest = [f for f in pending if f not in first_done]
+        if not rest or self.batch_window == 0:
+            return first_done
+        limits = [t for t in (self.batch_window, self._remaining(started)) if t is not None]
+        more, _ = wait(rest, timeout=min(limits) if limits else None, return_when=ALL_COMPLETED)
+        return first_done | more
+
+    def _evaluate(self, batch: List[Candidate], counters: Dict[str, int]) -> bool:
+        """批量评估；评估失败或返回数量不符时记录并返回 False"""
+        counters["evaluation_batches"] += 1
+        try:
+            evaluations = list(self.evaluate_batch([c.content for c in batch]))
+            if len(evaluations) != len(batch):
+                raise ValueError(f"evaluate_batch 返回 {len(evaluations)} 个结果，期望 {len(batch)} 个")
+            for candidate, evaluation in zip(batch, evaluations):
+                candidate.evaluation = evaluation
+                candidate.score = float(self.score(evaluation))
+                candidate.accepted = bool(self.accept(evaluation))
+        except Exception as e:
+            counters["evaluation_failed"] += 1
+            logger.error(f"[{self.name}] 批量评估 {len(batch)} 个候选失败，跳过这批候选: {e}")
+            return False
+        return True
+
+    def run(self) -> SpeculativeResult:
+        started = time.perf_counter()
+        evaluated: List[Candidate] = []
+        previous: Optional[Candidate] = None
+        counters = {"rounds": 0, "generated": 0, "evaluation_batches": 0, "evaluation_failed": 0,
+                    "abandoned": 0, "failed": 0}
+        stop_reason = "max_rounds"
+        accepted: Optional[Candidate] = None
+
+        pool = ContextThreadPoolExecutor(max_workers=self.n_candidates, thread_name_prefix=f"speculative-{self.name}")
+        try:
+            for round_index in range(self.max_rounds):
+                if evaluated and self._remaining(started) == 0.0:
+                    stop_reason = "latency_budget"
+                    break
+                counters["rounds"] += 1
+                logger.info(f"[{self.name}] 第 {round_index + 1} 轮：并行生成 {self.n_candidates} 个候选")
+                pending: Dict[Future, int] = {
+                    pool.submit(self.generate, round_index, i, previous): i for i in range(self.n_candidates)
+                }
+                round_candidates: List[Candidate] = []
+
+                while pending and accepted is None:
+                    # 还没有任何已评估候选时不受耗时预算限制，至少等到一个结果
+                    timeout = self._remaining(started) if evaluated else None
+                    done, _ = wait(list(pending), timeout=timeout, return_when=FIRST_COMPLETED)
+                    if not done:
+                        stop_reason = "latency_budget"
+                        break
+                    done = self._collect_batch(pending, done, started)
+
+                    batch: List[Candidate] = []
+                    for future in done:
+                        index = pending.pop(future)
+                        error = future.exception()
+                        if error is not None:
+                            counters["failed"] += 1
+                            logger.warning(f"[{self.name}] 候选 {round_index}-{index} 生成失败: {error}")
+                            continue
+                        counters["generated"] += 1
+                        batch.append(Candidate(round_index, index, future.result()))
+                    if not batch:
+                        continue
+
+                    # 已完成的候选一次批量评估
+                    if not self._evaluate(batch, counters):
+                        continue
+                    for candidate in batch:
+                        evaluated.append(candidate)
+                        round_candidates.append(candidate)
+                        logger.info(f"[{self.name}] 候选 {round_index}-{candidate.index}: "
+                                    f"评分 {candidate.score}，{'通过' if candidate.accepted else '未通过'}")
+                        if candidate.accepted and accepted is None:
+                            accepted = candidate
+
+                # 提前结束或预算耗尽：放弃本轮仍在生成的候选
+                for future in pending:
+                    future.cancel()
+                counters["abandoned"] += len(pending)
+
+                if accepted is not None:
+                    stop_reason = "accepted"
+                    break
+                if stop_reason == "latency_budget":
+                    break
+                if round_candidates:
+                    previous = max(round_candidates, key=lambda c: c.score)
+        finally:
+            pool.shutdown(wait=False)
+
+        if not evaluated:
+            stop_reason = "no_candidates"
+        best = accepted or max(evaluated, key=lambda c: c.score, default=None)
+
+        # 串行循环每个候选需要一次 生成+评估 往返：到通过的候选为止（未通过则为全部已评估候选）
+        sequential_rounds = (evaluated.index(accepted) + 1) if accepted is not None else len(evaluated)
+        stats = {
+            **counters,
+            "evaluated": len(evaluated),
+            "sequential_rounds": sequential_rounds,
+            "rounds_saved": max(0, sequential_rounds - counters["rounds"]),
+            "elapsed": round(time.perf_counter() - started, 3),
+        }
+        logger.info(f"[{self.name}] 推测式循环结束（{stop_reason}）: {stats}")
+        return SpeculativeResult(best, accepted is not None, stop_reason, evaluated, stats)
@@ -0,0 +1,321 @@
+# -*- coding: utf-8 -*-
+"""
+流式事件编码层
+供 11_stream_fastapi*.py 共用：SSE / NDJSON 帧编码、消息对象规整、token 小块合并
+
+设计要点：
+1. 优先使用 orjson 直接输出 bytes，缺失时回退到标准库 json
+2. 按类型注册编码器（LangChain 消息类），沿 MRO 查找并缓存结果，避免逐个 hasattr 试探
+3. 只做一次序列化：不可序列化对象在 default 钩子里就地转换，不再预先 json.dumps 试探
+4. messages 模式下的 token 小块可按 N 毫秒合并为一帧，降低每 token 的编码与发送开销
+5. stream_llm_text：节点内流式调用 LLM，供各 11_stream_fastapi*.py 的 LLM 节点共用
+"""
+
+import json
+import time
+from typing import Any, Callable, Dict, Iterable, Iterator, Optional, Tuple
+
+try:
+    import orjson
+except ImportError:  # orjson 为可选依赖
+    orjson = None
+
+try:
+    from langchain_core.messages import AIMessageChunk, BaseMessage
+except ImportError:  # 允许在未安装 LangChain 的环境中单独使用编码层
+    AIMessageChunk = None
+    BaseMessage = None
+
+
+# ============================================================================
+# 类型编码器注册表
+# ============================================================================
+
+_ENCODERS: Dict[type, Callable[[Any], Any]] = {}
+_RESOLVED: Dict[type, Optional[Callable[[Any], Any]]] = {}
+
+
+def register_encoder(cls: type):
+    """注册某个类型的编码器（装饰器），子类沿 MRO 自动继承"""
+    def decorator(func: Callable[[Any], Any]) -> Callable[[Any], Any]:
+        _ENCODERS[cls] = func
+        _RESOLVED.clear()
+        return func
+    return decorator
+
+
+def resolve_encoder(tp: type) -> Optional[Callable[[Any], Any]]:
+    """按类型查找编码器，结果按类型缓存"""
+    try:
+        return _RESOLVED[tp]
+    except KeyError:
+        pass
+    encoder = None
+    for base in tp.__mro__:
+        encoder = _ENCODERS.get(base)
+        if encoder is not None:
+            break
+    _RESOLVED[tp] = encoder
+    return encoder
+
+
+def _default(obj: Any) -> Any:
+    """序列化钩子：仅对 orjson/json 无法原生处理的对象调用"""
+    encoder = resolve_encoder(type(obj))
+    if encoder is not None:
+        return encoder(obj)
+    if isinstance(obj, (set, frozenset)):
+        return list(obj)
+    return str(obj)
+
+
+# ============================================================================
+# 序列化
+# ============================================================================
+
+if orjson is not None:
+    _ORJSON_OPTS = orjson.OPT_NON_STR_KEYS | orjson.OPT_SERIALIZE_NUMPY
+
+    def dumps(obj: Any) -> bytes:
+        """序列化为 UTF-8 JSON bytes"""
+        try:
+            return orjson.dumps(obj, default=_default, option=_ORJSON_OPTS)
+        except orjson.JSONEncodeError:
+            # 超过 64 位的整数等极端情况回退到标准库
+            return _json_dumps(obj)
+else:
+    def dumps(obj: Any) -> bytes:
+        """序列化为 UTF-8 JSON bytes"""
+        return _json_dumps(obj)
+
+
+def _json_dumps(obj: Any) -> bytes:
+    return json.dumps(obj, ensure_ascii=False, default=_default, separators=(",", ":")).encode("utf-8")
+
+
+def dumps_str(obj: Any) -> str:
+    """序列化为 JSON 字符串"""
+    return dumps(obj).decode("utf-8")
+
+
+def sse_frame(data: Any, event: str = "message") -> bytes:
+    """编码一条 SSE 事件帧"""
+    return b"event: " + event.encode("utf-8") + b"\ndata: " + dumps(data) + b"\n\n"
+
+
+def ndjson_frame(data: Any, event: str = "message") -> bytes:
+    """编码一行 NDJSON 事件：{"event": ..., "data": ...}"""
+    return dumps({"event": event, "data": data}) + b"\n"
+
+
+# ============================================================================
+# 消息规整
+# ============================================================================
+
+def normalize_content(content: Any) -> str:
+    """将复杂 message content 规整为字符串，避免不可序列化/不可哈希对象向下游传播。"""
+    # 最常见的 token 内容为 str，放在最前面
+    if isinstance(content, str):
+        return content
+    try:
+        if content is None:
+            return ""
+        if isinstance(content, (int, float, bool)):
+            return str(content)
+        # LangChain 常见：list[dict|str|obj]
+        if isinstance(content, list):
+            parts = []
+            for item in content:
+                if isinstance(item, str):
+                    parts.append(item)
+                elif isinstance(item, dict):
+                    # 优先提取 text 字段
+                    txt = item.get("text") or item.get("content")
+                    parts.append(txt if isinstance(txt, str) else dumps_str(item))
+                else:
+                    parts.append(str(item))
+            return "".join(parts)
+        if isinstance(content, dict):
+            txt = content.get("text") or content.get("content")
+            if isinstance(txt, str):
+                return txt
+            return dumps_str(content)
+        encoder = resolve_encoder(type(content))
+        if encoder is not None:
+            encoded = encoder(content)
+            if isinstance(encoded, dict) and "content" in encoded:
+                return normalize_content(encoded["content"])
+        # 对象：尝试取 .text/.value/.content 等
+        for attr in ("text", "value", "content"):
+            if hasattr(content, attr):
+                return normalize_content(getattr(content, attr))
+        return str(content)
+    except Exception:
+        return str(content)
+
+
+if BaseMessage is not None:
+    @register_encoder(BaseMessage)
+    def encode_message(msg) -> dict:
+        """LangChain 消息 -> 精简字典"""
+        out = {"role": msg.type, "content": normalize_content(msg.content)}
+        if msg.id:
+            out["id"] = msg.id
+        if msg.name:
+            out["name"] = msg.name
+        tool_calls = getattr(msg, "tool_calls", None)
+        if tool_calls:
+            out["tool_calls"] = tool_calls
+        tool_call_id = getattr(msg, "tool_call_id", None)
+        if tool_call_id:
+            out["tool_call_id"] = tool_call_id
+        return out
+
+    @register_encoder(AIMessageChunk)
+    def encode_ai_chunk(msg) -> dict:
+        """流式 token 块的热路径：只取必要字段"""
+        out = {"role": "ai", "content": normalize_content(msg.content)}
+        if msg.id:
+            out["id"] = msg.id
+        if msg.tool_call_chunks:
+            out["tool_call_chunks"] = msg.tool_call_chunks
+        return out
+
+
+def extract_message_list(value: Any) -> list:
+    """从节点输出中提取 [{"role", "content"}] 列表"""
+    if isinstance(value, dict) and "messages" in value:
+        src = value["messages"]
+    elif isinstance(value, list):
+        src = value
+    else:
+        src = [value]
+    messages = []
+    for m in src:
+        encoder = resolve_encoder(type(m))
+        if encoder is not None:
+            encoded = encoder(m)
+            if isinstance(encoded, dict):
+                messages.append({"role": encoded.get("role") or "unknown", "content": encoded.get("content", "")})
+                continue
+        if isinstance(m, dict):
+            role = m.get("type") or m.get("role")
+            content = m.get("content")
+        else:
+            role = getattr(m, "type", None) or getattr(m, "role", None)
+            content = getattr(m, "content", None)
+        messages.append({"role": role or "unknown", "content": normalize_content(content)})
+    return messages
+
+
+def iter_node_items(chunk: Any) -> Iterator[Tuple[Any, Any]]:
+    """兼容性迭代：将 chunk 统一为 (node_name, node_value) 序列。
+    支持 dict、(node, value) 元组、[(node,value), ...] 列表、或其它类型。
+    """
+    if isinstance(chunk, dict):
+        yield from chunk.items()
+        return
+    if isinstance(chunk, tuple) and len(chunk) == 2:
+        yield chunk[0], chunk[1]
+        return
+    if isinstance(chunk, list):
+        for item in chunk:
+            if isinstance(item, tuple) and len(item) == 2:
+                yield item[0], item[1]
+            elif isinstance(item, dict):
+                yield from item.items()
+            else:
+                yield "unknown", item
+        return
+    # 其它未知类型，作为单个值输出
+    yield "unknown", chunk
+
+
+# ============================================================================
+# token 小块合并
+# ============================================================================
+
+class TokenCoalescer:
+    """
+    将 messages 模式下同一节点的连续 token 小块合并成一帧
+
+    满足任一条件即输出：节点切换、距本帧首个 token 超过 interval_ms、累计字符超过 max_chars。
+    同步生成器无法定时唤醒，因此超时判断发生在下一个 token 到达时。
+    """
+
+    def __init__(self, interval_ms: int = 50, max_chars: int = 2048):
+        self.interval = interval_ms / 1000.0
+        self.max_chars = max_chars
+        self._node = None
+        self._meta: Optional[dict] = None
+        self._parts: list = []
+        self._size = 0
+        self._started = 0.0
+
+    def feed(self, text: str, meta: dict) -> Optional[Tuple[str, dict]]:
+        """加入一个 token 块，需要输出时返回 (合并文本, 首块 meta)"""
+        node = meta.get("langgraph_node")
+        flushed = None
+        if self._parts and node != self._node:
+            flushed = self.flush()
+        if not self._parts:
+            self._node = node
+            self._meta = meta
+            self._started = time.monotonic()
+        self._parts.append(text)
+        self._size += len(text)
+        if flushed is None and (self._size >= self.max_chars or time.monotonic() - self._started >= self.interval):
+            flushed = self.flush()
+        return flushed
+
+    def flush(self) -> Optional[Tuple[str, dict]]:
+        """输出缓冲区中的内容"""
+        if not self._parts:
+            return None
+        frame = ("".join(self._parts), self._meta or {})
+        self._parts = []
+        self._size = 0
+        self._node = None
+        self._meta = None
+        return frame
+
+
+def coalesce_messages(stream: Iterable[Any], interval_ms: int = 50, max_chars: int = 2048) -> Iterator[Tuple[str, dict]]:
+    """
+    将 stream_mode="messages" 的 (message_chunk, metadata) 序列合并为 (text, metadata)
+
+    interval_ms <= 0 时不合并，逐块输出；内容为空的块（如纯工具调用增量）直接跳过。
+    """
+    coalescer = TokenCoalescer(interval_ms, max_chars) if interval_ms > 0 else None
+    for item in stream:
+        if not (isinstance(item, tuple) and len(item) == 2):
+            continue
+        msg, meta = item
+        text = normalize_content(getattr(msg, "content", msg))
+        if not text:
+            continue
+        meta = meta if isinstance(meta, dict) else {}
+        if coalescer is None:
+            yield text, meta
+            continue
+        frame = coalescer.feed(text, meta)
+        if frame is not None:
+            yield frame
+    if coalescer is not None:
+        frame = coalescer.flush()
+        if frame is not None:
+            yield frame
+
+
+# ============================================================================
+# 节点内流式调用
+# ============================================================================
+
+def stream_llm_text(llm: Any, messages: Any) -> str:
+    """
+    在节点内以流式方式调用 LLM 并返回拼接后的完整文本
+
+    图以 stream_mode="messages" 运行时，每个 token 块会按所在节点实时推送给调用方；
+    其它模式下与 llm.invoke 的结果相同。
+    """
+    return "".join(normalize_content(chunk.content) for chunk in llm.stream(messages))
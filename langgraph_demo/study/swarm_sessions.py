@@ -0,0 +1,236 @@
+# -*- coding: utf-8 -*-
+"""
+Swarm 会话持久化
+供 multi_agent/12-5_swarm_simple.py 使用：会话保存在本地 SQLite，进程重启后可以批量恢复
+
+设计要点：
+1. 会话表每个 thread_id 一行：当前活跃智能体、轮次、更新时间、压缩后的消息历史（JSON）
+2. active_agent 单独成列并建索引：恢复时直接把 active_agent 放进输入，
+   Swarm 从上次的智能体继续，不再经过入口智能体重新路由；也可以按活跃智能体列出会话
+3. 压缩交接状态：早于当前轮次的工具调用往返（包括 handoff 切换工具）只在当轮有意义，
+   持久化和送入模型时都去掉，只保留用户消息和智能体的文字回答，并按轮次截断；
+   同时带文字和 tool_calls 的 AI 消息保留文字，只去掉工具调用部分
+4. 每个智能体可以通过 pre_model_hook 只看自己需要的最近几轮（history_hook），
+   状态里的完整历史不变，只是不再把整段历史在每次切换时重新发给模型
+5. resume_many 一次查询取出多个会话，用 app.batch 并发恢复并写回
+"""
+
+import json
+import sqlite3
+import threading
+import time
+from dataclasses import dataclass, field
+from typing import Any, Callable, Dict, Iterable, List, Optional, Sequence
+
+from langchain_core.messages import (AIMessage, BaseMessage, HumanMessage, ToolMessage,
+                                     messages_from_dict, messages_to_dict)
+
+from config import logger
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS sessions (
+    thread_id TEXT PRIMARY KEY,
+    active_agent TEXT NOT NULL,
+    turns INTEGER NOT NULL DEFAULT 0,
+    updated_at REAL NOT NULL,
+    messages TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS sessions_active_agent ON sessions (active_agent, updated_at);
+"""
+
+# SQLite 单条语句的参数个数上限较低，批量查询按块进行
+_QUERY_CHUNK = 500
+
+
+def _strip_tool_calls(msg: AIMessage) -> Optional[AIMessage]:
+    """去掉 AI 消息中的工具调用，只保留文字部分；没有文字时返回 None"""
+    content = msg.content
+    if isinstance(content, list):
+        content = [block for block in content if isinstance(block, str) or block.get("type") == "text"]
+    if not content or (isinstance(content, str) and not content.strip()):
+        return None
+    additional_kwargs = {k: v for k, v in msg.additional_kwargs.items() if k not in ("tool_calls", "function_call")}
+    return msg.model_copy(update={"content": content, "tool_calls": [], "invalid_tool_calls": [],
+                                  "additional_kwargs": additional_kwargs})
+
+
+def compact_history(messages: Sequence[BaseMessage], max_turns: Optional[int] = None) -> List[BaseMessage]:
+    """
+    压缩消息历史
+
+    - 当前轮次（最后一条用户消息之后）原样保留，保证进行中的工具调用与结果成对
+    - 更早轮次去掉工具调用及其 ToolMessage，只保留用户消息和文字回答
+      （带 tool_calls 的 AI 消息若同时有文字，保留文字部分）
+    - max_turns 限制保留的用户轮次数（按用户消息切分，不会切断工具调用对）
+    """
+    messages = list(messages)
+    last_human = max((i for i, m in enumerate(messages) if isinstance(m, HumanMessage)), default=0)
+
+    dropped_calls = set()
+    compacted: List[BaseMessage] = []
+    for i, msg in enumerate(messages):
+        if i < last_human:
+            if isinstance(msg, AIMessage) and msg.tool_calls:
+                dropped_calls.update(call["id"] for call in msg.tool_calls)
+                msg = _strip_tool_calls(msg)
+                if msg is None:
+                    continue
+            if isinstance(msg, ToolMessage) and msg.tool_call_id in dropped_calls:
+                continue
+        compacted.append(msg)
+
+    if max_turns:
+        human_positions = [i for i, m in enumerate(compacted) if isinstance(m, HumanMessage)]
+        if len(human_positions) > max_turns:
+            compacted = compacted[human_positions[-max_turns]:]
+    return compacted
+
+
+def history_hook(max_turns: int) -> Callable[[Dict[str, Any]], Dict[str, Any]]:
+    """生成 create_react_agent 的 pre_model_hook：模型只看到压缩后的最近 max_turns 轮"""
+    def hook(state: Dict[str, Any]) -> Dict[str, Any]:
+        return {"llm_input_messages": compact_history(state["messages"], max_turns)}
+    return hook
+
+
+@dataclass
+class SwarmSession:
+    """一个持久化的 Swarm 会话"""
+    thread_id: str
+    active_agent: str
+    turns: int
+    updated_at: float
+    messages: List[BaseMessage] = field(default_factory=list)
+
+    def resume_input(self, user_message: str) -> Dict[str, Any]:
+        """恢复时的图输入：带上压缩历史和活跃智能体，Swarm 直接从该智能体继续"""
+        return {
+            "messages": self.messages + [HumanMessage(content=user_message)],
+            "active_agent": self.active_agent,
+        }
+
+
+class SwarmSessionStore:
+    """
+    基于 SQLite 的 Swarm 会话存储
+
+    用法：
+        store = SwarmSessionStore(config.data_path("swarm_sessions.sqlite"), default_agent="assistant_agent")
+        store.save(thread_id, app.get_state(config).values)
+        results = store.resume_many(app, {thread_id: "继续上次的计算"})
+    """
+
+    def __init__(self, path: str, default_agent: str, max_turns: int = 6):
+        self.path = path
+        self.default_agent = default_agent
+        self.max_turns = max_turns
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.executescript(_SCHEMA)
+
+    # ---------- 写入 ----------
+
+    def save(self, thread_id: str, values: Dict[str, Any]) -> SwarmSession:
+        """保存图的最新状态（压缩历史 + 活跃智能体）"""
+        messages = compact_history(values.get("messages", []), self.max_turns)
+        session = SwarmSession(
+            thread_id=thread_id,
+            active_agent=values.get("active_agent") or self.default_agent,
+            turns=sum(isinstance(m, HumanMessage) for m in values.get("messages", [])),
+            updated_at=time.time(),
+            messages=messages,
+        )
+        payload = json.dumps(messages_to_dict(messages), ensure_ascii=False)
+        with self._lock, self._conn:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO sessions (thread_id, active_agent, turns, updated_at, messages) "
+                "VALUES (?, ?, ?, ?, ?)",
+                (thread_id, session.active_agent, session.turns, session.updated_at, payload),
+            )
+        return session
+
+    def delete(self, thread_id: str) -> None:
+        with self._lock, self._conn:
+            self._conn.execute("DELETE FROM sessions WHERE thread_id = ?", (thread_id,))
+
+    # ---------- 读取 ----------
+
+    @staticmethod
+    def _to_session(row: Sequence[Any]) -> SwarmSession:
+        thread_id, active_agent, turns, updated_at, payload = row
+        return SwarmSession(thread_id, active_agent, turns, updated_at, messages_from_dict(json.loads(payload)))
+
+    def load(self, thread_id: str) -> Optional[SwarmSession]:
+        return self.load_many([thread_id]).get(thread_id)
+
+    def load_many(self, thread_ids: Iterable[str]) -> Dict[str, SwarmSession]:
+        """按块批量读取会话"""
+        thread_ids = list(dict.fromkeys(thread_ids))
+        sessions: Dict[str, SwarmSession] = {}
+        with self._lock:
+            for start in range(0, len(thread_ids), _QUERY_CHUNK):
+                chunk = thread_ids[start:start + _QUERY_CHUNK]
+                rows = self._conn.execute(
+                    "SELECT thread_id, active_agent, turns, updated_at, messages FROM sessions "
+                    f"WHERE thread_id IN ({','.join('?' * len(chunk))})",
+                    chunk,
+                ).fetchall()
+                for row in rows:
+                    sessions[row[0]] = self._to_session(row)
+        return sessions
+
+    def active_agent(self, thread_id: str) -> str:
+        """只查活跃智能体，不读取消息历史"""
+        with self._lock:
+            row = self._conn.execute("SELECT active_agent FROM sessions WHERE thread_id = ?", (thread_id,)).fetchone()
+        return row[0] if row else self.default_agent
+
+    def list_sessions(self, active_agent: Optional[str] = None, limit: int = 100) -> List[Dict[str, Any]]:
+        """按更新时间倒序列出会话（可按活跃智能体过滤，走索引）"""
+        sql = "SELECT thread_id, active_agent, turns, updated_at FROM sessions"
+        params: List[Any] = []
+        if active_agent is not None:
+            sql += " WHERE active_agent = ?"
+            params.append(active_agent)
+        sql += " ORDER BY updated_at DESC LIMIT ?"
+        params.append(limit)
+        with self._lock:
+            rows = self._conn.execute(sql, params).fetchall()
+        return [{"thread_id": r[0], "active_agent": r[1], "turns": r[2], "updated_at": r[3]} for r in rows]
+
+    # ---------- 恢复 ----------
+
+    def resume_many(self, app: Any, requests: Dict[str, str], max_concurrency: int = 4) -> Dict[str, Any]:
+        """
+        批量恢复会话并各自处理一条新的用户消息
+
+        requests: thread_id -> 用户消息；不存在的会话按新会话处理（从默认智能体开始）
+        返回 thread_id -> 图的最终状态（失败时为异常对象）
+        """
+        thread_ids = list(requests)
+        sessions = self.load_many(thread_ids)
+        inputs, configs = [], []
+        for thread_id in thread_ids:
+            session = sessions.get(thread_id)
+            if session is not None:
+                inputs.append(session.resume_input(requests[thread_id]))
+            else:
+                inputs.append({"messages": [HumanMessage(content=requests[thread_id])]})
+            configs.append({"configurable": {"thread_id": thread_id}, "max_concurrency": max_concurrency})
+
+        logger.info(f"🔁 批量恢复 {len(thread_ids)} 个会话（已持久化 {len(sessions)} 个）")
+        outputs = app.batch(inputs, configs, return_exceptions=True)
+
+        results: Dict[str, Any] = {}
+        for thread_id, output in zip(thread_ids, outputs):
+            if isinstance(output, Exception):
+                logger.error(f"❌ 会话 {thread_id} 恢复失败: {output}")
+            else:
+                self.save(thread_id, output)
+            results[thread_id] = output
+        return results
+
+    def close(self) -> None:
+        with self._lock:
+            self._conn.close()
@@ -0,0 +1,17 @@
+# -*- coding: utf-8 -*-
+"""
+study 目录下共享模块的测试
+
+模块之间按 `import config` 的方式互相引用，这里把 study 目录加入 sys.path；
+运行时数据目录指向临时目录，测试不会写入 ~/.langgraph_demo
+"""
+
+import os
+import sys
+import tempfile
+
+STUDY_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if STUDY_DIR not in sys.path:
+    sys.path.insert(0, STUDY_DIR)
+
+os.environ.setdefault("LANGGRAPH_DEMO_DATA_DIR", tempfile.mkdtemp(prefix="langgraph_demo_test_"))
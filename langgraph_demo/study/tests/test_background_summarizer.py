@@ -0,0 +1,151 @@
+# -*- coding: utf-8 -*-
+"""15_langmem_summarization_demo.BackgroundSummarizer：后台提交、同会话单任务、套用运行摘要不调用模型、落后时等待与失败回退"""
+
+import importlib
+import threading
+import time
+
+import pytest
+from langchain_core.messages import AIMessage, HumanMessage, SystemMessage
+from langchain_core.runnables import RunnableLambda
+from langgraph.store.memory import InMemoryStore
+
+from token_counter import TokenCounterService, approx_count
+
+demo = importlib.import_module("15_langmem_summarization_demo")
+
+SETTINGS = dict(max_tokens=64, max_tokens_before_summary=40, max_summary_tokens=32)
+
+
+class FakeSummaryModel:
+    """记录调用次数的摘要模型；可设置延迟，或让某次调用失败"""
+
+    def __init__(self, delay: float = 0.0):
+        self.delay = delay
+        self.calls = 0
+        self.fail = False
+        self.release = threading.Event()
+        self.release.set()
+        self.runnable = RunnableLambda(self._invoke)
+
+    def _invoke(self, messages):
+        self.calls += 1
+        self.release.wait(5)
+        time.sleep(self.delay)
+        if self.fail:
+            raise RuntimeError("summary model down")
+        return AIMessage(content=f"summary #{self.calls}")
+
+
+def _counter():
+    service = TokenCounterService("gpt-4o-mini")
+    service._encode = lambda texts: [approx_count(t) for t in texts]
+    return service
+
+
+def _conversation(turns, start=0):
+    messages = []
+    for i in range(start, start + turns):
+        messages.append(HumanMessage(content=f"question number {i} " + "x" * 40, id=f"h{i}"))
+        messages.append(AIMessage(content=f"answer number {i} " + "y" * 40, id=f"a{i}"))
+    return messages
+
+
+def _summarizer(model, **kwargs):
+    return demo.BackgroundSummarizer(InMemoryStore(), model.runnable, _counter(), **{**SETTINGS, **kwargs})
+
+
+def test_short_history_does_not_schedule():
+    model = FakeSummaryModel()
+    summarizer = _summarizer(model)
+
+    assert not summarizer.schedule("t", [HumanMessage(content="hi", id="h0")])
+    assert summarizer.get_summary("t") is None
+    assert model.calls == 0
+
+
+def test_summary_runs_in_background_and_is_applied_without_model_call():
+    model = FakeSummaryModel()
+    summarizer = _summarizer(model)
+    messages = _conversation(4)
+
+    assert summarizer.schedule("t", messages)
+    summarizer.wait()
+    running = summarizer.get_summary("t")
+    assert running is not None and running.summary == "summary #1"
+
+    model.fail = True  # apply 不应再调用摘要模型
+    context = summarizer.apply("t", messages + _conversation(1, start=4))
+    assert model.calls == 1
+    assert isinstance(context[0], SystemMessage) and "summary #1" in context[0].content
+    assert context[-1].id == "a4"
+    assert len(context) < len(messages) + 2
+
+
+def test_one_inflight_task_per_thread():
+    model = FakeSummaryModel()
+    model.release.clear()
+    summarizer = _summarizer(model)
+    messages = _conversation(4)
+
+    assert summarizer.schedule("t", messages)
+    assert not summarizer.schedule("t", messages)
+    assert summarizer.schedule("other", messages)
+
+    model.release.set()
+    summarizer.wait()
+    assert model.calls == 2
+    assert summarizer._inflight == {}
+
+
+def test_apply_does_not_wait_when_not_lagging():
+    model = FakeSummaryModel()
+    model.release.clear()
+    summarizer = _summarizer(model, lag_factor=100)
+    messages = _conversation(4)
+    summarizer.schedule("t", messages)
+
+    start = time.perf_counter()
+    context = summarizer.apply("t", messages)
+    assert time.perf_counter() - start < 0.5
+    assert context == messages
+
+    model.release.set()
+    summarizer.wait()
+
+
+def test_lagging_apply_waits_for_inflight_summary():
+    model = FakeSummaryModel(delay=0.2)
+    summarizer = _summarizer(model, lag_factor=1)
+    messages = _conversation(4)
+    summarizer.schedule("t", messages)
+
+    context = summarizer.apply("t", messages)
+
+    assert "summary #1" in context[0].content
+
+
+def test_failed_summary_keeps_last_good_summary(monkeypatch):
+    warnings = []
+    monkeypatch.setattr(demo.logger, "warning", warnings.append)
+    model = FakeSummaryModel()
+    summarizer = _summarizer(model, lag_factor=1)
+    messages = _conversation(4)
+    summarizer.schedule("t", messages)
+    summarizer.wait()
+
+    model.fail = True
+    model.delay = 0.1
+    longer = messages + _conversation(4, start=4)
+    assert summarizer.schedule("t", longer)
+
+    context = summarizer.apply("t", longer)
+
+    assert "summary #1" in context[0].content
+    assert summarizer.get_summary("t").summary == "summary #1"
+    assert len(warnings) == 1 and "summary model down" in warnings[0]
+
+
+@pytest.fixture(autouse=True)
+def _quiet_print(monkeypatch):
+    monkeypatch.setattr("builtins.print", lambda *args, **kwargs: None)
@@ -0,0 +1,131 @@
+# -*- coding: utf-8 -*-
+"""branch_executor：分支截止时间、quorum 跳过、错误隔离、串行分支合并，以及分支内 LLM 调用的流式输出"""
+
+import importlib
+import operator
+import time
+from typing import Annotated, Dict, List, Optional, TypedDict
+
+import pytest
+from langchain_core.language_models.fake_chat_models import GenericFakeChatModel
+from langchain_core.messages import AIMessage, HumanMessage
+from langgraph.graph import END, START, StateGraph
+
+from branch_executor import ParallelBranchExecutor, sequential
+
+
+class _State(TypedDict, total=False):
+    results: Annotated[List[str], operator.add]
+    branch_group: str
+    branch_timings: Annotated[Dict[str, dict], operator.or_]
+    summary: dict
+
+
+def _build(branches: ParallelBranchExecutor, workers: Dict[str, callable], quorum: Optional[int] = None,
+           timeouts: Optional[Dict[str, float]] = None):
+    builder = StateGraph(_State)
+    builder.add_node("start", branches.opener(list(workers), quorum=quorum))
+    builder.add_node("join", lambda state: {"summary": branches.close(state)})
+    builder.add_edge(START, "start")
+    for name, fn in workers.items():
+        builder.add_node(name, branches.branch(name, fn, timeout=(timeouts or {}).get(name)))
+        builder.add_edge("start", name)
+        builder.add_edge(name, "join")
+    builder.add_edge("join", END)
+    return builder.compile()
+
+
+def _sleeper(name: str, seconds: float):
+    def fn(state):
+        time.sleep(seconds)
+        return {"results": [name]}
+    return fn
+
+
+@pytest.fixture
+def branches():
+    executor = ParallelBranchExecutor(max_workers=4, default_timeout=1.0)
+    yield executor
+    executor.shutdown()
+
+
+def test_slow_branch_times_out_without_blocking_join(branches):
+    graph = _build(branches, {"fast": _sleeper("fast", 0.0), "slow": _sleeper("slow", 2.0)},
+                   timeouts={"slow": 0.1})
+
+    started = time.perf_counter()
+    state = graph.invoke({"results": []})
+
+    assert time.perf_counter() - started < 1.0
+    assert state["results"] == ["fast"]
+    assert state["branch_timings"]["slow"]["status"] == "timeout"
+    assert state["summary"]["missing"] == ["slow"]
+
+
+def test_quorum_skips_remaining_branches(branches):
+    graph = _build(branches, {"a": _sleeper("a", 0.0), "b": _sleeper("b", 0.0), "c": _sleeper("c", 0.8)},
+                   quorum=2)
+
+    state = graph.invoke({"results": []})
+
+    assert sorted(state["results"]) == ["a", "b"]
+    assert state["branch_timings"]["c"]["status"] == "skipped"
+    assert state["summary"]["quorum_reached"]
+
+
+def test_branch_error_is_recorded_not_raised(branches):
+    def broken(state):
+        raise RuntimeError("boom")
+
+    state = _build(branches, {"ok": _sleeper("ok", 0.0), "broken": broken}).invoke({"results": []})
+
+    assert state["results"] == ["ok"]
+    assert state["branch_timings"]["broken"] == {
+        "status": "error", "elapsed": state["branch_timings"]["broken"]["elapsed"], "error": "RuntimeError: boom"}
+
+
+def test_llm_calls_inside_branches_stream_as_node_messages(branches):
+    """分支函数在线程池中运行，仍继承节点的运行配置"""
+    model = GenericFakeChatModel(messages=iter([AIMessage(content="from branch")]))
+
+    def ask(state):
+        return {"results": [model.invoke([HumanMessage(content="hi")]).content]}
+
+    graph = _build(branches, {"ask": ask})
+    chunks = list(graph.stream({"results": []}, stream_mode="messages"))
+
+    assert chunks and {metadata["langgraph_node"] for _, metadata in chunks} == {"ask"}
+    assert "".join(chunk.content for chunk, _ in chunks) == "from branch"
+
+
+def test_sequential_runs_steps_in_order_and_merges_updates():
+    calls = []
+
+    def first(state):
+        calls.append("first")
+        return {"results": ["first"], "branch_timings": {"x": {}}, "summary": {"n": 1, "m": 1}}
+
+    def second(state):
+        calls.append("second")
+        return {"results": ["second"], "branch_timings": {"y": {}}, "summary": {"n": 2}}
+
+    assert sequential(first, second)({}) == {
+        "results": ["first", "second"], "branch_timings": {"x": {}, "y": {}}, "summary": {"n": 2, "m": 1}}
+    assert calls == ["first", "second"]
+
+
+def test_demo_quorum_releases_slow_branch_without_timeout(monkeypatch):
+    """示例图的终端分支都在同一超步：不设截止时间时，quorum 也能放行慢的 Worker3"""
+    demo = importlib.import_module("05_扇入扇出聚合并发")
+    branches = ParallelBranchExecutor(max_workers=4, default_timeout=None)
+    monkeypatch.setattr(demo, "branch_executor", branches)
+    monkeypatch.setitem(demo.SIMULATED_LATENCY, "Worker3", 3.0)
+    graph = demo.build_fan_in_fan_out_graph()
+
+    started = time.perf_counter()
+    state = graph.invoke({"user_input": "q"}, config={"max_concurrency": demo.BRANCH_POOL_SIZE})
+    branches.shutdown()
+
+    assert time.perf_counter() - started < 1.5
+    assert sorted(state["parallel_results"]) == ["Worker1结果", "Worker2_1结果", "Worker2结果"]
+    assert state["branch_timings"]["parallel_3"]["status"] == "skipped"
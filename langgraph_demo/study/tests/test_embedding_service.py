@@ -0,0 +1,170 @@
+# -*- coding: utf-8 -*-
+"""embedding_service：缓存命中、in-flight 合并、凑批、错误传递给所有等待者"""
+
+import asyncio
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import List
+
+import pytest
+from langchain_core.embeddings import Embeddings
+
+from embedding_service import CachedEmbeddings
+
+
+class CountingEmbeddings(Embeddings):
+    """按文本长度生成向量，记录每次 embed_documents / embed_query 的输入"""
+
+    def __init__(self, delay: float = 0.0, fail: bool = False, drop_last: bool = False):
+        self.delay = delay
+        self.fail = fail
+        self.drop_last = drop_last
+        self.document_calls: List[List[str]] = []
+        self.query_calls: List[str] = []
+        self._lock = threading.Lock()
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        with self._lock:
+            self.document_calls.append(list(texts))
+        time.sleep(self.delay)
+        if self.fail:
+            raise RuntimeError("embedding backend down")
+        vectors = [[float(len(t)), 1.0] for t in texts]
+        return vectors[:-1] if self.drop_last else vectors
+
+    def embed_query(self, text: str) -> List[float]:
+        self.query_calls.append(text)
+        return [float(len(text)), 0.0]
+
+
+def test_repeated_texts_hit_memory_cache():
+    backend = CountingEmbeddings()
+    embeddings = CachedEmbeddings(backend, model="fake")
+
+    first = embeddings.embed_documents(["a", "bb"])
+    second = embeddings.embed_documents(["bb", "a"])
+
+    assert first == [[1.0, 1.0], [2.0, 1.0]]
+    assert second == [[2.0, 1.0], [1.0, 1.0]]
+    assert backend.document_calls == [["a", "bb"]]
+    stats = embeddings.stats()
+    assert stats["misses"] == 2
+    assert stats["memory_hits"] == 2
+    assert stats["hit_rate"] == 0.5
+
+
+def test_query_shares_document_cache_when_batching_queries():
+    backend = CountingEmbeddings()
+    embeddings = CachedEmbeddings(backend, model="fake")
+
+    embeddings.embed_documents(["hello"])
+    assert embeddings.embed_query("hello") == [5.0, 1.0]
+    assert backend.query_calls == []
+    assert len(backend.document_calls) == 1
+
+
+def test_queries_use_embed_query_when_not_batched():
+    backend = CountingEmbeddings()
+    embeddings = CachedEmbeddings(backend, model="fake", batch_queries=False)
+
+    embeddings.embed_documents(["hello"])
+    assert embeddings.embed_query("hello") == [5.0, 0.0]
+    assert embeddings.embed_query("hello") == [5.0, 0.0]
+    assert backend.query_calls == ["hello"]
+
+
+def test_lru_evicts_oldest_entry():
+    backend = CountingEmbeddings()
+    embeddings = CachedEmbeddings(backend, model="fake", cache_size=2)
+
+    embeddings.embed_documents(["a", "bb", "ccc"])
+    embeddings.embed_documents(["a"])
+
+    assert backend.document_calls == [["a", "bb", "ccc"], ["a"]]
+    assert embeddings.stats()["memory_entries"] == 2
+
+
+def test_concurrent_requests_for_same_text_share_one_call():
+    backend = CountingEmbeddings(delay=0.1)
+    embeddings = CachedEmbeddings(backend, model="fake")
+
+    with ThreadPoolExecutor(max_workers=4) as pool:
+        results = list(pool.map(lambda _: embeddings.embed_query("same"), range(4)))
+
+    assert results == [[4.0, 1.0]] * 4
+    assert backend.document_calls == [["same"]]
+    stats = embeddings.stats()
+    assert stats["misses"] == 1
+    assert stats["inflight_joins"] + stats["memory_hits"] == 3
+
+
+def test_concurrent_misses_are_batched_and_order_preserved():
+    backend = CountingEmbeddings(delay=0.05)
+    embeddings = CachedEmbeddings(backend, model="fake", max_wait_ms=200)
+    texts = ["x" * n for n in range(1, 9)]
+
+    with ThreadPoolExecutor(max_workers=len(texts)) as pool:
+        results = list(pool.map(embeddings.embed_query, texts))
+
+    assert results == [[float(len(t)), 1.0] for t in texts]
+    assert sorted(t for call in backend.document_calls for t in call) == sorted(texts)
+    # 第一批发出后，其余请求在等待窗口内合并
+    assert len(backend.document_calls) < len(texts)
+    assert embeddings.stats()["embedded_texts"] == len(texts)
+
+
+def test_max_batch_size_splits_requests():
+    backend = CountingEmbeddings()
+    embeddings = CachedEmbeddings(backend, model="fake", max_batch_size=2)
+
+    embeddings.embed_documents(["a", "b", "c", "d", "e"])
+
+    assert backend.document_calls == [["a", "b"], ["c", "d"], ["e"]]
+
+
+def test_backend_error_reaches_every_waiter_and_is_not_cached():
+    backend = CountingEmbeddings(delay=0.1, fail=True)
+    embeddings = CachedEmbeddings(backend, model="fake")
+
+    def call(_):
+        try:
+            embeddings.embed_query("boom")
+        except RuntimeError as e:
+            return str(e)
+        return "ok"
+
+    with ThreadPoolExecutor(max_workers=3) as pool:
+        outcomes = list(pool.map(call, range(3)))
+
+    assert outcomes == ["embedding backend down"] * 3
+    assert embeddings.stats()["memory_entries"] == 0
+
+    # 失败的 Future 已移出 in-flight，恢复后可以重试
+    backend.fail = False
+    backend.delay = 0.0
+    assert embeddings.embed_query("boom") == [4.0, 1.0]
+
+
+def test_count_mismatch_fails_whole_batch():
+    backend = CountingEmbeddings(drop_last=True)
+    embeddings = CachedEmbeddings(backend, model="fake")
+
+    with pytest.raises(ValueError, match="不一致"):
+        embeddings.embed_documents(["a", "bb"])
+    assert embeddings.stats()["memory_entries"] == 0
+
+
+def test_async_interface_uses_same_cache():
+    backend = CountingEmbeddings()
+    embeddings = CachedEmbeddings(backend, model="fake")
+
+    async def main():
+        docs = await embeddings.aembed_documents(["a", "bb"])
+        query = await embeddings.aembed_query("a")
+        return docs, query
+
+    docs, query = asyncio.run(main())
+    assert docs == [[1.0, 1.0], [2.0, 1.0]]
+    assert query == [1.0, 1.0]
+    assert backend.document_calls == [["a", "bb"]]
@@ -0,0 +1,144 @@
+# -*- coding: utf-8 -*-
+"""hybrid_retrieval：分词、Aho–Corasick、BM25、标签/情感倒排的增删、RRF 融合与向量通道的命名空间过滤"""
+
+import math
+from typing import List
+
+import pytest
+from langchain_core.embeddings import Embeddings
+from langgraph.store.memory import InMemoryStore
+
+from hybrid_retrieval import AhoCorasick, HybridMemoryRetriever, tokenize
+
+NAMESPACE = ("demo_user", "memories")
+TOPICS = ["咖啡", "跑步", "python"]
+
+
+class TopicEmbeddings(Embeddings):
+    """按话题词出现次数生成向量"""
+
+    def _vector(self, text: str) -> List[float]:
+        return [float(text.lower().count(topic)) + 0.01 for topic in TOPICS]
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        return [self._vector(t) for t in texts]
+
+    def embed_query(self, text: str) -> List[float]:
+        return self._vector(text)
+
+
+MEMORIES = {
+    "m1": {"content": "早上喝咖啡", "tags": ["咖啡"], "emotional_context": "很开心", "importance": 0.5},
+    "m2": {"content": "周末去跑步", "tags": ["运动"], "emotional_context": "有点焦虑", "importance": 0.9},
+    "m3": {"content": "学习 python 编程", "tags": ["学习", "编程"], "emotional_context": "兴奋", "importance": 0.7},
+}
+
+
+def _store():
+    return InMemoryStore(index={"embed": TopicEmbeddings(), "dims": len(TOPICS), "fields": ["content"]})
+
+
+@pytest.fixture
+def retriever():
+    store = _store()
+    for key, value in MEMORIES.items():
+        store.put(NAMESPACE, key, value)
+    return HybridMemoryRetriever(store, NAMESPACE)
+
+
+def test_tokenize_words_and_cjk_bigrams():
+    assert tokenize("Hello 世界和平 a 我") == ["hello", "世界", "界和", "和平", "a", "我"]
+
+
+def test_aho_corasick_finds_overlapping_patterns_in_order():
+    matcher = AhoCorasick([("he", 1), ("she", 2), ("his", 3), ("hers", 4), ("", 5)])
+
+    assert matcher.find_all("ushers") == [("she", 2), ("he", 1), ("hers", 4)]
+    assert matcher.find_all("ahishers")[0] == ("his", 3)
+    assert AhoCorasick().find_all("anything") == []
+
+
+def test_aho_corasick_follows_failure_links_for_cjk():
+    matcher = AhoCorasick([("没想到", "惊讶"), ("想到", "x"), ("开心", "积极")])
+    assert matcher.find_all("真没想到这么开心") == [("没想到", "惊讶"), ("想到", "x"), ("开心", "积极")]
+
+
+def test_rebuild_indexes_existing_items_of_own_namespace_only():
+    store = _store()
+    store.put(NAMESPACE, "m1", MEMORIES["m1"])
+    store.put(NAMESPACE + ("archive",), "old", MEMORIES["m2"])
+
+    retriever = HybridMemoryRetriever(store, NAMESPACE)
+    assert [key for key, _ in retriever.items()] == ["m1"]
+
+
+def test_bm25_matches_reference_formula(retriever):
+    ranked = retriever.bm25("python 咖啡")
+    assert [key for key, _ in ranked] in (["m3", "m1"], ["m1", "m3"])
+
+    # 手工计算 m3 的 BM25 分：文档只含一次 "python"
+    n_docs = 3
+    doc_len = retriever._doc_len["m3"]
+    avgdl = retriever._total_len / n_docs
+    idf = math.log(1 + (n_docs - 1 + 0.5) / (1 + 0.5))
+    norm = retriever.k1 * (1 - retriever.b + retriever.b * doc_len / avgdl)
+    expected = idf * 1 * (retriever.k1 + 1) / (1 + norm)
+    assert dict(ranked)["m3"] == pytest.approx(expected)
+
+    assert retriever.bm25("不存在的词") == []
+
+
+def test_tags_and_emotions_detected_in_one_scan(retriever):
+    detected = retriever.detect_keywords("我学习编程的时候很兴奋")
+    assert detected["tags"] == ["学习", "编程"]
+    assert detected["emotions"] == ["兴奋"]
+    assert detected["categories"] == ["积极情感"]
+
+    assert retriever.match_tags(["学习", "编程"], require_all=True) == [("m3", ["学习", "编程"])]
+    assert [key for key, _ in retriever.match_emotions(["开心"], ["积极情感"])] == ["m1", "m3"]
+
+
+def test_remove_prunes_every_posting_list(retriever):
+    retriever.remove("m2")
+    retriever.remove("m1")
+
+    assert "运动" not in retriever.tags()
+    assert "焦虑" not in retriever._emotion_postings
+    assert "消极情感" not in retriever._category_postings
+    assert "开心" not in retriever._emotion_postings
+    assert "积极情感" in retriever._category_postings
+    assert all(retriever._postings.values())
+    assert retriever.detect_keywords("运动")["tags"] == []
+
+
+def test_update_replaces_previous_index_entries(retriever):
+    retriever.add("m1", {"content": "喝茶", "tags": ["茶"], "emotional_context": "平静"})
+
+    assert retriever.match_tags(["咖啡"]) == []
+    assert retriever.bm25("咖啡") == []
+    assert [key for key, _ in retriever.match_emotions(["平静"])] == ["m1"]
+
+
+def test_rrf_fuses_channels(retriever):
+    hits = retriever.search("想喝咖啡，很开心", limit=3)
+
+    top = hits[0]
+    assert top.key == "m1"
+    assert set(top.sources) == {"vector", "bm25", "tags", "emotion"}
+    assert top.score == pytest.approx(sum(1.0 / (retriever.rrf_k + 1) for _ in top.sources))
+    assert top.matched_tags == ["咖啡"]
+    assert top.vector_score is not None and top.bm25_score is not None
+
+
+def test_vector_channel_ignores_child_namespaces():
+    store = _store()
+    store.put(NAMESPACE, "m1", MEMORIES["m1"])
+    store.put(NAMESPACE + ("archive",), "m1", {"content": "跑步 跑步 跑步"})
+    store.put(NAMESPACE + ("archive",), "other", {"content": "跑步"})
+    retriever = HybridMemoryRetriever(store, NAMESPACE)
+
+    hits = retriever.search("跑步", limit=5)
+
+    assert [h.key for h in hits] == ["m1"]
+    assert hits[0].value == MEMORIES["m1"]
+    assert hits[0].sources == ["vector"]
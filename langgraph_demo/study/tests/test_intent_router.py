@@ -0,0 +1,186 @@
+# -*- coding: utf-8 -*-
+"""intent_router：规则层、决策缓存、重训后的缓存失效、后台重训不阻塞路由，以及 LLM 失败/无效标签不缓存"""
+
+import json
+import threading
+import time
+
+import numpy as np
+import pytest
+
+import intent_router
+from intent_router import IntentRouter, KeywordRules, TfidfLogisticClassifier, normalize_query
+
+LABELS = ["weather", "math", "general"]
+SEEDS = {
+    "weather": ["明天会下雨吗", "今天气温多少度", "周末天气怎么样"],
+    "math": ["帮我算一下乘法", "这个方程怎么解", "求两个数的和"],
+}
+
+
+def _rules():
+    return KeywordRules({"weather": ["天气", "下雨"], "math": ["计算"]},
+                        patterns={"math": [r"\d+\s*[+\-*/]\s*\d+"]})
+
+
+def _router(llm=None, **kwargs):
+    kwargs.setdefault("seed_examples", SEEDS)
+    return IntentRouter(LABELS, _rules(), llm_classify=llm, **kwargs)
+
+
+def test_normalize_query_strips_trailing_punctuation_and_spaces():
+    assert normalize_query("  今天  天气？？ ") == normalize_query("今天 天气")
+
+
+def test_keyword_rules_confidence_drops_when_labels_conflict():
+    rules = _rules()
+    label, confidence, matched = rules.decide("今天天气怎么样")
+    assert label == "weather" and matched == ["天气"] and confidence == 0.85
+
+    _, mixed, _ = rules.decide("计算一下下雨的概率")
+    assert mixed < 0.5
+    assert rules.decide("你好") is None
+
+
+def test_rules_decision_is_cached_and_recorded(tmp_path):
+    log_path = tmp_path / "routes.jsonl"
+    router = _router(log_path=str(log_path))
+
+    first = router.route("明天天气怎么样")
+    second = router.route("明天天气怎么样？")
+
+    assert first.source == "rules" and first.label == "weather"
+    assert second.source == "cache" and second.label == "weather"
+    records = [json.loads(line) for line in log_path.read_text(encoding="utf-8").splitlines()]
+    assert [r["label"] for r in records] == ["weather"]
+
+    reloaded = _router(log_path=str(log_path))
+    assert reloaded.stats()["training_samples"] == router.stats()["training_samples"]
+
+
+def test_llm_called_only_below_threshold():
+    calls = []
+
+    def llm(text):
+        calls.append(text)
+        return "math"
+
+    router = _router(llm, confidence_threshold=1.01)
+    decision = router.route("3 + 4")
+
+    assert decision.source == "llm" and decision.label == "math"
+    assert router.route("3 + 4").source == "cache"
+    assert calls == ["3 + 4"]
+    assert router.stats()["llm_call_rate"] == 0.5
+
+
+@pytest.mark.parametrize("llm, source", [
+    (lambda text: "unknown-label", "llm_invalid"),
+    (lambda text: (_ for _ in ()).throw(RuntimeError("timeout")), "fallback"),
+])
+def test_failed_or_invalid_llm_results_are_not_cached(llm, source):
+    calls = []
+
+    def classify(text):
+        calls.append(text)
+        return llm(text)
+
+    router = _router(classify, seed_examples=None)
+    first = router.route("随便聊聊")
+    second = router.route("随便聊聊")
+
+    assert first.source == source and second.source == source
+    assert first.label == "general"
+    assert len(calls) == 2
+    assert router.stats()["cache_size"] == 0
+
+
+def test_fallback_keeps_best_local_guess():
+    def broken(text):
+        raise RuntimeError("timeout")
+
+    router = _router(broken, confidence_threshold=1.01)
+    decision = router.route("今天天气")
+
+    assert decision.source == "fallback"
+    assert decision.label == "weather"
+
+
+def test_classifier_decisions_invalidated_after_retrain():
+    router = _router(confidence_threshold=0.0)
+    assert router.wait_for_retrain(5)
+    text = "方程的和"
+
+    first = router.route(text)
+    assert first.source == "classifier"
+    assert router.route(text).source == "cache"
+
+    version = router.stats()["model_version"]
+    assert router.retrain()
+    assert router.stats()["model_version"] == version + 1
+    assert router.route(text).source == "classifier"
+
+
+def test_remembered_label_survives_retrain():
+    router = _router(confidence_threshold=0.0)
+    router.remember("方程的和", "weather")
+    router.retrain()
+
+    decision = router.route("方程的和")
+    assert decision.source == "cache" and decision.label == "weather"
+
+
+def test_retrain_skipped_with_single_label():
+    router = IntentRouter(LABELS, _rules(), seed_examples={"weather": ["天气"]})
+    assert router.wait_for_retrain(5)
+    assert router.stats()["model_version"] == 0
+    assert not router.classifier.ready
+    assert router.route("随便聊聊").source == "fallback"
+
+
+def test_sparse_features_are_normalized_and_fit_seeds():
+    texts = [text for texts in SEEDS.values() for text in texts]
+    labels = [label for label, texts in SEEDS.items() for _ in texts]
+    classifier = TfidfLogisticClassifier().fit(texts, labels)
+
+    rows, cols, values = classifier._vectorize([intent_router.tokenize(t) for t in texts] + [[]])
+    norms = np.bincount(rows, weights=values * values, minlength=len(texts) + 1)
+    assert np.allclose(norms[:-1], 1.0) and norms[-1] == 0
+    assert len(cols) < len(texts) * len(classifier._vocab)
+
+    assert [classifier.predict(t)[0] for t in texts] == labels
+    assert classifier.predict("完全无关") is None
+
+
+def test_route_does_not_wait_for_background_training(monkeypatch):
+    release = threading.Event()
+    started = threading.Event()
+    original_fit = TfidfLogisticClassifier.fit
+
+    def slow_fit(self, texts, labels):
+        started.set()
+        release.wait(5)
+        return original_fit(self, texts, labels)
+
+    monkeypatch.setattr(TfidfLogisticClassifier, "fit", slow_fit)
+
+    begin = time.perf_counter()
+    router = _router(retrain_every=1)
+    assert started.wait(1)
+    assert time.perf_counter() - begin < 0.5
+    assert router.stats()["model_version"] == 0
+
+    # 规则层决策会触发重训，但 route 不等训练结束
+    begin = time.perf_counter()
+    for i in range(5):
+        assert router.route(f"第 {i} 天的天气").source == "rules"
+    assert time.perf_counter() - begin < 0.5
+    assert router.stats()["model_version"] == 0
+
+    release.set()
+    assert router.wait_for_retrain(5)
+    assert router.stats()["model_version"] == 1
+    # 训练期间积累的新样本在下一次记录时触发新一轮后台重训
+    router.route("后天天气")
+    assert router.wait_for_retrain(5)
+    assert router.stats()["model_version"] == 2
@@ -0,0 +1,143 @@
+# -*- coding: utf-8 -*-
+"""interrupt_sessions：待处理中断的登记与过期、一次性恢复、同线程串行 / 跨线程并发、锁超时与回收"""
+
+import asyncio
+import time
+from typing import TypedDict
+
+import pytest
+from langgraph.checkpoint.memory import MemorySaver
+from langgraph.graph import END, START, StateGraph
+from langgraph.types import interrupt
+
+from interrupt_sessions import InterruptSessionManager
+
+
+class State(TypedDict):
+    question: str
+    answer: str
+
+
+def _graph(delay: float = 0.0, failures: int = 0):
+    attempts = []
+
+    def ask(state: State):
+        answer = interrupt({"question": state["question"]})
+        attempts.append(answer)
+        if len(attempts) <= failures:
+            raise RuntimeError("resume failed")
+        time.sleep(delay)
+        return {"answer": answer}
+
+    builder = StateGraph(State)
+    builder.add_node("ask", ask)
+    builder.add_edge(START, "ask")
+    builder.add_edge("ask", END)
+    return builder.compile(checkpointer=MemorySaver())
+
+
+def _cfg(thread_id):
+    return {"configurable": {"thread_id": thread_id}}
+
+
+def test_start_registers_pending_and_resume_clears_it():
+    manager = InterruptSessionManager(_graph())
+
+    async def main():
+        result = await manager.start("t1", {"question": "ok?", "answer": ""}, _cfg("t1"))
+        assert "__interrupt__" in result
+        pending = manager.list_pending()
+        assert [p["thread_id"] for p in pending] == ["t1"]
+        assert pending[0]["data"][0].value == {"question": "ok?"}
+
+        resumed = await manager.resume("t1", "yes", _cfg("t1"))
+        assert resumed["answer"] == "yes"
+        assert manager.get_pending("t1") is None
+
+        # 同一中断只能恢复一次
+        with pytest.raises(LookupError):
+            await manager.resume("t1", "again", _cfg("t1"))
+
+    asyncio.run(main())
+    assert manager._locks == {}
+
+
+def test_expired_interrupt_cannot_be_resumed():
+    manager = InterruptSessionManager(_graph(), pending_timeout=0.05)
+
+    async def main():
+        await manager.start("t1", {"question": "q", "answer": ""}, _cfg("t1"))
+        await asyncio.sleep(0.1)
+        assert manager.list_pending() == []
+        with pytest.raises(LookupError):
+            await manager.resume("t1", "late", _cfg("t1"))
+
+    asyncio.run(main())
+
+
+def test_failed_resume_keeps_pending_for_retry():
+    manager = InterruptSessionManager(_graph(failures=1))
+
+    async def main():
+        await manager.start("t1", {"question": "q", "answer": ""}, _cfg("t1"))
+        with pytest.raises(RuntimeError):
+            await manager.resume("t1", "first", _cfg("t1"))
+        assert manager.get_pending("t1") is not None
+        # 恢复值已写入检查点，重试沿用第一次提交的值
+        result = await manager.resume("t1", "second", _cfg("t1"))
+        assert result["answer"] == "first"
+        assert manager.get_pending("t1") is None
+
+    asyncio.run(main())
+
+
+def test_list_pending_is_ordered_and_limited():
+    manager = InterruptSessionManager(_graph())
+
+    async def main():
+        for tid in ("a", "b", "c"):
+            await manager.start(tid, {"question": tid, "answer": ""}, _cfg(tid))
+        return manager.list_pending(limit=2)
+
+    assert [p["thread_id"] for p in asyncio.run(main())] == ["a", "b"]
+
+
+def test_same_thread_serialized_other_threads_concurrent():
+    manager = InterruptSessionManager(_graph(delay=0.2))
+
+    async def main():
+        for tid in ("a", "b"):
+            await manager.start(tid, {"question": tid, "answer": ""}, _cfg(tid))
+
+        start = time.perf_counter()
+        results = await asyncio.gather(
+            manager.resume("a", "x", _cfg("a")),
+            manager.resume("a", "y", _cfg("a")),
+            manager.resume("b", "z", _cfg("b")),
+            return_exceptions=True,
+        )
+        return results, time.perf_counter() - start
+
+    results, elapsed = asyncio.run(main())
+
+    # 同一线程的第二次恢复排在第一次之后，发现中断已被处理
+    assert results[0]["answer"] == "x"
+    assert isinstance(results[1], LookupError)
+    assert results[2]["answer"] == "z"
+    assert elapsed < 0.35
+    assert manager._locks == {}
+
+
+def test_lock_wait_times_out():
+    manager = InterruptSessionManager(_graph(delay=0.3), lock_timeout=0.05)
+
+    async def main():
+        await manager.start("t1", {"question": "q", "answer": ""}, _cfg("t1"))
+        slow = asyncio.ensure_future(manager.resume("t1", "x", _cfg("t1")))
+        await asyncio.sleep(0.01)
+        with pytest.raises(TimeoutError):
+            await manager.resume("t1", "y", _cfg("t1"))
+        return await slow
+
+    assert asyncio.run(main())["answer"] == "x"
+    assert manager._locks == {}
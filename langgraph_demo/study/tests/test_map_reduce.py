@@ -0,0 +1,185 @@
+# -*- coding: utf-8 -*-
+"""map_reduce：Send worker 的超时与重试、在途上限与逐个推送，以及树形归约用的有界并发执行器"""
+
+import operator
+import threading
+import time
+from typing import Annotated, List, TypedDict
+
+import pytest
+from langchain_core.language_models.fake_chat_models import GenericFakeChatModel
+from langchain_core.messages import AIMessage, HumanMessage
+from langgraph.graph import END, START, StateGraph
+from langgraph.types import RetryPolicy, Send
+
+from map_reduce import MapReduceExecutor, WorkerTimeout, plan_batches, tree_reduce, with_timeout
+
+
+class _MapState(TypedDict):
+    items: List[int]
+    done: Annotated[List[int], operator.add]
+
+
+class _WorkerState(TypedDict):
+    item: int
+
+
+def _send_graph(work, timeout=None, max_attempts=1):
+    builder = StateGraph(_MapState)
+    builder.add_node("work", with_timeout(work, timeout),
+                     retry_policy=RetryPolicy(max_attempts=max_attempts, initial_interval=0.01, jitter=False))
+    builder.add_conditional_edges(START, lambda state: [Send("work", {"item": i}) for i in state["items"]], ["work"])
+    builder.add_edge("work", END)
+    return builder.compile()
+
+
+def test_send_fan_out_respects_max_concurrency_and_streams_each_result():
+    lock = threading.Lock()
+    in_flight = peak = 0
+
+    def work(state: _WorkerState):
+        nonlocal in_flight, peak
+        with lock:
+            in_flight += 1
+            peak = max(peak, in_flight)
+        time.sleep(0.02 * (5 - state["item"]))
+        with lock:
+            in_flight -= 1
+        return {"done": [state["item"]]}
+
+    chunks = list(_send_graph(work, timeout=5).stream(
+        {"items": list(range(5)), "done": []}, {"max_concurrency": 2}, stream_mode=["updates", "values"]))
+
+    updates = [chunk["work"]["done"][0] for mode, chunk in chunks if mode == "updates"]
+    assert sorted(updates) == [0, 1, 2, 3, 4]
+    assert updates != [0, 1, 2, 3, 4]  # 按完成顺序逐个推送
+    assert chunks[-1] == ("values", {"items": [0, 1, 2, 3, 4], "done": [0, 1, 2, 3, 4]})
+    assert peak == 2
+
+
+def test_timed_out_worker_is_retried_by_retry_policy():
+    attempts = []
+
+    def work(state: _WorkerState):
+        attempts.append(state["item"])
+        if state["item"] == 0 and attempts.count(0) == 1:
+            time.sleep(0.5)
+        return {"done": [state["item"]]}
+
+    started = time.perf_counter()
+    result = _send_graph(work, timeout=0.1, max_attempts=2).invoke({"items": [0, 1], "done": []})
+
+    assert time.perf_counter() - started < 0.45
+    assert result["done"] == [0, 1]
+    assert attempts.count(0) == 2 and attempts.count(1) == 1
+
+
+def test_worker_timeout_surfaces_after_last_attempt():
+    def work(state: _WorkerState):
+        time.sleep(0.3)
+        return {"done": [state["item"]]}
+
+    with pytest.raises(WorkerTimeout, match="work"):
+        _send_graph(work, timeout=0.05, max_attempts=2).invoke({"items": [0], "done": []})
+    assert with_timeout(work, None) is work
+
+
+def test_results_keep_input_order_and_respect_max_in_flight():
+    lock = threading.Lock()
+    in_flight = peak = 0
+
+    def worker(item):
+        nonlocal in_flight, peak
+        with lock:
+            in_flight += 1
+            peak = max(peak, in_flight)
+        time.sleep(0.02 * (5 - item))
+        with lock:
+            in_flight -= 1
+        return item * 10
+
+    outcome = MapReduceExecutor(max_in_flight=2).run(range(5), worker)
+
+    assert outcome.results == [0, 10, 20, 30, 40]
+    assert peak <= 2
+    assert outcome.stats["peak_in_flight"] <= 2
+
+
+def test_results_are_emitted_in_completion_order():
+    events = []
+
+    def worker(item):
+        time.sleep(0.03 if item == 0 else 0.0)
+        return f"part{item}"
+
+    outcome = MapReduceExecutor(max_in_flight=3).run(range(3), worker, on_event=events.append)
+
+    assert outcome.results == ["part0", "part1", "part2"]
+    assert [e["index"] for e in events if e["type"] == "map_result"][-1] == 0
+
+
+def test_failed_item_is_retried_then_isolated():
+    calls = []
+
+    def worker(item):
+        calls.append(item)
+        if item == 1:
+            raise ValueError("boom")
+        return item
+
+    outcome = MapReduceExecutor(max_in_flight=2, retries=1, backoff=0.01).run(range(3), worker)
+
+    assert calls.count(1) == 2
+    assert outcome.failures == {1: "ValueError: boom"}
+    assert outcome.results == [0, None, 2]
+
+
+def test_timed_out_attempt_is_abandoned():
+    def worker(item):
+        time.sleep(0.5 if item == 0 else 0.0)
+        return item
+
+    started = time.perf_counter()
+    outcome = MapReduceExecutor(max_in_flight=2, timeout=0.1).run(range(2), worker)
+
+    assert time.perf_counter() - started < 0.4
+    assert outcome.stats["timeouts"] == 1
+    assert 0 in outcome.failures and outcome.results[1] == 1
+
+
+def test_plan_batches_and_tree_reduce():
+    assert plan_batches([3, 3, 3, 3], 6) == [[0, 1], [2, 3]]
+    # 每段都超出预算时两两合并，保证层数收敛
+    assert plan_batches([9, 9, 9], 5) == [[0, 1], [2]]
+
+    merged = tree_reduce([str(i) for i in range(8)], lambda texts: "".join(texts),
+                         token_budget=2, count_tokens=len)
+    assert merged == "01234567"
+
+
+class _State(TypedDict):
+    items: List[str]
+    answers: Annotated[List[str], operator.add]
+
+
+def test_llm_calls_inside_timed_workers_stream_as_node_messages():
+    """with_timeout 的线程继承节点的运行配置，worker 里的 LLM 调用出现在 stream_mode="messages" 中"""
+    model = GenericFakeChatModel(messages=iter([AIMessage(content=f"answer {i}") for i in range(3)]))
+
+    def answer(state: dict):
+        return {"answers": [model.invoke([HumanMessage(content=state["item"])]).content]}
+
+    builder = StateGraph(_State)
+    builder.add_node("answer", with_timeout(answer, 5))
+    builder.add_conditional_edges(START, lambda state: [Send("answer", {"item": i}) for i in state["items"]],
+                                  ["answer"])
+    builder.add_edge("answer", END)
+    graph = builder.compile()
+
+    chunks = list(graph.stream({"items": ["a", "b", "c"], "answers": []}, stream_mode="messages"))
+
+    assert chunks and {metadata["langgraph_node"] for _, metadata in chunks} == {"answer"}
+    by_message = {}
+    for chunk, _ in chunks:
+        by_message[chunk.id] = by_message.get(chunk.id, "") + chunk.content
+    assert sorted(by_message.values()) == ["answer 0", "answer 1", "answer 2"]
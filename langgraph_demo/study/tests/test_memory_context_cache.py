@@ -0,0 +1,52 @@
+# -*- coding: utf-8 -*-
+"""13_langgraph_inmemory_demo.MemoryContextCache：命中、按命名空间失效、构建期间失效不回写旧结果"""
+
+import importlib
+
+import pytest
+
+MemoryContextCache = importlib.import_module("13_langgraph_inmemory_demo").MemoryContextCache
+
+NAMESPACE = ("memories", "user_1")
+
+
+@pytest.fixture
+def cache():
+    return MemoryContextCache(max_entries_per_namespace=2)
+
+
+def test_hit_after_first_build(cache):
+    builds = []
+    build = lambda: builds.append(1) or "context"
+
+    assert cache.get_or_build(NAMESPACE, "q ", 3, build) == "context"
+    assert cache.get_or_build(NAMESPACE, "q", 3, build) == "context"
+    assert len(builds) == 1
+    assert cache.stats() == {"hits": 1, "misses": 1, "entries": 1}
+
+
+def test_invalidate_only_touches_given_namespace(cache):
+    other = ("memories", "user_2")
+    cache.get_or_build(NAMESPACE, "q", 3, lambda: "a")
+    cache.get_or_build(other, "q", 3, lambda: "b")
+
+    cache.invalidate([list(NAMESPACE)])
+
+    assert cache.get_or_build(NAMESPACE, "q", 3, lambda: "a2") == "a2"
+    assert cache.get_or_build(other, "q", 3, lambda: "b2") == "b"
+
+
+def test_invalidation_during_build_is_not_overwritten(cache):
+    def stale_build():
+        cache.invalidate([NAMESPACE])  # 构建期间有写入
+        return "stale"
+
+    assert cache.get_or_build(NAMESPACE, "q", 3, stale_build) == "stale"
+    assert cache.get_or_build(NAMESPACE, "q", 3, lambda: "fresh") == "fresh"
+
+
+def test_lru_bound_per_namespace(cache):
+    for query in ("a", "b", "c"):
+        cache.get_or_build(NAMESPACE, query, 3, lambda: query)
+    assert cache.stats()["entries"] == 2
+    assert cache.get_or_build(NAMESPACE, "a", 3, lambda: "rebuilt") == "rebuilt"
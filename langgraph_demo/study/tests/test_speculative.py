@@ -0,0 +1,133 @@
+# -*- coding: utf-8 -*-
+"""speculative：批量评估窗口、提前结束、耗时预算、失败处理，以及生成中的 LLM 流式输出"""
+
+import time
+from typing import TypedDict
+
+import pytest
+from langchain_core.language_models.fake_chat_models import GenericFakeChatModel
+from langchain_core.messages import AIMessage, HumanMessage
+from langgraph.graph import END, START, StateGraph
+
+from speculative import SpeculativeLoop
+
+DELAYS = [0.0, 0.05, 0.1]
+
+
+def _generate(round_index, index, previous):
+    time.sleep(DELAYS[index])
+    return f"r{round_index}-c{index}"
+
+
+def _loop(evaluate_batch, accept=lambda e: False, generate=_generate, **kwargs):
+    kwargs.setdefault("n_candidates", 3)
+    kwargs.setdefault("max_rounds", 1)
+    return SpeculativeLoop(generate, evaluate_batch, accept=accept, score=lambda e: e, **kwargs)
+
+
+def _recording_evaluator(batches):
+    def evaluate(contents):
+        batches.append(list(contents))
+        return [int(c[-1]) for c in contents]
+    return evaluate
+
+
+@pytest.mark.parametrize("window", [0.5, None])
+def test_candidates_completing_within_window_are_evaluated_together(window):
+    batches = []
+    result = _loop(_recording_evaluator(batches), batch_window=window).run()
+
+    assert [sorted(b) for b in batches] == [["r0-c0", "r0-c1", "r0-c2"]]
+    assert result.stats["evaluation_batches"] == 1
+    assert result.best.content == "r0-c2"
+    assert result.stop_reason == "max_rounds"
+
+
+def test_zero_window_evaluates_as_candidates_arrive():
+    batches = []
+    _loop(_recording_evaluator(batches), batch_window=0).run()
+    assert len(batches) > 1
+
+
+def test_first_accepted_candidate_ends_loop_and_abandons_the_rest():
+    def slow_generate(round_index, index, previous):
+        time.sleep(0.0 if index == 0 else 1.0)
+        return f"r{round_index}-c{index}"
+
+    started = time.perf_counter()
+    result = _loop(_recording_evaluator([]), accept=lambda e: e == 0, batch_window=0.05,
+                   max_rounds=3, generate=slow_generate).run()
+
+    assert time.perf_counter() - started < 0.5
+    assert result.accepted and result.stop_reason == "accepted"
+    assert result.best.content == "r0-c0"
+    assert result.stats["abandoned"] == 2
+
+
+def test_zero_latency_budget_returns_best_so_far():
+    result = _loop(_recording_evaluator([]), latency_budget=0, max_rounds=3).run()
+
+    assert result.best is not None
+    assert result.stop_reason == "latency_budget"
+    assert result.stats["rounds"] == 1
+
+
+def test_evaluation_failures_are_skipped():
+    calls = []
+
+    def flaky(contents):
+        calls.append(contents)
+        if len(calls) == 1:
+            raise RuntimeError("evaluator down")
+        if len(calls) == 2:
+            return []  # 数量不符
+        return [1 for _ in contents]
+
+    result = _loop(flaky, batch_window=None, max_rounds=3).run()
+
+    assert result.stats["evaluation_failed"] == 2
+    assert result.best is not None and result.best.round == 2
+    assert [c.round for c in result.candidates] == [2, 2, 2]
+
+
+def test_generation_failures_are_counted():
+    def generate(round_index, index, previous):
+        if index == 1:
+            raise ValueError("boom")
+        return f"r{round_index}-c{index}"
+
+    result = _loop(_recording_evaluator([]), batch_window=None, generate=generate).run()
+
+    assert result.stats["failed"] == 1
+    assert result.stats["generated"] == 2
+
+
+def test_nothing_evaluated_reports_no_candidates():
+    def broken(contents):
+        raise RuntimeError("down")
+
+    result = _loop(broken, batch_window=None).run()
+    assert result.best is None and result.stop_reason == "no_candidates"
+
+
+class _State(TypedDict):
+    best: str
+
+
+def test_llm_calls_in_generate_stream_as_node_messages():
+    model = GenericFakeChatModel(messages=iter([AIMessage(content="draft")]))
+
+    def node(state: _State):
+        loop = SpeculativeLoop(lambda r, i, p: model.invoke([HumanMessage(content="write")]).content,
+                               lambda contents: [1] * len(contents), accept=lambda e: True, score=lambda e: e,
+                               n_candidates=1, max_rounds=1)
+        return {"best": loop.run().best.content}
+
+    builder = StateGraph(_State)
+    builder.add_node("draft", node)
+    builder.add_edge(START, "draft")
+    builder.add_edge("draft", END)
+    chunks = list(builder.compile().stream({"best": ""}, stream_mode="messages"))
+
+    assert chunks and {metadata["langgraph_node"] for _, metadata in chunks} == {"draft"}
+    assert "".join(chunk.content for chunk, _ in chunks) == "draft"
@@ -0,0 +1,155 @@
+# -*- coding: utf-8 -*-
+"""stream_codec：序列化与帧格式、消息规整、编码器注册表缓存、token 合并，以及节点内流式调用"""
+
+import json
+import time
+from typing import TypedDict
+
+from langchain_core.language_models.fake_chat_models import GenericFakeChatModel
+from langchain_core.messages import AIMessage, AIMessageChunk, HumanMessage, ToolMessage
+from langgraph.graph import END, START, StateGraph
+
+import stream_codec
+from stream_codec import (
+    TokenCoalescer,
+    coalesce_messages,
+    dumps,
+    dumps_str,
+    extract_message_list,
+    iter_node_items,
+    ndjson_frame,
+    normalize_content,
+    register_encoder,
+    resolve_encoder,
+    sse_frame,
+    stream_llm_text,
+)
+
+
+def test_dumps_keeps_unicode_and_handles_sets_and_unknown_objects():
+    class Opaque:
+        def __str__(self):
+            return "opaque"
+
+    data = json.loads(dumps({"text": "你好", "tags": {"a"}, "obj": Opaque()}))
+    assert data == {"text": "你好", "tags": ["a"], "obj": "opaque"}
+    assert "你好" in dumps_str({"text": "你好"})
+
+
+def test_sse_and_ndjson_frames():
+    assert sse_frame({"a": 1}, event="token") == b'event: token\ndata: {"a":1}\n\n'
+    line = ndjson_frame({"a": 1}, event="done")
+    assert line.endswith(b"\n")
+    assert json.loads(line) == {"event": "done", "data": {"a": 1}}
+
+
+def test_normalize_content_shapes():
+    assert normalize_content("plain") == "plain"
+    assert normalize_content(None) == ""
+    assert normalize_content(3) == "3"
+    assert normalize_content([{"type": "text", "text": "a"}, "b", {"type": "image"}]) == 'ab{"type":"image"}'
+    assert normalize_content({"content": "c"}) == "c"
+    assert normalize_content(AIMessage(content=[{"type": "text", "text": "nested"}])) == "nested"
+
+
+def test_message_encoders():
+    ai = AIMessage(content="hi", id="a1", tool_calls=[{"name": "t", "args": {}, "id": "c1"}])
+    encoded = json.loads(dumps(ai))
+    assert encoded["role"] == "ai" and encoded["id"] == "a1"
+    assert encoded["tool_calls"][0]["id"] == "c1"
+
+    tool = json.loads(dumps(ToolMessage(content="ok", tool_call_id="c1")))
+    assert tool == {"role": "tool", "content": "ok", "tool_call_id": "c1"}
+
+    chunk = json.loads(dumps(AIMessageChunk(content="to", id="x")))
+    assert chunk == {"role": "ai", "content": "to", "id": "x"}
+
+
+def test_resolve_encoder_follows_mro_and_cache_resets_on_register():
+    class Base:
+        pass
+
+    class Child(Base):
+        pass
+
+    assert resolve_encoder(Child) is None
+    assert Child in stream_codec._RESOLVED
+
+    try:
+        @register_encoder(Base)
+        def encode_base(obj):
+            return {"content": "base"}
+
+        assert Child not in stream_codec._RESOLVED
+        assert resolve_encoder(Child) is encode_base
+        assert normalize_content(Child()) == "base"
+    finally:
+        stream_codec._ENCODERS.pop(Base, None)
+        stream_codec._RESOLVED.clear()
+
+
+def test_extract_message_list_and_iter_node_items():
+    value = {"messages": [HumanMessage(content="q"), {"role": "assistant", "content": [{"text": "a"}]}]}
+    assert extract_message_list(value) == [
+        {"role": "human", "content": "q"},
+        {"role": "assistant", "content": "a"},
+    ]
+
+    assert list(iter_node_items({"n": 1})) == [("n", 1)]
+    assert list(iter_node_items(("n", 1))) == [("n", 1)]
+    assert list(iter_node_items([("a", 1), {"b": 2}, 3])) == [("a", 1), ("b", 2), ("unknown", 3)]
+    assert list(iter_node_items(5)) == [("unknown", 5)]
+
+
+def test_coalescer_flushes_on_node_change_and_size():
+    coalescer = TokenCoalescer(interval_ms=10_000, max_chars=5)
+    assert coalescer.feed("ab", {"langgraph_node": "a"}) is None
+    assert coalescer.feed("c", {"langgraph_node": "b"}) == ("ab", {"langgraph_node": "a"})
+    assert coalescer.feed("defg", {"langgraph_node": "b"}) == ("cdefg", {"langgraph_node": "b"})
+    assert coalescer.flush() is None
+
+
+def test_coalescer_flushes_after_interval():
+    coalescer = TokenCoalescer(interval_ms=20, max_chars=1000)
+    meta = {"langgraph_node": "a"}
+    assert coalescer.feed("a", meta) is None
+    time.sleep(0.03)
+    assert coalescer.feed("b", meta) == ("ab", meta)
+
+
+def test_coalesce_messages_skips_empty_chunks_and_preserves_order():
+    stream = [
+        (AIMessageChunk(content="Hel"), {"langgraph_node": "a"}),
+        (AIMessageChunk(content=""), {"langgraph_node": "a"}),
+        (AIMessageChunk(content="lo"), {"langgraph_node": "a"}),
+        "not a pair",
+        (AIMessageChunk(content="!"), {"langgraph_node": "b"}),
+    ]
+
+    assert list(coalesce_messages(stream, interval_ms=10_000)) == [
+        ("Hello", {"langgraph_node": "a"}),
+        ("!", {"langgraph_node": "b"}),
+    ]
+    assert [text for text, _ in coalesce_messages(stream, interval_ms=0)] == ["Hel", "lo", "!"]
+
+
+def test_stream_llm_text_emits_tokens_from_inside_node():
+    class State(TypedDict):
+        answer: str
+
+    llm = GenericFakeChatModel(messages=iter([AIMessage(content="streamed answer text")]))
+
+    def answer(state: State):
+        return {"answer": stream_llm_text(llm, [HumanMessage(content="q")])}
+
+    builder = StateGraph(State)
+    builder.add_node("answer", answer)
+    builder.add_edge(START, "answer")
+    builder.add_edge("answer", END)
+    graph = builder.compile()
+
+    frames = list(coalesce_messages(graph.stream({"answer": ""}, stream_mode="messages"), interval_ms=0))
+
+    assert len(frames) > 1
+    assert "".join(text for text, _ in frames) == "streamed answer text"
+    assert {meta["langgraph_node"] for _, meta in frames} == {"answer"}
@@ -0,0 +1,105 @@
+# -*- coding: utf-8 -*-
+"""swarm_sessions：历史压缩、SQLite 会话存储与批量恢复"""
+
+import pytest
+from langchain_core.messages import AIMessage, HumanMessage, ToolMessage
+
+from swarm_sessions import SwarmSessionStore, compact_history
+
+
+def _call(call_id: str, name: str = "add_numbers"):
+    return {"name": name, "args": {}, "id": call_id, "type": "tool_call"}
+
+
+def _history():
+    return [
+        HumanMessage(content="1+2", id="h1"),
+        AIMessage(content="", tool_calls=[_call("c1")], id="a1"),
+        ToolMessage(content="3", tool_call_id="c1", id="t1"),
+        AIMessage(content="我先转给天气助手", tool_calls=[_call("c2", "transfer_to_weather_agent")], id="a2"),
+        ToolMessage(content="已切换", tool_call_id="c2", id="t2"),
+        AIMessage(content="结果是 3", id="a3"),
+        HumanMessage(content="北京天气", id="h2"),
+        AIMessage(content="", tool_calls=[_call("c3", "get_weather")], id="a4"),
+        ToolMessage(content="晴", tool_call_id="c3", id="t3"),
+    ]
+
+
+def test_compaction_drops_old_tool_round_trips_but_keeps_text():
+    compacted = compact_history(_history())
+
+    assert [m.id for m in compacted] == ["h1", "a2", "a3", "h2", "a4", "t3"]
+    kept = compacted[1]
+    assert kept.content == "我先转给天气助手"
+    assert kept.tool_calls == [] and "tool_calls" not in kept.additional_kwargs
+    # 当前轮次原样保留，工具调用与结果成对
+    assert compacted[-2].tool_calls[0]["id"] == compacted[-1].tool_call_id
+
+
+def test_compaction_keeps_text_blocks_of_list_content():
+    message = AIMessage(content=[{"type": "text", "text": "稍等"}, {"type": "tool_use", "id": "c1", "name": "x", "input": {}}],
+                        tool_calls=[_call("c1")], id="a1")
+    compacted = compact_history([HumanMessage(content="q", id="h1"), message,
+                                 ToolMessage(content="r", tool_call_id="c1"), HumanMessage(content="q2", id="h2")])
+
+    assert [m.id for m in compacted] == ["h1", "a1", "h2"]
+    assert compacted[1].content == [{"type": "text", "text": "稍等"}]
+
+
+def test_compaction_max_turns():
+    compacted = compact_history(_history(), max_turns=1)
+    assert compacted[0].id == "h2"
+
+
+@pytest.fixture
+def store(tmp_path):
+    store = SwarmSessionStore(str(tmp_path / "sessions.sqlite"), default_agent="assistant_agent", max_turns=2)
+    yield store
+    store.close()
+
+
+def test_save_and_load_round_trip(store):
+    store.save("t1", {"messages": _history(), "active_agent": "weather_agent"})
+    store.save("t2", {"messages": [HumanMessage(content="hi", id="x")]})
+
+    session = store.load("t1")
+    assert session.active_agent == "weather_agent"
+    assert session.turns == 2
+    assert [m.id for m in session.messages] == ["h1", "a2", "a3", "h2", "a4", "t3"]
+    assert store.active_agent("t2") == "assistant_agent"
+    assert store.active_agent("missing") == "assistant_agent"
+    assert [s["thread_id"] for s in store.list_sessions(active_agent="weather_agent")] == ["t1"]
+    assert set(store.load_many(["t1", "t2", "missing"])) == {"t1", "t2"}
+
+
+class _FakeApp:
+    """记录 batch 输入，对指定会话抛错"""
+
+    def __init__(self, fail=()):
+        self.fail = set(fail)
+        self.inputs = []
+
+    def batch(self, inputs, configs, return_exceptions=False):
+        self.inputs = inputs
+        outputs = []
+        for value, cfg in zip(inputs, configs):
+            if cfg["configurable"]["thread_id"] in self.fail:
+                outputs.append(RuntimeError("boom"))
+            else:
+                reply = AIMessage(content="ok", id=f"r-{cfg['configurable']['thread_id']}")
+                outputs.append({"messages": value["messages"] + [reply], "active_agent": "math_agent"})
+        return outputs
+
+
+def test_resume_many_starts_from_active_agent_and_saves(store):
+    store.save("t1", {"messages": _history(), "active_agent": "weather_agent"})
+    app = _FakeApp(fail={"t3"})
+
+    results = store.resume_many(app, {"t1": "继续", "t2": "新会话", "t3": "会失败"})
+
+    assert app.inputs[0]["active_agent"] == "weather_agent"
+    assert app.inputs[0]["messages"][-1].content == "继续"
+    assert "active_agent" not in app.inputs[1]
+    assert isinstance(results["t3"], RuntimeError)
+    assert store.active_agent("t2") == "math_agent"
+    assert store.load("t3") is None
@@ -0,0 +1,81 @@
+# -*- coding: utf-8 -*-
+"""token_counter：模型家族识别、近似计数、消息文本提取，以及 TokenCounterService 的批量编码与缓存"""
+
+import pytest
+from langchain_core.messages import AIMessage, HumanMessage, SystemMessage
+
+from token_counter import TokenCounterService, approx_count, detect_family, message_text
+
+
+@pytest.mark.parametrize("name, family", [
+    ("qwen-plus", "qwen"),
+    ("Qwen/Qwen2.5-7B-Instruct", "qwen"),
+    ("deepseek-chat", "deepseek"),
+    ("deepseek-ai/DeepSeek-V3", "deepseek"),
+    ("gpt-4o-mini", "openai"),
+    ("chatgpt-4o-latest", "openai"),
+    ("o1", "openai"),
+    # 词段必须完整匹配，子串不算
+    ("foo1", "openai"),
+    ("protoqwen-model", "openai"),
+    ("my-deepseekr", "deepseek"),
+    ("llama-3-70b", "openai"),
+])
+def test_detect_family(name, family):
+    assert detect_family(name) == family
+
+
+def test_approx_count_cjk_and_ascii():
+    assert approx_count("") == 0
+    assert approx_count("你好") == 2
+    assert approx_count("abcd") == 1
+    assert approx_count("abcde") == 2
+    assert approx_count("你好abcd") == 3
+
+
+def test_message_text_includes_text_blocks_and_tool_calls():
+    message = AIMessage(content=[{"type": "text", "text": "a"}, "b", {"type": "image_url"}],
+                        tool_calls=[{"name": "t", "args": {"q": 1}, "id": "c1"}])
+    text = message_text(message)
+    assert text.startswith("a\nb")
+    assert '"q": 1' in text
+    assert message_text({"content": "dict"}) == "dict"
+
+
+@pytest.fixture
+def service():
+    service = TokenCounterService("gpt-4o-mini")
+    batches = []
+
+    def encode(texts):
+        batches.append(list(texts))
+        return [approx_count(t) for t in texts]
+
+    service._encode = encode
+    service.batches = batches
+    return service
+
+
+def test_count_batch_encodes_uncached_messages_once(service):
+    messages = [
+        HumanMessage(content="abcdefgh", id="h1"),
+        AIMessage(content="abcd", id="a1"),
+        HumanMessage(content="abcdefgh", id="h1"),
+    ]
+
+    assert service.count_batch(messages) == [2 + 3, 1 + 3, 2 + 3]
+    assert service.batches == [["abcdefgh", "abcd"]]
+
+    assert service.count_messages(messages[:2]) == 5 + 4 + service.tokens_per_reply
+    assert service.batches == [["abcdefgh", "abcd"]]
+    assert service.stats()["hits"] == 2
+
+
+def test_messages_without_id_are_cached_by_type_and_text(service):
+    summary = SystemMessage(content="summary")
+    service.count_batch([summary])
+    service.count_batch([SystemMessage(content="summary")])
+    service.count_batch([HumanMessage(content="summary")])
+
+    assert service.batches == [["summary"], ["summary"]]
+    assert service.count_messages([]) == 0
@@ -0,0 +1,182 @@
+# -*- coding: utf-8 -*-
+"""max_message_window.token_window：增量窗口裁剪、工具调用单元、历史改写后的重建与计数缓存"""
+
+import os
+import sys
+
+import pytest
+from langchain_core.messages import AIMessage, HumanMessage, RemoveMessage, SystemMessage, ToolMessage
+from langgraph.graph.message import add_messages
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "max_message_window"))
+
+from token_window import MessageTokenCounter, TokenWindowManager, get_tokenizer  # noqa: E402
+
+
+def _manager(**kwargs):
+    # 每条消息 = 内容长度（approx：4 个 ASCII 字符 1 个 token）+ 4 的固定开销
+    return TokenWindowManager(tokenizer="approx", **kwargs)
+
+
+def _turns(n):
+    messages = []
+    for i in range(n):
+        messages.append(HumanMessage(content=f"question {i:02d}", id=f"h{i}"))
+        messages.append(AIMessage(content=f"answer {i:02d}..", id=f"a{i}"))
+    return messages
+
+
+def test_unknown_tokenizer_name_raises():
+    with pytest.raises(ValueError):
+        get_tokenizer("no-such-tokenizer")
+
+
+def test_counter_caches_by_message_id():
+    counter = MessageTokenCounter("approx")
+    message = HumanMessage(content="abcdefgh", id="m1")
+
+    assert counter.count(message) == 2 + 4
+    assert counter.count(message) == 6
+    assert (counter.hits, counter.misses) == (1, 1)
+
+    anonymous = HumanMessage(content="abcdefgh")
+    counter.count(anonymous)
+    counter.count(anonymous)
+    assert counter.misses == 3
+
+
+def test_window_keeps_latest_turns_within_budget():
+    manager = _manager(max_tokens=30)
+    messages = _turns(5)  # 每条 7 个 token
+
+    window = manager.apply(messages)
+
+    assert [m.id for m in window] == ["h3", "a3", "h4", "a4"]
+    assert manager.stats()["window_tokens"] == 28
+
+
+def test_max_messages_and_pinned_system_message():
+    manager = _manager(max_messages=3)
+    messages = [SystemMessage(content="sys", id="s")] + _turns(3)
+
+    window = manager.apply(messages)
+
+    assert window[0].id == "s"
+    assert [m.id for m in window[1:]] == ["h2", "a2"]
+
+
+def test_tool_call_and_result_are_trimmed_together():
+    manager = _manager(max_messages=3)
+    messages = [
+        HumanMessage(content="q", id="h0"),
+        AIMessage(content="", id="a0", tool_calls=[{"name": "lookup", "args": {}, "id": "call-1"}]),
+        ToolMessage(content="result", tool_call_id="call-1", id="t0"),
+        AIMessage(content="done", id="a1"),
+        HumanMessage(content="next", id="h1"),
+    ]
+
+    window = manager.apply(messages)
+
+    # 不会出现孤立的工具结果，也不会以 AI 消息开头
+    assert [m.id for m in window] == ["h1"]
+
+
+def test_window_falls_back_to_latest_human_when_last_unit_is_not_human():
+    manager = _manager(max_tokens=10)
+    messages = [
+        HumanMessage(content="question", id="h0"),
+        AIMessage(content="a much longer answer that exceeds the budget", id="a0"),
+    ]
+
+    window = manager.apply(messages)
+
+    assert [m.id for m in window] == ["h0", "a0"]
+
+
+def test_incremental_apply_counts_only_new_messages():
+    manager = _manager(max_tokens=1000)
+    messages = _turns(3)
+    manager.apply(messages)
+    misses = manager.counter.misses
+
+    messages = messages + [HumanMessage(content="more", id="h-new")]
+    window = manager.apply(messages)
+
+    assert window[-1].id == "h-new"
+    assert manager.counter.misses == misses + 1
+    assert manager.counter.hits == 0
+
+
+def test_rewritten_history_triggers_rebuild():
+    manager = _manager(max_tokens=1000)
+    messages = _turns(3)
+    manager.apply(messages)
+
+    rewritten = add_messages(messages, [RemoveMessage(id="a2")])
+    window = manager.apply(rewritten)
+
+    assert [m.id for m in window] == ["h0", "a0", "h1", "a1", "h2"]
+    assert manager.stats()["window_messages"] == 5
+
+
+def test_sessions_are_isolated_but_share_token_cache():
+    manager = _manager(max_messages=2)
+    manager.apply(_turns(2), session_id="a")
+    manager.apply(_turns(1), session_id="b")
+
+    assert manager.stats("a")["window_messages"] == 2
+    assert manager.stats("b")["window_messages"] == 2
+    assert manager.counter.hits == 2
+
+
+def test_counter_recounts_message_replaced_under_same_id():
+    counter = MessageTokenCounter("approx")
+    assert counter.count(AIMessage(content="abcd", id="a1")) == 1 + 4
+    assert counter.count(AIMessage(content="abcd" * 5, id="a1")) == 5 + 4
+    assert counter.count(AIMessage(content="abcd" * 5, id="a1")) == 9
+    assert (counter.hits, counter.misses) == (1, 2)
+
+
+def test_replacing_last_message_under_same_id_triggers_rebuild():
+    manager = _manager(max_tokens=1000)
+    messages = _turns(2)
+    manager.apply(messages)
+    before = manager.stats()["window_tokens"]
+
+    replaced = add_messages(messages, [AIMessage(content="answer 01.." * 4, id="a1")])
+    window = manager.apply(replaced)
+
+    assert window[-1].content == "answer 01.." * 4
+    # 旧回复 7 个 token，新回复 44 个字符 = 11 + 4
+    assert manager.stats()["window_tokens"] == before - 7 + 15
+
+
+def test_messages_without_ids_are_checked_by_content():
+    manager = _manager(max_messages=10)
+    history = [HumanMessage(content="q1"), AIMessage(content="a1")]
+    manager.apply(history)
+
+    # 调用方改写了最后一条（没有 id），窗口应重建而不是继续增量追加
+    rewritten = [HumanMessage(content="q1"), AIMessage(content="a1 edited"), HumanMessage(content="q2")]
+    window = manager.apply(rewritten)
+    assert [m.content for m in window] == ["q1", "a1 edited", "q2"]
+    assert manager.stats()["window_tokens"] == sum(manager.counter.count(m) for m in rewritten)
+
+    # 内容相同的新对象视为同一条消息，只追加新增部分
+    same = [HumanMessage(content="q1"), AIMessage(content="a1 edited"), HumanMessage(content="q2"),
+            AIMessage(content="a2")]
+    misses = manager.counter.misses
+    manager.apply(same)
+    assert manager.counter.misses == misses + 1
+    assert manager.stats()["window_messages"] == 4
+
+
+def test_adaptive_compression_refreshed_when_message_replaced():
+    from context_window_demo import ContextWindowManager
+
+    manager = ContextWindowManager(max_window_size=10, strategy="adaptive_window", tokenizer="approx")
+    first = manager._compress(AIMessage(content="x" * 80, id="a1"))
+    assert manager._compress(AIMessage(content="x" * 80, id="a1")) is first
+
+    replaced = manager._compress(AIMessage(content="y" * 80, id="a1"))
+    assert replaced.content == "y" * 50 + "..."
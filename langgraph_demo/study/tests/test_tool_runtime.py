@@ -0,0 +1,135 @@
+# -*- coding: utf-8 -*-
+"""tool_runtime：缓存、in-flight 合并、超时、错误、并发执行，以及工具内 LLM 调用的回调传递"""
+
+import asyncio
+import time
+from typing import TypedDict
+
+import pytest
+from langchain_core.language_models.fake_chat_models import GenericFakeChatModel
+from langchain_core.messages import AIMessage, HumanMessage
+from langgraph.graph import END, START, StateGraph
+
+from tool_runtime import ToolRuntime
+
+
+@pytest.fixture
+def runtime():
+    return ToolRuntime()
+
+
+def test_ttl_cache_hit_and_inflight_merge(runtime):
+    calls = []
+
+    @runtime.tool(ttl=60)
+    async def lookup(key: str) -> str:
+        """查询"""
+        calls.append(key)
+        await asyncio.sleep(0.05)
+        return key.upper()
+
+    async def concurrent():
+        return await asyncio.gather(*(runtime.acall("lookup", key="a") for _ in range(3)))
+
+    assert asyncio.run(concurrent()) == ["A", "A", "A"]
+    assert runtime.call("lookup", key="a") == "A"
+    assert calls == ["a"]
+    stats = runtime.stats()["lookup"]
+    assert stats["calls"] == 4 and stats["merged"] == 2 and stats["cache_hits"] == 1
+
+
+def test_timeout_returns_message_and_error_propagates(runtime):
+    @runtime.tool(timeout=0.05)
+    async def slow() -> str:
+        """慢工具"""
+        await asyncio.sleep(1)
+        return "done"
+
+    @runtime.tool()
+    async def broken() -> str:
+        """出错的工具"""
+        raise ValueError("boom")
+
+    assert "超时" in runtime.call("slow")
+    with pytest.raises(ValueError, match="boom"):
+        runtime.call("broken")
+    assert runtime.stats()["slow"]["timeouts"] == 1
+    assert runtime.stats()["broken"]["errors"] == 1
+
+
+def test_run_tool_calls_runs_concurrently_in_order(runtime):
+    @runtime.tool()
+    async def wait(seconds: float) -> str:
+        """等待"""
+        await asyncio.sleep(seconds)
+        return str(seconds)
+
+    @runtime.tool()
+    async def broken() -> str:
+        """出错的工具"""
+        raise RuntimeError("boom")
+
+    started = time.perf_counter()
+    messages = runtime.run_tool_calls([
+        {"name": "wait", "args": {"seconds": 0.2}, "id": "1"},
+        {"name": "wait", "args": {"seconds": 0.1}, "id": "2"},
+        {"name": "broken", "args": {}, "id": "3"},
+    ])
+
+    assert time.perf_counter() - started < 0.3
+    assert [m.tool_call_id for m in messages] == ["1", "2", "3"]
+    assert [m.content for m in messages[:2]] == ["0.2", "0.1"]
+    assert messages[2].status == "error"
+
+
+def test_register_rejects_sync_function(runtime):
+    def plain() -> str:
+        return ""
+
+    with pytest.raises(TypeError):
+        runtime.register(plain)
+
+
+class _State(TypedDict):
+    answer: str
+
+
+def _graph_with_tool(runtime, use_async: bool):
+    model = GenericFakeChatModel(messages=iter([AIMessage(content="from tool")]))
+
+    @runtime.tool()
+    async def ask(question: str) -> str:
+        """在工具里调用模型"""
+        return (await model.ainvoke([HumanMessage(content=question)])).content
+
+    tool = runtime.as_tool("ask")
+
+    if use_async:
+        async def node(state: _State):
+            return {"answer": await tool.ainvoke({"question": "hi"})}
+    else:
+        def node(state: _State):
+            return {"answer": tool.invoke({"question": "hi"})}
+
+    builder = StateGraph(_State)
+    builder.add_node("use_tool", node)
+    builder.add_edge(START, "use_tool")
+    builder.add_edge("use_tool", END)
+    return builder.compile()
+
+
+@pytest.mark.parametrize("use_async", [False, True])
+def test_llm_calls_inside_tools_keep_node_callbacks(runtime, use_async):
+    """工具在后台事件循环中执行，其中的 LLM 调用仍出现在节点的 messages 流里"""
+    graph = _graph_with_tool(runtime, use_async)
+
+    if use_async:
+        async def collect():
+            return [chunk async for chunk in graph.astream({"answer": ""}, stream_mode="messages")]
+        chunks = asyncio.run(collect())
+    else:
+        chunks = list(graph.stream({"answer": ""}, stream_mode="messages"))
+
+    llm_chunks = [(c, m) for c, m in chunks if isinstance(c, AIMessage)]
+    assert llm_chunks and {m["langgraph_node"] for _, m in llm_chunks} == {"use_tool"}
+    assert "".join(c.content for c, _ in llm_chunks) == "from tool"
@@ -0,0 +1,155 @@
+# -*- coding: utf-8 -*-
+"""vector_store：与 InMemoryStore 的检索结果一致、过滤、游标分页、写入监听、持久化与重新加载"""
+
+from typing import List
+
+import pytest
+from langchain_core.embeddings import Embeddings
+from langgraph.store.memory import InMemoryStore
+
+from vector_store import VectorIndexStore
+
+TOPICS = ["coffee", "tea", "python", "rust"]
+
+
+class TopicEmbeddings(Embeddings):
+    """按话题词出现次数生成向量，记录嵌入的文本数量"""
+
+    def __init__(self):
+        self.embedded = 0
+
+    def _vector(self, text: str) -> List[float]:
+        text = text.lower()
+        return [float(text.count(topic)) + 0.01 for topic in TOPICS]
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        self.embedded += len(texts)
+        return [self._vector(t) for t in texts]
+
+    def embed_query(self, text: str) -> List[float]:
+        return self._vector(text)
+
+
+MEMORIES = {
+    "m1": {"content": "likes coffee in the morning", "kind": "food", "score": 3},
+    "m2": {"content": "drinks tea after lunch, tea is great", "kind": "food", "score": 5},
+    "m3": {"content": "writes python at work", "kind": "code", "score": 4},
+    "m4": {"content": "learning rust and python", "kind": "code", "score": 1},
+}
+
+
+def _index(embeddings):
+    return {"embed": embeddings, "dims": len(TOPICS), "fields": ["content"]}
+
+
+def _fill(store, namespace=("user", "alice")):
+    for key, value in MEMORIES.items():
+        store.put(namespace, key, value)
+
+
+def _keys(items):
+    return [item.key for item in items]
+
+
+@pytest.fixture
+def store():
+    s = VectorIndexStore(index=_index(TopicEmbeddings()))
+    _fill(s)
+    return s
+
+
+@pytest.mark.parametrize("query, filter", [
+    ("tea", None),
+    ("python", None),
+    ("python", {"kind": "code"}),
+    ("coffee", {"score": {"$gte": 3}}),
+    ("rust", {"kind": {"$ne": "food"}}),
+])
+def test_search_matches_in_memory_store(store, query, filter):
+    reference = InMemoryStore(index=_index(TopicEmbeddings()))
+    _fill(reference)
+
+    expected = reference.search(("user",), query=query, filter=filter, limit=3)
+    actual = store.search(("user",), query=query, filter=filter, limit=3)
+
+    assert _keys(actual) == _keys(expected)
+    assert [round(i.score, 4) for i in actual] == [round(i.score, 4) for i in expected]
+
+
+def test_get_put_delete_and_namespace_prefix(store):
+    store.put(("user", "bob"), "m1", {"content": "tea"})
+
+    assert store.get(("user", "alice"), "m3").value["kind"] == "code"
+    assert _keys(store.search(("user", "bob"), query="tea")) == ["m1"]
+    assert len(store.search(("user",), query="tea", limit=10)) == 5
+
+    store.delete(("user", "alice"), "m2")
+    assert store.get(("user", "alice"), "m2") is None
+    assert "m2" not in _keys(store.search(("user",), query="tea", limit=10))
+    assert sorted(store.list_namespaces(prefix=("user",))) == [("user", "alice"), ("user", "bob")]
+
+
+def test_overwrite_replaces_vector(store):
+    store.put(("user", "alice"), "m1", {"content": "rust rust rust", "kind": "code", "score": 0})
+
+    assert _keys(store.search(("user",), query="rust", limit=1)) == ["m1"]
+
+
+def test_list_items_pages_in_key_order(store):
+    store.put(("user", "bob"), "a", {"content": "x", "kind": "code"})
+
+    page, cursor = store.list_items(("user",), limit=3)
+    assert _keys(page) == ["m1", "m2", "m3"]
+    rest, end = store.list_items(("user",), limit=3, cursor=cursor)
+    assert _keys(rest) == ["m4", "a"]
+    assert end is None
+
+    code, _ = store.list_items(("user",), filter={"kind": "code"})
+    assert _keys(code) == ["m3", "m4", "a"]
+
+
+def test_write_listener_receives_written_namespaces(store):
+    writes = []
+    store.add_write_listener(writes.append)
+
+    store.search(("user",), query="tea")
+    store.put(("user", "bob"), "k", {"content": "tea"})
+    store.delete(("user", "alice"), "m1")
+
+    assert writes == [{("user", "bob")}, {("user", "alice")}]
+
+
+def test_save_and_reload_without_reembedding(tmp_path):
+    embeddings = TopicEmbeddings()
+    store = VectorIndexStore(index=_index(embeddings), persist_dir=str(tmp_path))
+    _fill(store)
+    store.save()
+    expected = _keys(store.search(("user",), query="python", limit=2))
+
+    reloaded_embeddings = TopicEmbeddings()
+    reloaded = VectorIndexStore(index=_index(reloaded_embeddings), persist_dir=str(tmp_path))
+
+    assert reloaded_embeddings.embedded == 0
+    assert _keys(reloaded.search(("user",), query="python", limit=2)) == expected
+    assert reloaded.get(("user", "alice"), "m2").value == MEMORIES["m2"]
+
+    # 重新加载后继续写入与再次保存，旧的向量文件被清理
+    reloaded.put(("user", "alice"), "m5", {"content": "rust"})
+    reloaded.save()
+    assert len([n for n in tmp_path.iterdir() if n.name.startswith("vectors_")]) == 1
+    assert _keys(reloaded.search(("user",), query="rust", limit=1)) == ["m5"]
+
+
+def test_save_requires_persist_dir(store):
+    with pytest.raises(ValueError):
+        store.save()
+
+
+def test_dims_mismatch_on_load(tmp_path):
+    store = VectorIndexStore(index=_index(TopicEmbeddings()), persist_dir=str(tmp_path))
+    _fill(store)
+    store.save()
+
+    with pytest.raises(ValueError, match="不一致"):
+        VectorIndexStore(index={"embed": TopicEmbeddings(), "dims": 8, "fields": ["content"]},
+                         persist_dir=str(tmp_path))
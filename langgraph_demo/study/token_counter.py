@@ -0,0 +1,245 @@
+# -*- coding: utf-8 -*-
+"""
+本地 token 计数服务
+供 15_langmem_summarization_demo.py 等需要频繁统计对话 token 的演示共用
+
+设计要点：
+1. 按模型家族选择分词器，每个家族只加载一次：
+   - qwen / deepseek：从本地 tokenizer.json 加载（需要 tokenizers 包），
+     目录为 {tokenizer_dir}/{family}/tokenizer.json，tokenizer_dir 默认取环境变量 TOKENIZER_DIR
+   - gpt / o 系列：tiktoken
+   - 以上都不可用时回退到按字符估算，只警告一次
+2. 单条消息的 token 数按消息 id（无 id 时按类型 + 内容）缓存，历史消息不会重复编码
+3. count_messages 对未命中的消息批量编码（encode_batch），一次调用完成
+4. 实例可直接作为 SummarizationNode 的 token_counter 使用
+5. 本模块是唯一的 token 计数实现：max_message_window/token_window.py 的分词器也从这里加载
+
+模型家族按模型名中的词段识别（按 / : _ - 空格切分），例如 "o1" 只匹配 "o1-mini" 这样的独立词段，
+不会误中 "yolo1"、"gpt-4o3x" 之类的名称。
+"""
+
+import json
+import os
+import re
+import threading
+from collections import OrderedDict
+from typing import Callable, Dict, Hashable, List, Optional, Sequence, Tuple
+
+from langchain_core.messages import BaseMessage
+
+from config import logger
+
+try:
+    from tokenizers import Tokenizer as HFTokenizer
+except ImportError:  # tokenizers 为可选依赖，缺失时 qwen/deepseek 回退到 tiktoken 或估算
+    HFTokenizer = None
+
+# 分词器以 "批量编码函数" 的形式保存：List[str] -> List[int]（每段文本的 token 数）
+BatchEncoder = Callable[[List[str]], List[int]]
+
+# 模型名词段（完整匹配）-> 模型家族，按顺序取第一个命中
+MODEL_FAMILIES: List[Tuple[str, str]] = [
+    (r"qwen[\w.]*", "qwen"),
+    (r"deepseek[\w.]*", "deepseek"),
+    (r"(?:chat)?gpt[\w.]*", "openai"),
+    (r"o[134]", "openai"),
+]
+_FAMILY_PATTERNS = [(re.compile(pattern), family) for pattern, family in MODEL_FAMILIES]
+_NAME_SEPARATORS = re.compile(r"[/:_\-\s]+")
+
+_CJK_RE = re.compile(r"[　-〿一-鿿＀-￯]")
+
+_ENCODERS: Dict[str, Tuple[str, BatchEncoder]] = {}
+_ENCODERS_LOCK = threading.Lock()
+
+
+def detect_family(model_name: str) -> str:
+    """根据模型名判断模型家族，无法识别时返回 "openai"（使用 tiktoken 的通用编码）"""
+    segments = [s for s in _NAME_SEPARATORS.split(model_name.lower()) if s]
+    for pattern, family in _FAMILY_PATTERNS:
+        if any(pattern.fullmatch(segment) for segment in segments):
+            return family
+    return "openai"
+
+
+def approx_count(text: str) -> int:
+    """近似估算：中日韩字符按 1 个 token，其余按 4 个字符 1 个 token"""
+    cjk = len(_CJK_RE.findall(text))
+    return cjk + (len(text) - cjk + 3) // 4
+
+
+def _load_hf_encoder(family: str, tokenizer_dir: str) -> Optional[BatchEncoder]:
+    path = os.path.join(tokenizer_dir, family, "tokenizer.json")
+    if HFTokenizer is None or not os.path.exists(path):
+        return None
+    tokenizer = HFTokenizer.from_file(path)
+    tokenizer.no_padding()
+    tokenizer.no_truncation()
+
+    def encode(texts: List[str]) -> List[int]:
+        return [len(e.ids) for e in tokenizer.encode_batch(texts, add_special_tokens=False)]
+
+    return encode
+
+
+def load_tiktoken_encoder(model_name: Optional[str] = None) -> Optional[BatchEncoder]:
+    """加载 tiktoken 编码（未指定或无法识别模型时用 cl100k_base），不可用时返回 None"""
+    try:
+        import tiktoken
+        try:
+            if model_name is None:
+                raise KeyError(model_name)
+            encoding = tiktoken.encoding_for_model(model_name)
+        except KeyError:
+            encoding = tiktoken.get_encoding("cl100k_base")
+    except Exception as e:
+        logger.warning(f"tiktoken 不可用: {e}")
+        return None
+
+    def encode(texts: List[str]) -> List[int]:
+        return [len(ids) for ids in encoding.encode_ordinary_batch(texts)]
+
+    return encode
+
+
+def get_encoder(model_name: str, tokenizer_dir: Optional[str] = None) -> Tuple[str, BatchEncoder]:
+    """
+    返回 (分词器描述, 批量编码函数)，同一模型家族在进程内只加载一次
+    """
+    family = detect_family(model_name)
+    tokenizer_dir = tokenizer_dir or os.environ.get("TOKENIZER_DIR", "tokenizers")
+    cache_key = family if family != "openai" else f"openai:{model_name}"
+    with _ENCODERS_LOCK:
+        cached = _ENCODERS.get(cache_key)
+        if cached is not None:
+            return cached
+
+        encoder = None
+        source = ""
+        if family != "openai":
+            encoder = _load_hf_encoder(family, tokenizer_dir)
+            source = f"{family}:{os.path.join(tokenizer_dir, family, 'tokenizer.json')}"
+            if encoder is None:
+                logger.warning(f"未找到 {family} 本地分词器（{source}），改用 tiktoken 近似")
+        if encoder is None:
+            encoder = load_tiktoken_encoder(model_name)
+            source = "tiktoken"
+        if encoder is None:
+            logger.warning("没有可用的分词器，使用字符估算 token 数量")
+            encoder = lambda texts: [approx_count(t) for t in texts]
+            source = "approx"
+
+        _ENCODERS[cache_key] = (source, encoder)
+        logger.info(f"🔤 模型 {model_name} 使用分词器: {source}")
+        return source, encoder
+
+
+def message_text(message) -> str:
+    """提取消息中参与计数的文本（内容 + 工具调用参数）"""
+    if isinstance(message, dict):
+        content = message.get("content", "")
+        tool_calls = message.get("tool_calls")
+    else:
+        content = getattr(message, "content", message)
+        tool_calls = getattr(message, "tool_calls", None)
+    if isinstance(content, list):
+        # 多模态内容只统计文本部分
+        parts = []
+        for item in content:
+            if isinstance(item, str):
+                parts.append(item)
+            elif isinstance(item, dict) and "text" in item:
+                parts.append(item["text"])
+            elif hasattr(item, "text"):
+                parts.append(item.text)
+        content = "\n".join(parts)
+    elif not isinstance(content, str):
+        content = str(content)
+    if tool_calls:
+        content += json.dumps(tool_calls, ensure_ascii=False, default=str)
+    return content
+
+
+class TokenCounterService:
+    """
+    带缓存的消息 token 计数器
+
+    用法：
+        counter = TokenCounterService(config.model)
+        counter.count_messages(messages)      # 整段对话的 token 数
+        counter.count_batch(messages)         # 每条消息各自的 token 数
+        SummarizationNode(token_counter=counter, ...)
+    """
+
+    # 与 OpenAI 计数规则一致：每条消息的角色/分隔符开销，以及回复前缀开销
+    tokens_per_message = 3
+    tokens_per_reply = 3
+
+    def __init__(self, model_name: str, *, tokenizer_dir: Optional[str] = None, cache_size: int = 50000):
+        self.model_name = model_name
+        self.source, self._encode = get_encoder(model_name, tokenizer_dir)
+        self.cache_size = cache_size
+        self._cache: "OrderedDict[Hashable, int]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def _key(message) -> Hashable:
+        msg_id = message.get("id") if isinstance(message, dict) else getattr(message, "id", None)
+        if msg_id:
+            return msg_id
+        # 无 id 的消息（如摘要生成的系统消息）按类型 + 文本缓存
+        kind = message.get("role") if isinstance(message, dict) else getattr(message, "type", type(message).__name__)
+        return (kind, message_text(message))
+
+    def count_text(self, text: str) -> int:
+        return self._encode([text])[0]
+
+    def count_batch(self, messages: Sequence[BaseMessage]) -> List[int]:
+        """返回每条消息的 token 数（含单条消息开销），未缓存的消息一次批量编码"""
+        keys = [self._key(m) for m in messages]
+        counts: List[Optional[int]] = [None] * len(messages)
+        missing: Dict[Hashable, List[int]] = {}
+        with self._lock:
+            for i, key in enumerate(keys):
+                cached = self._cache.get(key)
+                if cached is not None:
+                    self._cache.move_to_end(key)
+                    self.hits += 1
+                    counts[i] = cached
+                else:
+                    missing.setdefault(key, []).append(i)
+
+        if missing:
+            texts = [message_text(messages[positions[0]]) for positions in missing.values()]
+            encoded = self._encode(texts)
+            with self._lock:
+                for (key, positions), n in zip(missing.items(), encoded):
+                    n += self.tokens_per_message
+                    self.misses += 1
+                    self._cache[key] = n
+                    for i in positions:
+                        counts[i] = n
+                while len(self._cache) > self.cache_size:
+                    self._cache.popitem(last=False)
+        return counts
+
+    def count_messages(self, messages: Sequence[BaseMessage]) -> int:
+        """整段消息作为模型输入时的 token 数"""
+        if not messages:
+            return 0
+        return sum(self.count_batch(messages)) + self.tokens_per_reply
+
+    __call__ = count_messages
+
+    def stats(self) -> Dict[str, object]:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "tokenizer": self.source,
+                "cached_messages": len(self._cache),
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+            }
@@ -0,0 +1,290 @@
+# -*- coding: utf-8 -*-
+"""
+共享异步工具运行时
+供 multi_agent/12-2、12-4、12-5 等多智能体示例共用：工具只实现一次（async），各团队按名字取用
+
+设计要点：
+1. 工具以 async 函数实现，全部在运行时自己的后台事件循环中执行；
+   同步调用方（ToolNode 的线程池）和异步调用方（ainvoke / astream）最终都提交到这个循环
+2. 同一轮 AIMessage 中的多个并行 tool_call 会被并发执行（ToolNode 同步模式按线程并发、
+   异步模式 asyncio.gather，run_tool_calls 也可直接并发执行），一轮耗时取决于最慢的工具
+3. 每个工具有独立策略 ToolPolicy：结果缓存 TTL、超时时间、最大并发数
+4. 相同参数的并发调用只真正执行一次（in-flight 合并），结果写入 TTL 缓存
+5. stats() 按工具统计调用次数、缓存命中、超时、失败与平均耗时，print_stats() 打印给示例脚本看
+6. 提交到后台循环的调用在调用方的 contextvars 上下文中执行：工具内部的 LLM 调用仍挂在
+   当前工具运行（及 LangGraph 节点）的回调下，流式输出与追踪不会断开
+
+注意：超时的工具调用返回一段说明文字（与示例工具出错时返回文字的约定一致），不抛异常。
+"""
+
+import asyncio
+import concurrent.futures
+import functools
+import json
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Any, Awaitable, Callable, Dict, Iterable, List, Optional, Tuple
+
+from langchain_core.messages import ToolMessage
+from langchain_core.tools import StructuredTool
+from langchain_core.tools.base import create_schema_from_function
+
+from config import logger
+
+AsyncToolFn = Callable[..., Awaitable[Any]]
+
+
+@dataclass
+class ToolPolicy:
+    """单个工具的执行策略"""
+    timeout: Optional[float] = 30.0   # 单次调用超时（秒），None 表示不限
+    ttl: float = 0.0                  # 结果缓存时间（秒），0 表示不缓存（有副作用的工具）
+    max_concurrency: int = 4          # 同一工具同时执行的最大调用数
+
+
+class TTLCache:
+    """带过期时间的 LRU 缓存"""
+
+    def __init__(self, max_entries: int = 512):
+        self.max_entries = max_entries
+        self._data: "OrderedDict[Tuple[str, str], Tuple[float, Any]]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: Tuple[str, str]) -> Tuple[bool, Any]:
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is None:
+                return False, None
+            expires, value = entry
+            if expires < time.monotonic():
+                del self._data[key]
+                return False, None
+            self._data.move_to_end(key)
+            return True, value
+
+    def put(self, key: Tuple[str, str], value: Any, ttl: float) -> None:
+        if ttl <= 0:
+            return
+        with self._lock:
+            self._data[key] = (time.monotonic() + ttl, value)
+            self._data.move_to_end(key)
+            while len(self._data) > self.max_entries:
+                self._data.popitem(last=False)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._data.clear()
+
+
+class _ToolEntry:
+    def __init__(self, name: str, fn: AsyncToolFn, policy: ToolPolicy, description: str):
+        self.name = name
+        self.fn = fn
+        self.policy = policy
+        self.description = description
+        self.semaphore: Optional[asyncio.Semaphore] = None  # 在运行时事件循环中惰性创建
+        self.stats = {"calls": 0, "cache_hits": 0, "merged": 0, "timeouts": 0, "errors": 0, "total_time": 0.0}
+
+
+class ToolRuntime:
+    """
+    共享异步工具运行时
+
+    用法：
+        runtime = ToolRuntime()
+
+        @runtime.tool(ttl=600, timeout=5, max_concurrency=4)
+        async def get_weather(location: str) -> str:
+            \"\"\"获取指定地点的天气信息\"\"\"
+            ...
+
+        agent = create_react_agent(model, tools=runtime.as_tools(["get_weather"]), ...)
+    """
+
+    def __init__(self, default_policy: Optional[ToolPolicy] = None, cache_size: int = 512):
+        self.default_policy = default_policy or ToolPolicy()
+        self.cache = TTLCache(cache_size)
+        self._tools: Dict[str, _ToolEntry] = {}
+        self._inflight: Dict[Tuple[str, str], asyncio.Future] = {}
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._loop_lock = threading.Lock()
+
+    # ---------- 注册 ----------
+
+    def register(self, fn: AsyncToolFn, *, name: Optional[str] = None, description: Optional[str] = None,
+                 **policy: Any) -> AsyncToolFn:
+        """注册一个 async 工具函数，policy 可覆盖 timeout / ttl / max_concurrency"""
+        if not asyncio.iscoroutinefunction(fn):
+            raise TypeError(f"工具 {fn.__name__} 必须是 async 函数")
+        tool_name = name or fn.__name__
+        merged = {**self.default_policy.__dict__, **policy}
+        self._tools[tool_name] = _ToolEntry(tool_name, fn, ToolPolicy(**merged),
+                                            description or (fn.__doc__ or tool_name).strip())
+        return fn
+
+    def tool(self, name: Optional[str] = None, **policy: Any) -> Callable[[AsyncToolFn], AsyncToolFn]:
+        """注册工具的装饰器"""
+        def decorator(fn: AsyncToolFn) -> AsyncToolFn:
+            return self.register(fn, name=name, **policy)
+        return decorator
+
+    def names(self) -> List[str]:
+        return list(self._tools)
+
+    # ---------- 事件循环 ----------
+
+    def _ensure_loop(self) -> asyncio.AbstractEventLoop:
+        with self._loop_lock:
+            if self._loop is None:
+                loop = asyncio.new_event_loop()
+                thread = threading.Thread(target=loop.run_forever, name="tool-runtime", daemon=True)
+                thread.start()
+                self._loop = loop
+            return self._loop
+
+    def _in_runtime_loop(self) -> bool:
+        try:
+            return asyncio.get_running_loop() is self._loop
+        except RuntimeError:
+            return False
+
+    def _submit(self, coro: Awaitable[Any]) -> concurrent.futures.Future:
+        """
+        把协程提交到运行时事件循环
+
+        run_coroutine_threadsafe 在调用方线程里登记回调，回调（及其创建的任务）运行在调用方 contextvars 的副本中，
+        因此工具内的 LLM 调用能拿到当前工具运行的回调与 LangGraph 运行配置。
+        所有跨线程提交都走这里，不要改成在后台循环里直接 create_task
+        """
+        return asyncio.run_coroutine_threadsafe(coro, self._ensure_loop())
+
+    # ---------- 执行 ----------
+
+    @staticmethod
+    def _cache_key(name: str, kwargs: Dict[str, Any]) -> Tuple[str, str]:
+        return name, json.dumps(kwargs, sort_keys=True, ensure_ascii=False, default=str)
+
+    async def _execute(self, name: str, kwargs: Dict[str, Any]) -> Any:
+        """在运行时事件循环中执行：缓存 -> in-flight 合并 -> 并发限制 + 超时"""
+        entry = self._tools[name]
+        stats = entry.stats
+        stats["calls"] += 1
+        key = self._cache_key(name, kwargs)
+
+        hit, value = self.cache.get(key)
+        if hit:
+            stats["cache_hits"] += 1
+            logger.info(f"🗃️ 工具缓存命中: {name}({key[1]})")
+            return value
+
+        pending = self._inflight.get(key)
+        if pending is not None:
+            stats["merged"] += 1
+            return await asyncio.shield(pending)
+
+        future = asyncio.get_running_loop().create_future()
+        self._inflight[key] = future
+        if entry.semaphore is None:
+            entry.semaphore = asyncio.Semaphore(entry.policy.max_concurrency)
+        start = time.perf_counter()
+        try:
+            async with entry.semaphore:
+                result = await asyncio.wait_for(entry.fn(**kwargs), timeout=entry.policy.timeout)
+        except asyncio.TimeoutError:
+            stats["timeouts"] += 1
+            logger.warning(f"⏰ 工具 {name} 超时（>{entry.policy.timeout}s）")
+            result = f"工具 {name} 调用超时（>{entry.policy.timeout}s），请稍后重试或换一种方式完成任务"
+            future.set_result(result)
+        except Exception as e:
+            stats["errors"] += 1
+            future.set_exception(e)
+            future.exception()  # 标记异常已被获取，避免无人等待时告警
+            raise
+        else:
+            self.cache.put(key, result, entry.policy.ttl)
+            future.set_result(result)
+        finally:
+            stats["total_time"] += time.perf_counter() - start
+            self._inflight.pop(key, None)
+        return result
+
+    async def acall(self, name: str, **kwargs: Any) -> Any:
+        """异步调用工具（可在任意事件循环中 await）"""
+        self._ensure_loop()
+        if self._in_runtime_loop():
+            return await self._execute(name, kwargs)
+        return await asyncio.wrap_future(self._submit(self._execute(name, kwargs)))
+
+    def call(self, name: str, **kwargs: Any) -> Any:
+        """同步调用工具：提交到运行时事件循环并等待结果"""
+        return self._submit(self._execute(name, kwargs)).result()
+
+    async def arun_tool_calls(self, tool_calls: Iterable[Dict[str, Any]]) -> List[ToolMessage]:
+        """并发执行一条 AIMessage 中的全部 tool_calls，按原顺序返回 ToolMessage"""
+        tool_calls = list(tool_calls)
+
+        async def run_one(call: Dict[str, Any]) -> ToolMessage:
+            try:
+                content = await self.acall(call["name"], **call.get("args", {}))
+                status = "success"
+            except Exception as e:
+                content, status = f"工具 {call['name']} 执行失败: {type(e).__name__}: {e}", "error"
+            return ToolMessage(content=str(content), name=call["name"], tool_call_id=call["id"], status=status)
+
+        return list(await asyncio.gather(*(run_one(call) for call in tool_calls)))
+
+    def run_tool_calls(self, tool_calls: Iterable[Dict[str, Any]]) -> List[ToolMessage]:
+        """arun_tool_calls 的同步版本"""
+        return self._submit(self.arun_tool_calls(tool_calls)).result()
+
+    # ---------- 与 LangChain 对接 ----------
+
+    def as_tool(self, name: str) -> StructuredTool:
+        """把已注册的工具包装为 StructuredTool（同时提供同步与异步入口，参数模式取自原函数签名）"""
+        entry = self._tools[name]
+
+        @functools.wraps(entry.fn)
+        def sync_entry(**kwargs: Any) -> Any:
+            return self.call(name, **kwargs)
+
+        @functools.wraps(entry.fn)
+        async def async_entry(**kwargs: Any) -> Any:
+            return await self.acall(name, **kwargs)
+
+        return StructuredTool.from_function(func=sync_entry, coroutine=async_entry, name=name,
+                                            description=entry.description,
+                                            args_schema=create_schema_from_function(name, entry.fn))
+
+    def as_tools(self, names: Optional[Iterable[str]] = None) -> List[StructuredTool]:
+        return [self.as_tool(name) for name in (names if names is not None else self._tools)]
+
+    # ---------- 统计 ----------
+
+    def stats(self) -> Dict[str, Dict[str, Any]]:
+        report = {}
+        for name, entry in self._tools.items():
+            s = entry.stats
+            executed = s["calls"] - s["cache_hits"] - s["merged"]
+            report[name] = {
+                "calls": s["calls"],
+                "cache_hits": s["cache_hits"],
+                "merged": s["merged"],
+                "timeouts": s["timeouts"],
+                "errors": s["errors"],
+                "avg_time": round(s["total_time"] / executed, 3) if executed else 0.0,
+            }
+        return report
+
+    def log_stats(self) -> None:
+        for name, s in self.stats().items():
+            if s["calls"]:
+                logger.info(f"🧰 工具 {name}: {s}")
+
+    def print_stats(self, title: str = "🧰 工具运行统计:") -> None:
+        """打印有调用记录的工具统计（调用次数、缓存命中、超时、平均耗时）"""
+        print(f"\n{title}")
+        for name, s in self.stats().items():
+            if s["calls"]:
+                print(f"   {name}: {s}")
@@ -0,0 +1,784 @@
+# -*- coding: utf-8 -*-
+"""
+向量索引存储
+供 13_/14_ 记忆演示共用的 BaseStore 实现，可直接替换 InMemoryStore(index=...)
+
+设计要点：
+1. 每个命名空间的向量存放在一块连续的 float32 矩阵中，写入时归一化，余弦相似度即点积
+2. 同一批次中命名空间前缀与过滤条件相同的查询合并为一次矩阵乘法打分，用 argpartition 取 top-k
+3. 单个命名空间的向量数超过 ann_threshold 且安装了 hnswlib 时，无过滤查询改走 HNSW 近似检索
+4. 可选 persist_dir：save() 将向量矩阵写为 .npy，重启后以 mmap 方式加载，不必重新嵌入；
+   保存后内存中的向量块也切换到新文件的 mmap，旧的 .npy 文件随之清理
+5. 命名空间前缀树（如 org → user → thread）：前缀检索、list_namespaces 只遍历相关子树
+6. 顶层标量字段的等值倒排索引，过滤条件先用索引求交集，再对剩余条件逐条判断
+7. list_items() 按 (命名空间, key) 有序游标分页，替代 search(query="", limit=1000) 全量枚举
+8. add_write_listener 注册写入监听：put / delete 完成后回调被写入的命名空间集合（用于让上层缓存失效）
+"""
+
+import asyncio
+import bisect
+import json
+import os
+import threading
+import uuid
+from collections import defaultdict
+from datetime import datetime, timezone
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Optional, Set, Tuple
+
+import numpy as np
+from langgraph.store.base import (
+    BaseStore,
+    GetOp,
+    IndexConfig,
+    Item,
+    ListNamespacesOp,
+    Op,
+    PutOp,
+    Result,
+    SearchItem,
+    SearchOp,
+)
+from langgraph.store.base.embed import ensure_embeddings, get_text_at_path, tokenize_path
+
+try:
+    import hnswlib
+except ImportError:  # hnswlib 为可选依赖，缺失时始终使用精确检索
+    hnswlib = None
+
+
+Namespace = Tuple[str, ...]
+
+_INITIAL_CAPACITY = 64
+_META_FILE = "meta.json"
+
+
+def _normalize(vectors: np.ndarray) -> np.ndarray:
+    """按行 L2 归一化，零向量保持为零"""
+    norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return vectors / norms
+
+
+def _filter_key(filter: Optional[Dict[str, Any]]) -> str:
+    """过滤条件的稳定键，用于合并同条件的查询"""
+    return json.dumps(filter, sort_keys=True, ensure_ascii=False, default=str) if filter else ""
+
+
+def _apply_operator(value: Any, operator: str, operand: Any) -> bool:
+    """过滤条件中的比较运算符（$eq / $ne / $gt / $gte / $lt / $lte）"""
+    if operator == "$eq":
+        return value == operand
+    if operator == "$ne":
+        return value != operand
+    if value is None:
+        return False
+    try:
+        if operator == "$gt":
+            return float(value) > float(operand)
+        if operator == "$gte":
+            return float(value) >= float(operand)
+        if operator == "$lt":
+            return float(value) < float(operand)
+        if operator == "$lte":
+            return float(value) <= float(operand)
+    except (TypeError, ValueError):
+        return False
+    raise ValueError(f"不支持的过滤运算符: {operator}")
+
+
+def _compare_values(item_value: Any, filter_value: Any) -> bool:
+    """按 JSONB 语义比较字段值与过滤条件：运算符字典、嵌套对象逐键比较、列表逐项比较"""
+    if isinstance(filter_value, dict):
+        if any(k.startswith("$") for k in filter_value):
+            return all(_apply_operator(item_value, op, operand) for op, operand in filter_value.items())
+        if not isinstance(item_value, dict):
+            return False
+        return all(_compare_values(item_value.get(k), v) for k, v in filter_value.items())
+    if isinstance(filter_value, (list, tuple)):
+        return (
+            isinstance(item_value, (list, tuple))
+            and len(item_value) == len(filter_value)
+            and all(_compare_values(iv, fv) for iv, fv in zip(item_value, filter_value))
+        )
+    return item_value == filter_value
+
+
+def _namespace_matches(condition: Any, namespace: Namespace) -> bool:
+    """命名空间是否满足 list_namespaces 的前缀/后缀条件（"*" 为单层通配符）"""
+    path = tuple(condition.path)
+    if len(namespace) < len(path):
+        return False
+    if condition.match_type == "prefix":
+        pairs = zip(namespace, path)
+    elif condition.match_type == "suffix":
+        pairs = zip(reversed(namespace), reversed(path))
+    else:
+        raise ValueError(f"不支持的匹配类型: {condition.match_type}")
+    return all(p == "*" or k == p for k, p in pairs)
+
+
+def _matches(item: Item, filter: Optional[Dict[str, Any]]) -> bool:
+    if not filter:
+        return True
+    return all(_compare_values(item.value.get(k), v) for k, v in filter.items())
+
+
+def _is_scalar(value: Any) -> bool:
+    return value is None or isinstance(value, (str, int, float, bool))
+
+
+def _equality_value(condition: Any) -> Tuple[bool, Any]:
+    """过滤条件能否用等值索引：纯标量或 {"$eq": 标量}"""
+    if _is_scalar(condition):
+        return True, condition
+    if isinstance(condition, dict) and len(condition) == 1 and _is_scalar(condition.get("$eq", [])):
+        return True, condition["$eq"]
+    return False, None
+
+
+# ============================================================================
+# 命名空间前缀树
+# ============================================================================
+
+class _NamespaceTrie:
+    """命名空间前缀树：每层一个节点，terminal 表示该路径本身是一个存有条目的命名空间"""
+
+    __slots__ = ("children", "terminal")
+
+    def __init__(self):
+        self.children: Dict[str, "_NamespaceTrie"] = {}
+        self.terminal = False
+
+    def insert(self, namespace: Namespace) -> None:
+        node = self
+        for part in namespace:
+            node = node.children.setdefault(part, _NamespaceTrie())
+        node.terminal = True
+
+    def remove(self, namespace: Namespace) -> None:
+        path = [self]
+        for part in namespace:
+            node = path[-1].children.get(part)
+            if node is None:
+                return
+            path.append(node)
+        path[-1].terminal = False
+        # 自底向上剪掉空节点
+        for depth in range(len(namespace), 0, -1):
+            node = path[depth]
+            if node.terminal or node.children:
+                break
+            del path[depth - 1].children[namespace[depth - 1]]
+
+    def under(self, prefix: Namespace, max_depth: Optional[int] = None) -> Iterator[Namespace]:
+        """按字典序遍历 prefix 下的命名空间；给定 max_depth 时到该层即截断，不再向下展开"""
+        node = self
+        for part in prefix:
+            node = node.children.get(part)
+            if node is None:
+                return
+        stack: List[Tuple[Namespace, "_NamespaceTrie"]] = [(tuple(prefix), node)]
+        while stack:
+            path, node = stack.pop()
+            if max_depth is not None and len(path) >= max_depth:
+                yield path
+                continue
+            if node.terminal:
+                yield path
+            for part in sorted(node.children, reverse=True):
+                stack.append((path + (part,), node.children[part]))
+
+
+# ============================================================================
+# 单个命名空间的向量块
+# ============================================================================
+
+class _VectorBlock:
+    """
+    单个命名空间的向量块：连续 float32 矩阵 + 行号到 key 的映射
+
+    一个 key 可能对应多行（多个索引字段），检索时对同一 key 取最高分（max pooling）。
+    删除只打标记，失效行超过一半时整体压缩。
+    """
+
+    def __init__(self, dims: int, matrix: Optional[np.ndarray] = None, rows: Optional[List[Optional[str]]] = None):
+        self.dims = dims
+        self.rows: List[Optional[str]] = list(rows or [])  # 行号 -> key，None 表示已删除
+        self.size = len(self.rows)
+        self.matrix = matrix if matrix is not None else np.empty((_INITIAL_CAPACITY, dims), dtype=np.float32)
+        self.alive = np.zeros(len(self.matrix), dtype=bool)
+        self.key_rows: Dict[str, List[int]] = {}
+        for row, key in enumerate(self.rows):
+            if key is not None:
+                self.key_rows.setdefault(key, []).append(row)
+                self.alive[row] = True
+        self.dead = self.size - int(self.alive.sum())
+        self.fanout = max((len(r) for r in self.key_rows.values()), default=1)
+        self.ann = None
+
+    @property
+    def n_alive(self) -> int:
+        return self.size - self.dead
+
+    def add(self, key: str, vectors: np.ndarray) -> None:
+        count = len(vectors)
+        end = self.size + count
+        if end > len(self.matrix):
+            # 容量倍增；mmap 加载的只读矩阵也在这里转为内存数组
+            capacity = max(len(self.matrix) * 2, end, _INITIAL_CAPACITY)
+            matrix = np.empty((capacity, self.dims), dtype=np.float32)
+            matrix[:self.size] = self.matrix[:self.size]
+            alive = np.zeros(capacity, dtype=bool)
+            alive[:self.size] = self.alive[:self.size]
+            self.matrix, self.alive = matrix, alive
+        self.matrix[self.size:end] = vectors
+        self.alive[self.size:end] = True
+        new_rows = list(range(self.size, end))
+        self.rows.extend([key] * count)
+        self.key_rows[key] = new_rows
+        self.fanout = max(self.fanout, count)
+        if self.ann is not None:
+            if end > self.ann.get_max_elements():
+                self.ann.resize_index(len(self.matrix))
+            self.ann.add_items(vectors, new_rows)
+        self.size = end
+
+    def remove(self, key: str) -> None:
+        rows = self.key_rows.pop(key, None)
+        if not rows:
+            return
+        for row in rows:
+            self.rows[row] = None
+            if self.ann is not None:
+                self.ann.mark_deleted(row)
+        self.alive[rows] = False
+        self.dead += len(rows)
+        if self.dead > _INITIAL_CAPACITY and self.dead * 2 > self.size:
+            self.compact()
+
+    def compact(self) -> None:
+        """丢弃已删除的行，重建行号映射（近似索引随之失效，下次检索时重建）"""
+        keep = self.alive[:self.size]
+        matrix = np.array(self.matrix[:self.size][keep], dtype=np.float32)
+        rows = [key for key in self.rows if key is not None]
+        self.__init__(self.dims, matrix, rows)
+
+    def _ann_index(self, threshold: int):
+        if hnswlib is None or self.n_alive < threshold:
+            return None
+        if self.ann is None:
+            index = hnswlib.Index(space="ip", dim=self.dims)
+            index.init_index(max_elements=len(self.matrix), ef_construction=200, M=16)
+            live = np.flatnonzero(self.alive[:self.size])
+            index.add_items(self.matrix[live], live)
+            self.ann = index
+        return self.ann
+
+    def search(self, queries: np.ndarray, limit: int, allowed: Optional[set] = None,
+               ann_threshold: int = 0) -> List[List[Tuple[str, float]]]:
+        """
+        对一组已归一化的查询向量打分，每个查询返回按分数降序、按 key 去重的前 limit 条 (key, score)
+
+        allowed 为通过过滤条件的 key 集合；为 None 时不过滤，此时可使用近似索引。
+        """
+        n_valid = self.n_alive
+        if n_valid == 0 or limit <= 0:
+            return [[] for _ in range(len(queries))]
+        # 前 limit 个不同 key 的最佳行必然落在前 limit * fanout 行之内
+        k = min(limit * self.fanout, n_valid)
+
+        index = self._ann_index(ann_threshold) if allowed is None else None
+        if index is not None:
+            index.set_ef(max(k, 64))
+            labels, distances = index.knn_query(queries, k=k)
+            candidates = [zip(labels[i], 1.0 - distances[i]) for i in range(len(queries))]
+        else:
+            scores = queries @ self.matrix[:self.size].T
+            mask = self.alive[:self.size]
+            if allowed is not None:
+                mask = mask & np.fromiter((key in allowed for key in self.rows), dtype=bool, count=self.size)
+                k = min(k, int(mask.sum()))
+                if k == 0:
+                    return [[] for _ in range(len(queries))]
+            scores[:, ~mask] = -np.inf
+            top = np.argpartition(-scores, k - 1, axis=1)[:, :k]
+            candidates = []
+            for i in range(len(queries)):
+                row_ids = top[i][np.argsort(-scores[i, top[i]])]
+                candidates.append(zip(row_ids, scores[i, row_ids]))
+
+        results = []
+        for pairs in candidates:
+            seen = set()
+            hits = []
+            for row, score in pairs:
+                key = self.rows[row]
+                if key is None or key in seen:
+                    continue
+                seen.add(key)
+                hits.append((key, float(score)))
+                if len(hits) >= limit:
+                    break
+            results.append(hits)
+        return results
+
+
+# ============================================================================
+# BaseStore 实现
+# ============================================================================
+
+class VectorIndexStore(BaseStore):
+    """
+    基于 NumPy 向量矩阵的 BaseStore，接口与 InMemoryStore 一致
+
+    用法：
+        store = VectorIndexStore(index={"embed": embeddings, "dims": 1024, "fields": ["content"]})
+        store = VectorIndexStore(index=..., persist_dir="./memory_index")  # 需要持久化时
+        store.save()
+    """
+
+    def __init__(self, *, index: Optional[IndexConfig] = None, persist_dir: Optional[str] = None,
+                 ann_threshold: int = 20000) -> None:
+        self._lock = threading.RLock()
+        self._data: Dict[Namespace, Dict[str, Item]] = {}
+        self._blocks: Dict[Namespace, _VectorBlock] = {}
+        self._trie = _NamespaceTrie()
+        self._sorted_keys: Dict[Namespace, List[str]] = {}
+        # [ns][字段][取值] -> key 集合，仅索引顶层标量字段
+        self._field_index: Dict[Namespace, Dict[str, Dict[Any, Set[str]]]] = {}
+        self._write_listeners: List[Callable[[Set[Namespace]], None]] = []
+        self.persist_dir = persist_dir
+        self.ann_threshold = ann_threshold
+        self.index_config = dict(index) if index else None
+        if self.index_config:
+            self.embeddings = ensure_embeddings(self.index_config.get("embed"))
+            self.dims = int(self.index_config["dims"])
+            self._fields = [
+                (p, tokenize_path(p)) if p != "$" else (p, p)
+                for p in (self.index_config.get("fields") or ["$"])
+            ]
+        else:
+            self.embeddings = None
+            self.dims = 0
+            self._fields = []
+        if persist_dir and os.path.exists(os.path.join(persist_dir, _META_FILE)):
+            self._load()
+
+    # ------------------------------------------------------------------
+    # 批量接口
+    # ------------------------------------------------------------------
+
+    def batch(self, ops: Iterable[Op]) -> List[Result]:
+        results, puts, searches = self._prepare_ops(ops)
+        # 嵌入计算耗时较长，放在锁外进行
+        query_vectors = {}
+        queries = self._collect_queries(searches)
+        if queries:
+            query_vectors = dict(zip(queries, (self.embeddings.embed_query(q) for q in queries)))
+        to_embed = self._extract_texts(puts)
+        vectors = self.embeddings.embed_documents(list(to_embed)) if to_embed else []
+        with self._lock:
+            self._batch_search(searches, query_vectors, results)
+            self._apply_puts(puts, to_embed, vectors)
+        self._notify_writes(puts)
+        return results
+
+    async def abatch(self, ops: Iterable[Op]) -> List[Result]:
+        results, puts, searches = self._prepare_ops(ops)
+        query_vectors = {}
+        queries = self._collect_queries(searches)
+        if queries:
+            embedded = await asyncio.gather(*(self.embeddings.aembed_query(q) for q in queries))
+            query_vectors = dict(zip(queries, embedded))
+        to_embed = self._extract_texts(puts)
+        vectors = await self.embeddings.aembed_documents(list(to_embed)) if to_embed else []
+        with self._lock:
+            self._batch_search(searches, query_vectors, results)
+            self._apply_puts(puts, to_embed, vectors)
+        self._notify_writes(puts)
+        return results
+
+    def add_write_listener(self, listener: Callable[[Set[Namespace]], None]) -> None:
+        """注册写入监听：每次批量写入完成后，以被写入的命名空间集合回调"""
+        self._write_listeners.append(listener)
+
+    def _notify_writes(self, puts: Dict[Tuple[Namespace, str], PutOp]) -> None:
+        if not puts or not self._write_listeners:
+            return
+        namespaces = {namespace for namespace, _ in puts}
+        for listener in self._write_listeners:
+            listener(namespaces)
+
+    def _prepare_ops(self, ops: Iterable[Op]):
+        results: List[Result] = []
+        puts: Dict[Tuple[Namespace, str], PutOp] = {}
+        searches: Dict[int, SearchOp] = {}
+        with self._lock:
+            for i, op in enumerate(ops):
+                if isinstance(op, GetOp):
+                    results.append(self._data.get(op.namespace, {}).get(op.key))
+                elif isinstance(op, SearchOp):
+                    searches[i] = op
+                    results.append(None)
+                elif isinstance(op, ListNamespacesOp):
+                    results.append(self._list_namespaces(op))
+                elif isinstance(op, PutOp):
+                    puts[(op.namespace, op.key)] = op
+                    results.append(None)
+                else:
+                    raise ValueError(f"Unknown operation type: {type(op)}")
+        return results, puts, searches
+
+    # ------------------------------------------------------------------
+    # 写入
+    # ------------------------------------------------------------------
+
+    def _extract_texts(self, puts: Dict[Tuple[Namespace, str], PutOp]) -> Dict[str, List[Tuple[Namespace, str]]]:
+        """收集需要嵌入的文本，相同文本只嵌入一次"""
+        to_embed: Dict[str, List[Tuple[Namespace, str]]] = defaultdict(list)
+        if not self.embeddings:
+            return to_embed
+        for op in puts.values():
+            if op.value is None or op.index is False:
+                continue
+            paths = self._fields if op.index is None else [(p, tokenize_path(p)) for p in op.index]
+            for _, field in paths:
+                for text in get_text_at_path(op.value, field):
+                    to_embed[text].append((op.namespace, op.key))
+        return to_embed
+
+    def _apply_puts(self, puts: Dict[Tuple[Namespace, str], PutOp],
+                    to_embed: Dict[str, List[Tuple[Namespace, str]]], vectors: List[List[float]]) -> None:
+        owned: Dict[Tuple[Namespace, str], List[int]] = defaultdict(list)
+        for i, owners in enumerate(to_embed.values()):
+            for owner in owners:
+                owned[owner].append(i)
+        matrix = _normalize(np.asarray(vectors, dtype=np.float32)) if len(vectors) else None
+
+        now = datetime.now(timezone.utc)
+        for (namespace, key), op in puts.items():
+            block = self._blocks.get(namespace)
+            if op.value is None:
+                self._delete_item(namespace, key)
+                if block is not None:
+                    block.remove(key)
+                continue
+            previous = self._data.get(namespace, {}).get(key)
+            self._insert_item(Item(
+                value=op.value,
+                key=key,
+                namespace=namespace,
+                created_at=previous.created_at if previous else now,
+                updated_at=now,
+            ))
+            # 覆盖写入时旧向量一律作废，保证向量与当前值一致
+            if block is not None:
+                block.remove(key)
+            rows = owned.get((namespace, key))
+            if rows:
+                if block is None:
+                    block = self._blocks[namespace] = _VectorBlock(self.dims)
+                block.add(key, matrix[rows])
+
+    def _insert_item(self, item: Item) -> None:
+        """写入条目并维护命名空间树、有序 key 列表与字段索引"""
+        namespace, key = item.namespace, item.key
+        items = self._data.get(namespace)
+        if items is None:
+            items = self._data[namespace] = {}
+            self._trie.insert(namespace)
+            self._sorted_keys[namespace] = []
+            self._field_index[namespace] = {}
+        if key in items:
+            self._unindex_fields(namespace, items[key])
+        else:
+            bisect.insort(self._sorted_keys[namespace], key)
+        items[key] = item
+        fields = self._field_index[namespace]
+        for field, value in item.value.items():
+            if _is_scalar(value):
+                fields.setdefault(field, {}).setdefault(value, set()).add(key)
+
+    def _delete_item(self, namespace: Namespace, key: str) -> None:
+        items = self._data.get(namespace)
+        if items is None or key not in items:
+            return
+        self._unindex_fields(namespace, items.pop(key))
+        keys = self._sorted_keys[namespace]
+        del keys[bisect.bisect_left(keys, key)]
+        if not items:
+            del self._data[namespace], self._sorted_keys[namespace], self._field_index[namespace]
+            self._trie.remove(namespace)
+
+    def _unindex_fields(self, namespace: Namespace, item: Item) -> None:
+        fields = self._field_index[namespace]
+        for field, value in item.value.items():
+            if not _is_scalar(value):
+                continue
+            keys = fields[field][value]
+            keys.discard(item.key)
+            if not keys:
+                del fields[field][value]
+
+    def _filter_keys(self, namespace: Namespace, filter: Dict[str, Any]) -> Set[str]:
+        """返回命名空间内满足过滤条件的 key：等值条件走倒排索引，其余条件在候选集上逐条判断"""
+        fields = self._field_index[namespace]
+        candidates: Optional[Set[str]] = None
+        rest = {}
+        for field, condition in filter.items():
+            indexable, value = _equality_value(condition)
+            if not indexable:
+                rest[field] = condition
+                continue
+            if value is None:
+                # 缺失字段同样等于 None，无法只靠索引判断
+                rest[field] = condition
+                continue
+            keys = fields.get(field, {}).get(value, set())
+            candidates = keys.copy() if candidates is None else candidates & keys
+            if not candidates:
+                return set()
+        items = self._data[namespace]
+        if candidates is None:
+            candidates = items.keys()
+        if not rest:
+            return set(candidates)
+        return {key for key in candidates if _matches(items[key], rest)}
+
+    # ------------------------------------------------------------------
+    # 检索
+    # ------------------------------------------------------------------
+
+    def _collect_queries(self, searches: Dict[int, SearchOp]) -> List[str]:
+        if not self.embeddings:
+            return []
+        return list(dict.fromkeys(op.query for op in searches.values() if op.query))
+
+    def _namespaces_under(self, prefix: Namespace) -> List[Namespace]:
+        return list(self._trie.under(prefix))
+
+    def _batch_search(self, searches: Dict[int, SearchOp], query_vectors: Dict[str, List[float]],
+                      results: List[Result]) -> None:
+        groups: Dict[Tuple[Namespace, str], List[int]] = defaultdict(list)
+        for i, op in searches.items():
+            if op.query and op.query in query_vectors:
+                groups[(op.namespace_prefix, _filter_key(op.filter))].append(i)
+            else:
+                results[i] = self._scan(op)
+
+        for idxs in groups.values():
+            ops = [searches[i] for i in idxs]
+            prefix, filter = ops[0].namespace_prefix, ops[0].filter
+            need = max(op.offset + op.limit for op in ops)
+            queries = _normalize(np.asarray([query_vectors[op.query] for op in ops], dtype=np.float32))
+
+            hits: List[List[Tuple[float, Namespace, str]]] = [[] for _ in ops]
+            namespaces = self._namespaces_under(prefix)
+            for ns in namespaces:
+                block = self._blocks.get(ns)
+                if block is None:
+                    continue
+                allowed = None
+                if filter:
+                    allowed = self._filter_keys(ns, filter)
+                    if not allowed:
+                        continue
+                for j, block_hits in enumerate(block.search(queries, need, allowed, self.ann_threshold)):
+                    hits[j].extend((score, ns, key) for key, score in block_hits)
+
+            for j, i in enumerate(idxs):
+                op = ops[j]
+                ranked = sorted(hits[j], key=lambda h: h[0], reverse=True)[op.offset:op.offset + op.limit]
+                found = [self._to_search_item(self._data[ns][key], score) for score, ns, key in ranked]
+                if len(found) < op.limit:
+                    # 与 InMemoryStore 一致：命中不足时用未建向量的条目补齐
+                    found.extend(self._unindexed(namespaces, filter, op.limit - len(found)))
+                results[i] = found
+
+    def _iter_matching(self, namespaces: List[Namespace], filter: Optional[Dict[str, Any]]) -> Iterator[Item]:
+        """遍历满足过滤条件的条目：命名空间按字典序，命名空间内按插入顺序"""
+        for ns in namespaces:
+            items = self._data[ns]
+            if not filter:
+                yield from items.values()
+                continue
+            allowed = self._filter_keys(ns, filter)
+            if allowed:
+                yield from (item for key, item in items.items() if key in allowed)
+
+    def _scan(self, op: SearchOp) -> List[SearchItem]:
+        """无查询文本时直接返回过滤后的条目（不打分）"""
+        matched = self._iter_matching(self._namespaces_under(op.namespace_prefix), op.filter)
+        out = []
+        for pos, item in enumerate(matched):
+            if pos >= op.offset + op.limit:
+                break
+            if pos >= op.offset:
+                out.append(self._to_search_item(item))
+        return out
+
+    def _unindexed(self, namespaces: List[Namespace], filter: Optional[Dict[str, Any]], count: int) -> List[SearchItem]:
+        out = []
+        for item in self._iter_matching(namespaces, filter):
+            if len(out) >= count:
+                break
+            block = self._blocks.get(item.namespace)
+            if block is None or item.key not in block.key_rows:
+                out.append(self._to_search_item(item))
+        return out
+
+    @staticmethod
+    def _to_search_item(item: Item, score: Optional[float] = None) -> SearchItem:
+        return SearchItem(
+            namespace=item.namespace,
+            key=item.key,
+            value=item.value,
+            created_at=item.created_at,
+            updated_at=item.updated_at,
+            score=score,
+        )
+
+    def _list_namespaces(self, op: ListNamespacesOp) -> List[Namespace]:
+        conditions = op.match_conditions or ()
+        # 前缀条件中通配符之前的部分可直接定位到子树
+        root: Namespace = ()
+        for condition in conditions:
+            if condition.match_type == "prefix":
+                literal = []
+                for part in condition.path:
+                    if part == "*":
+                        break
+                    literal.append(part)
+                if len(literal) > len(root):
+                    root = tuple(literal)
+        # 只有前缀条件且都不深于 max_depth 时，可以在树上截断遍历
+        shallow = op.max_depth is not None and all(
+            c.match_type == "prefix" and len(c.path) <= op.max_depth for c in conditions
+        )
+        if shallow:
+            namespaces = self._trie.under(root, op.max_depth)
+        else:
+            namespaces = self._trie.under(root)
+        namespaces = [ns for ns in namespaces if all(_namespace_matches(c, ns) for c in conditions)]
+        if op.max_depth is not None and not shallow:
+            namespaces = sorted({ns[:op.max_depth] for ns in namespaces})
+        return namespaces[op.offset:op.offset + op.limit]
+
+    # ------------------------------------------------------------------
+    # 游标分页
+    # ------------------------------------------------------------------
+
+    def list_items(self, namespace_prefix: Namespace, *, filter: Optional[Dict[str, Any]] = None,
+                   limit: int = 100, cursor: Optional[str] = None) -> Tuple[List[Item], Optional[str]]:
+        """
+        按 (命名空间, key) 顺序分页列出条目
+
+        Returns:
+            (本页条目, 下一页游标)；游标为 None 表示已到末尾
+        """
+        start_ns: Optional[Namespace] = None
+        start_key = ""
+        if cursor:
+            raw_ns, start_key = json.loads(cursor)
+            start_ns = tuple(raw_ns)
+        out: List[Item] = []
+        with self._lock:
+            for ns in self._trie.under(tuple(namespace_prefix)):
+                if start_ns is not None and ns < start_ns:
+                    continue
+                keys = self._sorted_keys[ns]
+                pos = bisect.bisect_right(keys, start_key) if ns == start_ns else 0
+                allowed = self._filter_keys(ns, filter) if filter else None
+                items = self._data[ns]
+                for key in keys[pos:]:
+                    if allowed is not None and key not in allowed:
+                        continue
+                    out.append(items[key])
+                    if len(out) >= limit:
+                        return out, json.dumps([list(ns), key], ensure_ascii=False)
+        return out, None
+
+    # ------------------------------------------------------------------
+    # 持久化
+    # ------------------------------------------------------------------
+
+    def save(self) -> None:
+        """
+        将条目与向量矩阵写入 persist_dir（元数据为 JSON，向量为 .npy）
+
+        每次保存使用新的向量文件名，元数据替换完成后才切换引用，中途失败不会破坏上一次的结果；
+        保存后各向量块改为映射新文件（不再常驻内存），不再被引用的旧 .npy 文件随即删除。
+        """
+        if not self.persist_dir:
+            raise ValueError("未配置 persist_dir，无法持久化")
+        os.makedirs(self.persist_dir, exist_ok=True)
+        generation = uuid.uuid4().hex[:8]
+        with self._lock:
+            namespaces = []
+            written: Dict[Namespace, Tuple[str, List[str]]] = {}
+            for i, (ns, items) in enumerate(self._data.items()):
+                entry = {
+                    "namespace": list(ns),
+                    "items": [
+                        {
+                            "key": item.key,
+                            "value": item.value,
+                            "created_at": item.created_at.isoformat(),
+                            "updated_at": item.updated_at.isoformat(),
+                        }
+                        for item in items.values()
+                    ],
+                }
+                block = self._blocks.get(ns)
+                if block is not None and block.n_alive:
+                    # 只写存活的行（相当于压缩），不改动内存中的向量块
+                    keep = block.alive[:block.size]
+                    rows = [key for key in block.rows if key is not None]
+                    filename = f"vectors_{i}_{generation}.npy"
+                    with open(os.path.join(self.persist_dir, filename), "wb") as f:
+                        np.save(f, np.asarray(block.matrix[:block.size][keep], dtype=np.float32))
+                    entry["vectors"] = filename
+                    entry["rows"] = rows
+                    written[ns] = (filename, rows)
+                namespaces.append(entry)
+            meta = {"dims": self.dims, "namespaces": namespaces}
+            tmp = os.path.join(self.persist_dir, _META_FILE + ".tmp")
+            with open(tmp, "w", encoding="utf-8") as f:
+                json.dump(meta, f, ensure_ascii=False)
+            os.replace(tmp, os.path.join(self.persist_dir, _META_FILE))
+
+            # 元数据落盘后，向量块切换到新文件的 copy-on-write 映射
+            for ns, (filename, rows) in written.items():
+                matrix = np.load(os.path.join(self.persist_dir, filename), mmap_mode="c")
+                self._blocks[ns] = _VectorBlock(matrix.shape[1], matrix, rows)
+            self._remove_stale_vectors({filename for filename, _ in written.values()})
+
+    def _remove_stale_vectors(self, keep: Set[str]) -> None:
+        """删除 persist_dir 中不再被元数据引用的向量文件（含上次中断遗留的临时文件）"""
+        for name in os.listdir(self.persist_dir):
+            if name.startswith("vectors_") and (name.endswith(".npy") or name.endswith(".npy.tmp")) and name not in keep:
+                try:
+                    os.remove(os.path.join(self.persist_dir, name))
+                except OSError:
+                    # Windows 上仍被映射的旧文件无法删除，留到下次保存时再清理
+                    pass
+
+    def _load(self) -> None:
+        with open(os.path.join(self.persist_dir, _META_FILE), encoding="utf-8") as f:
+            meta = json.load(f)
+        if self.dims and meta.get("dims") and meta["dims"] != self.dims:
+            raise ValueError(f"持久化向量维度 {meta['dims']} 与当前配置 {self.dims} 不一致")
+        for entry in meta["namespaces"]:
+            ns = tuple(entry["namespace"])
+            for raw in entry["items"]:
+                self._insert_item(Item(
+                    value=raw["value"],
+                    key=raw["key"],
+                    namespace=ns,
+                    created_at=datetime.fromisoformat(raw["created_at"]),
+                    updated_at=datetime.fromisoformat(raw["updated_at"]),
+                ))
+            if entry.get("vectors"):
+                # copy-on-write 映射：按需分页读取，原地修改不会写回磁盘
+                matrix = np.load(os.path.join(self.persist_dir, entry["vectors"]), mmap_mode="c")
+                self._blocks[ns] = _VectorBlock(matrix.shape[1], matrix, entry["rows"])